@@ -2,15 +2,30 @@
 """
 Flask API Server for Healthcare Realtime Events
 Provides REST API endpoints for HTML to get real events from database
+
+- Connection pool (psycopg2 ThreadedConnectionPool) thay vì connect mỗi request
+- Keyset pagination trên (detected_at, event_id) - dùng index, thứ tự ổn định với UUID
+  Index khuyến nghị: CREATE INDEX idx_ed_detected_event ON event_detections (detected_at, event_id)
+- Long-poll (/api/events/new?wait=25) và SSE (/api/events/stream) trả về ngay khi có event mới
+- Event insert muộn (edge replay từ local spool, detected_at gốc <= cursor) được SSE đẩy theo
+  created_at watermark, data có 'late': true và không có id (Last-Event-ID giữ nguyên)
+  Index khuyến nghị: CREATE INDEX idx_ed_created_at ON event_detections (created_at)
+- ETag / If-None-Match -> 304 khi kết quả không đổi
+- /api/stats đọc O(1) từ stats rollup (STATS_ROLLUP_ENABLED=true), backfill 1 lần khi rollup trống
 """
 
-from flask import Flask, jsonify, request, render_template_string
+from flask import Flask, jsonify, request, render_template_string, Response, stream_with_context
 from flask_cors import CORS
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 from dotenv import load_dotenv
+from contextlib import contextmanager
 import os
-from datetime import datetime, timedelta
+import sys
+import base64
+import hashlib
+from datetime import datetime, timedelta, timezone
 import threading
 import time
 import json
@@ -18,6 +33,24 @@ import json
 # Load environment
 load_dotenv()
 
+src_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+if src_path not in sys.path:
+    sys.path.insert(0, src_path)
+
+try:
+    from infrastructure.services.event_bus_service import event_bus, EVENT_FALL, EVENT_SEIZURE
+    EVENT_BUS_AVAILABLE = True
+except ImportError:
+    EVENT_BUS_AVAILABLE = False
+    event_bus = None
+
+try:
+    from infrastructure.services.stats_rollup_service import stats_rollup
+    STATS_ROLLUP_AVAILABLE = True
+except ImportError:
+    STATS_ROLLUP_AVAILABLE = False
+    stats_rollup = None
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for HTML
 
@@ -30,188 +63,482 @@ DB_CONFIG = {
     'database': os.getenv('DB_NAME', 'postgres')
 }
 
-def get_db_connection():
-    """Get database connection"""
+# Pool / long-poll settings
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+LONG_POLL_MAX_WAIT = float(os.getenv('LONG_POLL_MAX_WAIT', '30'))
+EVENT_WATCH_INTERVAL = float(os.getenv('EVENT_WATCH_INTERVAL', '0.5'))
+SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', '15'))
+
+EVENT_COLUMNS = """
+    event_id,
+    event_type,
+    confidence_score,
+    detected_at,
+    camera_id,
+    detection_data,
+    context_data,
+    created_at
+"""
+
+# Keyset đầu stream (trước mọi event)
+START_KEY = (datetime(1970, 1, 1, tzinfo=timezone.utc), '00000000-0000-0000-0000-000000000000')
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+def get_db_pool():
+    """Lazy ThreadedConnectionPool (DB_POOL_MIN..DB_POOL_MAX connections)"""
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                try:
+                    _db_pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX,
+                                                      cursor_factory=RealDictCursor, **DB_CONFIG)
+                    print(f"✅ Database pool ready ({DB_POOL_MIN}-{DB_POOL_MAX} connections)")
+                except Exception as e:
+                    print(f"❌ Database connection failed: {e}")
+                    return None
+    return _db_pool
+
+
+@contextmanager
+def db_cursor():
+    """Mượn connection từ pool, trả lại sau khi dùng (connection hỏng bị đóng, không trả vào pool)"""
+    pool = get_db_pool()
+    if pool is None:
+        raise psycopg2.OperationalError("Database connection failed")
+
+    conn = pool.getconn()
+    broken = False
     try:
-        conn = psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
-        return conn
+        with conn.cursor() as cursor:
+            yield cursor
+        conn.commit()
+    except psycopg2.Error:
+        broken = bool(conn.closed)
+        if not broken:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        raise
+    finally:
+        pool.putconn(conn, close=broken)
+
+
+def encode_cursor(detected_at, event_id) -> str:
+    """(detected_at, event_id) -> opaque URL-safe cursor"""
+    raw = f"{detected_at.isoformat()}|{event_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """Opaque cursor -> (detected_at, event_id). Raises ValueError khi cursor sai"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        detected_at, event_id = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|', 1)
+        return datetime.fromisoformat(detected_at), event_id
     except Exception as e:
-        print(f"❌ Database connection failed: {e}")
-        return None
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def serialize_event(row) -> dict:
+    event_dict = dict(row)
+    event_dict['cursor'] = encode_cursor(event_dict['detected_at'], event_dict['event_id'])
+    event_dict['event_id'] = str(event_dict['event_id'])
+    # Convert datetime to string
+    if event_dict['detected_at']:
+        event_dict['detected_at'] = event_dict['detected_at'].isoformat()
+    if event_dict['created_at']:
+        event_dict['created_at'] = event_dict['created_at'].isoformat()
+    if event_dict.get('camera_id') is not None:
+        event_dict['camera_id'] = str(event_dict['camera_id'])
+    return event_dict
+
+
+def query_events(cursor, after=None, before=None, limit: int = 20, user_id=None, camera_id=None):
+    """
+    Keyset pagination trên (detected_at, event_id)
+
+    Args:
+        after: (detected_at, event_id) - event mới hơn, thứ tự tăng dần
+        before: (detected_at, event_id) - event cũ hơn, thứ tự giảm dần
+    """
+    where, params = [], []
+    if after:
+        where.append("(detected_at, event_id) > (%s, %s::uuid)")
+        params.extend(after)
+    if before:
+        where.append("(detected_at, event_id) < (%s, %s::uuid)")
+        params.extend(before)
+    if user_id:
+        where.append("user_id = %s::uuid")
+        params.append(user_id)
+    if camera_id:
+        where.append("camera_id = %s::uuid")
+        params.append(camera_id)
+
+    order = 'ASC' if after else 'DESC'
+    cursor.execute(f"""
+        SELECT {EVENT_COLUMNS}
+        FROM event_detections
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY detected_at {order}, event_id {order}
+        LIMIT %s
+    """, params + [limit])
+    return [serialize_event(row) for row in cursor.fetchall()]
+
+
+def query_last_insert(cursor):
+    """created_at lớn nhất (watermark cho event insert muộn)"""
+    cursor.execute("SELECT MAX(created_at) AS last_insert FROM event_detections")
+    row = cursor.fetchone()
+    return row['last_insert'] if row else None
+
+
+def query_late_events(cursor, position, since, limit: int = 100, user_id=None, camera_id=None):
+    """
+    Event insert sau watermark `since` nhưng detected_at nằm ở/trước cursor `position`
+    (keyset theo detected_at không bao giờ trả về) - thứ tự created_at tăng dần
+    """
+    where = ["created_at > %s", "(detected_at, event_id) <= (%s, %s::uuid)"]
+    params = [since, *position]
+    if user_id:
+        where.append("user_id = %s::uuid")
+        params.append(user_id)
+    if camera_id:
+        where.append("camera_id = %s::uuid")
+        params.append(camera_id)
+    cursor.execute(f"""
+        SELECT {EVENT_COLUMNS}
+        FROM event_detections
+        WHERE {' AND '.join(where)}
+        ORDER BY created_at ASC, event_id ASC
+        LIMIT %s
+    """, params + [limit])
+    return [serialize_event(row) for row in cursor.fetchall()]
+
+
+def conditional_json(payload: dict, etag_source):
+    """jsonify + ETag; trả 304 khi If-None-Match khớp (etag_source không gồm timestamp của response)"""
+    etag = hashlib.sha1(json.dumps(etag_source, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _request_filters():
+    return {'user_id': request.args.get('user_id'), 'camera_id': request.args.get('camera_id')}
+
+
+def _request_limit(default: int, maximum: int = 100) -> int:
+    return max(1, min(request.args.get('limit', type=int, default=default), maximum))
+
+
+class EventWatcher:
+    """
+    1 background thread theo dõi event mới nhất cho tất cả long-poll/SSE clients
+    (1 query nhẹ mỗi EVENT_WATCH_INTERVAL thay vì mỗi client tự poll); Redis event bus đánh thức ngay
+    """
+
+    def __init__(self, interval: float = EVENT_WATCH_INTERVAL):
+        self.interval = interval
+        self.head = None
+        self.last_insert = None
+        self.version = 0
+        self.condition = threading.Condition()
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+            threading.Thread(target=self._run, daemon=True, name="EventWatcher").start()
+            if EVENT_BUS_AVAILABLE and event_bus.start_consumer('realtime_api', lambda event: self.notify(),
+                                                                event_types=[EVENT_FALL, EVENT_SEIZURE]):
+                print("🎧 Event watcher: Redis event bus wake-up enabled")
+
+    def poll_head(self):
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT detected_at, event_id
+                FROM event_detections
+                ORDER BY detected_at DESC, event_id DESC
+                LIMIT 1
+            """)
+            row = cursor.fetchone()
+        return (row['detected_at'], str(row['event_id'])) if row else None
+
+    def poll_last_insert(self):
+        with db_cursor() as cursor:
+            return query_last_insert(cursor)
+
+    def _run(self):
+        while True:
+            try:
+                head = self.poll_head()
+                # Event replay muộn không đổi head (detected_at cũ) -> theo dõi thêm created_at
+                last_insert = self.poll_last_insert()
+                if head != self.head or last_insert != self.last_insert:
+                    self.head = head
+                    self.last_insert = last_insert
+                    self.notify()
+            except Exception as e:
+                print(f"⚠️ Event watcher error: {e}")
+                time.sleep(2.0)
+            time.sleep(self.interval)
+
+    def notify(self):
+        with self.condition:
+            self.version += 1
+            self.condition.notify_all()
+
+    def wait(self, version: int, timeout: float) -> bool:
+        """Chờ tới khi version thay đổi. Returns False khi hết timeout"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.version != version, max(0.0, timeout))
+
+
+event_watcher = EventWatcher()
+
 
 @app.route('/api/health')
 def health_check():
     """Health check endpoint"""
+    pool = get_db_pool()
+    database = 'disconnected'
+    if pool:
+        try:
+            with db_cursor() as cursor:
+                cursor.execute("SELECT 1")
+            database = 'connected'
+        except Exception:
+            pass
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'database': 'connected' if get_db_connection() else 'disconnected'
+        'database': database
     })
 
 @app.route('/api/events/latest')
 def get_latest_events():
-    """Get latest healthcare events from database"""
+    """
+    Get latest healthcare events from database (mới nhất trước)
+    ?limit=20&before=<cursor> để lấy trang cũ hơn
+    """
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        cursor = conn.cursor()
-        
-        # Get latest events ordered by detected_at
-        cursor.execute("""
-            SELECT 
-                event_id,
-                event_type,
-                confidence_score,
-                detected_at,
-                camera_id,
-                detection_data,
-                context_data,
-                created_at
-            FROM event_detections 
-            ORDER BY detected_at DESC, created_at DESC
-            LIMIT 20
-        """)
-        
-        events = cursor.fetchall()
-        
-        # Convert to list of dicts
-        events_list = []
-        for event in events:
-            event_dict = dict(event)
-            # Convert datetime to string
-            if event_dict['detected_at']:
-                event_dict['detected_at'] = event_dict['detected_at'].isoformat()
-            if event_dict['created_at']:
-                event_dict['created_at'] = event_dict['created_at'].isoformat()
-            events_list.append(event_dict)
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
+        before = decode_cursor(request.args['before']) if request.args.get('before') else None
+        limit = _request_limit(20)
+
+        with db_cursor() as cursor:
+            events_list = query_events(cursor, before=before, limit=limit, **_request_filters())
+
+        return conditional_json({
             'success': True,
             'events': events_list,
             'count': len(events_list),
+            'head_cursor': events_list[0]['cursor'] if events_list and not before else None,
+            'next_cursor': events_list[-1]['cursor'] if len(events_list) == limit else None,
             'timestamp': datetime.now().isoformat()
-        })
-        
+        }, events_list)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except PoolError:
+        return jsonify({'error': 'Database pool exhausted'}), 503
     except Exception as e:
         print(f"❌ Error getting events: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/events/new')
 def get_new_events():
-    """Get new events since a specific timestamp or ID"""
+    """
+    Get new events after a cursor (tăng dần)
+    ?after=<cursor>&wait=25 -> long-poll: trả về ngay khi có event mới hoặc hết wait giây
+    since_time=<iso> vẫn được hỗ trợ (tương thích cũ)
+    """
     try:
-        # Get query parameters
-        since_id = request.args.get('since_id', type=int, default=0)
         since_time = request.args.get('since_time')
-        
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        cursor = conn.cursor()
-        
-        # Build query based on parameters
-        if since_time:
-            cursor.execute("""
-                SELECT 
-                    event_id,
-                    event_type,
-                    confidence_score,
-                    detected_at,
-                    camera_id,
-                    detection_data,
-                    context_data,
-                    created_at
-                FROM event_detections 
-                WHERE detected_at > %s
-                ORDER BY detected_at DESC, created_at DESC
-                LIMIT 50
-            """, (since_time,))
+        if request.args.get('after'):
+            after = decode_cursor(request.args['after'])
+        elif since_time:
+            after = (datetime.fromisoformat(since_time), 'ffffffff-ffff-ffff-ffff-ffffffffffff')
         else:
-            cursor.execute("""
-                SELECT 
-                    event_id,
-                    event_type,
-                    confidence_score,
-                    detected_at,
-                    camera_id,
-                    detection_data,
-                    context_data,
-                    created_at
-                FROM event_detections 
-                WHERE event_id::text > %s
-                ORDER BY detected_at DESC, created_at DESC
-                LIMIT 50
-            """, (str(since_id),))
-        
-        events = cursor.fetchall()
-        
-        # Convert to list of dicts
-        events_list = []
-        for event in events:
-            event_dict = dict(event)
-            # Convert datetime to string
-            if event_dict['detected_at']:
-                event_dict['detected_at'] = event_dict['detected_at'].isoformat()
-            if event_dict['created_at']:
-                event_dict['created_at'] = event_dict['created_at'].isoformat()
-            events_list.append(event_dict)
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
+            after = None
+        limit = _request_limit(50)
+        wait = max(0.0, min(request.args.get('wait', type=float, default=0.0), LONG_POLL_MAX_WAIT))
+        filters = _request_filters()
+
+        if wait:
+            event_watcher.ensure_started()
+        deadline = time.time() + wait
+        while True:
+            version = event_watcher.version
+            with db_cursor() as cursor:
+                if after:
+                    events_list = query_events(cursor, after=after, limit=limit, **filters)
+                else:
+                    # Không có cursor: trang mới nhất, trả về theo thứ tự tăng dần
+                    events_list = list(reversed(query_events(cursor, limit=limit, **filters)))
+            # Connection đã trả về pool trước khi chờ
+            if events_list or time.time() >= deadline:
+                break
+            event_watcher.wait(version, deadline - time.time())
+
+        next_cursor = events_list[-1]['cursor'] if events_list else request.args.get('after')
+
+        return conditional_json({
             'success': True,
             'events': events_list,
             'count': len(events_list),
+            'next_cursor': next_cursor,
             'timestamp': datetime.now().isoformat()
-        })
-        
+        }, [next_cursor, events_list])
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except PoolError:
+        return jsonify({'error': 'Database pool exhausted'}), 503
     except Exception as e:
         print(f"❌ Error getting new events: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/events/stream')
+def stream_events():
+    """
+    Server-Sent Events: đẩy event mới ngay khi có (id = cursor, hỗ trợ Last-Event-ID khi reconnect)
+    """
+    try:
+        start = request.headers.get('Last-Event-ID') or request.args.get('after')
+        position = decode_cursor(start) if start else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    filters = _request_filters()
+    event_watcher.ensure_started()
+
+    def generate():
+        nonlocal position
+        late_since = None
+        try:
+            if position is None:
+                # Chỉ stream event mới từ thời điểm kết nối
+                position = event_watcher.poll_head() or START_KEY
+            late_since = event_watcher.poll_last_insert()
+        except Exception:
+            position = position or (datetime.now(timezone.utc), START_KEY[1])
+        late_since = late_since or START_KEY[0]
+        yield "retry: 3000\n\n"
+
+        while True:
+            version = event_watcher.version
+            try:
+                with db_cursor() as cursor:
+                    late_events = query_late_events(cursor, position, late_since, limit=100, **filters)
+                    # Còn event muộn chưa đọc hết -> đẩy xong trước rồi mới đọc tiếp theo cursor
+                    events_list = [] if len(late_events) == 100 else \
+                        query_events(cursor, after=position, limit=100, **filters)
+            except Exception as e:
+                print(f"⚠️ SSE query error: {e}")
+                events_list, late_events = [], []
+                time.sleep(2.0)
+
+            for event in late_events:
+                # Không gửi id: cursor của event muộn nằm trước position, không được tua Last-Event-ID lùi
+                event['late'] = True
+                yield f"event: healthcare_event\ndata: {json.dumps(event, default=str)}\n\n"
+            for event in events_list:
+                yield f"id: {event['cursor']}\nevent: healthcare_event\ndata: {json.dumps(event, default=str)}\n\n"
+
+            if events_list or late_events:
+                if events_list:
+                    position = decode_cursor(events_list[-1]['cursor'])
+                # Watermark qua cả event thường đã gửi để lần sau không bị coi là event muộn
+                late_since = max([late_since] + [datetime.fromisoformat(event['created_at'])
+                                                 for event in late_events + events_list if event['created_at']])
+                continue
+
+            if not event_watcher.wait(version, SSE_HEARTBEAT):
+                yield ": keepalive\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+_rollup_rebuild_started = False
+
+
+def _rollup_ready() -> bool:
+    """Rollup sẵn sàng; nếu bật mà chưa backfill thì rebuild 1 lần ở background"""
+    global _rollup_rebuild_started
+    if not STATS_ROLLUP_AVAILABLE or not stats_rollup.enabled:
+        return False
+    if stats_rollup.is_ready():
+        return True
+    if not _rollup_rebuild_started:
+        _rollup_rebuild_started = True
+
+        def rebuild():
+            pool = get_db_pool()
+            if pool is None:
+                return
+            conn = pool.getconn()
+            try:
+                stats_rollup.rebuild_from_database(conn)
+            finally:
+                pool.putconn(conn)
+
+        threading.Thread(target=rebuild, daemon=True, name="StatsRollupRebuild").start()
+    return False
+
 @app.route('/api/stats')
 def get_stats():
-    """Get healthcare statistics"""
+    """Get healthcare statistics (?user_id= / ?camera_id= / ?day=YYYY-MM-DD khi dùng rollup)"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        cursor = conn.cursor()
+        if _rollup_ready():
+            stats_dict = stats_rollup.get_event_stats(day=request.args.get('day'), **_request_filters())
+            if stats_dict['latest_event_time']:
+                stats_dict['latest_event_time'] = stats_dict['latest_event_time'].isoformat()
+            return conditional_json({
+                'success': True,
+                'stats': stats_dict,
+                'source': 'rollup',
+                'timestamp': datetime.now().isoformat()
+            }, stats_dict)
         
-        # Get overall statistics
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_events,
-                COUNT(CASE WHEN event_type = 'fall' THEN 1 END) as fall_events,
-                COUNT(CASE WHEN event_type = 'abnormal_behavior' THEN 1 END) as seizure_events,
-                MAX(detected_at) as latest_event_time
-            FROM event_detections
-        """)
-        
-        stats = cursor.fetchone()
-        stats_dict = dict(stats)
+        with db_cursor() as cursor:
+            # Get overall statistics
+            cursor.execute("""
+                SELECT 
+                    COUNT(*) as total_events,
+                    COUNT(CASE WHEN event_type = 'fall' THEN 1 END) as fall_events,
+                    COUNT(CASE WHEN event_type = 'abnormal_behavior' THEN 1 END) as seizure_events,
+                    MAX(detected_at) as latest_event_time
+                FROM event_detections
+            """)
+            stats_dict = dict(cursor.fetchone())
         
         # Convert datetime to string
         if stats_dict['latest_event_time']:
             stats_dict['latest_event_time'] = stats_dict['latest_event_time'].isoformat()
         
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
+        return conditional_json({
             'success': True,
             'stats': stats_dict,
             'timestamp': datetime.now().isoformat()
-        })
+        }, stats_dict)
         
+    except PoolError:
+        return jsonify({'error': 'Database pool exhausted'}), 503
     except Exception as e:
         print(f"❌ Error getting stats: {e}")
         return jsonify({'error': str(e)}), 500
@@ -353,8 +680,7 @@ def index():
 
         <script>
             let isMonitoring = false;
-            let pollInterval = null;
-            let lastEventId = 0;
+            let lastCursor = null;
             let totalEvents = 0;
             let fallEvents = 0;
             let seizureEvents = 0;
@@ -407,7 +733,7 @@ def index():
                     }
                     
                     isMonitoring = true;
-                    updateStatus(true, 'Connected - Polling database for real events');
+                    updateStatus(true, 'Connected - Waiting for real events (long-poll)');
                     log('🚀 Started real-time monitoring');
                     log('📡 Connected to PostgreSQL database');
                     
@@ -415,8 +741,8 @@ def index():
                     await loadStats();
                     await loadLatestEvents();
                     
-                    // Start polling for new events every 2 seconds
-                    pollInterval = setInterval(pollForNewEvents, 2000);
+                    // Long-poll: server trả về ngay khi có event mới
+                    pollForNewEvents();
                     
                 } catch (error) {
                     log(`❌ Failed to start monitoring: ${error.message}`);
@@ -428,10 +754,6 @@ def index():
                 if (!isMonitoring) return;
                 
                 isMonitoring = false;
-                if (pollInterval) {
-                    clearInterval(pollInterval);
-                    pollInterval = null;
-                }
                 updateStatus(false, 'Monitoring stopped');
                 log('⏹️ Stopped real-time monitoring');
             }
@@ -462,8 +784,10 @@ def index():
                         eventsEl.innerHTML = '';
                         data.events.forEach(event => displayEvent(event, false));
                         
+                        if (data.head_cursor) {
+                            lastCursor = data.head_cursor;
+                        }
                         if (data.events.length > 0) {
-                            lastEventId = Math.max(...data.events.map(e => e.id));
                             log(`📋 Loaded ${data.events.length} latest events`);
                         }
                     }
@@ -473,27 +797,29 @@ def index():
             }
             
             async function pollForNewEvents() {
-                if (!isMonitoring) return;
-                
-                try {
-                    const response = await fetch(`/api/events/new?since_id=${lastEventId}`);
-                    if (!response.ok) return;
-                    
-                    const data = await response.json();
-                    if (data.success && data.events.length > 0) {
-                        // Add new events to the top
-                        data.events.reverse().forEach(event => {
-                            displayEvent(event, true);
-                            lastEventId = Math.max(lastEventId, event.id);
-                        });
-                        
-                        // Update stats
-                        await loadStats();
+                while (isMonitoring) {
+                    try {
+                        const after = lastCursor ? `&after=${encodeURIComponent(lastCursor)}` : '';
+                        const response = await fetch(`/api/events/new?wait=25${after}`);
+                        if (!response.ok) throw new Error(`HTTP ${response.status}`);
                         
-                        log(`📨 Received ${data.events.length} new events`);
+                        const data = await response.json();
+                        if (data.next_cursor) {
+                            lastCursor = data.next_cursor;
+                        }
+                        if (isMonitoring && data.success && data.events.length > 0) {
+                            // Events tăng dần -> chèn lần lượt lên đầu
+                            data.events.forEach(event => displayEvent(event, true));
+                            
+                            // Update stats
+                            await loadStats();
+                            
+                            log(`📨 Received ${data.events.length} new events`);
+                        }
+                    } catch (error) {
+                        log(`⚠️ Poll error: ${error.message}`);
+                        await new Promise(resolve => setTimeout(resolve, 2000));
                     }
-                } catch (error) {
-                    log(`⚠️ Poll error: ${error.message}`);
                 }
             }
             
@@ -532,7 +858,7 @@ def index():
                     <div><strong>🕒 Time:</strong> ${time}</div>
                     <div><strong>📍 Location:</strong> ${eventData.location || 'Unknown'}</div>
                     <div><strong>📹 Camera:</strong> ${eventData.camera_id || 'Unknown'}</div>
-                    <div><strong>🆔 ID:</strong> ${eventData.id}</div>
+                    <div><strong>🆔 ID:</strong> ${eventData.event_id}</div>
                 `;
                 
                 if (isNew) {
@@ -624,8 +950,9 @@ if __name__ == '__main__':
     print("🔗 Access: http://localhost:5000")
     print("📋 API Endpoints:")
     print("   - GET /api/health - Health check")
-    print("   - GET /api/events/latest - Get latest events")
-    print("   - GET /api/events/new?since_id=X - Get new events since ID")
+    print("   - GET /api/events/latest?limit=20&before=<cursor> - Get latest events (keyset pages)")
+    print("   - GET /api/events/new?after=<cursor>&wait=25 - Long-poll new events after cursor")
+    print("   - GET /api/events/stream - Server-Sent Events stream")
     print("   - GET /api/stats - Get statistics")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000, debug=True, threaded=True)
@@ -2,6 +2,10 @@
 """
 Healthcare WebSocket Server for Real-time Alerts (Production Version)
 Sends alerts to mobile clients in real-time - NO TEST ALERTS
+
+Fan-out: mỗi alert serialize 1 lần, đẩy vào bounded queue của từng client;
+mỗi client có sender task riêng nên 1 điện thoại chậm không làm trễ các client khác.
+Subscription: ws://host:9999/?user_id=<id>&camera_id=<id> hoặc message {"type": "subscribe", ...}
 """
 
 import asyncio
@@ -10,34 +14,171 @@ import json
 import time
 import uuid
 import logging
+from collections import deque
 from datetime import datetime
-from typing import Dict, Set
+from typing import Dict, Iterable, Optional, Set
+from urllib.parse import urlparse, parse_qs
 from pathlib import Path
 import threading
+import sys
+import os
+
+src_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+if src_path not in sys.path:
+    sys.path.insert(0, src_path)
+
+try:
+    from infrastructure.services.event_bus_service import event_bus, EVENT_FALL, EVENT_SEIZURE, RetryableEventError
+    EVENT_BUS_AVAILABLE = True
+except ImportError:
+    EVENT_BUS_AVAILABLE = False
+    event_bus = None
+
+try:
+    import orjson
+
+    def _dumps(data) -> str:
+        return orjson.dumps(data).decode('utf-8')
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(data) -> str:
+        return json.dumps(data, ensure_ascii=False)
+
+    _loads = json.loads
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("HealthcareWebSocket")
 
+# Queue policies khi send queue của client đầy
+DROP_OLDEST = 'drop_oldest'    # Bỏ message cũ nhất, giữ alert mới
+DROP_NEWEST = 'drop_newest'    # Bỏ message mới đến
+COALESCE = 'coalesce'          # Thay message đang chờ của cùng camera bằng message mới
+QUEUE_POLICIES = (DROP_OLDEST, DROP_NEWEST, COALESCE)
+
+
+def _split_ids(values) -> Set[str]:
+    """'a,b' / ['a', 42] / 42 / None -> {'a', 'b'} / {'a', '42'} / {'42'} / set(); kiểu khác -> ValueError"""
+    if values is None:
+        return set()
+    if isinstance(values, (str, int, float)):
+        values = [values]
+    elif not isinstance(values, (list, tuple, set)):
+        raise ValueError(f"ids must be a string, number or list, got {type(values).__name__}")
+    ids = set()
+    for value in values:
+        if not isinstance(value, (str, int, float)):
+            raise ValueError(f"id must be a string or number, got {type(value).__name__}")
+        ids.update(item.strip() for item in str(value).split(',') if item.strip())
+    return ids
+
+
+class ClientSession:
+    """1 mobile client: bounded send queue + subscription filter"""
+
+    def __init__(self, websocket, client_id: str, max_queue: int, policy: str,
+                 user_ids: Optional[Iterable] = None, camera_ids: Optional[Iterable] = None):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.max_queue = max_queue
+        self.policy = policy
+        self.user_ids = _split_ids(user_ids)
+        self.camera_ids = _split_ids(camera_ids)
+        self.queue = deque()  # (message, coalesce_key, enqueued_at)
+        self.wakeup = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def subscribe(self, user_ids=None, camera_ids=None):
+        """Đổi filter; id không hợp lệ -> ValueError, giữ nguyên subscription cũ"""
+        user_ids, camera_ids = _split_ids(user_ids), _split_ids(camera_ids)
+        self.user_ids, self.camera_ids = user_ids, camera_ids
+
+    def matches(self, user_id: Optional[str], camera_id: Optional[str]) -> bool:
+        """Alert không gắn user/camera (legacy) gửi cho tất cả client"""
+        if self.user_ids and user_id and str(user_id) not in self.user_ids:
+            return False
+        if self.camera_ids and camera_id and str(camera_id) not in self.camera_ids:
+            return False
+        return True
+
+    def enqueue(self, message: str, key: Optional[str] = None) -> bool:
+        """Non-blocking; áp dụng policy khi queue đầy. Returns False nếu message bị bỏ"""
+        if len(self.queue) >= self.max_queue:
+            if self.policy == DROP_NEWEST:
+                self.dropped += 1
+                return False
+            if self.policy == COALESCE and key is not None:
+                for index, item in enumerate(self.queue):
+                    if item[1] == key:
+                        del self.queue[index]
+                        self.coalesced += 1
+                        break
+                else:
+                    self.queue.popleft()
+                    self.dropped += 1
+            else:
+                self.queue.popleft()
+                self.dropped += 1
+
+        self.queue.append((message, key, time.perf_counter()))
+        self.wakeup.set()
+        return True
+
+    async def run_sender(self, send_timeout: float, on_sent=None):
+        """Gửi tuần tự queue của client này (raise asyncio.TimeoutError khi client treo)"""
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.queue:
+                message, _key, enqueued_at = self.queue.popleft()
+                await asyncio.wait_for(self.websocket.send(message), send_timeout)
+                self.sent += 1
+                if on_sent:
+                    on_sent((time.perf_counter() - enqueued_at) * 1000.0)
+
+
 class HealthcareWebSocketServer:
     """
     WebSocket server for real-time healthcare alerts
     Supports multiple mobile clients simultaneously
     """
     
-    def __init__(self, host: str = "0.0.0.0", port: int = 9999):
+    def __init__(self, host: str = "0.0.0.0", port: int = 9999, max_queue: Optional[int] = None,
+                 queue_policy: Optional[str] = None, send_timeout: Optional[float] = None):
         self.host = host
         self.port = port
-        self.clients: Set[websockets.WebSocketServerProtocol] = set()
+        self.clients: Dict[websockets.WebSocketServerProtocol, ClientSession] = {}
         self.session_id = str(uuid.uuid4())
         self.user_sessions = {}  # Track user sessions
-        self.alert_history = []  # Store recent alerts
+        self.alert_history = deque(maxlen=20)  # (message, user_id, camera_id) - recent alerts
         self.running = False
         
+        # Per-client send queue (WS_CLIENT_QUEUE_SIZE, WS_QUEUE_POLICY, WS_SEND_TIMEOUT)
+        self.max_queue = max_queue or int(os.getenv('WS_CLIENT_QUEUE_SIZE', '32'))
+        self.queue_policy = queue_policy or os.getenv('WS_QUEUE_POLICY', DROP_OLDEST)
+        if self.queue_policy not in QUEUE_POLICIES:
+            logger.warning(f"⚠️ Unknown WS_QUEUE_POLICY={self.queue_policy}, using {DROP_OLDEST}")
+            self.queue_policy = DROP_OLDEST
+        self.send_timeout = send_timeout or float(os.getenv('WS_SEND_TIMEOUT', '5.0'))
+        
+        self.stats = {'broadcasts': 0, 'enqueued': 0, 'filtered': 0, 'dropped': 0, 'slow_disconnects': 0}
+        self.send_latencies = deque(maxlen=5000)  # enqueue -> send done (ms)
+    
+    @staticmethod
+    def _parse_subscription(path: Optional[str]):
+        """?user_id=a,b&camera_id=c -> (user_ids, camera_ids)"""
+        query = parse_qs(urlparse(path or '').query)
+        return query.get('user_id'), query.get('camera_id')
+    
     async def register_client(self, websocket, path=None):
         """Register new mobile client"""
-        self.clients.add(websocket)
         client_id = f"{websocket.remote_address[0]}:{websocket.remote_address[1]}"
+        user_ids, camera_ids = self._parse_subscription(path or getattr(websocket, 'path', ''))
+        session = ClientSession(websocket, client_id, self.max_queue, self.queue_policy, user_ids, camera_ids)
+        self.clients[websocket] = session
         logger.info(f"📱 Mobile client connected: {client_id}")
         
         # Send welcome message with session info
@@ -49,48 +190,80 @@ class HealthcareWebSocketServer:
             "message": "Connected to Healthcare Monitor"
         }
         
+        sender = None
         try:
-            await websocket.send(json.dumps(welcome_msg))
+            await websocket.send(_dumps(welcome_msg))
             logger.info(f"✅ Welcome message sent to {client_id}")
             
+            sender = asyncio.ensure_future(self._run_sender(session))
+            
             # Send recent alerts to new client (only last 3 to avoid overload)
-            if self.alert_history:
-                for alert in self.alert_history[-3:]:  # Last 3 alerts only
-                    await websocket.send(json.dumps(alert))
-                logger.info(f"📋 Sent {min(3, len(self.alert_history))} recent alerts to {client_id}")
+            recent = [item for item in self.alert_history if session.matches(item[1], item[2])][-3:]
+            for message, _user_id, camera_id in recent:
+                session.enqueue(message, camera_id)
+            if recent:
+                logger.info(f"📋 Sent {len(recent)} recent alerts to {client_id}")
             
             # Keep connection alive - listen for messages or ping
             async for message in websocket:
                 try:
                     # Handle any incoming messages from client
-                    data = json.loads(message)
+                    data = _loads(message)
+                    if not isinstance(data, dict):
+                        session.enqueue(_dumps({"type": "error", "message": "message must be a JSON object"}))
+                        continue
                     logger.info(f"📩 Received from {client_id}: {data.get('type', 'unknown')}")
                     
                     # Echo back a response if needed
                     if data.get('type') == 'ping':
-                        await websocket.send(json.dumps({"type": "pong", "time": datetime.now().isoformat()}))
-                        
-                except json.JSONDecodeError:
+                        session.enqueue(_dumps({"type": "pong", "time": datetime.now().isoformat()}))
+                    elif data.get('type') == 'subscribe':
+                        session.enqueue(self._handle_subscribe(session, data))
+                
+                except ValueError:
                     logger.warning(f"⚠️ Invalid JSON from {client_id}: {message}")
                 except Exception as e:
                     logger.error(f"🚨 Error processing message from {client_id}: {e}")
                     break
-            
+        
         except websockets.exceptions.ConnectionClosed:
             logger.info(f"📱 Client {client_id} disconnected normally")
         except Exception as e:
             logger.error(f"🚨 Error handling client {client_id}: {e}")
         finally:
-            if websocket in self.clients:
-                self.clients.remove(websocket)
+            if sender:
+                sender.cancel()
+            self.clients.pop(websocket, None)
             logger.info(f"📱 Mobile client disconnected: {client_id} (Total: {len(self.clients)} clients)")
     
-    async def broadcast_alert(self, alert_data: Dict):
-        """Broadcast alert to all connected mobile clients"""
-        if not self.clients:
-            logger.warning("🚫 No mobile clients connected - alert not sent")
-            return
-        
+    @staticmethod
+    def _handle_subscribe(session: ClientSession, data: Dict) -> str:
+        """Message subscribe -> reply 'subscribed' hoặc 'error' (id sai kiểu không được ngắt kết nối)"""
+        try:
+            session.subscribe(data.get('user_id'), data.get('camera_id'))
+        except ValueError as e:
+            logger.warning(f"⚠️ Invalid subscribe from {session.client_id}: {e}")
+            return _dumps({"type": "error", "error": "invalid_subscription", "message": str(e)})
+        return _dumps({"type": "subscribed",
+                       "user_id": sorted(session.user_ids),
+                       "camera_id": sorted(session.camera_ids)})
+    
+    async def _run_sender(self, session: ClientSession):
+        """Sender task của 1 client; client treo quá send_timeout bị ngắt kết nối"""
+        try:
+            await session.run_sender(self.send_timeout, self.send_latencies.append)
+        except asyncio.TimeoutError:
+            self.stats['slow_disconnects'] += 1
+            logger.warning(f"🐢 Client {session.client_id} too slow ({len(session.queue)} queued), closing")
+            await session.websocket.close(code=1013, reason="slow consumer")
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except asyncio.CancelledError:
+            pass
+    
+    async def broadcast_alert(self, alert_data: Dict, user_id: Optional[str] = None,
+                              camera_id: Optional[str] = None):
+        """Broadcast alert to all connected (subscribed) mobile clients"""
         # Ensure standard format: imageUrl, status, action, time (4 fields only)
         standard_alert = {
             "imageUrl": alert_data.get("imageUrl", ""),
@@ -99,47 +272,64 @@ class HealthcareWebSocketServer:
             "time": alert_data.get("time", int(time.time()))
         }
         
-        # Store in history (limit to prevent memory issues)
-        self.alert_history.append(standard_alert)
-        if len(self.alert_history) > 20:  # Keep only recent 20 alerts
-            self.alert_history.pop(0)
+        # Serialize 1 lần cho tất cả client
+        message = _dumps(standard_alert)
         
-        message = json.dumps(standard_alert, ensure_ascii=False)
-        logger.info(f"📤 Broadcasting alert: {standard_alert['action']} (status: {standard_alert['status']}) to {len(self.clients)} clients")
+        # Store in history (deque maxlen giữ 20 alerts gần nhất)
+        self.alert_history.append((message, user_id, camera_id))
+        self.stats['broadcasts'] += 1
         
-        # Send to all connected clients
-        disconnected_clients = set()
-        successful_sends = 0
+        if not self.clients:
+            logger.warning("🚫 No mobile clients connected - alert not sent")
+            return 0
         
-        for client in self.clients.copy():
-            try:
-                await client.send(message)
-                successful_sends += 1
-            except websockets.exceptions.ConnectionClosed:
-                logger.warning(f"Client disconnected during send")
-                disconnected_clients.add(client)
-            except Exception as e:
-                logger.error(f"Error sending to client: {e}")
-                disconnected_clients.add(client)
-        
-        # Remove disconnected clients
-        self.clients -= disconnected_clients
-        
-        logger.info(f"✅ Alert sent successfully to {successful_sends} mobile clients")
+        # Chỉ enqueue (non-blocking), sender task của từng client tự gửi
+        enqueued = 0
+        for session in list(self.clients.values()):
+            if not session.matches(user_id, camera_id):
+                self.stats['filtered'] += 1
+                continue
+            if session.enqueue(message, camera_id):
+                enqueued += 1
+            else:
+                self.stats['dropped'] += 1
+        self.stats['enqueued'] += enqueued
+        
+        logger.info(f"📤 Broadcasting alert: {standard_alert['action']} (status: {standard_alert['status']}) "
+                    f"queued for {enqueued}/{len(self.clients)} clients")
+        return enqueued
     
-    def send_alert_sync(self, alert_data: Dict):
+    def send_alert_sync(self, alert_data: Dict, user_id: Optional[str] = None, camera_id: Optional[str] = None):
         """Synchronous method to send alert (for use in main thread)"""
         if self.running and hasattr(self, '_loop') and self._loop.is_running():
             # Schedule the coroutine in the event loop
-            asyncio.run_coroutine_threadsafe(self.broadcast_alert(alert_data), self._loop)
+            return asyncio.run_coroutine_threadsafe(
+                self.broadcast_alert(alert_data, user_id=user_id, camera_id=camera_id), self._loop)
         else:
             logger.warning("WebSocket server not running or event loop not available")
+            return None
+    
+    def start_event_bus_consumer(self) -> bool:
+        """Nhận fall/seizure alerts từ Redis event bus (consumer group 'websocket')"""
+        if not EVENT_BUS_AVAILABLE or not event_bus.enabled:
+            return False
+        return event_bus.start_consumer('websocket', self._handle_bus_event,
+                                        event_types=[EVENT_FALL, EVENT_SEIZURE])
+    
+    def _handle_bus_event(self, event):
+        """Broadcast alert của event; server chưa chạy / đang restart -> RetryableEventError (giữ pending, không dead-letter)"""
+        if not event.data.get('alert_created'):
+            return
+        if not (self.running and hasattr(self, '_loop') and self._loop.is_running()):
+            raise RetryableEventError("WebSocket server not running")
+        self.send_alert_sync(event.data.get('alert') or {}, user_id=event.user_id, camera_id=event.camera_id)
     
     async def start_server(self):
         """Start the WebSocket server"""
         self.running = True
         self._loop = asyncio.get_event_loop()
         logger.info(f"🚀 Healthcare WebSocket Server starting on {self.host}:{self.port}")
+        logger.info(f"   Per-client queue: {self.max_queue} ({self.queue_policy}), send timeout {self.send_timeout}s")
         
         server = await websockets.serve(
             self.register_client,
@@ -153,6 +343,8 @@ class HealthcareWebSocketServer:
         logger.info(f"✅ Healthcare WebSocket Server running on ws://{self.host}:{self.port}")
         logger.info("📱 Mobile clients can now connect for real-time alerts")
         logger.info("🔄 Server is ready to receive alerts from healthcare monitor")
+        if self.start_event_bus_consumer():
+            logger.info(f"🎧 Consuming alerts from Redis stream {event_bus.stream}")
         
         try:
             await server.wait_closed()
@@ -180,12 +372,25 @@ class HealthcareWebSocketServer:
     
     def get_stats(self) -> Dict:
         """Get server statistics"""
+        sessions = list(self.clients.values())
+        latencies = sorted(self.send_latencies)
+        
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(p / 100.0 * len(latencies)))], 3) if latencies else 0.0
+        
         return {
             "connected_clients": len(self.clients),
             "session_id": self.session_id,
-            "alerts_sent": len(self.alert_history),
+            "alerts_sent": self.stats['broadcasts'],
             "running": self.running,
-            "server_address": f"ws://{self.host}:{self.port}"
+            "server_address": f"ws://{self.host}:{self.port}",
+            "queue_policy": self.queue_policy,
+            "queued_messages": sum(len(session.queue) for session in sessions),
+            "client_drops": sum(session.dropped for session in sessions),
+            "client_coalesced": sum(session.coalesced for session in sessions),
+            "send_latency_p50_ms": pct(50),
+            "send_latency_p95_ms": pct(95),
+            **self.stats
         }
 
 # Production server - no test alerts
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Redis Event Bus Benchmark
+Đo throughput publish (đơn lẻ / pipeline), fan-out tới nhiều consumer groups song song,
+end-to-end latency (publish -> handler) và replay sau khi consumer restart.
+
+Usage:
+    python examples/test/benchmark_event_bus.py                    # dùng REDIS_URL (mặc định localhost:6379)
+    python examples/test/benchmark_event_bus.py --spawn-redis      # tự chạy redis-server tạm trên port 6390
+    python examples/test/benchmark_event_bus.py --events 20000 --groups websocket,alarm,db_writer
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Dict, List
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "src"))
+
+from infrastructure.services.event_bus_service import RedisEventBus, REDIS_AVAILABLE, EVENT_FALL
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, Any]:
+    return {
+        'count': len(samples_ms),
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p95_ms': round(percentile(samples_ms, 95), 3),
+        'p99_ms': round(percentile(samples_ms, 99), 3),
+        'max_ms': round(max(samples_ms), 3) if samples_ms else 0.0
+    }
+
+
+def spawn_redis(port: int):
+    """Chạy redis-server tạm (không persist) cho benchmark"""
+    binary = shutil.which('redis-server')
+    if not binary:
+        raise RuntimeError("redis-server not found in PATH")
+    process = subprocess.Popen([binary, '--port', str(port), '--save', '', '--appendonly', 'no'],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(0.5)
+    return process
+
+
+def sample_event(index: int) -> Dict[str, Any]:
+    return {
+        'event_id': f"bench-{index}",
+        'persisted': True,
+        'severity': 'high',
+        'alert_created': True,
+        'alert': {'imageUrl': '', 'status': 'danger', 'action': 'Fall detected', 'time': int(time.time())},
+        'event_data': {'event_type': 'fall', 'confidence': 0.87, 'camera_id': 'bench-cam'}
+    }
+
+
+def bench_publish(bus: RedisEventBus, events: int, batch: int) -> Dict[str, Any]:
+    """Throughput XADD đơn lẻ vs pipeline"""
+    single = max(1, events // 10)
+    start = time.perf_counter()
+    for i in range(single):
+        bus.publish(EVENT_FALL, sample_event(i), camera_id='bench-cam')
+    single_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for offset in range(0, events, batch):
+        bus.publish_many({'type': EVENT_FALL, 'data': sample_event(i), 'camera_id': 'bench-cam'}
+                         for i in range(offset, min(events, offset + batch)))
+    batch_elapsed = time.perf_counter() - start
+
+    return {
+        'single_events': single,
+        'single_per_sec': round(single / single_elapsed, 1),
+        'pipelined_events': events,
+        'pipeline_batch': batch,
+        'pipelined_per_sec': round(events / batch_elapsed, 1)
+    }
+
+
+def bench_fanout(bus: RedisEventBus, groups: List[str], events: int, batch: int,
+                 timeout: float) -> Dict[str, Any]:
+    """N consumer groups nhận cùng stream song song, đo latency publish -> handler"""
+    latencies = {group: [] for group in groups}
+    done = {group: threading.Event() for group in groups}
+    locks = {group: threading.Lock() for group in groups}
+
+    def make_handler(group):
+        def handler(event):
+            with locks[group]:
+                latencies[group].append((time.time() - event.timestamp) * 1000.0)
+                if len(latencies[group]) >= events:
+                    done[group].set()
+        return handler
+
+    for group in groups:
+        bus.ensure_group(group, start_id='$')
+        bus.start_consumer(group, make_handler(group), consumer=f"bench-{group}", block_ms=200)
+
+    start = time.perf_counter()
+    for offset in range(0, events, batch):
+        bus.publish_many({'type': EVENT_FALL, 'data': sample_event(i), 'camera_id': 'bench-cam'}
+                         for i in range(offset, min(events, offset + batch)))
+
+    for group in groups:
+        done[group].wait(timeout)
+    elapsed = time.perf_counter() - start
+    bus.stop()
+
+    return {
+        group: {
+            'received': len(latencies[group]),
+            'events_per_sec': round(len(latencies[group]) / elapsed, 1),
+            'latency': summarize(latencies[group])
+        }
+        for group in groups
+    }
+
+
+def bench_replay(bus: RedisEventBus, events: int) -> Dict[str, Any]:
+    """Consumer nhận event nhưng crash trước khi ack -> restart phải replay đủ"""
+    group = 'bench-replay'
+    bus.ensure_group(group, start_id='$')
+    bus.publish_many({'type': EVENT_FALL, 'data': sample_event(i)} for i in range(events))
+
+    # "Crash": đọc nhưng không ack
+    delivered = 0
+    while True:
+        batch = bus.read_group(group, 'replay-consumer', count=500, block_ms=200)
+        if not batch:
+            break
+        delivered += len(batch)
+
+    replayed = []
+    stop_event = threading.Event()
+
+    def handler(event):
+        replayed.append(event.id)
+        if len(replayed) >= delivered:
+            stop_event.set()
+
+    start = time.perf_counter()
+    thread = threading.Thread(target=bus.consume, args=(group, 'replay-consumer', handler),
+                              kwargs={'block_ms': 200, 'claim_idle_ms': 0, 'stop_event': stop_event}, daemon=True)
+    thread.start()
+    stop_event.wait(30)
+    stop_event.set()
+    thread.join(timeout=2.0)
+    elapsed = time.perf_counter() - start
+
+    pending = bus.client.xpending(bus.stream, group)
+    return {
+        'delivered_before_crash': delivered,
+        'replayed': len(replayed),
+        'replay_seconds': round(elapsed, 3),
+        'pending_after_ack': pending.get('pending', 0) if isinstance(pending, dict) else pending[0],
+        'history_entries': len(bus.replay(count=events))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis event bus benchmark")
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--batch', type=int, default=200)
+    parser.add_argument('--groups', default='websocket,alarm,db_writer')
+    parser.add_argument('--spawn-redis', action='store_true')
+    parser.add_argument('--port', type=int, default=6390)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--output', default='')
+    args = parser.parse_args()
+
+    if not REDIS_AVAILABLE:
+        print("❌ Package redis chưa được cài (pip install redis[hiredis])")
+        return 1
+
+    process = spawn_redis(args.port) if args.spawn_redis else None
+    redis_url = f"redis://localhost:{args.port}/0" if process else os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    stream = f"bench:events:{int(time.time())}"
+    bus = RedisEventBus(redis_url=redis_url, stream=stream, enabled=True)
+
+    try:
+        if not bus.ping():
+            print(f"❌ Redis không kết nối được: {redis_url}")
+            return 1
+
+        print(f"🚀 Event bus benchmark: {args.events} events, stream {stream}")
+        report = {'timestamp': datetime.now().isoformat(), 'redis_url': redis_url, 'events': args.events}
+
+        report['publish'] = bench_publish(bus, args.events, args.batch)
+        print(f"📤 Publish: {report['publish']['single_per_sec']}/s single, "
+              f"{report['publish']['pipelined_per_sec']}/s pipelined")
+
+        groups = [group.strip() for group in args.groups.split(',') if group.strip()]
+        report['fanout'] = bench_fanout(bus, groups, args.events, args.batch, args.timeout)
+        for group, result in report['fanout'].items():
+            latency = result['latency']
+            print(f"📥 {group}: {result['received']} events, {result['events_per_sec']}/s, "
+                  f"p50 {latency['p50_ms']}ms, p95 {latency['p95_ms']}ms")
+
+        report['replay'] = bench_replay(bus, min(args.events, 5000))
+        print(f"♻️ Replay: {report['replay']['replayed']}/{report['replay']['delivered_before_crash']} events "
+              f"in {report['replay']['replay_seconds']}s, pending after ack: {report['replay']['pending_after_ack']}")
+
+        output = Path(args.output or Path(__file__).parent / "test_results" / "benchmarks" /
+                      f"benchmark_event_bus_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"💾 Saved: {output}")
+        return 0
+    finally:
+        try:
+            bus.client.delete(stream)
+        except Exception:
+            pass
+        if process:
+            process.terminate()
+            process.wait(timeout=5)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+MinIO Upload Benchmark
+So sánh upload tuần tự (1 camera mỗi lần) với upload song song từ nhiều camera qua pooled client,
+đo latency mỗi frame (full + thumbnail), throughput và số retry.
+
+Usage:
+    python examples/test/benchmark_minio_upload.py                          # dùng MINIO_* env
+    python examples/test/benchmark_minio_upload.py --cameras 8 --frames 20 --width 1920 --height 1080
+    python examples/test/benchmark_minio_upload.py --cleanup                # xóa object sau khi đo
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "src"))
+
+from infrastructure.storage.minio_service import MinIOService
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, Any]:
+    return {
+        'count': len(samples_ms),
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p95_ms': round(percentile(samples_ms, 95), 3),
+        'p99_ms': round(percentile(samples_ms, 99), 3),
+        'max_ms': round(max(samples_ms), 3) if samples_ms else 0.0
+    }
+
+
+def synthetic_frame(rng: np.random.Generator, width: int, height: int) -> np.ndarray:
+    """Noise + gradient để JPEG không nén quá nhỏ so với frame camera thật"""
+    gradient = np.linspace(0, 255, width, dtype=np.uint8)[None, :, None]
+    noise = rng.integers(0, 64, (height, width, 3), dtype=np.uint8)
+    return (np.broadcast_to(gradient, (height, width, 3)) // 2 + noise).astype(np.uint8)
+
+
+def run_sequential(service: MinIOService, frames: List[np.ndarray], cameras: int) -> Dict[str, Any]:
+    latencies, objects = [], []
+    start = time.perf_counter()
+    for index, frame in enumerate(frames):
+        began = time.perf_counter()
+        result = service.upload_frame_renditions(frame, 'bench-user', f"bench-cam-{index % cameras}", 'bench', 0.9)
+        latencies.append((time.perf_counter() - began) * 1000.0)
+        if result:
+            objects.append(result['object_name'])
+    elapsed = time.perf_counter() - start
+    return {'frames_per_sec': round(len(frames) / elapsed, 2), 'latency': summarize(latencies),
+            'uploaded': len(objects), 'objects': objects}
+
+
+def run_concurrent(service: MinIOService, frames: List[np.ndarray], cameras: int) -> Dict[str, Any]:
+    latencies, objects = [], []
+    start = time.perf_counter()
+    submitted = [(time.perf_counter(), service.upload_frame_image_async(
+        frame, 'bench-user', f"bench-cam-{index % cameras}", 'bench', 0.9)) for index, frame in enumerate(frames)]
+    for began, future in submitted:
+        result = future.result()
+        latencies.append((time.perf_counter() - began) * 1000.0)
+        if result:
+            objects.append(result['object_name'])
+    elapsed = time.perf_counter() - start
+    return {'frames_per_sec': round(len(frames) / elapsed, 2), 'latency': summarize(latencies),
+            'uploaded': len(objects), 'objects': objects}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MinIO upload benchmark")
+    parser.add_argument('--cameras', type=int, default=4)
+    parser.add_argument('--frames', type=int, default=10, help="Frames mỗi camera")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--cleanup', action='store_true', help="Xóa object benchmark sau khi đo")
+    parser.add_argument('--output', default='')
+    args = parser.parse_args()
+
+    service = MinIOService()
+    if not service.client or not service.test_connection():
+        print("❌ MinIO không kết nối được (kiểm tra MINIO_ENDPOINT / MINIO_ACCESS_KEY / MINIO_SECRET_KEY)")
+        return 1
+
+    rng = np.random.default_rng(42)
+    frames = [synthetic_frame(rng, args.width, args.height) for _ in range(args.cameras * args.frames)]
+    print(f"🚀 MinIO upload benchmark: {args.cameras} cameras x {args.frames} frames, "
+          f"{args.width}x{args.height}, {service.upload_workers} workers")
+
+    report = {'timestamp': datetime.now().isoformat(), 'config': vars(args),
+              'workers': service.upload_workers, 'thumbnail_width': service.thumbnail_width}
+    report['sequential'] = run_sequential(service, frames, args.cameras)
+    report['concurrent'] = run_concurrent(service, frames, args.cameras)
+    report['upload_stats'] = service.get_upload_stats()
+
+    for mode in ('sequential', 'concurrent'):
+        result = report[mode]
+        print(f"📤 {mode}: {result['uploaded']} frames, {result['frames_per_sec']} frames/s, "
+              f"p50 {result['latency']['p50_ms']}ms, p95 {result['latency']['p95_ms']}ms")
+    print(f"♻️ Retries: {report['upload_stats']['retries']}, failures: {report['upload_stats']['failures']}")
+
+    if args.cleanup:
+        for mode in ('sequential', 'concurrent'):
+            for object_name in report[mode]['objects']:
+                service.delete_image(object_name)
+        print("🧹 Benchmark objects removed")
+    service.shutdown()
+
+    output = Path(args.output or Path(__file__).parent / "test_results" / "benchmarks" /
+                  f"benchmark_minio_upload_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"💾 Saved: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Recording Format Benchmark
+So sánh format cột nhị phân của DetectionRecorder với JSON (1 dòng JSON / frame, json và orjson nếu có):
+dung lượng / frame, write throughput trong frame loop, thời gian đọc lại toàn bộ keypoints + detections.
+
+Usage:
+    python examples/test/benchmark_recording_format.py
+    python examples/test/benchmark_recording_format.py --frames 100000 --persons 3
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "src"))
+
+from infrastructure.services.detection_recorder_service import DetectionRecorder, RecordingReader
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def synthetic_frames(count: int, persons: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Frame giống output pipeline: detections (YOLO), keypoints (17, 3) numpy, confidences"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for index in range(count):
+        n = int(rng.integers(0, persons + 1))
+        detections = [{'bbox': [float(v) for v in rng.uniform(0, 1280, 4)], 'confidence': float(rng.random()),
+                       'class_id': 0, 'class_name': 'person'} for _ in range(n)]
+        frames.append({
+            'timestamp': 1_700_000_000.0 + index / 15.0,
+            'frame_index': index,
+            'detections': detections,
+            'bbox': detections[0]['bbox'] if detections else None,
+            'keypoints': rng.uniform(0, 1280, (17, 3)).astype(np.float32) if n else None,
+            'motion_level': float(rng.random()),
+            'fall_confidence': float(rng.random()),
+            'seizure_confidence': float(rng.random()),
+        })
+    return frames
+
+
+def directory_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in Path(path).rglob('*') if entry.is_file())
+
+
+def bench_binary(frames: List[Dict[str, Any]], workdir: str) -> Dict[str, Any]:
+    recorder = DetectionRecorder('benchmark', base_dir=workdir)
+    start = time.perf_counter()
+    for frame in frames:
+        recorder.append(frame['timestamp'], frame['frame_index'], keyframe=True, detections=frame['detections'],
+                        bbox=frame['bbox'], keypoints=frame['keypoints'], motion_level=frame['motion_level'],
+                        fall_confidence=frame['fall_confidence'], seizure_confidence=frame['seizure_confidence'])
+    recorder.close()
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reader = RecordingReader(recorder.path)
+    keypoint_mean = float(np.nanmean(reader['keypoints']))
+    detection_total = sum(len(reader.detections(i)) for i in range(len(reader)))
+    read_time = time.perf_counter() - start
+    return {'bytes': directory_size(recorder.path), 'write_s': write_time, 'read_s': read_time,
+            'frames_read': len(reader), 'detections_read': detection_total, 'keypoint_mean': keypoint_mean}
+
+
+def bench_jsonl(frames: List[Dict[str, Any]], workdir: str, use_orjson: bool) -> Dict[str, Any]:
+    path = os.path.join(workdir, 'orjson.jsonl' if use_orjson else 'json.jsonl')
+    start = time.perf_counter()
+    with open(path, 'wb') as f:
+        for frame in frames:
+            record = dict(frame)
+            if use_orjson:
+                f.write(orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY) + b'\n')
+            else:
+                record['keypoints'] = frame['keypoints'].tolist() if frame['keypoints'] is not None else None
+                f.write(json.dumps(record).encode() + b'\n')
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loads = orjson.loads if use_orjson else json.loads
+    keypoints, detection_total = [], 0
+    with open(path, 'rb') as f:
+        for line in f:
+            record = loads(line)
+            detection_total += len(record['detections'])
+            keypoints.append(record['keypoints'] if record['keypoints'] is not None else np.full((17, 3), np.nan))
+    keypoint_mean = float(np.nanmean(np.asarray(keypoints, dtype=np.float32)))
+    read_time = time.perf_counter() - start
+    return {'bytes': os.path.getsize(path), 'write_s': write_time, 'read_s': read_time,
+            'frames_read': len(keypoints), 'detections_read': detection_total, 'keypoint_mean': keypoint_mean}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection recording format benchmark")
+    parser.add_argument('--frames', type=int, default=50000)
+    parser.add_argument('--persons', type=int, default=2, help="Số người tối đa mỗi frame")
+    parser.add_argument('--output', default='')
+    args = parser.parse_args()
+
+    frames = synthetic_frames(args.frames, args.persons)
+    print(f"🎞️ Recording format benchmark: {args.frames} frames, <= {args.persons} persons/frame")
+
+    report = {'timestamp': datetime.now().isoformat(), 'config': vars(args), 'formats': {}}
+    workdir = tempfile.mkdtemp(prefix='recording_bench_')
+    try:
+        report['formats']['binary'] = bench_binary(frames, workdir)
+        report['formats']['json'] = bench_jsonl(frames, workdir, use_orjson=False)
+        if ORJSON_AVAILABLE:
+            report['formats']['orjson'] = bench_jsonl(frames, workdir, use_orjson=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    binary = report['formats']['binary']
+    for name, result in report['formats'].items():
+        result['bytes_per_frame'] = round(result['bytes'] / args.frames, 1)
+        result['write_frames_per_sec'] = round(args.frames / result['write_s'])
+        result['read_frames_per_sec'] = round(args.frames / result['read_s'])
+        result['size_vs_binary'] = round(result['bytes'] / binary['bytes'], 2)
+        print(f"📦 {name:7s} {result['bytes'] / 1024 / 1024:8.2f} MB ({result['bytes_per_frame']} B/frame, "
+              f"x{result['size_vs_binary']}) | write {result['write_frames_per_sec']:>9,} frames/s | "
+              f"read {result['read_frames_per_sec']:>10,} frames/s")
+
+    output = Path(args.output or Path(__file__).parent / "test_results" / "benchmarks" /
+                  f"benchmark_recording_format_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"💾 Saved: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+Healthcare Pipeline Replay Benchmark
+Replay video corpus (resource/*.mp4) + synthetic clips qua IntegratedVideoProcessor
+và AdvancedHealthcarePipeline, đo latency từng stage để so sánh giữa các version.
+
+Usage:
+    python examples/test/benchmark_replay.py                      # corpus + synthetic
+    python examples/test/benchmark_replay.py --synthetic-only     # không cần video/network
+    python examples/test/benchmark_replay.py --mode processor     # chỉ IntegratedVideoProcessor
+    python examples/test/benchmark_replay.py --compare baseline.json
+"""
+
+import os
+import sys
+import cv2
+import json
+import time
+import logging
+import argparse
+import platform
+from pathlib import Path
+from datetime import datetime
+from functools import wraps
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "src"))
+
+from service.video_processing_service import VideoProcessingService
+from service.fall_detection_service import FallDetectionService
+from service.seizure_detection_service import SeizureDetectionService
+from seizure_detection.seizure_predictor import SeizurePredictor
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:  # Windows
+    RESOURCE_AVAILABLE = False
+
+# Thứ tự stage cố định để diff giữa các baseline
+BENCHMARK_STAGES = ['motion', 'keyframe', 'yolo', 'pose', 'fall', 'seizure', 'persistence']
+PERCENTILES = (50, 95, 99)
+
+
+def get_peak_rss_mb() -> Optional[float]:
+    """Peak RSS của process hiện tại (MB)"""
+    if RESOURCE_AVAILABLE:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux trả về KB, macOS trả về bytes
+        if platform.system() == 'Darwin':
+            return peak / (1024 * 1024)
+        return peak / 1024
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+def summarize_latencies(samples_ms: List[float]) -> Dict[str, Any]:
+    """Tóm tắt latency samples (ms) thành count/mean/p50/p95/p99/max"""
+    if not samples_ms:
+        return {'count': 0, 'total_ms': 0.0, 'mean_ms': 0.0,
+                'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+
+    values = np.asarray(samples_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, PERCENTILES)
+    return {
+        'count': int(values.size),
+        'total_ms': round(float(values.sum()), 3),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'max_ms': round(float(values.max()), 3)
+    }
+
+
+class StageTimer:
+    """Gắn timer vào method của component mà không sửa code pipeline"""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in BENCHMARK_STAGES}
+        self._patched = []
+
+    def instrument(self, obj, method_name: str, stage: str):
+        """
+        Wrap obj.method_name để ghi thời gian vào stage
+
+        Args:
+            obj: Component instance (None sẽ bị bỏ qua)
+            method_name: Tên method cần đo
+            stage: Tên stage trong BENCHMARK_STAGES
+        """
+        if obj is None or not hasattr(obj, method_name):
+            return
+
+        original = getattr(obj, method_name)
+        samples = self.samples[stage]
+
+        @wraps(original)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                samples.append((time.perf_counter() - start) * 1000.0)
+
+        setattr(obj, method_name, timed)
+        self._patched.append((obj, method_name))
+
+    def restore(self):
+        """Gỡ toàn bộ wrapper (trả lại method gốc của class)"""
+        for obj, method_name in self._patched:
+            try:
+                delattr(obj, method_name)
+            except AttributeError:
+                pass
+        self._patched.clear()
+
+    def reset(self):
+        for stage in self.samples:
+            self.samples[stage].clear()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {stage: summarize_latencies(self.samples[stage]) for stage in BENCHMARK_STAGES}
+
+
+def generate_synthetic_clips(output_dir: Path, fps: int = 30, resolution=(640, 360)) -> List[Path]:
+    """
+    Tạo clip tổng hợp để benchmark chạy được không cần asset/network
+
+    Returns:
+        Danh sách đường dẫn clip (.mp4)
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    width, height = resolution
+    rng = np.random.default_rng(2024)
+
+    def person_box(cx, cy, w, h):
+        return (int(cx - w / 2), int(cy - h / 2), int(cx + w / 2), int(cy + h / 2))
+
+    scenarios = {
+        # Phòng tĩnh: motion detector phải lọc gần hết frame
+        'synthetic_static_room': lambda i: None,
+        # Người đi qua phòng
+        'synthetic_walking': lambda i: person_box(60 + i * 4, height * 0.55, 60, 180),
+        # Người đứng rồi ngã (bbox chuyển từ dọc sang ngang và đi xuống)
+        'synthetic_fall': lambda i: (person_box(width / 2, height * 0.5, 60, 180) if i < 90
+                                     else person_box(width / 2, height * 0.8, 190, 55)),
+        # Chuyển động rung liên tục (giả lập co giật)
+        'synthetic_shaking': lambda i: person_box(width / 2 + rng.integers(-15, 16),
+                                                  height * 0.7 + rng.integers(-10, 11), 170, 70),
+    }
+
+    background = np.full((height, width, 3), 70, dtype=np.uint8)
+    cv2.rectangle(background, (0, int(height * 0.75)), (width, height), (90, 80, 60), -1)
+    cv2.rectangle(background, (width - 180, int(height * 0.45)), (width - 20, int(height * 0.75)), (120, 120, 160), -1)
+
+    clips = []
+    frames_per_clip = fps * 6
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+
+    for name, box_fn in scenarios.items():
+        clip_path = output_dir / f"{name}.mp4"
+        if clip_path.exists():
+            clips.append(clip_path)
+            continue
+
+        writer = cv2.VideoWriter(str(clip_path), fourcc, fps, (width, height))
+        if not writer.isOpened():
+            logger.error(f"❌ Cannot create synthetic clip: {clip_path}")
+            continue
+
+        for i in range(frames_per_clip):
+            frame = background.copy()
+            # Sensor noise nhẹ để motion/keyframe detector có dữ liệu thực tế
+            noise = rng.integers(0, 6, size=frame.shape, dtype=np.uint8)
+            frame = cv2.add(frame, noise)
+            box = box_fn(i)
+            if box is not None:
+                x1, y1, x2, y2 = box
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (40, 160, 220), -1)
+                cv2.circle(frame, ((x1 + x2) // 2, max(y1 - 15, 10)), 15, (60, 190, 240), -1)
+            writer.write(frame)
+
+        writer.release()
+        clips.append(clip_path)
+
+    return clips
+
+
+class ReplayBenchmark:
+    """Replay video qua pipeline và ghi per-stage latency ra JSON baseline"""
+
+    def __init__(self, mode: str = 'pipeline', max_frames: int = 0, warmup_frames: int = 5,
+                 use_snapshot_service: bool = False, output_dir: str = ""):
+        self.mode = mode
+        self.max_frames = max_frames
+        self.warmup_frames = warmup_frames
+        self.use_snapshot_service = use_snapshot_service
+
+        script_dir = Path(__file__).parent
+        self.output_dir = Path(output_dir) if output_dir else script_dir / "test_results" / "benchmarks"
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.user_id = os.getenv('DEFAULT_USER_ID', 'test_user_001')
+
+    def _build_components(self, case_id: str):
+        """Khởi tạo component giống main.py; trả về (runner, processor, pipeline)"""
+        video_processor = VideoProcessingService(120)
+        processor = getattr(video_processor, 'processor', video_processor)
+
+        if self.mode == 'processor':
+            return video_processor.process_frame, processor, None
+
+        from service.advanced_healthcare_pipeline import AdvancedHealthcarePipeline
+
+        alerts_folder = self.output_dir / "alerts" / case_id
+        pipeline = AdvancedHealthcarePipeline(
+            camera=None,
+            video_processor=video_processor,
+            fall_detector=FallDetectionService(),
+            seizure_detector=SeizureDetectionService(),
+            seizure_predictor=SeizurePredictor(temporal_window=3, alert_threshold=0.01, warning_threshold=0.005),
+            alerts_folder=str(alerts_folder),
+            camera_id=f"benchmark_{case_id}",
+            user_id=self.user_id
+        )
+        if not self.use_snapshot_service:
+            # Persistence đo trên local fallback để kết quả không phụ thuộc MinIO/network
+            pipeline.snapshot_service = None
+        return pipeline.process_frame, processor, pipeline
+
+    def _instrument(self, timer: StageTimer, processor, pipeline):
+        timer.instrument(getattr(processor, 'motion_detector', None), 'detect_motion', 'motion')
+        timer.instrument(getattr(processor, 'keyframe_detector', None), 'is_keyframe', 'keyframe')
+        timer.instrument(getattr(processor, 'yolo_detector', None), 'detect', 'yolo')
+        timer.instrument(getattr(processor, 'pose_estimator', None), 'extract_keypoints', 'pose')
+
+        frame_saver = getattr(processor, 'frame_saver', None)
+        for method in ('save_keyframe', 'save_detection', 'save_alert'):
+            timer.instrument(frame_saver, method, 'persistence')
+
+        if pipeline is not None:
+            timer.instrument(pipeline.fall_detector, 'detect_fall', 'fall')
+            timer.instrument(pipeline.seizure_detector, 'detect_seizure', 'seizure')
+            timer.instrument(pipeline, 'save_detection_snapshot', 'persistence')
+            timer.instrument(pipeline, 'save_alert_image', 'persistence')
+        else:
+            timer.instrument(getattr(processor, 'fall_detector', None), 'detect_fall', 'fall')
+
+    def run_video(self, video_path: Path) -> Dict[str, Any]:
+        """Benchmark 1 video, decode time tách riêng khỏi processing time"""
+        case_id = video_path.stem
+        cap = cv2.VideoCapture(str(video_path))
+        if not cap.isOpened():
+            return {'video': video_path.name, 'status': 'failed', 'error': 'Failed to open video'}
+
+        process_fn, processor, pipeline = self._build_components(case_id)
+        timer = StageTimer()
+        self._instrument(timer, processor, pipeline)
+
+        frame_latencies = []
+        decode_latencies = []
+        frame_index = 0
+
+        print(f"⏱️  Benchmarking {video_path.name} ({self.mode})...")
+        try:
+            while True:
+                decode_start = time.perf_counter()
+                ret, frame = cap.read()
+                decode_ms = (time.perf_counter() - decode_start) * 1000.0
+                if not ret:
+                    break
+
+                frame_start = time.perf_counter()
+                process_fn(frame)
+                frame_ms = (time.perf_counter() - frame_start) * 1000.0
+                frame_index += 1
+
+                # Warmup: model load/JIT không được tính vào baseline
+                if frame_index == self.warmup_frames:
+                    timer.reset()
+                    frame_latencies.clear()
+                    decode_latencies.clear()
+                    continue
+
+                frame_latencies.append(frame_ms)
+                decode_latencies.append(decode_ms)
+
+                if self.max_frames and frame_index >= self.max_frames:
+                    break
+        finally:
+            cap.release()
+            timer.restore()
+
+        measured_frames = len(frame_latencies)
+        processing_seconds = sum(frame_latencies) / 1000.0
+        stats = processor.get_processing_stats() if hasattr(processor, 'get_processing_stats') else {}
+
+        return {
+            'video': video_path.name,
+            'status': 'completed',
+            'frames_total': frame_index,
+            'frames_measured': measured_frames,
+            'fps': round(measured_frames / processing_seconds, 2) if processing_seconds > 0 else 0.0,
+            'frame_latency': summarize_latencies(frame_latencies),
+            'decode_latency': summarize_latencies(decode_latencies),
+            'stages': timer.summary(),
+            'processing_stats': {k: v for k, v in stats.items() if isinstance(v, (int, float))},
+            'peak_rss_mb': get_peak_rss_mb()
+        }
+
+    def run(self, videos: List[Path]) -> Dict[str, Any]:
+        """Chạy toàn bộ corpus và gộp kết quả"""
+        run_start = time.time()
+        results = [self.run_video(video) for video in videos]
+        completed = [r for r in results if r['status'] == 'completed']
+
+        total_frames = sum(r['frames_measured'] for r in completed)
+        total_ms = sum(r['frame_latency']['total_ms'] for r in completed)
+
+        aggregate_stages = {}
+        for stage in BENCHMARK_STAGES:
+            count = sum(r['stages'][stage]['count'] for r in completed)
+            stage_total = sum(r['stages'][stage]['total_ms'] for r in completed)
+            aggregate_stages[stage] = {
+                'count': count,
+                'total_ms': round(stage_total, 3),
+                'mean_ms': round(stage_total / count, 3) if count else 0.0,
+                'p95_ms_max': max((r['stages'][stage]['p95_ms'] for r in completed), default=0.0),
+                'share_of_frame_time': round(stage_total / total_ms, 4) if total_ms > 0 else 0.0
+            }
+
+        return {
+            'benchmark_version': 1,
+            'created_at': datetime.now().isoformat(),
+            'mode': self.mode,
+            'warmup_frames': self.warmup_frames,
+            'max_frames': self.max_frames,
+            'environment': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'opencv': cv2.__version__,
+                'numpy': np.__version__
+            },
+            'summary': {
+                'videos': len(results),
+                'videos_completed': len(completed),
+                'frames_measured': total_frames,
+                'fps': round(total_frames / (total_ms / 1000.0), 2) if total_ms > 0 else 0.0,
+                'wall_time_s': round(time.time() - run_start, 2),
+                'peak_rss_mb': get_peak_rss_mb(),
+                'stages': aggregate_stages
+            },
+            'videos': results
+        }
+
+    def save(self, report: Dict[str, Any], output_path: str = "") -> Path:
+        if output_path:
+            path = Path(output_path)
+        else:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            path = self.output_dir / f"benchmark_{self.mode}_{timestamp}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+        return path
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """So sánh 2 baseline; trả về các dòng text để in"""
+    def delta(old, new):
+        if not old:
+            return "   n/a"
+        return f"{(new - old) / old * 100:+6.1f}%"
+
+    lines = []
+    base_summary, cur_summary = baseline['summary'], current['summary']
+    lines.append(f"{'metric':<28}{'baseline':>12}{'current':>12}{'delta':>10}")
+    lines.append(f"{'fps':<28}{base_summary['fps']:>12.2f}{cur_summary['fps']:>12.2f}{delta(base_summary['fps'], cur_summary['fps']):>10}")
+
+    base_rss = base_summary.get('peak_rss_mb') or 0.0
+    cur_rss = cur_summary.get('peak_rss_mb') or 0.0
+    lines.append(f"{'peak_rss_mb':<28}{base_rss:>12.1f}{cur_rss:>12.1f}{delta(base_rss, cur_rss):>10}")
+
+    for stage in BENCHMARK_STAGES:
+        old = base_summary['stages'].get(stage, {}).get('mean_ms', 0.0)
+        new = cur_summary['stages'].get(stage, {}).get('mean_ms', 0.0)
+        lines.append(f"{stage + ' mean_ms':<28}{old:>12.3f}{new:>12.3f}{delta(old, new):>10}")
+
+    base_videos = {v['video']: v for v in baseline.get('videos', []) if v.get('status') == 'completed'}
+    for video in current.get('videos', []):
+        old = base_videos.get(video['video'])
+        if not old or video.get('status') != 'completed':
+            continue
+        for pct in PERCENTILES:
+            key = f'p{pct}_ms'
+            label = f"{video['video'][:20]} {key}"
+            lines.append(f"{label:<28}{old['frame_latency'][key]:>12.3f}{video['frame_latency'][key]:>12.3f}"
+                         f"{delta(old['frame_latency'][key], video['frame_latency'][key]):>10}")
+    return lines
+
+
+def print_report(report: Dict[str, Any]):
+    summary = report['summary']
+    print("\n" + "=" * 80)
+    print(f"📊 REPLAY BENCHMARK ({report['mode']})")
+    print("=" * 80)
+    print(f"   Videos: {summary['videos_completed']}/{summary['videos']} | Frames: {summary['frames_measured']}")
+    print(f"   FPS: {summary['fps']:.2f} | Peak RSS: {summary['peak_rss_mb'] or 0:.1f} MB")
+    print(f"   {'stage':<14}{'calls':>8}{'mean ms':>10}{'p95 max':>10}{'share':>8}")
+    for stage, data in summary['stages'].items():
+        print(f"   {stage:<14}{data['count']:>8}{data['mean_ms']:>10.2f}{data['p95_ms_max']:>10.2f}{data['share_of_frame_time']:>8.1%}")
+    print()
+    for video in report['videos']:
+        if video['status'] != 'completed':
+            print(f"   ❌ {video['video']}: {video.get('error')}")
+            continue
+        lat = video['frame_latency']
+        print(f"   🎬 {video['video']}: {video['fps']:.1f} FPS | p50 {lat['p50_ms']:.1f} | "
+              f"p95 {lat['p95_ms']:.1f} | p99 {lat['p99_ms']:.1f} ms")
+    print("=" * 80)
+
+
+def find_corpus_videos(resource_folder: Path) -> List[Path]:
+    videos = list(resource_folder.glob("*.mp4")) + list(resource_folder.glob("*.MP4"))
+    return sorted(videos, key=lambda x: x.name.lower())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline replay benchmark for the healthcare pipeline")
+    parser.add_argument('--mode', choices=['pipeline', 'processor'], default='pipeline',
+                        help="pipeline = AdvancedHealthcarePipeline, processor = IntegratedVideoProcessor only")
+    parser.add_argument('--resource', default="", help="Video corpus folder (default: examples/test/resource)")
+    parser.add_argument('--synthetic-only', action='store_true', help="Only run generated clips")
+    parser.add_argument('--no-synthetic', action='store_true', help="Skip generated clips")
+    parser.add_argument('--max-frames', type=int, default=0, help="Limit frames per video (0 = all)")
+    parser.add_argument('--warmup', type=int, default=5, help="Frames excluded from measurements")
+    parser.add_argument('--use-snapshot-service', action='store_true',
+                        help="Persist snapshots through MinIO/DB instead of local fallback")
+    parser.add_argument('--output', default="", help="Output JSON path")
+    parser.add_argument('--compare', default="", help="Baseline JSON to diff against")
+    args = parser.parse_args()
+
+    script_dir = Path(__file__).parent
+    videos = []
+    if not args.synthetic_only:
+        resource_folder = Path(args.resource) if args.resource else script_dir / "resource"
+        videos.extend(find_corpus_videos(resource_folder))
+    if not args.no_synthetic:
+        videos.extend(generate_synthetic_clips(script_dir / "test_results" / "benchmarks" / "synthetic"))
+
+    if not videos:
+        print("❌ No videos to benchmark")
+        return 1
+
+    benchmark = ReplayBenchmark(
+        mode=args.mode,
+        max_frames=args.max_frames,
+        warmup_frames=args.warmup,
+        use_snapshot_service=args.use_snapshot_service
+    )
+    report = benchmark.run(videos)
+    output_path = benchmark.save(report, args.output)
+    print_report(report)
+    print(f"💾 Baseline saved: {output_path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print("\n🔍 Comparison vs baseline:")
+        for line in compare_reports(baseline, report):
+            print(f"   {line}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
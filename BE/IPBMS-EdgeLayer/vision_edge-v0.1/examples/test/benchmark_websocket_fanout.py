@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+WebSocket Fan-out Load Test
+Chạy HealthcareWebSocketServer local + hàng nghìn client giả lập (một phần là client chậm),
+broadcast alerts và đo latency broadcast -> client nhận (p50/p95/p99), drop/coalesce của client chậm.
+
+Usage:
+    python examples/test/benchmark_websocket_fanout.py                         # 2000 clients, 5% chậm
+    python examples/test/benchmark_websocket_fanout.py --clients 5000 --alerts 50 --policy coalesce
+    python examples/test/benchmark_websocket_fanout.py --subscribed 0.5 --users 100   # lọc theo user_id
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Dict, List
+
+import websockets
+
+# Add examples directory (server) + src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "src"))
+
+import logging
+from healthcare_websocket_production import HealthcareWebSocketServer, QUEUE_POLICIES
+
+logging.getLogger("HealthcareWebSocket").setLevel(logging.WARNING)
+logging.getLogger("websockets").setLevel(logging.WARNING)
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:  # Windows
+    RESOURCE_AVAILABLE = False
+
+
+def raise_fd_limit(needed: int):
+    """Mỗi client = 2 socket (client + server side) trong cùng process"""
+    if not RESOURCE_AVAILABLE:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = min(hard, max(soft, needed))
+    if target > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    if target < needed:
+        print(f"⚠️ RLIMIT_NOFILE={target} < {needed}: giảm --clients hoặc tăng ulimit -n")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, Any]:
+    return {
+        'count': len(samples_ms),
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p95_ms': round(percentile(samples_ms, 95), 3),
+        'p99_ms': round(percentile(samples_ms, 99), 3),
+        'max_ms': round(max(samples_ms), 3) if samples_ms else 0.0
+    }
+
+
+class SimulatedClient:
+    """1 mobile client giả lập; slow client ngủ slow_delay sau mỗi message"""
+
+    def __init__(self, index: int, url: str, slow_delay: float, sent_at: Dict[str, float]):
+        self.index = index
+        self.url = url
+        self.slow_delay = slow_delay
+        self.sent_at = sent_at
+        self.latencies: List[float] = []
+        self.received = 0
+        self.websocket = None
+
+    async def connect(self):
+        # Client chậm: buffer nhận nhỏ để backpressure về server như điện thoại mạng yếu
+        self.websocket = await websockets.connect(self.url, ping_interval=None,
+                                                  max_queue=1 if self.slow_delay else None)
+        await self.websocket.recv()  # welcome
+
+    async def run(self):
+        try:
+            async for message in self.websocket:
+                alert = json.loads(message)
+                sent = self.sent_at.get(alert.get('action'))
+                if sent is not None:
+                    self.latencies.append((time.perf_counter() - sent) * 1000.0)
+                    self.received += 1
+                if self.slow_delay:
+                    await asyncio.sleep(self.slow_delay)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+
+async def run_load_test(args) -> Dict[str, Any]:
+    server = HealthcareWebSocketServer(host=args.host, port=args.port, max_queue=args.queue_size,
+                                       queue_policy=args.policy, send_timeout=args.send_timeout)
+    server.run_server_in_thread()
+    for _ in range(100):
+        if server.running and getattr(server, '_loop', None) and server._loop.is_running():
+            break
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.2)
+
+    rng = random.Random(42)
+    sent_at: Dict[str, float] = {}
+    clients: List[SimulatedClient] = []
+    for index in range(args.clients):
+        url = f"ws://{args.host}:{args.port}/"
+        if rng.random() < args.subscribed:
+            url += f"?user_id=user-{index % args.users}"
+        slow_delay = args.slow_delay if rng.random() < args.slow else 0.0
+        clients.append(SimulatedClient(index, url, slow_delay, sent_at))
+
+    # Connect theo batch để không vượt backlog của listen socket
+    connect_start = time.perf_counter()
+    for offset in range(0, len(clients), 200):
+        await asyncio.gather(*(client.connect() for client in clients[offset:offset + 200]))
+    connect_seconds = time.perf_counter() - connect_start
+    print(f"🔌 {len(clients)} clients connected in {connect_seconds:.1f}s")
+
+    readers = [asyncio.ensure_future(client.run()) for client in clients]
+
+    # Broadcast: mỗi alert gắn user_id ngẫu nhiên, client không subscribe nhận tất cả
+    # --burst: bắn tất cả alerts không chờ -> queue của client đầy, đo drop/coalesce
+    image_url = "http://minio.local/healthcare/" + "x" * args.image_url_bytes
+    enqueue_ms = []
+    pending = []
+    for i in range(args.alerts):
+        action = f"bench_{i}"
+        sent_at[action] = time.perf_counter()
+        future = server.send_alert_sync({"imageUrl": image_url, "status": "danger", "action": action,
+                                         "time": int(time.time())},
+                                        user_id=f"user-{rng.randrange(args.users)}", camera_id="bench-cam")
+        if args.burst:
+            pending.append(asyncio.wrap_future(future))
+            continue
+        await asyncio.wrap_future(future)
+        enqueue_ms.append((time.perf_counter() - sent_at[action]) * 1000.0)
+        await asyncio.sleep(args.interval)
+    if pending:
+        await asyncio.gather(*pending)
+
+    await asyncio.sleep(args.drain)
+
+    fast = [client for client in clients if not client.slow_delay]
+    slow = [client for client in clients if client.slow_delay]
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'config': vars(args),
+        'connect_seconds': round(connect_seconds, 3),
+        'broadcast_enqueue': summarize(enqueue_ms),
+        'fast_clients': {
+            'clients': len(fast),
+            'messages_received': sum(client.received for client in fast),
+            'latency': summarize([value for client in fast for value in client.latencies])
+        },
+        'slow_clients': {
+            'clients': len(slow),
+            'messages_received': sum(client.received for client in slow),
+            'latency': summarize([value for client in slow for value in client.latencies])
+        },
+        'server': server.get_stats()
+    }
+
+    for reader in readers:
+        reader.cancel()
+    await asyncio.gather(*(client.websocket.close() for client in clients), return_exceptions=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket fan-out load test")
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--alerts', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.05, help="Giây giữa 2 alerts")
+    parser.add_argument('--burst', action='store_true', help="Broadcast tất cả alerts liên tiếp")
+    parser.add_argument('--image-url-bytes', type=int, default=256, help="Độ dài imageUrl (kích thước message)")
+    parser.add_argument('--slow', type=float, default=0.05, help="Tỉ lệ client chậm")
+    parser.add_argument('--slow-delay', type=float, default=0.5, help="Client chậm ngủ bao lâu mỗi message")
+    parser.add_argument('--subscribed', type=float, default=0.0, help="Tỉ lệ client lọc theo user_id")
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--queue-size', type=int, default=32)
+    parser.add_argument('--policy', choices=QUEUE_POLICIES, default='drop_oldest')
+    parser.add_argument('--send-timeout', type=float, default=5.0)
+    parser.add_argument('--drain', type=float, default=3.0, help="Chờ sau alert cuối (giây)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9998)
+    parser.add_argument('--output', default='')
+    args = parser.parse_args()
+
+    raise_fd_limit(args.clients * 2 + 256)
+    print(f"🚀 Fan-out load test: {args.clients} clients, {args.alerts} alerts, policy {args.policy}")
+    report = asyncio.run(run_load_test(args))
+
+    fast = report['fast_clients']['latency']
+    print(f"📤 Enqueue per broadcast: p50 {report['broadcast_enqueue']['p50_ms']}ms, "
+          f"p95 {report['broadcast_enqueue']['p95_ms']}ms")
+    print(f"📱 Fast clients: {report['fast_clients']['messages_received']} msgs, "
+          f"p50 {fast['p50_ms']}ms, p95 {fast['p95_ms']}ms, p99 {fast['p99_ms']}ms")
+    print(f"🐢 Slow clients: {report['slow_clients']['messages_received']} msgs, "
+          f"drops {report['server']['client_drops']}, coalesced {report['server']['client_coalesced']}, "
+          f"disconnects {report['server']['slow_disconnects']}")
+
+    output = Path(args.output or Path(__file__).parent / "test_results" / "benchmarks" /
+                  f"benchmark_websocket_fanout_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"💾 Saved: {output}")
+
+
+if __name__ == "__main__":
+    main()
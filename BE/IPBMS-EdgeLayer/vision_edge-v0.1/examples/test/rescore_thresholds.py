@@ -0,0 +1,635 @@
+#!/usr/bin/env python3
+"""
+Offline Threshold Re-scoring
+Load stream đã ghi theo frame (bbox người chính, keypoints, motion level, raw confidence) rồi đánh giá lại
+logic fall / seizure trên cả parameter grid bằng NumPy - không decode video, không chạy model.
+
+Logic được mirror (giữ đồng bộ khi sửa code gốc):
+- SimpleFallDetector._analyze_bbox_changes (ring buffer 3 frame, min_time_interval)
+- VSViGSeizureDetector._analyze_motion_patterns (cửa sổ 15 frame có keypoints)
+- SeizurePredictor.update_prediction / _determine_alert_level (EMA + temporal pattern)
+- AdvancedHealthcarePipeline.process_dual_detection (motion enhancement, moving average 10,
+  confirmation frames, cooldown) với ngưỡng từ DetectionConfig
+
+Feature của mọi cửa sổ tính 1 lần (vectorized theo window), phần có trạng thái (EMA, confirmation,
+cooldown) chạy 1 vòng theo thời gian nhưng vectorized theo toàn bộ grid (P settings cùng lúc).
+
+Session: thư mục recording của pipeline (RECORDING_ENABLED=true, chỉ lấy keyframe), .npz hoặc .json list các frame:
+    timestamp (T,) giây | bbox (T, 4) xyxy, NaN = không có người | keypoints (T, K, 3), NaN = pose lỗi
+    motion_level (T,) | fall_confidence (T,) raw output detector (tuỳ chọn, dùng khi không có bbox)
+    label_fall / label_seizure (T,) bool (tuỳ chọn, hoặc --labels JSON: {session: {"fall": [[start_s, end_s]]}})
+
+Usage:
+    python examples/test/rescore_thresholds.py data/recordings/ --labels labels.json
+    python examples/test/rescore_thresholds.py recordings/*.npz --grid fall_confidence_threshold=0.5:0.9:0.1 \\
+        --grid seizure_threshold=0.01,0.02,0.05 --grid predictor_smoothing=0.5,0.8
+    python examples/test/rescore_thresholds.py --synthetic 40     # session tổng hợp có label, không cần data
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "src"))
+
+from infrastructure.services.config_snapshot_service import DetectionConfig
+from infrastructure.services.detection_recorder_service import RecordingReader, is_recording
+
+# Ngưỡng pipeline lấy từ DetectionConfig (env / DB override như lúc chạy thật)
+CONFIG_PARAMS = (
+    'fall_confidence_threshold', 'fall_confirm_threshold', 'fall_cooldown_seconds', 'fall_min_confirmation_frames',
+    'seizure_threshold', 'seizure_warning_threshold', 'seizure_min_confirmation_frames', 'seizure_cooldown_seconds',
+)
+
+# Hằng số đang hard-code trong detector (giá trị hiện tại của code gốc)
+DETECTOR_DEFAULTS = {
+    # FallDetectionService -> SimpleFallDetector
+    'fall_detector_threshold': 0.25,
+    'fall_min_time_interval': 0.8,
+    'fall_aspect_change': 1.3,
+    'fall_vertical_movement': 15.0,
+    # VSViGSeizureDetector._analyze_motion_patterns
+    'seizure_velocity_gate': 20.0,
+    'seizure_acceleration_gate': 50.0,
+    'seizure_frequency_gate': 15.0,
+    'seizure_intensity_gate': 10.0,
+    'seizure_spike_gate': 20.0,
+    'seizure_indicator_threshold': 0.15,
+    'seizure_min_score': 0.1,
+    # SeizurePredictor như main.py (multi-camera)
+    'predictor_smoothing': 0.8,
+    'predictor_alert_threshold': 0.01,
+    'predictor_warning_threshold': 0.005,
+}
+
+FALL_BUFFER_SIZE = 3          # SimpleFallDetector max_buffer_size
+SMOOTHING_HISTORY = 10        # AdvancedHealthcarePipeline.smooth_detection_confidence
+DECISIONS = ('fall', 'seizure', 'seizure_predictor')
+
+
+def default_params() -> Dict[str, float]:
+    config = DetectionConfig.from_env()
+    params = {name: float(getattr(config, name)) for name in CONFIG_PARAMS}
+    params.update(DETECTOR_DEFAULTS)
+    return params
+
+
+# ----------------------------------------------------------------------
+# Sessions
+# ----------------------------------------------------------------------
+class Session:
+    """1 stream đã ghi, các array căn theo frame (chỉ frame đã qua process_dual_detection)"""
+
+    def __init__(self, name: str, timestamp, bbox, keypoints, motion_level, fall_confidence=None,
+                 labels: Optional[Dict[str, List[Tuple[float, float]]]] = None,
+                 label_arrays: Optional[Dict[str, np.ndarray]] = None):
+        self.name = name
+        self.timestamp = np.asarray(timestamp, dtype=np.float64)
+        self.bbox = np.asarray(bbox, dtype=np.float64).reshape(-1, 4)
+        self.keypoints = np.asarray(keypoints, dtype=np.float64)
+        self.motion_level = np.asarray(motion_level, dtype=np.float64)
+        self.fall_confidence = (np.zeros(len(self.timestamp)) if fall_confidence is None
+                                else np.nan_to_num(np.asarray(fall_confidence, dtype=np.float64)))
+        self.has_person = np.isfinite(self.bbox).all(axis=1)
+        self.has_keypoints = self.has_person & np.isfinite(self.keypoints).all(axis=(1, 2))
+
+        # Label -> list interval [start, end) theo chỉ số frame
+        self.events: Dict[str, List[Tuple[int, int]]] = {}
+        for event_type in ('fall', 'seizure'):
+            if label_arrays and label_arrays.get(event_type) is not None:
+                self.events[event_type] = _runs(np.asarray(label_arrays[event_type], dtype=bool))
+            elif labels and labels.get(event_type):
+                start_ts = self.timestamp[0] if len(self.timestamp) else 0.0
+                self.events[event_type] = [
+                    (int(np.searchsorted(self.timestamp, start_ts + start, 'left')),
+                     int(np.searchsorted(self.timestamp, start_ts + end, 'right')))
+                    for start, end in labels[event_type]
+                ]
+            else:
+                self.events[event_type] = []
+
+    @property
+    def frames(self) -> int:
+        return len(self.timestamp)
+
+    @property
+    def duration(self) -> float:
+        return float(self.timestamp[-1] - self.timestamp[0]) if self.frames > 1 else 0.0
+
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """Các đoạn True liên tiếp -> [(start, end)]"""
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def _frames_to_arrays(frames: List[Dict[str, Any]], keypoint_count: int = 17) -> Dict[str, np.ndarray]:
+    """JSON list frame dict -> array (bbox / keypoints thiếu -> NaN)"""
+    count = len(frames)
+    arrays = {
+        'timestamp': np.array([frame.get('timestamp', index / 30.0) for index, frame in enumerate(frames)]),
+        'bbox': np.full((count, 4), np.nan),
+        'motion_level': np.array([frame.get('motion_level', 0.0) or 0.0 for frame in frames]),
+        'fall_confidence': np.array([frame.get('fall_confidence', 0.0) or 0.0 for frame in frames]),
+    }
+    shapes = [np.asarray(frame['keypoints']).shape for frame in frames if frame.get('keypoints') is not None]
+    keypoint_shape = shapes[0] if shapes else (keypoint_count, 3)
+    arrays['keypoints'] = np.full((count,) + tuple(keypoint_shape), np.nan)
+    for index, frame in enumerate(frames):
+        if frame.get('bbox') is not None:
+            arrays['bbox'][index] = frame['bbox'][:4]
+        if frame.get('keypoints') is not None:
+            arrays['keypoints'][index] = np.asarray(frame['keypoints'], dtype=np.float64).reshape(keypoint_shape)
+    for event_type in ('fall', 'seizure'):
+        if any(f'label_{event_type}' in frame for frame in frames):
+            arrays[f'label_{event_type}'] = np.array([bool(frame.get(f'label_{event_type}')) for frame in frames])
+    return arrays
+
+
+def load_session(path: Path, labels: Optional[Dict[str, Any]] = None) -> Session:
+    """Load 1 recording (thư mục DetectionRecorder / .npz / .json)"""
+    name = path.stem
+    if is_recording(str(path)):
+        arrays = RecordingReader(str(path)).to_session_arrays()
+        name = f"{path.parent.name}_{path.name}"   # <camera_id>_<session>
+    elif path.suffix == '.npz':
+        with np.load(path) as data:
+            arrays = {key: data[key] for key in data.files}
+    else:
+        with open(path) as f:
+            content = json.load(f)
+        arrays = _frames_to_arrays(content['frames'] if isinstance(content, dict) else content)
+
+    return Session(
+        name, arrays['timestamp'], arrays['bbox'], arrays['keypoints'], arrays['motion_level'],
+        fall_confidence=arrays.get('fall_confidence'),
+        labels=(labels or {}).get(name),
+        label_arrays={event_type: arrays.get(f'label_{event_type}') for event_type in ('fall', 'seizure')}
+    )
+
+
+def find_recordings(inputs: List[str]) -> List[Path]:
+    paths = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir() and is_recording(str(path)):
+            paths.append(path)
+        elif path.is_dir():
+            paths.extend(sorted(header.parent for header in path.rglob('header.json')))
+            paths.extend(sorted(p for p in path.iterdir() if p.suffix in ('.npz', '.json') and p.name != 'labels.json'))
+        elif path.exists():
+            paths.append(path)
+    return paths
+
+
+# ----------------------------------------------------------------------
+# Parameter grid
+# ----------------------------------------------------------------------
+def parse_grid(specs: List[str], base: Dict[str, float]) -> Dict[str, np.ndarray]:
+    """
+    'name=a:b:step' (inclusive) hoặc 'name=v1,v2,...' -> tích Descartes.
+    Returns dict name -> array (P,), param không có trong grid giữ giá trị base
+    """
+    axes: Dict[str, np.ndarray] = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        name = name.strip()
+        if name not in base:
+            raise ValueError(f"Unknown parameter '{name}' (known: {', '.join(sorted(base))})")
+        if ':' in values:
+            start, stop, step = (float(v) for v in values.split(':'))
+            axes[name] = np.round(np.arange(start, stop + step / 2, step), 6)
+        else:
+            axes[name] = np.array([float(v) for v in values.split(',')])
+
+    if axes:
+        mesh = np.meshgrid(*axes.values(), indexing='ij')
+        size = mesh[0].size
+        grid = {name: axis.ravel() for name, axis in zip(axes, mesh)}
+    else:
+        size, grid = 1, {}
+    for name, value in base.items():
+        grid.setdefault(name, np.full(size, value, dtype=np.float64))
+    return grid
+
+
+# ----------------------------------------------------------------------
+# Vectorized detector logic
+# ----------------------------------------------------------------------
+def fall_raw_confidence(session: Session, grid: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    SimpleFallDetector output cho mọi frame có người -> (P, T).
+    So sánh entry cũ nhất trong ring buffer 3 frame với frame hiện tại. Xấp xỉ: coi mọi frame có người
+    đều được push (pipeline bỏ qua detect_fall trong cooldown, khi đó confidence bị ép về 0 nên chỉ lệch
+    1-2 frame ngay sau cooldown). Frame không có bbox hợp lệ -> dùng fall_confidence đã ghi (frame difference).
+    """
+    params = {name: values[:, None] for name, values in grid.items()}
+    result = np.zeros((len(next(iter(grid.values()))), session.frames))
+    person_idx = np.flatnonzero(session.has_person)
+    if person_idx.size < 2:
+        return result
+
+    j = np.arange(person_idx.size)
+    oldest = person_idx[j - np.minimum(j, FALL_BUFFER_SIZE - 1)]
+    current = person_idx
+    box1, box2 = session.bbox[oldest], session.bbox[current]
+
+    w1, h1 = box1[:, 2] - box1[:, 0], box1[:, 3] - box1[:, 1]
+    w2, h2 = box2[:, 2] - box2[:, 0], box2[:, 3] - box2[:, 1]
+    valid = (j >= 1) & (w1 > 0) & (h1 > 0) & (w2 > 0) & (h2 > 0) & (box1 >= 0).all(axis=1) & (box2 >= 0).all(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aspect_change = np.where(valid, (w2 / h2) / (w1 / h1), 1.0)
+    center1, center2 = (box1[:, 1] + box1[:, 3]) / 2, (box2[:, 1] + box2[:, 3]) / 2
+    vertical_movement = np.abs(center2 - center1)
+    confidence = np.minimum(0.9, 0.5 + (aspect_change - 1.5) * 0.3 + np.minimum(vertical_movement / 100, 0.4))
+
+    interval_ok = (j >= 1) & ((session.timestamp[current] - session.timestamp[oldest]) >= params['fall_min_time_interval'])
+    fall = (valid & (center2 > center1)
+            & (aspect_change > params['fall_aspect_change'])
+            & (vertical_movement > params['fall_vertical_movement'])
+            & (confidence >= params['fall_detector_threshold']))
+    bbox_conf = np.where(fall, confidence, 0.0)
+    recorded = np.where(valid, 0.0, session.fall_confidence[current])
+    result[:, current] = np.where(interval_ok, bbox_conf + recorded, 0.0)
+    return result
+
+
+def seizure_window_features(keypoints: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Feature của _analyze_motion_patterns cho mọi cửa sổ cùng lúc.
+    keypoints: (W, T, K, 3) -> dict feature (W,)
+    """
+    coords = keypoints[..., :2]
+    velocities = np.diff(coords, axis=1)                                  # (W, T-1, K, 2)
+    vel_magnitudes = np.sqrt(np.sum(velocities ** 2, axis=3))             # (W, T-1, K)
+    accelerations = np.diff(velocities, axis=1)
+    acc_magnitudes = np.sqrt(np.sum(accelerations ** 2, axis=3))          # (W, T-2, K)
+
+    if vel_magnitudes.shape[1] > 5:
+        main_joints = vel_magnitudes[:, :, :8]
+        direction_changes = np.sum(np.diff(np.sign(main_joints), axis=1) != 0, axis=(1, 2)).astype(np.float64)
+    else:
+        direction_changes = np.full(keypoints.shape[0], -np.inf)          # frequency_score luôn 0
+
+    return {
+        'velocity_variance': np.var(vel_magnitudes, axis=1).mean(axis=1),
+        'acceleration_peaks': np.max(acc_magnitudes, axis=1).mean(axis=1),
+        'direction_changes': direction_changes,
+        'total_movement': np.mean(vel_magnitudes, axis=(1, 2)),
+        'movement_spikes': np.max(vel_magnitudes, axis=1).mean(axis=1),
+    }
+
+
+def seizure_scores(features: Dict[str, np.ndarray], grid: Dict[str, np.ndarray]) -> np.ndarray:
+    """Feature (W,) x grid (P,) -> seizure confidence (P, W)"""
+    params = {name: values[:, None] for name, values in grid.items()}
+
+    def gated(value, gate, scale):
+        return np.where(value[None, :] > gate, np.tanh(value[None, :] / scale), 0.0)
+
+    velocity = gated(features['velocity_variance'], params['seizure_velocity_gate'], 50.0)
+    acceleration = gated(features['acceleration_peaks'], params['seizure_acceleration_gate'], 100.0)
+    frequency = gated(features['direction_changes'], params['seizure_frequency_gate'], 50.0)
+    intensity = gated(features['total_movement'], params['seizure_intensity_gate'], 25.0)
+    spike = gated(features['movement_spikes'], params['seizure_spike_gate'], 40.0)
+
+    indicator = params['seizure_indicator_threshold']
+    active = ((velocity > indicator) | (acceleration > indicator) | (frequency > indicator)
+              | (intensity > indicator) | (spike > indicator))
+    confidence = 0.25 * velocity + 0.25 * acceleration + 0.20 * frequency + 0.15 * intensity + 0.15 * spike
+    confidence = np.where(active & (confidence >= params['seizure_min_score']), confidence, 0.0)
+    return np.clip(confidence, 0.0, 1.0)
+
+
+def seizure_raw_confidence(session: Session, grid: Dict[str, np.ndarray],
+                           window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    VSViG confidence cho frame temporal_ready (buffer đủ `window` frame có keypoints hợp lệ).
+    Returns (ready_frame_indices (R,), confidence (P, R))
+    """
+    size = len(next(iter(grid.values())))
+    keypoint_idx = np.flatnonzero(session.has_keypoints)
+    if keypoint_idx.size < window:
+        return np.zeros(0, dtype=np.int64), np.zeros((size, 0))
+
+    compact = session.keypoints[keypoint_idx]
+    windows = sliding_window_view(compact, window, axis=0)                # (W, K, 3, window)
+    windows = np.moveaxis(windows, -1, 1)                                  # (W, window, K, 3)
+    return keypoint_idx[window - 1:], seizure_scores(seizure_window_features(windows), grid)
+
+
+def _enhance(confidence: np.ndarray, motion: float, detection_type: str) -> np.ndarray:
+    """AdvancedHealthcarePipeline.enhance_detection_with_motion (motion là scalar của frame)"""
+    if detection_type == 'fall':
+        if motion > 0.1:
+            return np.minimum(1.0, confidence + min(0.3, motion * 0.5))
+        if motion < 0.02:
+            return confidence * 0.95
+    else:
+        if motion > 0.05:
+            return np.minimum(1.0, confidence + min(0.2, motion * 0.4))
+        if motion < 0.01:
+            return confidence * 0.9
+    return confidence
+
+
+class _MovingAverage:
+    """smooth_detection_confidence (10 giá trị gần nhất) cho P setting, chỉ push ở các setting trong mask"""
+
+    def __init__(self, size: int, history: int = SMOOTHING_HISTORY):
+        self.values = np.zeros((size, history))
+        self.count = np.zeros(size, dtype=np.int64)
+        self.head = np.zeros(size, dtype=np.int64)
+        self.rows = np.arange(size)
+
+    def push(self, values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        rows = self.rows[mask]
+        self.values[rows, self.head[rows]] = values[rows]
+        self.head[rows] = (self.head[rows] + 1) % self.values.shape[1]
+        self.count[rows] = np.minimum(self.count[rows] + 1, self.values.shape[1])
+        return self.values.sum(axis=1) / np.maximum(self.count, 1)
+
+
+def simulate(session: Session, grid: Dict[str, np.ndarray], seizure_window: int = 15,
+             predictor_window: int = 3) -> Dict[str, np.ndarray]:
+    """
+    Chạy lại process_dual_detection cho cả grid. Returns {decision: (P, T) bool}
+    - fall: fall_detected | seizure: seizure_detected | seizure_predictor: SeizurePredictor level 'critical'
+    """
+    size = len(next(iter(grid.values())))
+    p = grid
+    fall_raw = fall_raw_confidence(session, grid)
+    ready_idx, seizure_raw = seizure_raw_confidence(session, grid, seizure_window)
+    ready_column = np.full(session.frames, -1, dtype=np.int64)
+    ready_column[ready_idx] = np.arange(ready_idx.size)
+
+    decisions = {name: np.zeros((size, session.frames), dtype=bool) for name in DECISIONS}
+
+    # Trạng thái pipeline (P,)
+    last_fall = np.full(size, -np.inf)
+    last_seizure = np.full(size, -np.inf)
+    fall_frames = np.zeros(size)
+    seizure_frames = np.zeros(size)
+    fall_average = _MovingAverage(size)
+    seizure_average = _MovingAverage(size)
+    all_rows = np.ones(size, dtype=bool)
+
+    # Trạng thái SeizurePredictor
+    ema = np.zeros(size)
+    history = np.zeros((size, predictor_window))
+    history_count = 0
+
+    for t in range(session.frames):
+        if not session.has_person[t]:
+            fall_frames[:] = 0
+            seizure_frames[:] = 0
+            continue
+        now = session.timestamp[t]
+        motion = float(session.motion_level[t])
+
+        # ---- Fall ----
+        active = (now - last_fall) >= p['fall_cooldown_seconds']
+        base = fall_raw[:, t]
+        direct = active & (base >= p['fall_confidence_threshold'])
+        confirm = active & ~direct
+        smoothed = fall_average.push(_enhance(base, motion, 'fall'), confirm)
+        above = smoothed > p['fall_confirm_threshold']
+        fall_frames = np.where(confirm, np.where(above, fall_frames + 1, np.maximum(0, fall_frames - 1)), fall_frames)
+        fall = direct | (confirm & (fall_frames >= p['fall_min_confirmation_frames']))
+        last_fall = np.where(fall, now, last_fall)
+        decisions['fall'][:, t] = fall
+
+        # ---- Seizure (chỉ khi temporal_ready) ----
+        column = ready_column[t]
+        if column < 0:
+            continue
+        raw = seizure_raw[:, column]
+        smoothing = p['predictor_smoothing']
+        ema = raw if history_count == 0 else smoothing * raw + (1 - smoothing) * ema
+        history = np.roll(history, -1, axis=1)
+        history[:, -1] = raw
+        history_count = min(history_count + 1, predictor_window)
+
+        critical = (ema >= p['predictor_alert_threshold']) | (raw >= p['predictor_alert_threshold'] + 0.1)
+        warning = ~critical & (ema >= p['predictor_warning_threshold'])
+        if history_count >= 5:
+            values = history[:, -history_count:]
+            x = np.arange(history_count) - (history_count - 1) / 2
+            slope = (values * x).sum(axis=1) / (x ** 2).sum()
+            sustained = values[:, -10:].mean(axis=1) > p['predictor_warning_threshold']
+            warning |= ~critical & sustained & (slope > 0.01)
+        decisions['seizure_predictor'][:, t] = critical
+
+        final = seizure_average.push(_enhance(ema, motion, 'seizure'), all_rows)
+        seizure_frames = np.where(final > p['seizure_threshold'], seizure_frames + 1,
+                                  np.where(final > p['seizure_warning_threshold'], seizure_frames, 0))
+        confirmed = seizure_frames >= p['seizure_min_confirmation_frames']
+        seizure = confirmed & ((now - last_seizure) > p['seizure_cooldown_seconds'])
+        last_seizure = np.where(seizure, now, last_seizure)
+        seizure_frames = np.where(seizure, 0, seizure_frames)
+        decisions['seizure'][:, t] = seizure
+
+    return decisions
+
+
+# ----------------------------------------------------------------------
+# Scoring
+# ----------------------------------------------------------------------
+def score_session(session: Session, decisions: Dict[str, np.ndarray], tolerance: float) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Event-level: detection trong interval label (mở rộng ±tolerance giây) = TP, ngoài = false alarm;
+    recall = số event label có >= 1 detection. Returns {decision: {tp, fp, hits, events}} mỗi field (P,)
+    """
+    counts = {}
+    for decision, detected in decisions.items():
+        event_type = 'fall' if decision == 'fall' else 'seizure'
+        inside = np.zeros(session.frames, dtype=bool)
+        hits = np.zeros(detected.shape[0])
+        for start, end in session.events[event_type]:
+            lo = int(np.searchsorted(session.timestamp, session.timestamp[min(start, session.frames - 1)] - tolerance, 'left'))
+            hi = int(np.searchsorted(session.timestamp, session.timestamp[max(end - 1, 0)] + tolerance, 'right'))
+            inside[lo:hi] = True
+            hits += detected[:, lo:hi].any(axis=1)
+        tp = detected[:, inside].sum(axis=1)
+        counts[decision] = {'tp': tp, 'fp': detected.sum(axis=1) - tp, 'hits': hits,
+                            'events': np.full(detected.shape[0], len(session.events[event_type]))}
+    return counts
+
+
+def summarize(totals: Dict[str, Dict[str, np.ndarray]], duration_hours: float) -> Dict[str, Dict[str, np.ndarray]]:
+    summary = {}
+    for decision, counts in totals.items():
+        detections = counts['tp'] + counts['fp']
+        precision = np.divide(counts['tp'], detections, out=np.zeros_like(detections, dtype=np.float64), where=detections > 0)
+        recall = np.divide(counts['hits'], counts['events'], out=np.zeros_like(counts['hits']), where=counts['events'] > 0)
+        f1 = np.divide(2 * precision * recall, precision + recall, out=np.zeros_like(precision), where=(precision + recall) > 0)
+        summary[decision] = {
+            'precision': precision, 'recall': recall, 'f1': f1,
+            'detections': detections, 'false_alarms': counts['fp'],
+            'false_alarms_per_hour': counts['fp'] / max(duration_hours, 1e-9),
+        }
+    return summary
+
+
+def rescore(sessions: List[Session], grid: Dict[str, np.ndarray], tolerance: float = 1.0,
+            seizure_window: int = 15, predictor_window: int = 3) -> Dict[str, Dict[str, np.ndarray]]:
+    totals: Dict[str, Dict[str, np.ndarray]] = {}
+    for session in sessions:
+        decisions = simulate(session, grid, seizure_window, predictor_window)
+        for decision, counts in score_session(session, decisions, tolerance).items():
+            bucket = totals.setdefault(decision, {key: np.zeros_like(value, dtype=np.float64) for key, value in counts.items()})
+            for key, value in counts.items():
+                bucket[key] += value
+    return summarize(totals, sum(session.duration for session in sessions) / 3600.0)
+
+
+# ----------------------------------------------------------------------
+# Synthetic sessions
+# ----------------------------------------------------------------------
+def synthetic_session(index: int, seconds: float = 180.0, fps: float = 2.0, seed: int = 0) -> Session:
+    """Session tổng hợp (~tần suất keyframe): đứng yên + 1 fall (bbox đứng -> nằm, đi xuống) và/hoặc 1 đoạn co giật (keypoint rung)"""
+    rng = np.random.default_rng(seed + index)
+    count = int(seconds * fps)
+    timestamp = np.arange(count) / fps
+    bbox = np.tile([400.0, 200.0, 520.0, 560.0], (count, 1)) + rng.normal(0, 1.5, (count, 4))
+    base_pose = rng.uniform([420, 220], [500, 540], (17, 2))
+    keypoints = np.concatenate([np.tile(base_pose, (count, 1, 1)) + rng.normal(0, 1.0, (count, 17, 2)),
+                                np.full((count, 17, 1), 0.9)], axis=2)
+    motion = np.abs(rng.normal(0.03, 0.02, count))
+    label_fall = np.zeros(count, dtype=bool)
+    label_seizure = np.zeros(count, dtype=bool)
+
+    if index % 2 == 0:   # fall
+        start = int(rng.uniform(0.2, 0.6) * count)
+        end = start + int(2.0 * fps)
+        lying = np.array([330.0, 440.0, 650.0, 580.0])
+        for step, t in enumerate(range(start, min(end, count))):
+            alpha = (step + 1) / (end - start)
+            bbox[t] = (1 - alpha) * bbox[t] + alpha * lying
+        bbox[end:] = lying + rng.normal(0, 1.5, (max(count - end, 0), 4))
+        motion[start:end] += 0.4
+        label_fall[start:end + int(fps)] = True
+    if index % 3 == 0:   # seizure
+        start = int(rng.uniform(0.5, 0.8) * count)
+        end = min(count, start + int(rng.uniform(4, 8) * fps))
+        phase = rng.uniform(0, 2 * np.pi, (17, 2))
+        t = np.arange(end - start)[:, None, None]
+        keypoints[start:end, :, :2] += 25 * np.sin(2 * np.pi * 0.4 * t + phase) * rng.uniform(0.5, 1.5, (17, 2))
+        motion[start:end] += 0.3
+        label_seizure[start:end] = True
+    # Pose lỗi / mất người ngẫu nhiên
+    keypoints[rng.random(count) < 0.03] = np.nan
+    bbox[rng.random(count) < 0.01] = np.nan
+
+    return Session(f"synthetic_{index:03d}", timestamp, bbox, keypoints, motion,
+                   label_arrays={'fall': label_fall, 'seizure': label_seizure})
+
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+def build_report(grid: Dict[str, np.ndarray], summary, varied: List[str], sessions: List[Session],
+                 elapsed: float, args) -> Dict[str, Any]:
+    size = len(next(iter(grid.values())))
+    settings = []
+    for index in range(size):
+        settings.append({
+            'params': {name: float(grid[name][index]) for name in varied},
+            **{decision: {metric: round(float(values[index]), 4) for metric, values in metrics.items()}
+               for decision, metrics in summary.items()}
+        })
+    return {
+        'created_at': datetime.now().isoformat(),
+        'sessions': [{'name': s.name, 'frames': s.frames, 'duration_s': round(s.duration, 2),
+                      'fall_events': len(s.events['fall']), 'seizure_events': len(s.events['seizure'])}
+                     for s in sessions],
+        'base_params': {name: float(values[0]) for name, values in grid.items() if name not in varied},
+        'grid_size': size,
+        'tolerance_s': args.tolerance,
+        'seizure_window': args.seizure_window,
+        'predictor_window': args.predictor_window,
+        'elapsed_s': round(elapsed, 3),
+        'settings': settings,
+    }
+
+
+def print_top(report: Dict[str, Any], decision: str, top: int):
+    ranked = sorted(report['settings'], key=lambda s: (-s[decision]['f1'], s[decision]['false_alarms_per_hour']))
+    print(f"\n🏆 Top {min(top, len(ranked))} settings - {decision}")
+    print(f"   {'F1':>6} {'Prec':>6} {'Recall':>6} {'FA/h':>8}  params")
+    for setting in ranked[:top]:
+        metrics = setting[decision]
+        params = ', '.join(f"{name}={value:g}" for name, value in setting['params'].items()) or '(defaults)'
+        print(f"   {metrics['f1']:6.3f} {metrics['precision']:6.3f} {metrics['recall']:6.3f} "
+              f"{metrics['false_alarms_per_hour']:8.1f}  {params}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score fall/seizure thresholds offline on recorded streams")
+    parser.add_argument('inputs', nargs='*', help="Recording files (.npz/.json) hoặc thư mục")
+    parser.add_argument('--labels', help="JSON {session_name: {'fall': [[start_s, end_s]], 'seizure': [...]}}")
+    parser.add_argument('--grid', action='append', default=[],
+                        help="name=start:stop:step hoặc name=v1,v2 (lặp lại để thêm trục)")
+    parser.add_argument('--tolerance', type=float, default=1.0, help="Giây mở rộng mỗi interval label")
+    parser.add_argument('--seizure-window', type=int, default=15, help="VSViG temporal_window")
+    parser.add_argument('--predictor-window', type=int, default=3, help="SeizurePredictor temporal_window")
+    parser.add_argument('--synthetic', type=int, default=0, help="Thêm N session tổng hợp có label")
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--list-params', action='store_true', help="In tên + giá trị mặc định các param")
+    parser.add_argument('--output', help="JSON report (mặc định test_results/rescoring/rescore_<timestamp>.json)")
+    args = parser.parse_args()
+
+    base = default_params()
+    if args.list_params:
+        for name, value in base.items():
+            print(f"{name} = {value:g}")
+        return
+
+    labels = None
+    if args.labels:
+        with open(args.labels) as f:
+            labels = json.load(f)
+
+    load_start = time.perf_counter()
+    sessions = [load_session(path, labels) for path in find_recordings(args.inputs)]
+    sessions += [synthetic_session(index) for index in range(args.synthetic)]
+    if not sessions:
+        print("❌ No recordings found (truyền file/thư mục hoặc --synthetic N)")
+        return
+    load_time = time.perf_counter() - load_start
+
+    grid = parse_grid(args.grid, base)
+    varied = [spec.partition('=')[0].strip() for spec in args.grid]
+    size = len(next(iter(grid.values())))
+    frames = sum(session.frames for session in sessions)
+    print(f"🧮 Re-scoring {len(sessions)} sessions ({frames} frames) x {size} settings "
+          f"(loaded in {load_time:.2f}s)")
+
+    start = time.perf_counter()
+    summary = rescore(sessions, grid, args.tolerance, args.seizure_window, args.predictor_window)
+    elapsed = time.perf_counter() - start
+    print(f"⏱️ {elapsed:.2f}s ({frames * size / max(elapsed, 1e-9):,.0f} frame-settings/s)")
+
+    report = build_report(grid, summary, varied, sessions, elapsed, args)
+    for decision in DECISIONS:
+        print_top(report, decision, args.top)
+
+    output = Path(args.output) if args.output else (
+        Path(__file__).parent / 'test_results' / 'rescoring' / f"rescore_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Report: {output}")
+
+
+if __name__ == "__main__":
+    main()
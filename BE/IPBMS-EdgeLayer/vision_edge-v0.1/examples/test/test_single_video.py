@@ -30,6 +30,7 @@ from service.fall_detection_service import FallDetectionService
 from service.seizure_detection_service import SeizureDetectionService
 from seizure_detection.seizure_predictor import SeizurePredictor
 from service.advanced_healthcare_pipeline import AdvancedHealthcarePipeline
+from infrastructure.services.inference_cache_service import inference_cache
 
 # Setup logging
 logging.basicConfig(
@@ -176,6 +177,7 @@ class SingleVideoTester:
         frame_count = 0
         start_time = time.time()
         paused = False
+        inference_cache.reset_stats()
         
         while True:
             if not paused:
@@ -387,6 +389,11 @@ class SingleVideoTester:
         print(f"   - Falls: {falls}")
         print(f"   - Seizures/Abnormal: {seizures}")
         
+        cache_stats = inference_cache.get_stats()
+        if cache_stats['enabled']:
+            print(f"🗄️  Inference Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                  f"({cache_stats['hit_rate']:.1%})")
+        
         print(f"\n📊 Statistics:")
         for k, v in pipeline.stats.items():
             print(f"   {k}: {v}")
@@ -413,7 +420,8 @@ class SingleVideoTester:
             'total_frames': frame_count,
             'fps': frame_count / processing_time,
             'detected_events': detected_events,
-            'statistics': pipeline.stats.copy()
+            'statistics': pipeline.stats.copy(),
+            'inference_cache': inference_cache.get_stats()
         }
     
     def _generate_report(self, video_number, video_name, video_path, processing_time, 
@@ -10,12 +10,16 @@ import sys
 import cv2
 import json
 import time
+import queue
 import logging
 import asyncio
+import argparse
 import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import pandas as pd
 
 # Add parent directory to path
@@ -30,6 +34,7 @@ from service.fall_detection_service import FallDetectionService
 from service.seizure_detection_service import SeizureDetectionService
 from seizure_detection.seizure_predictor import SeizurePredictor
 from service.advanced_healthcare_pipeline import AdvancedHealthcarePipeline
+from infrastructure.services.inference_cache_service import inference_cache
 
 # Setup logging
 logging.basicConfig(
@@ -47,6 +52,56 @@ except ImportError:
     INTELLIGENT_ACTIONS_AVAILABLE = False
     print("📝 Intelligent Action Generation: Using static messages")
 
+PROCESSOR_CONFIG = 120
+
+
+def build_services() -> Dict[str, Any]:
+    """Khởi tạo services nặng (YOLO, pose, VSViG, caption model) - 1 lần / process"""
+    services = {
+        'video_processor': VideoProcessingService(PROCESSOR_CONFIG),
+        'fall_detector': FallDetectionService(),
+        'seizure_detector': SeizureDetectionService(),
+        'caption_pipeline': None
+    }
+    if INTELLIGENT_ACTIONS_AVAILABLE:
+        try:
+            services['caption_pipeline'] = get_professional_caption_pipeline()
+            print("🤖 Intelligent action pipeline initialized")
+        except Exception as e:
+            print(f"⚠️ Could not load intelligent actions: {e}")
+    return services
+
+
+def reset_services(services: Dict[str, Any]):
+    """Reset state theo video (buffer, history, stats) nhưng giữ model đã load"""
+    for name in ('video_processor', 'fall_detector', 'seizure_detector'):
+        if hasattr(services[name], 'reset'):
+            services[name].reset()
+
+
+# ==================== PROCESS POOL WORKER ====================
+# Mỗi worker load model 1 lần trong initializer, các video sau chỉ reset state
+_worker_runner = None
+_worker_services = None
+
+
+def _init_worker(resource_folder: str, progress_queue, threads: int):
+    global _worker_runner, _worker_services
+    # Chia CPU cho các worker, tránh oversubscription OpenCV / torch threads
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_runner = VideoTestRunner(resource_folder)
+    _worker_runner.progress_queue = progress_queue
+    _worker_services = build_services()
+
+
+def _run_case(video_path: str, case_number: int) -> Dict[str, Any]:
+    return _worker_runner.run_single_video_test(Path(video_path), case_number, services=_worker_services)
+
 
 class VideoTestRunner:
     """Test runner tự động quét và test tất cả video .mp4"""
@@ -76,6 +131,9 @@ class VideoTestRunner:
         # Results storage
         self.all_results = []
         self.case_number = 1
+        
+        # Process pool mode: progress gửi về main process thay vì print
+        self.progress_queue = None
     
     def find_all_videos(self) -> List[Path]:
         """Tự động tìm tất cả video .mp4/.MP4 trong resource folder"""
@@ -89,9 +147,20 @@ class VideoTestRunner:
             logger.info(f"   - {video.name}")
         return videos
     
-    def run_single_video_test(self, video_path: Path, case_number: int) -> Dict[str, Any]:
+    def _report_progress(self, case_number: int, event: str, frame: int = 0, total: int = 0, events: int = 0):
+        """Progress của 1 case: vào queue (process pool) hoặc print (tuần tự)"""
+        if self.progress_queue is not None:
+            self.progress_queue.put((case_number, event, frame, total, events))
+        elif event == 'progress':
+            print(f"📊 Progress: {frame / max(total, 1):.1%} - Frame {frame}/{total}")
+    
+    def run_single_video_test(self, video_path: Path, case_number: int,
+                              services: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Test 1 video - SỬ DỤNG TOÀN BỘ LOGIC TỪ MAIN.PY
+        
+        Args:
+            services: Services dùng lại (build_services()), None = load mới cho video này
         """
         video_name = video_path.stem
         
@@ -114,7 +183,6 @@ class VideoTestRunner:
             'loop': False
         }
         
-        processor_config = 120
         alerts_folder = str(self.output_folders['alerts'] / f"case_{case_number}")
         Path(alerts_folder).mkdir(parents=True, exist_ok=True)
         
@@ -122,6 +190,7 @@ class VideoTestRunner:
         print("🔧 Initializing services...")
         camera = VideoCameraService(camera_config)
         if not camera.connect():
+            self._report_progress(case_number, 'failed')
             return {
                 'case_number': case_number,
                 'video_name': video_name,
@@ -130,9 +199,13 @@ class VideoTestRunner:
                 'error': 'Failed to load video'
             }
         
-        video_processor = VideoProcessingService(processor_config)
-        fall_detector = FallDetectionService()
-        seizure_detector = SeizureDetectionService()
+        if services is None:
+            services = build_services()
+        else:
+            reset_services(services)
+        video_processor = services['video_processor']
+        fall_detector = services['fall_detector']
+        seizure_detector = services['seizure_detector']
         seizure_predictor = SeizurePredictor(
             temporal_window=3,
             alert_threshold=0.01,
@@ -152,14 +225,8 @@ class VideoTestRunner:
             user_id=self.user_id
         )
         
-        # 4. Initialize intelligent action pipeline (GIỐNG MAIN.PY)
-        caption_pipeline = None
-        if INTELLIGENT_ACTIONS_AVAILABLE:
-            try:
-                caption_pipeline = get_professional_caption_pipeline()
-                print("🤖 Intelligent action pipeline initialized")
-            except Exception as e:
-                print(f"⚠️ Could not load intelligent actions: {e}")
+        # 4. Intelligent action pipeline (load 1 lần trong build_services)
+        caption_pipeline = services['caption_pipeline']
         
         print("\n✅ All systems initialized!")
         print("="*100)
@@ -181,6 +248,9 @@ class VideoTestRunner:
         total_falls = 0
         total_seizures = 0
         
+        inference_cache.reset_stats()
+        self._report_progress(case_number, 'started', 0, camera.total_frames)
+        
         # Main processing loop (GIỐNG MAIN.PY)
         while True:
             frame = camera.get_frame()
@@ -291,8 +361,7 @@ class VideoTestRunner:
             
             # Show progress every 100 frames
             if frame_count % 100 == 0:
-                camera_status = camera.get_status()
-                print(f"📊 Progress: {camera_status['progress']} - Frame {frame_count}/{camera.total_frames}")
+                self._report_progress(case_number, 'progress', frame_count, camera.total_frames, len(detected_events))
         
         # ==================== CLEANUP & RESULTS ====================
         
@@ -306,6 +375,10 @@ class VideoTestRunner:
         print(f"   Total Frames: {frame_count}")
         print(f"   FPS: {frame_count / processing_time:.2f}")
         print(f"   Detected Events: {len(detected_events)}")
+        cache_stats = inference_cache.get_stats()
+        if cache_stats['enabled']:
+            print(f"   Inference Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                  f"({cache_stats['hit_rate']:.1%})")
         print(f"   - Falls: {total_falls}")
         print(f"   - Seizures: {total_seizures}")
         print(f"   Saved Keypoint Images: {len(saved_keypoint_images)}")
@@ -328,12 +401,14 @@ class VideoTestRunner:
                 'total_seizures': total_seizures,
                 'keypoint_images_saved': len(saved_keypoint_images)
             },
+            'inference_cache': cache_stats,
             'intelligent_actions_used': INTELLIGENT_ACTIONS_AVAILABLE and caption_pipeline is not None,
             'saved_keypoint_images': saved_keypoint_images[:10]  # First 10 for report
         }
         
         # Cleanup
         camera.disconnect()
+        self._report_progress(case_number, 'completed', frame_count, camera.total_frames, len(detected_events))
         
         return result
     
@@ -363,6 +438,7 @@ class VideoTestRunner:
                 'Falls Detected': result.get('statistics', {}).get('total_falls', 0),
                 'Seizures Detected': result.get('statistics', {}).get('total_seizures', 0),
                 'Keypoint Images Saved': result.get('statistics', {}).get('keypoint_images_saved', 0),
+                'Inference Cache Hit Rate': result.get('inference_cache', {}).get('hit_rate', 0),
                 'Intelligent Actions': 'Yes' if result.get('intelligent_actions_used') else 'No'
             }
             summary_data.append(summary_row)
@@ -418,8 +494,119 @@ class VideoTestRunner:
         print(f"✅ Excel report generated: {output_path}")
         return output_path
     
-    def run_all_tests(self):
-        """Tự động chạy test tất cả video trong resource folder"""
+    def _run_parallel(self, videos: List[Path], workers: int) -> List[Dict[str, Any]]:
+        """Chia video cho process pool: model load 1 lần / worker, progress stream qua Manager queue"""
+        ctx = multiprocessing.get_context('spawn')  # torch / CUDA không an toàn với fork
+        manager = ctx.Manager()
+        progress_queue = manager.Queue()
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        progress: Dict[int, tuple] = {}
+        results = []
+        
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(str(self.resource_folder), progress_queue, threads)) as executor:
+            pending = {}
+            for video_path in videos:
+                future = executor.submit(_run_case, str(video_path), self.case_number)
+                pending[future] = (video_path, self.case_number)
+                self.case_number += 1
+            
+            while pending:
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                self._drain_progress(progress_queue, progress, len(videos), len(results))
+                for future in done:
+                    video_path, case_number = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"❌ Case {case_number} ({video_path.name}) failed: {e}")
+                        result = {
+                            'case_number': case_number,
+                            'video_name': video_path.stem,
+                            'video_path': str(video_path),
+                            'status': 'failed',
+                            'error': str(e)
+                        }
+                    progress.pop(case_number, None)
+                    results.append(result)
+                    print(f"\n✅ Completed video [{len(results)}/{len(videos)}]: {video_path.name} - "
+                          f"{result['status']}, events: {len(result.get('detected_events', []))}")
+        
+        manager.shutdown()
+        return results
+    
+    @staticmethod
+    def _drain_progress(progress_queue, progress: Dict[int, tuple], total_videos: int, completed: int):
+        """Gom progress của các worker thành 1 dòng trạng thái"""
+        updated = False
+        while True:
+            try:
+                case_number, event, frame, total, events = progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            updated = True
+            if event in ('completed', 'failed'):
+                progress.pop(case_number, None)
+            else:
+                progress[case_number] = (frame, total, events)
+        if updated and progress:
+            running = " | ".join(f"#{case}: {frame / max(total, 1):.0%} ({events} ev)"
+                                 for case, (frame, total, events) in sorted(progress.items()))
+            print(f"📊 Progress [{completed}/{total_videos} done] {running}")
+    
+    def _write_run_summary(self, results: List[Dict[str, Any]], wall_time: float, workers: int) -> Path:
+        """Thống kê gộp của toàn bộ run (tổng frame / event, speedup so với chạy tuần tự)"""
+        completed = [r for r in results if r['status'] == 'completed']
+        processing_time = sum(r.get('processing_time', 0) for r in completed)
+        total_frames = sum(r.get('total_frames', 0) for r in completed)
+        cache_hits = sum(r.get('inference_cache', {}).get('hits', 0) for r in completed)
+        cache_misses = sum(r.get('inference_cache', {}).get('misses', 0) for r in completed)
+        summary = {
+            'timestamp': datetime.now().isoformat(),
+            'workers': workers,
+            'total_cases': len(results),
+            'completed_cases': len(completed),
+            'failed_cases': len(results) - len(completed),
+            'total_frames': total_frames,
+            'total_events': sum(len(r.get('detected_events', [])) for r in completed),
+            'total_falls': sum(r.get('statistics', {}).get('total_falls', 0) for r in completed),
+            'total_seizures': sum(r.get('statistics', {}).get('total_seizures', 0) for r in completed),
+            'sum_processing_time': processing_time,
+            'wall_time': wall_time,
+            'speedup': processing_time / wall_time if wall_time > 0 else 0,
+            'throughput_fps': total_frames / wall_time if wall_time > 0 else 0,
+            'inference_cache': {
+                'enabled': inference_cache.enabled,
+                'hits': cache_hits,
+                'misses': cache_misses,
+                'hit_rate': cache_hits / (cache_hits + cache_misses) if cache_hits + cache_misses else 0.0
+            },
+            'cases': [{'case_number': r['case_number'], 'video_name': r['video_name'], 'status': r['status'],
+                       'processing_time': r.get('processing_time', 0), 'total_frames': r.get('total_frames', 0),
+                       'events': len(r.get('detected_events', [])),
+                       'inference_cache_hit_rate': r.get('inference_cache', {}).get('hit_rate', 0.0)} for r in results]
+        }
+        
+        summary_path = self.output_folders['statistics'] / f"run_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False, default=str)
+        
+        print(f"⏱️ Wall Time: {wall_time:.2f}s (sum of case times {processing_time:.2f}s, "
+              f"speedup x{summary['speedup']:.2f}, {summary['throughput_fps']:.1f} FPS overall)")
+        print(f"🎯 Events: {summary['total_events']} (falls {summary['total_falls']}, "
+              f"seizures {summary['total_seizures']}), failed cases: {summary['failed_cases']}")
+        if inference_cache.enabled:
+            print(f"🗄️ Inference Cache: {cache_hits} hits / {cache_misses} misses "
+                  f"({summary['inference_cache']['hit_rate']:.1%})")
+        return summary_path
+    
+    def run_all_tests(self, workers: int = 1):
+        """
+        Tự động chạy test tất cả video trong resource folder
+        
+        Args:
+            workers: Số process song song (1 = tuần tự, services load 1 lần và reset giữa các video)
+        """
         videos = self.find_all_videos()
         
         if not videos:
@@ -427,6 +614,8 @@ class VideoTestRunner:
             print(f"💡 Please add video files to {self.resource_folder}")
             return
         
+        workers = max(1, min(workers, len(videos)))
+        
         print("\n" + "="*100)
         print(f"🧪 HEALTHCARE SYSTEM VIDEO TEST SUITE")
         print("="*100)
@@ -434,23 +623,32 @@ class VideoTestRunner:
         print(f"📂 Resource Folder: {self.resource_folder}")
         print(f"📊 Output Folder: {self.output_base}")
         print(f"👤 User ID: {self.user_id}")
+        print(f"⚙️ Workers: {workers}")
         print(f"🤖 Intelligent Actions: {'ENABLED' if INTELLIGENT_ACTIONS_AVAILABLE else 'DISABLED'}")
         print("="*100 + "\n")
         
-        results = []
+        start_time = time.time()
         
-        for video_path in videos:
-            result = self.run_single_video_test(video_path, self.case_number)
-            results.append(result)
-            self.all_results.append(result)
-            self.case_number += 1
-            
-            # Note completion
-            print(f"\n✅ Completed video: {video_path.name}")
-            print(f"   Status: {result['status']}")
-            if result['status'] == 'completed':
-                print(f"   Events detected: {len(result.get('detected_events', []))}")
-            print()
+        if workers > 1:
+            results = self._run_parallel(videos, workers)
+        else:
+            services = build_services()
+            results = []
+            for video_path in videos:
+                result = self.run_single_video_test(video_path, self.case_number, services=services)
+                results.append(result)
+                self.case_number += 1
+                
+                # Note completion
+                print(f"\n✅ Completed video: {video_path.name}")
+                print(f"   Status: {result['status']}")
+                if result['status'] == 'completed':
+                    print(f"   Events detected: {len(result.get('detected_events', []))}")
+                print()
+        
+        wall_time = time.time() - start_time
+        results.sort(key=lambda r: r['case_number'])
+        self.all_results.extend(results)
         
         # Generate final report
         print("\n" + "="*100)
@@ -458,6 +656,7 @@ class VideoTestRunner:
         print("="*100)
         
         report_path = self.generate_excel_report(results)
+        summary_path = self._write_run_summary(results, wall_time, workers)
         
         print("\n" + "="*100)
         print("✅ ALL TESTS COMPLETED!")
@@ -465,15 +664,22 @@ class VideoTestRunner:
         print(f"📊 Total Cases: {len(results)}")
         print(f"📁 Results saved to: {self.output_base}")
         print(f"📄 Excel Report: {report_path}")
+        print(f"📈 Run Summary: {summary_path}")
         print(f"📸 Alert Images: {self.output_folders['alerts']}")
         print(f"🎯 Keypoint Images: {self.output_folders['keypoints']}")
         print("="*100 + "\n")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vision Edge healthcare video test runner")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('TEST_RUNNER_WORKERS', '1')),
+                        help="Số process song song, mỗi process load model 1 lần (default: TEST_RUNNER_WORKERS hoặc 1)")
+    parser.add_argument('--resource', default='', help="Thư mục video .mp4 (default: examples/test/resource)")
+    args = parser.parse_args()
+    
     print("="*100)
     print("🏥 Vision Edge Healthcare System - Video Test Mode")
     print("="*100 + "\n")
     
-    runner = VideoTestRunner()
-    runner.run_all_tests()
+    runner = VideoTestRunner(args.resource)
+    runner.run_all_tests(workers=args.workers)
@@ -7,7 +7,9 @@ import cv2
 import time
 import logging
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+
+from infrastructure.services.inference_cache_service import inference_cache
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +42,7 @@ class VideoCameraService:
         self.frame_count = 0
         self.total_frames = 0
         self.video_fps = 0
+        self.video_key = None
         
         logger.info(f"📹 Initialized VideoCameraService for {self.camera_name}")
         logger.info(f"   Video path: {self.video_path}")
@@ -70,6 +73,10 @@ class VideoCameraService:
             logger.info(f"   Resolution: {video_width}x{video_height}")
             logger.info(f"   Duration: {self.total_frames / self.video_fps:.2f}s")
             
+            # Inference cache key: nội dung video + resolution sau resize (INFERENCE_CACHE_ENABLED=true)
+            self.video_key = inference_cache.video_key(
+                self.video_path, 'x'.join(map(str, self.resolution)) if self.resolution else 'native')
+            
             return True
             
         except Exception as e:
@@ -111,8 +118,15 @@ class VideoCameraService:
         
         return frame
     
+    def get_replay_key(self) -> Optional[Tuple[str, int]]:
+        """(video_key, index của frame vừa đọc) cho inference cache, None khi cache tắt"""
+        if self.video_key is None or self.frame_count == 0:
+            return None
+        return self.video_key, self.frame_count - 1
+    
     def disconnect(self):
         """Disconnect from video"""
+        inference_cache.flush()
         if self.cap:
             self.cap.release()
             self.is_connected = False
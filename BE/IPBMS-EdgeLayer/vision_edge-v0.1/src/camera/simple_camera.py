@@ -3,12 +3,15 @@ Simple IMOU Camera Stream Handler - No external dependencies
 Xử lý kết nối và stream video từ camera IMOU
 """
 
+import os
 import cv2
 import numpy as np
 import threading
 import time
 from typing import Optional, Callable, Tuple
 
+from infrastructure.services.metrics_service import pipeline_metrics
+
 
 class SimpleIMOUCamera:
     """Simple IMOU Camera Stream Handler - không dùng loguru"""
@@ -24,12 +27,28 @@ class SimpleIMOUCamera:
         
         # Frame properties
         self.current_frame = None
+        self.current_frame_timestamp = None  # Wall-clock time khi frame được capture
         self.frame_lock = threading.Lock()
         self.stream_thread = None
         
         # Stats
         self.frame_count = 0
         self.failed_frames = 0
+        self.camera_id = str(self.config.get('camera_id', self.config.get('camera_name', 'camera')))
+        
+        # Giới hạn thời gian connect (open RTSP + chờ frame đầu tiên)
+        self.open_timeout_ms = int(self.config.get('open_timeout_ms', os.getenv('CAMERA_OPEN_TIMEOUT_MS', '5000')))
+        self.read_timeout_ms = int(self.config.get('read_timeout_ms', os.getenv('CAMERA_READ_TIMEOUT_MS', '3000')))
+        self.first_frame_timeout = float(self.config.get('first_frame_timeout',
+                                                         os.getenv('CAMERA_FIRST_FRAME_TIMEOUT', '10')))
+        
+        # Supervised (CameraSupervisor): stream loop không tự reconnect, chỉ báo lỗi qua get_health()
+        self.supervised = False
+        self.stream_failed = False
+        self.last_frame_monotonic = None
+        self.identical_frames = 0
+        self._last_signature = None
+        self._generation = 0
         
     def connect(self) -> bool:
         """Kết nối tới camera IMOU với enhanced error handling"""
@@ -46,6 +65,9 @@ class SimpleIMOUCamera:
                 
             print(f"📹 Connecting to camera: {url}")
             
+            # Retry / restart -> tách stream thread + capture cũ (không chờ read() đang kẹt)
+            self._detach_stream()
+            
             # Enhanced RTSP connection with proper type handling
             self.cap = cv2.VideoCapture(url)
             
@@ -54,8 +76,8 @@ class SimpleIMOUCamera:
                 self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
                 # Note: Timeout properties may not be available in all OpenCV versions
                 try:
-                    self.cap.set(cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, 5000)  # 5 second timeout
-                    self.cap.set(cv2.CAP_PROP_READ_TIMEOUT_MSEC, 3000)  # 3 second read timeout
+                    self.cap.set(cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, self.open_timeout_ms)  # 5 second timeout
+                    self.cap.set(cv2.CAP_PROP_READ_TIMEOUT_MSEC, self.read_timeout_ms)  # 3 second read timeout
                 except:
                     pass  # Ignore if timeout properties not available
                 
@@ -87,7 +109,7 @@ class SimpleIMOUCamera:
             # Test đọc frame với timeout
             import time
             timeout_start = time.time()
-            timeout_duration = 10  # 10 seconds
+            timeout_duration = self.first_frame_timeout  # 10 seconds mặc định
             
             ret, frame = None, None
             while time.time() < timeout_start + timeout_duration:
@@ -106,6 +128,10 @@ class SimpleIMOUCamera:
             print("✅ Camera connected successfully!")
             print(f"   📐 Frame resolution: {frame.shape[1]}x{frame.shape[0]}")
             self.connected = True
+            self.stream_failed = False
+            self.identical_frames = 0
+            self._last_signature = None
+            self.last_frame_monotonic = time.monotonic()
             
             # Start streaming thread
             self.start_stream()
@@ -138,10 +164,21 @@ class SimpleIMOUCamera:
             return
             
         self.streaming = True
-        self.stream_thread = threading.Thread(target=self._stream_loop, daemon=True)
+        self.stream_thread = threading.Thread(target=self._stream_loop, args=(self.cap, self._generation),
+                                              name=f"CameraStream-{self.camera_id}", daemon=True)
         self.stream_thread.start()
         print("📹 Camera streaming started")
     
+    def _detach_stream(self):
+        """Bỏ stream thread hiện tại: thread cũ thoát sau read() kế tiếp và tự release capture của nó"""
+        self._generation += 1
+        old_cap, self.cap = self.cap, None
+        old_thread, self.stream_thread = self.stream_thread, None
+        self.streaming = False
+        self.connected = False
+        if old_cap is not None and not (old_thread and old_thread.is_alive()):
+            old_cap.release()
+    
     def stop_stream(self):
         """Dừng stream camera"""
         self.streaming = False
@@ -149,44 +186,67 @@ class SimpleIMOUCamera:
             self.stream_thread.join(timeout=2)
         print("📹 Camera streaming stopped")
     
-    def _stream_loop(self):
-        """Main stream loop"""
+    def _stream_loop(self, cap, generation: int):
+        """Main stream loop (capture + generation riêng, thoát khi bị detach bởi connect() mới)"""
         retry_count = 0
         max_retries = 5
         
-        while self.streaming and self.connected:
+        while self.streaming and self.connected and generation == self._generation:
             try:
-                if self.cap and self.cap.isOpened():
-                    ret, frame = self.cap.read()
+                if cap and cap.isOpened():
+                    ret, frame = cap.read()
+                    capture_timestamp = time.time()
+                    if generation != self._generation:
+                        break
                     
                     if ret and frame is not None:
                         # Update current frame
                         with self.frame_lock:
                             self.current_frame = frame.copy()
+                            self.current_frame_timestamp = capture_timestamp
                         
                         self.frame_count += 1
                         retry_count = 0  # Reset retry count on success
+                        self.last_frame_monotonic = time.monotonic()
+                        # Frame đứng hình (encoder lặp lại frame cũ): so chữ ký trên lưới thưa
+                        signature = hash(frame[::32, ::32].tobytes())
+                        self.identical_frames = self.identical_frames + 1 if signature == self._last_signature else 0
+                        self._last_signature = signature
+                        pipeline_metrics.record_camera_frame(self.camera_id)
                         
                     else:
                         self.failed_frames += 1
+                        pipeline_metrics.record_camera_frame(self.camera_id, success=False)
                         print(f"⚠️ Failed to read frame (failed: {self.failed_frames})")
                         
                         retry_count += 1
                         if retry_count >= max_retries:
+                            if self.supervised:
+                                # Supervisor reconnect với backoff, không sleep / reopen trong thread này
+                                print("⚠️ Too many failed frames, handing over to camera supervisor")
+                                self.stream_failed = True
+                                break
                             print("⚠️ Too many failed frames, attempting reconnect...")
                             if not self._attempt_reconnect():
                                 break
+                            cap = self.cap
                             retry_count = 0
                         
                         time.sleep(0.1)  # Small delay on failure
                 
                 else:
                     print("⚠️ Camera not available")
+                    if self.supervised:
+                        self.stream_failed = True
+                        break
                     time.sleep(1)
                     
             except Exception as e:
                 print(f"❌ Stream loop error: {e}")
                 time.sleep(1)
+        
+        if generation != self._generation and cap is not None:
+            cap.release()  # Capture đã bị detach, thread này là owner cuối cùng
     
     def get_frame(self) -> Optional[np.ndarray]:
         """Lấy frame hiện tại"""
@@ -197,6 +257,21 @@ class SimpleIMOUCamera:
         with self.frame_lock:
             return self.current_frame.copy() if self.current_frame is not None else None
     
+    def get_frame_with_timestamp(self) -> Tuple[Optional[np.ndarray], Optional[float]]:
+        """Lấy frame hiện tại kèm capture timestamp (time.time() lúc decode xong)"""
+        if not self.connected:
+            return None, None
+            
+        with self.frame_lock:
+            if self.current_frame is None:
+                return None, None
+            return self.current_frame.copy(), self.current_frame_timestamp
+    
+    def get_frame_timestamp(self) -> Optional[float]:
+        """Capture timestamp của frame hiện tại"""
+        with self.frame_lock:
+            return self.current_frame_timestamp
+    
     def _attempt_reconnect(self) -> bool:
         """Thử kết nối lại camera"""
         try:
@@ -243,6 +318,17 @@ class SimpleIMOUCamera:
         
         print("🔌 Camera disconnected")
     
+    def get_health(self) -> dict:
+        """Trạng thái cho supervisor: frame age (giây), số frame giống hệt liên tiếp, stream lỗi"""
+        last_frame = self.last_frame_monotonic
+        return {
+            'connected': self.connected,
+            'streaming': self.streaming,
+            'stream_failed': self.stream_failed,
+            'frame_age': (time.monotonic() - last_frame) if last_frame is not None else None,
+            'identical_frames': self.identical_frames
+        }
+    
     def get_stats(self) -> dict:
         """Lấy thống kê camera"""
         return {
@@ -4,6 +4,7 @@ Simplified version without complex dependencies
 """
 import logging
 import time
+import cv2
 import numpy as np
 from PIL import Image
 
@@ -15,23 +16,35 @@ class SimpleFallDetector:
     Uses lightweight approach without AI models.
     """
     
-    def __init__(self, confidence_threshold=0.4):  # Giảm từ 0.7 xuống 0.4 để nhạy hơn
+    def __init__(self, confidence_threshold=0.4, max_buffer_size=3, thumbnail_width=80):  # Giảm từ 0.7 xuống 0.4 để nhạy hơn
         """
         Initialize simplified fall detector.
         
         Args:
             confidence_threshold: Minimum confidence for fall detection
+            max_buffer_size: Ring buffer capacity (frames)
+            thumbnail_width: Width of the grayscale thumbnail kept per frame; height follows the
+                frame aspect ratio so horizontal/vertical gradients keep the full-resolution ratio
         """
         self.confidence_threshold = confidence_threshold
         self.previous_frame = None
         self.previous_timestamp = None
         self.min_time_interval = 0.8  # Giảm từ 1.0 xuống 0.8 giây để nhạy hơn
-        self.frame_buffer = []
-        self.max_buffer_size = 3
+        self.max_buffer_size = max_buffer_size
+        self.thumbnail_width = int(thumbnail_width)
+        self.thumbnail_size = None  # (width, height), set from the first frame's aspect ratio
+        
+        # Fixed-capacity ring buffer: gray thumbnails + timestamp + bbox (no full frames kept)
+        self._thumbs = None
+        self._timestamps = np.zeros(max_buffer_size, dtype=np.float64)
+        self._bboxes = np.zeros((max_buffer_size, 4), dtype=np.float64)
+        self._has_bbox = np.zeros(max_buffer_size, dtype=bool)
+        self._head = 0   # Next write slot
+        self._count = 0
         
         log.info(f"🩺 Simplified fall detector initialized (confidence: {confidence_threshold})")
     
-    def detect_fall(self, current_frame, timestamp=None, person_bbox=None):
+    def detect_fall(self, current_frame, timestamp=None, person_bbox=None, frame_context=None):
         """
         Detect fall in current frame using simplified approach.
         
@@ -39,6 +52,7 @@ class SimpleFallDetector:
             current_frame: Current video frame (numpy array)
             timestamp: Frame timestamp (optional)
             person_bbox: Person bounding box from YOLO (optional)
+            frame_context: Per-frame derived image cache (optional, FrameContext)
             
         Returns:
             dict: Fall detection result
@@ -71,29 +85,14 @@ class SimpleFallDetector:
             else:
                 current_time = time.time()
             
-            # Add frame to buffer
+            # Add frame to ring buffer (overwrites the oldest slot when full)
             safe_bbox = self._safe_bbox_conversion(person_bbox)
-            
-            frame_data = {
-                'frame': current_frame,
-                'timestamp': current_time,
-                'bbox': safe_bbox
-            }
-            
-            self.frame_buffer.append(frame_data)
-            
-            # Keep buffer size manageable
-            if len(self.frame_buffer) > self.max_buffer_size:
-                self.frame_buffer.pop(0)
+            self._push(current_frame, current_time, safe_bbox, frame_context)
             
             # Check if we have enough frames and time interval
-            if len(self.frame_buffer) >= 2:
+            if self._count >= 2:
                 try:
-                    first_timestamp = self.frame_buffer[0]['timestamp']
-                    if hasattr(first_timestamp, '__iter__') and not isinstance(first_timestamp, (str, bytes)):
-                        first_timestamp = float(list(first_timestamp)[0])
-                    else:
-                        first_timestamp = float(first_timestamp)
+                    first_timestamp = float(self._timestamps[self._slot(0)])
                     
                     # Check time interval
                     if (current_time - first_timestamp) >= self.min_time_interval:
@@ -115,6 +114,50 @@ class SimpleFallDetector:
         result['processing_time'] = time.time() - start_time
         return result
     
+    def _slot(self, index):
+        """Ring buffer slot of the index-th oldest entry (negative = from newest)."""
+        if index < 0:
+            index += self._count
+        return (self._head - self._count + index) % self.max_buffer_size
+    
+    def _make_thumbnail(self, frame, frame_context=None):
+        """Small grayscale thumbnail (INTER_AREA), reusing the frame context's gray when available."""
+        if frame_context is not None and frame_context.frame is frame:
+            return frame_context.get(('fall_thumbnail', self.thumbnail_size),
+                                     lambda: cv2.resize(frame_context.gray(), self.thumbnail_size,
+                                                        interpolation=cv2.INTER_AREA))
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, self.thumbnail_size, interpolation=cv2.INTER_AREA)
+    
+    def _thumbnail_size_for(self, frame):
+        """(width, height) keeping the frame aspect ratio (a fixed 4:3 size squeezes 16:9 frames in x)"""
+        height, width = frame.shape[:2]
+        thumb_w = min(self.thumbnail_width, width)
+        return thumb_w, max(1, int(round(thumb_w * height / width)))
+    
+    def _push(self, frame, timestamp, bbox, frame_context=None):
+        """Write one entry into the preallocated ring buffer."""
+        size = self._thumbnail_size_for(frame)
+        if size != self.thumbnail_size:
+            # First frame / resolution change: (re)allocate, thumbnails of another size are not comparable
+            self.thumbnail_size = size
+            self._thumbs = np.zeros((self.max_buffer_size, size[1], size[0]), dtype=np.uint8)
+            self._head = 0
+            self._count = 0
+            self._has_bbox[:] = False
+        
+        slot = self._head
+        self._thumbs[slot] = self._make_thumbnail(frame, frame_context)
+        self._timestamps[slot] = timestamp
+        if bbox is not None:
+            self._bboxes[slot] = bbox
+            self._has_bbox[slot] = True
+        else:
+            self._has_bbox[slot] = False
+        
+        self._head = (self._head + 1) % self.max_buffer_size
+        self._count = min(self._count + 1, self.max_buffer_size)
+    
     def _safe_bbox_conversion(self, bbox):
         """
         Safely convert bbox to standard format [x1, y1, x2, y2].
@@ -164,22 +207,21 @@ class SimpleFallDetector:
         Returns:
             dict or None: Fall detection result
         """
-        if len(self.frame_buffer) < 2:
+        if self._count < 2:
             return None
             
         try:
-            # Get first and last frames
-            first_frame = self.frame_buffer[0]
-            last_frame = self.frame_buffer[-1]
+            # Get first and last entries
+            first_slot = self._slot(0)
+            last_slot = self._slot(-1)
             
             # Simplified fall detection based on bbox changes
-            if (first_frame['bbox'] is not None and 
-                last_frame['bbox'] is not None):
-                
-                return self._analyze_bbox_changes(first_frame['bbox'], last_frame['bbox'])
+            if self._has_bbox[first_slot] and self._has_bbox[last_slot]:
+                return self._analyze_bbox_changes(self._bboxes[first_slot].tolist(),
+                                                  self._bboxes[last_slot].tolist())
             
-            # Fallback to frame difference analysis
-            return self._analyze_frame_difference(first_frame['frame'], last_frame['frame'])
+            # Fallback to frame difference analysis on thumbnails
+            return self._analyze_frame_difference(self._thumbs[first_slot], self._thumbs[last_slot])
             
         except Exception as e:
             log.error(f"Movement analysis error: {e}")
@@ -251,39 +293,26 @@ class SimpleFallDetector:
             
         return None
     
-    def _analyze_frame_difference(self, frame1, frame2):
+    def _analyze_frame_difference(self, thumb1, thumb2):
         """
         Analyze frame differences for fall detection.
         
         Args:
-            frame1: First frame (numpy array)
-            frame2: Second frame (numpy array)
+            thumb1: First grayscale thumbnail (uint8)
+            thumb2: Second grayscale thumbnail (uint8)
             
         Returns:
             dict or None: Fall result
         """
         try:
-            # Convert to grayscale if needed
-            if len(frame1.shape) == 3:
-                gray1 = np.mean(frame1, axis=2).astype(np.uint8)
-            else:
-                gray1 = frame1
-                
-            if len(frame2.shape) == 3:
-                gray2 = np.mean(frame2, axis=2).astype(np.uint8)
-            else:
-                gray2 = frame2
-                
-            # Calculate frame difference
-            diff = np.abs(gray2.astype(np.float32) - gray1.astype(np.float32))
+            # Calculate frame difference (uint8 absdiff is exact, no float copies)
+            diff = cv2.absdiff(thumb2, thumb1)
             
             # Analyze movement patterns
-            movement_intensity = np.mean(diff)
-            horizontal_movement = np.mean(np.abs(np.diff(diff, axis=1)))
-            vertical_movement = np.mean(np.abs(np.diff(diff, axis=0)))
+            movement_intensity = cv2.mean(diff)[0]
             
             # Simple fall detection heuristic
-            movement_ratio = horizontal_movement / (vertical_movement + 1e-6)
+            movement_ratio = self._movement_ratio(diff)
             
             if (movement_intensity > 15 and  # Significant movement
                 movement_ratio > 1.3):  # More horizontal than vertical movement
@@ -304,9 +333,18 @@ class SimpleFallDetector:
             
         return None
     
+    @staticmethod
+    def _movement_ratio(diff):
+        """Horizontal / vertical gradient of the difference image (> 1 = more horizontal movement)."""
+        horizontal_movement = cv2.mean(cv2.absdiff(diff[:, 1:], diff[:, :-1]))[0]
+        vertical_movement = cv2.mean(cv2.absdiff(diff[1:, :], diff[:-1, :]))[0]
+        return horizontal_movement / (vertical_movement + 1e-6)
+    
     def reset(self):
         """Reset detector state."""
-        self.frame_buffer.clear()
+        self._head = 0
+        self._count = 0
+        self._has_bbox[:] = False
         self.previous_frame = None
         self.previous_timestamp = None
         log.debug("Fall detector state reset")
@@ -316,6 +354,9 @@ class SimpleFallDetector:
         return {
             'confidence_threshold': self.confidence_threshold,
             'min_time_interval': self.min_time_interval,
-            'buffer_size': len(self.frame_buffer),
-            'max_buffer_size': self.max_buffer_size
+            'buffer_size': self._count,
+            'max_buffer_size': self.max_buffer_size,
+            'thumbnail_size': self.thumbnail_size,
+            'buffer_bytes': int((self._thumbs.nbytes if self._thumbs is not None else 0)
+                                + self._timestamps.nbytes + self._bboxes.nbytes)
         }
@@ -5,13 +5,35 @@ Supports automatic device detection and emergency alarm playback
 """
 
 import os
+import time
+import queue
 import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 
+from .metrics_service import pipeline_metrics
+
 logger = logging.getLogger(__name__)
 
+# Thứ tự ưu tiên file siren
+SIREN_SOUNDS = ("emergency_siren.mp3", "emergency_alert.wav")
+
+
+class _PcmBuffer:
+    """PCM đã decode (pydub backend), phát trực tiếp bằng simpleaudio.play_buffer"""
+    __slots__ = ('data', 'channels', 'sample_width', 'frame_rate')
+
+    def __init__(self, data: bytes, channels: int, sample_width: int, frame_rate: int):
+        self.data = data
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frame_rate = frame_rate
+
+
 class AudioAlertService:
     """
     Service để phát cảnh báo âm thanh qua thiết bị audio bên ngoài
@@ -28,21 +50,45 @@ class AudioAlertService:
         self.sounds_dir = Path(os.getenv('SOUNDS_DIRECTORY', str(default_sounds_dir)))
         
         self.alert_duration = int(os.getenv('ALERT_DURATION_SECONDS', '30'))
+        self.preload = os.getenv('AUDIO_PRELOAD_SOUNDS', 'true').lower() == 'true'
+        self.keep_warm = os.getenv('AUDIO_KEEP_WARM', 'true').lower() == 'true'
+        self.mixer_buffer = int(os.getenv('AUDIO_MIXER_BUFFER', '512'))
         
         self.is_playing = False
         self.current_sound = None
         self.audio_backend = None
         self.available_devices = []
         
+        # Decoded sounds + persistent alarm loop
+        self._sound_cache: Dict[str, Any] = {}
+        self._siren_channel = None
+        self._warm_channel = None
+        self._silence = None
+        self._play_obj = None
+        self._play_lock = threading.Lock()
+        self._loop_stop: Optional[threading.Event] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._commands: queue.Queue = queue.Queue()
+        self._alarm_thread: Optional[threading.Thread] = None
+        self._deadline: Optional[float] = None
+        self._active_duration = self.alert_duration
+        self.output_latency_ms = 0.0
+        self._latencies = deque(maxlen=200)
+        self.last_first_sample_ms: Optional[float] = None
+        
         if self.enabled:
             self._initialize_audio()
+        if self.enabled:
+            self._preload_sounds()
+            self._warm_mixer()
+            self._start_alarm_loop()
     
     def _initialize_audio(self):
         """Khởi tạo audio backend và detect devices"""
         try:
             # Try pygame first (cross-platform, dễ dùng)
             import pygame
-            pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
+            pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=self.mixer_buffer)
             self.audio_backend = 'pygame'
             logger.info("✅ Audio backend: pygame initialized")
             
@@ -131,7 +177,11 @@ class AudioAlertService:
         return self.available_devices
     
     def _load_sound(self, sound_name: str = "emergency_siren.mp3"):
-        """Load file âm thanh"""
+        """Load file âm thanh (đã decode sẵn trong cache nếu preload)"""
+        cached = self._sound_cache.get(sound_name)
+        if cached is not None:
+            return cached
+        
         sound_path = self.sounds_dir / sound_name
         
         if not sound_path.exists():
@@ -143,20 +193,238 @@ class AudioAlertService:
                 import pygame
                 sound = pygame.mixer.Sound(str(sound_path))
                 sound.set_volume(self.volume)
-                return sound
             
             elif self.audio_backend == 'pydub':
                 from pydub import AudioSegment
-                sound = AudioSegment.from_file(str(sound_path))
+                segment = AudioSegment.from_file(str(sound_path))
                 # Adjust volume (pydub uses dB)
                 volume_db = (self.volume - 1) * 20  # Convert 0-1 to dB
-                sound = sound + volume_db
-                return sound
+                segment = segment + volume_db
+                # Giữ PCM đã decode để simpleaudio phát ngay, không decode lại bằng ffmpeg
+                sound = _PcmBuffer(segment.raw_data, segment.channels, segment.sample_width, segment.frame_rate)
+            
+            else:
+                return None
+            
+            self._sound_cache[sound_name] = sound
+            return sound
             
         except Exception as e:
             logger.error(f"Failed to load sound {sound_name}: {e}")
             return None
     
+    def _preload_sounds(self):
+        """Decode siren vào RAM lúc khởi động"""
+        if not self.preload:
+            return
+        start = time.perf_counter()
+        loaded = [name for name in SIREN_SOUNDS if (self.sounds_dir / name).exists() and self._load_sound(name)]
+        if loaded:
+            logger.info(f"🔊 Preloaded sounds: {', '.join(loaded)} ({(time.perf_counter() - start) * 1000:.0f}ms)")
+    
+    def _get_siren(self):
+        for name in SIREN_SOUNDS:
+            sound = self._load_sound(name)
+            if sound:
+                return sound
+        return None
+    
+    def _warm_mixer(self):
+        """Reserve channel cho siren + loop 1 buffer im lặng để output stream không idle / suspend"""
+        if self.audio_backend != 'pygame':
+            return
+        try:
+            import pygame
+            pygame.mixer.set_reserved(2)
+            self._siren_channel = pygame.mixer.Channel(0)
+            self._warm_channel = pygame.mixer.Channel(1)
+            frequency, size, channels = pygame.mixer.get_init()
+            self.output_latency_ms = self.mixer_buffer / float(frequency) * 1000.0
+            self._silence = pygame.mixer.Sound(buffer=bytes(int(frequency * 0.1) * channels * (abs(size) // 8)))
+            if self.keep_warm:
+                self._warm_channel.play(self._silence, loops=-1)
+                logger.info(f"🔥 Audio mixer kept warm (buffer {self.mixer_buffer} = {self.output_latency_ms:.1f}ms)")
+        except Exception as e:
+            logger.warning(f"Mixer warm-up failed: {e}")
+            self._siren_channel = None
+    
+    # ------------------------------------------------------------------
+    # Persistent alarm loop (1 thread nhận lệnh play / stop / probe)
+    # ------------------------------------------------------------------
+    def _start_alarm_loop(self):
+        if self._alarm_thread and self._alarm_thread.is_alive():
+            return
+        self._alarm_thread = threading.Thread(target=self._alarm_loop, name="AudioAlarmLoop", daemon=True)
+        self._alarm_thread.start()
+    
+    def _submit(self, command: str, *args) -> Future:
+        future: Future = Future()
+        if not self.enabled:
+            future.set_result({"success": False, "message": "Audio service disabled"})
+            return future
+        self._start_alarm_loop()
+        self._commands.put((command, args, future))
+        return future
+    
+    def _alarm_loop(self):
+        while True:
+            timeout = None if self._deadline is None else max(0.0, self._deadline - time.monotonic())
+            try:
+                command, args, future = self._commands.get(timeout=timeout)
+            except queue.Empty:
+                if self.is_playing:
+                    self._stop_playback()
+                    logger.info(f"⏰ Auto-stopped alarm after {self._active_duration}s")
+                self._deadline = None
+                continue
+            
+            if command == 'shutdown':
+                self._stop_playback()
+                future.set_result({"success": True})
+                break
+            try:
+                if command == 'play':
+                    result = self._handle_play(*args)
+                elif command == 'probe':
+                    result = self._handle_probe(*args)
+                else:
+                    result = self._handle_stop()
+            except Exception as e:
+                logger.error(f"Alarm loop {command} failed: {e}")
+                result = {"success": False, "message": str(e)}
+            future.set_result(result)
+    
+    def _start_playback(self, sound):
+        if self.audio_backend == 'pygame':
+            if self._siren_channel is not None:
+                self._siren_channel.play(sound, loops=-1)  # Loop indefinitely
+            else:
+                sound.play(loops=-1)
+            self.current_sound = sound
+            self.is_playing = True
+        
+        elif self.audio_backend == 'pydub':
+            import simpleaudio
+            # Mỗi lần phát 1 stop Event riêng: re-trigger cùng sound không để loop cũ chạy tiếp
+            stop = threading.Event()
+            with self._play_lock:
+                self._play_obj = simpleaudio.play_buffer(sound.data, sound.channels, sound.sample_width,
+                                                         sound.frame_rate)
+            self.current_sound = sound
+            self.is_playing = True
+            
+            def play_loop(play_obj):
+                while True:
+                    play_obj.wait_done()
+                    with self._play_lock:
+                        # Check trong lock: _stop_playback set Event rồi mới stop _play_obj
+                        if stop.is_set():
+                            break
+                        play_obj = self._play_obj = simpleaudio.play_buffer(
+                            sound.data, sound.channels, sound.sample_width, sound.frame_rate)
+            
+            self._loop_stop = stop
+            self._loop_thread = threading.Thread(target=play_loop, args=(self._play_obj,),
+                                                 name="AudioPlayLoop", daemon=True)
+            self._loop_thread.start()
+    
+    def _stop_playback(self):
+        self.is_playing = False
+        self.current_sound = None
+        if self.audio_backend == 'pygame':
+            if self._siren_channel is not None:
+                self._siren_channel.stop()
+            else:
+                import pygame
+                pygame.mixer.stop()
+        elif self.audio_backend == 'pydub':
+            # Báo play_loop dừng trước, rồi stop buffer đang phát và chờ loop thoát
+            if self._loop_stop is not None:
+                self._loop_stop.set()
+            with self._play_lock:
+                if self._play_obj is not None:
+                    self._play_obj.stop()
+                    self._play_obj = None
+            if self._loop_thread is not None and self._loop_thread is not threading.current_thread():
+                self._loop_thread.join(timeout=2.0)
+            self._loop_stop = None
+            self._loop_thread = None
+        self._deadline = None
+    
+    def _record_latency(self, requested_at: float) -> Dict[str, float]:
+        """Trigger -> play() (đo được) + độ trễ buffer output (ước lượng) = first sample"""
+        trigger_ms = (time.perf_counter() - requested_at) * 1000.0
+        first_sample_ms = trigger_ms + self.output_latency_ms
+        self._latencies.append(first_sample_ms)
+        self.last_first_sample_ms = first_sample_ms
+        pipeline_metrics.observe_alarm_latency('first_sample', first_sample_ms / 1000.0, 'audio')
+        return {'trigger_latency_ms': round(trigger_ms, 2), 'first_sample_ms': round(first_sample_ms, 2)}
+    
+    def _handle_play(self, user_id: str, triggered_by: str, duration: int, requested_at: float) -> Dict[str, Any]:
+        sound = self._get_siren()
+        if not sound:
+            return {"success": False, "message": "No sound file available"}
+        
+        if self.is_playing:
+            logger.info("Alert already playing, stopping current alert first")
+            self._stop_playback()
+        
+        actual_duration = duration if duration > 0 else self.alert_duration
+        self._start_playback(sound)
+        latency = self._record_latency(requested_at)
+        self._active_duration = actual_duration
+        self._deadline = time.monotonic() + actual_duration
+        
+        logger.info(f"🚨 EMERGENCY ALARM ACTIVATED")
+        logger.info(f"   User ID: {user_id}")
+        logger.info(f"   Triggered by: {triggered_by}")
+        logger.info(f"   Volume: {self.volume * 100:.0f}%")
+        logger.info(f"   Duration: {actual_duration}s")
+        logger.info(f"   Trigger -> first sample: {latency['first_sample_ms']:.1f}ms")
+        
+        return {
+            "success": True,
+            "message": "Emergency alarm activated",
+            "duration": actual_duration,
+            "volume": self.volume,
+            "devices": len(self.available_devices),
+            "timestamp": datetime.now().isoformat(),
+            **latency
+        }
+    
+    def _handle_probe(self, requested_at: float) -> Dict[str, Any]:
+        """Đo trigger -> first sample bằng buffer im lặng trên siren channel (không phát tiếng)"""
+        if self.is_playing or self._siren_channel is None or self._silence is None:
+            return {"success": False, "message": "Probe not available"}
+        self._siren_channel.play(self._silence)
+        return {"success": True, **self._record_latency(requested_at)}
+    
+    def _handle_stop(self) -> Dict[str, Any]:
+        if not self.is_playing:
+            return {"success": False, "message": "No alarm is playing"}
+        self._stop_playback()
+        logger.info("✅ Emergency alarm stopped")
+        return {
+            "success": True,
+            "message": "Alarm stopped successfully",
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def trigger_alarm(self, user_id: str, triggered_by: str = "mobile_app", duration: int = 0) -> Future:
+        """Gửi lệnh play tới alarm loop (non-blocking). Future -> result dict khi siren đã bắt đầu phát"""
+        return self._submit('play', user_id, triggered_by, duration, time.perf_counter())
+    
+    def probe_latency(self, timeout: float = 2.0) -> Optional[float]:
+        """Đo trigger -> first sample (ms) không phát tiếng; None nếu backend không hỗ trợ"""
+        try:
+            result = self._submit('probe', time.perf_counter()).result(timeout=timeout)
+            return result.get('first_sample_ms') if result.get('success') else None
+        except Exception:
+            return None
+    
     async def play_emergency_alarm(self, user_id: str, triggered_by: str = "mobile_app", duration: int = 0) -> Dict[str, Any]:
         """
         Phát báo động khẩn cấp
@@ -173,92 +441,8 @@ class AudioAlertService:
             logger.warning("Audio alert service is disabled")
             return {"success": False, "message": "Audio service disabled"}
         
-        if self.is_playing:
-            logger.info("Alert already playing, stopping current alert first")
-            await self.stop_alarm()
-        
-        # Override duration if specified
-        original_duration = self.alert_duration
-        if duration > 0:
-            self.alert_duration = duration
-        
-        try:
-            # Load emergency sound
-            sound = self._load_sound("emergency_siren.mp3")
-            
-            if not sound:
-                # Try fallback sound
-                sound = self._load_sound("emergency_alert.wav")
-            
-            if not sound:
-                return {"success": False, "message": "No sound file available"}
-            
-            logger.info(f"🚨 EMERGENCY ALARM ACTIVATED")
-            logger.info(f"   User ID: {user_id}")
-            logger.info(f"   Triggered by: {triggered_by}")
-            logger.info(f"   Volume: {self.volume * 100:.0f}%")
-            logger.info(f"   Duration: {self.alert_duration}s")
-            
-            # Play based on backend
-            if self.audio_backend == 'pygame':
-                import pygame
-                sound.play(loops=-1)  # Loop indefinitely
-                self.is_playing = True
-                self.current_sound = sound
-                
-                # Schedule auto-stop
-                import asyncio
-                asyncio.create_task(self._auto_stop_after_duration())
-            
-            elif self.audio_backend == 'pydub':
-                from pydub.playback import play
-                import threading
-                
-                def play_loop():
-                    while self.is_playing:
-                        play(sound)
-                
-                self.is_playing = True
-                play_thread = threading.Thread(target=play_loop, daemon=True)
-                play_thread.start()
-                
-                # Schedule auto-stop
-                import asyncio
-                asyncio.create_task(self._auto_stop_after_duration())
-            
-            # Restore original duration
-            actual_duration = self.alert_duration
-            if duration > 0:
-                self.alert_duration = original_duration
-            
-            return {
-                "success": True,
-                "message": "Emergency alarm activated",
-                "duration": actual_duration,
-                "volume": self.volume,
-                "devices": len(self.available_devices),
-                "timestamp": datetime.now().isoformat()
-            }
-            
-        except Exception as e:
-            logger.error(f"Failed to play emergency alarm: {e}")
-            # Restore duration on error too
-            if duration > 0:
-                self.alert_duration = original_duration
-            return {"success": False, "message": str(e)}
-    
-    async def _auto_stop_after_duration(self):
-        """Tự động dừng sau duration"""
         import asyncio
-        try:
-            await asyncio.sleep(self.alert_duration)
-            if self.is_playing:
-                await self.stop_alarm()
-                logger.info(f"⏰ Auto-stopped alarm after {self.alert_duration}s")
-        except asyncio.CancelledError:
-            pass
-        except Exception as e:
-            logger.error(f"Error in auto-stop: {e}")
+        return await asyncio.wrap_future(self.trigger_alarm(user_id, triggered_by, duration))
     
     async def stop_alarm(self) -> Dict[str, Any]:
         """
@@ -270,25 +454,20 @@ class AudioAlertService:
         if not self.is_playing:
             return {"success": False, "message": "No alarm is playing"}
         
-        try:
-            if self.audio_backend == 'pygame':
-                import pygame
-                pygame.mixer.stop()
-            
-            self.is_playing = False
-            self.current_sound = None
-            
-            logger.info("✅ Emergency alarm stopped")
-            
-            return {
-                "success": True,
-                "message": "Alarm stopped successfully",
-                "timestamp": datetime.now().isoformat()
-            }
-            
-        except Exception as e:
-            logger.error(f"Failed to stop alarm: {e}")
-            return {"success": False, "message": str(e)}
+        import asyncio
+        return await asyncio.wrap_future(self._submit('stop'))
+    
+    def get_latency_stats(self) -> Dict[str, Any]:
+        """Trigger -> first sample (ms): last / p50 / p95 trên các lần phát gần nhất"""
+        samples = sorted(self._latencies)
+        if not samples:
+            return {'count': 0, 'last_ms': None, 'p50_ms': None, 'p95_ms': None}
+        return {
+            'count': len(samples),
+            'last_ms': round(self.last_first_sample_ms, 2),
+            'p50_ms': round(samples[len(samples) // 2], 2),
+            'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2)
+        }
     
     def get_status(self) -> Dict[str, Any]:
         """Lấy trạng thái hiện tại của service"""
@@ -300,7 +479,10 @@ class AudioAlertService:
             "audio_backend": self.audio_backend,
             "available_devices": len(self.available_devices),
             "sounds_directory": str(self.sounds_dir),
-            "devices": self.available_devices
+            "devices": self.available_devices,
+            "preloaded_sounds": sorted(self._sound_cache),
+            "mixer_warm": self.keep_warm and self._siren_channel is not None,
+            "latency": self.get_latency_stats()
         }
     
     def test_audio(self) -> bool:
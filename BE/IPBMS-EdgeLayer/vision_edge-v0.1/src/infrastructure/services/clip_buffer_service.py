@@ -0,0 +1,324 @@
+"""
+Clip Buffer Service
+Ring buffer packet H.264 đã nén (demux bằng PyAV, không decode) theo từng camera, để khi có event
+remux ra clip MP4 trước/sau event (CLIP_PRE_SECONDS / CLIP_POST_SECONDS) mà không re-encode.
+
+- Buffer lưu theo GOP (bắt đầu bằng keyframe): trim nguyên GOP khi quá cửa sổ hoặc CLIP_BUFFER_MAX_MB,
+  nên clip luôn bắt đầu ở keyframe
+- add_camera(camera_id, url): 1 thread demux / camera (RTSP session riêng bên cạnh decode của OpenCV)
+- request_clip(...): hẹn giờ event_ts + post, remux packet trong cửa sổ ra MP4 tạm, upload qua MinIOService
+  (upload_file) rồi gắn vào snapshot (SnapshotImages) nếu có snapshot_id
+- get_stats(): bộ nhớ buffer / camera (bytes, giây, GOP) + số clip; gauge clip_buffer_bytes
+Tắt mặc định (CLIP_ENABLED=true để bật), cần package av (PyAV).
+"""
+
+import os
+import time
+import random
+import logging
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+try:
+    import av
+    AV_AVAILABLE = True
+except ImportError:
+    AV_AVAILABLE = False
+    av = None
+
+from infrastructure.services.metrics_service import pipeline_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Packet:
+    """Packet đã copy ra bytes (không giữ buffer của demuxer)"""
+    __slots__ = ('data', 'pts', 'dts', 'duration', 'wall_ts')
+
+    def __init__(self, data: bytes, pts: Optional[int], dts: int, duration: Optional[int], wall_ts: float):
+        self.data = data
+        self.pts = pts
+        self.dts = dts
+        self.duration = duration
+        self.wall_ts = wall_ts
+
+
+class _Gop:
+    """1 GOP: keyframe + các packet phụ thuộc"""
+    __slots__ = ('packets', 'start_ts', 'size')
+
+    def __init__(self, start_ts: float):
+        self.packets: List[_Packet] = []
+        self.start_ts = start_ts
+        self.size = 0
+
+
+class PacketRingBuffer:
+    """Ring buffer packet video nén cho 1 camera, demux trên thread riêng, reconnect với backoff"""
+
+    def __init__(self, camera_id: str, url: str, window_seconds: float, max_bytes: int):
+        self.camera_id = str(camera_id)
+        self.url = url
+        self.window_seconds = window_seconds
+        self.max_bytes = max_bytes
+        self.retry_base_delay = float(os.getenv('CLIP_RETRY_BASE_DELAY', '2'))
+        self.retry_max_delay = float(os.getenv('CLIP_RETRY_MAX_DELAY', '60'))
+
+        self._lock = threading.Lock()
+        self._gops: deque = deque()
+        self._size = 0
+        self._stream = None          # input stream của session hiện tại (template cho remux)
+        self._session = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_gauge = 0.0
+        self.stats = {'packets': 0, 'reconnects': 0, 'last_error': None}
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._demux_loop, name=f"ClipDemux-{self.camera_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _demux_loop(self):
+        attempt = 0
+        while not self._stop_event.is_set():
+            container = None
+            try:
+                container = av.open(self.url, options={'rtsp_transport': 'tcp', 'stimeout': '5000000'},
+                                    timeout=10.0)
+                stream = container.streams.video[0]
+                with self._lock:
+                    # Packet của session cũ gắn với stream đã đóng -> bỏ, không remux lẫn 2 session
+                    self._gops.clear()
+                    self._size = 0
+                    self._stream = stream
+                    self._session += 1
+                attempt = 0
+                logger.info(f"🎞️ Clip buffer demuxing camera {self.camera_id} ({stream.codec_context.name})")
+
+                for packet in container.demux(stream):
+                    if self._stop_event.is_set():
+                        break
+                    if packet.dts is None or packet.size == 0:
+                        continue
+                    self._append(packet)
+            except Exception as e:
+                self.stats['last_error'] = str(e)
+                logger.warning(f"⚠️ Clip buffer demux error on camera {self.camera_id}: {e}")
+            finally:
+                with self._lock:
+                    self._stream = None
+                if container is not None:
+                    try:
+                        container.close()
+                    except Exception:
+                        pass
+
+            if self._stop_event.is_set():
+                break
+            delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)) * (0.5 + random.random() / 2)
+            attempt += 1
+            self.stats['reconnects'] += 1
+            self._stop_event.wait(delay)
+
+    def _append(self, packet):
+        now = time.time()
+        item = _Packet(bytes(packet), packet.pts, packet.dts, packet.duration, now)
+        with self._lock:
+            if packet.is_keyframe or not self._gops:
+                if not packet.is_keyframe:
+                    return  # Chưa có keyframe đầu tiên -> packet không decode được
+                self._gops.append(_Gop(now))
+            gop = self._gops[-1]
+            gop.packets.append(item)
+            gop.size += len(item.data)
+            self._size += len(item.data)
+
+            # Trim nguyên GOP: giữ GOP chứa mốc (now - window) để clip vẫn bắt đầu ở keyframe
+            cutoff = now - self.window_seconds
+            while len(self._gops) > 1 and (self._gops[1].start_ts <= cutoff or self._size > self.max_bytes):
+                self._size -= self._gops.popleft().size
+        self.stats['packets'] += 1
+
+        if now - self._last_gauge >= 1.0:
+            self._last_gauge = now
+            pipeline_metrics.set_clip_buffer_bytes(self.camera_id, self._size)
+
+    def collect(self, start_ts: float, end_ts: float):
+        """Packet từ keyframe <= start_ts tới end_ts. Returns (stream, packets) hoặc (None, [])"""
+        with self._lock:
+            stream = self._stream
+            gops = list(self._gops)
+        if stream is None or not gops:
+            return None, []
+        first = 0
+        for index, gop in enumerate(gops):
+            if gop.start_ts <= start_ts:
+                first = index
+        packets = [packet for gop in gops[first:] for packet in gop.packets if packet.wall_ts <= end_ts]
+        return stream, packets
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            gops = list(self._gops)
+            size = self._size
+        return {
+            'memory_bytes': size,
+            'buffered_seconds': round(time.time() - gops[0].start_ts, 2) if gops else 0.0,
+            'gops': len(gops),
+            'connected': self._stream is not None,
+            **self.stats
+        }
+
+
+class ClipBufferService:
+    """Quản lý ring buffer của các camera + remux / upload clip trên worker pool"""
+
+    def __init__(self, enabled: Optional[bool] = None):
+        self.enabled = (os.getenv('CLIP_ENABLED', 'false').lower() == 'true') if enabled is None else enabled
+        self.pre_seconds = float(os.getenv('CLIP_PRE_SECONDS', '10'))
+        self.post_seconds = float(os.getenv('CLIP_POST_SECONDS', '10'))
+        self.max_bytes = int(float(os.getenv('CLIP_BUFFER_MAX_MB', '32')) * 1024 * 1024)
+        self.workers = int(os.getenv('CLIP_WORKERS', '2'))
+
+        if self.enabled and not AV_AVAILABLE:
+            logger.warning("⚠️ CLIP_ENABLED=true nhưng thiếu package av (PyAV) - clip capture disabled")
+            self.enabled = False
+
+        self._buffers: Dict[str, PacketRingBuffer] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self.stats = {'clips_requested': 0, 'clips_uploaded': 0, 'clips_failed': 0, 'last_clip_url': None}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ClipWorker")
+            return self._executor
+
+    def add_camera(self, camera_id: str, url: str) -> bool:
+        """Bắt đầu buffer packet cho camera (no-op khi tắt)"""
+        if not self.enabled or not url:
+            return False
+        camera_id = str(camera_id)
+        if camera_id not in self._buffers:
+            self._buffers[camera_id] = PacketRingBuffer(camera_id, url, self.pre_seconds + self.post_seconds,
+                                                        self.max_bytes)
+        self._buffers[camera_id].start()
+        return True
+
+    def request_clip(self, camera_id: str, user_id: str, event_type: str, confidence: float = 0.0,
+                     snapshot_id: Optional[str] = None, event_ts: Optional[float] = None) -> bool:
+        """Hẹn tạo clip [event_ts - pre, event_ts + post] sau khi đủ post_seconds"""
+        buffer = self._buffers.get(str(camera_id))
+        if not self.enabled or buffer is None:
+            return False
+        event_ts = event_ts or time.time()
+        self.stats['clips_requested'] += 1
+        delay = max(0.0, event_ts + self.post_seconds - time.time())
+        timer = threading.Timer(delay, self.executor.submit,
+                                args=(self._build_and_upload, buffer, user_id, event_type, confidence,
+                                      snapshot_id, event_ts))
+        timer.daemon = True
+        timer.start()
+        return True
+
+    @staticmethod
+    def _remux(stream, packets: List[_Packet], path: str):
+        """Ghi packet vào MP4 (copy codec, rebase timestamp về 0)"""
+        with av.open(path, 'w', format='mp4') as output:
+            if hasattr(output, 'add_stream_from_template'):
+                out_stream = output.add_stream_from_template(stream)
+            else:
+                out_stream = output.add_stream(template=stream)
+            base = packets[0].dts
+            for item in packets:
+                packet = av.Packet(item.data)
+                packet.dts = item.dts - base
+                packet.pts = (item.pts - base) if item.pts is not None else packet.dts
+                if item.duration:
+                    packet.duration = item.duration
+                packet.time_base = stream.time_base
+                packet.stream = out_stream
+                output.mux(packet)
+
+    def _build_and_upload(self, buffer: PacketRingBuffer, user_id: str, event_type: str, confidence: float,
+                          snapshot_id: Optional[str], event_ts: float) -> Optional[str]:
+        stream, packets = buffer.collect(event_ts - self.pre_seconds, event_ts + self.post_seconds)
+        if not packets:
+            self.stats['clips_failed'] += 1
+            logger.warning(f"⚠️ No buffered packets for {event_type} clip on camera {buffer.camera_id}")
+            return None
+
+        fd, path = tempfile.mkstemp(suffix='.mp4', prefix='clip_')
+        os.close(fd)
+        try:
+            self._remux(stream, packets, path)
+
+            from infrastructure.storage.minio_service import get_minio_service
+            minio_service = get_minio_service()
+            if minio_service is None:
+                raise RuntimeError("MinIO service not available")
+            object_name = minio_service.build_object_name(user_id, buffer.camera_id, f"{event_type}_clip",
+                                                           confidence, extension='mp4')
+            result = minio_service.upload_file(path, object_name, 'video/mp4', metadata={
+                'camera_id': buffer.camera_id,
+                'event_type': event_type,
+                'snapshot_id': snapshot_id or '',
+                'pre_seconds': str(self.pre_seconds),
+                'post_seconds': str(self.post_seconds)
+            })
+            if result is None:
+                raise RuntimeError("MinIO upload failed")
+            object_name, cloud_url, size = result
+
+            if snapshot_id:
+                from infrastructure.services.snapshot_service import get_snapshot_service
+                get_snapshot_service().attach_clip(snapshot_id, object_name, cloud_url, size)
+
+            self.stats['clips_uploaded'] += 1
+            self.stats['last_clip_url'] = cloud_url
+            logger.info(f"🎬 {event_type} clip uploaded ({len(packets)} packets, {size / 1024:.0f}KB): {cloud_url}")
+            return cloud_url
+        except Exception as e:
+            self.stats['clips_failed'] += 1
+            logger.error(f"❌ {event_type} clip failed on camera {buffer.camera_id}: {e}")
+            return None
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'pre_seconds': self.pre_seconds,
+            'post_seconds': self.post_seconds,
+            'cameras': {camera_id: buffer.get_stats() for camera_id, buffer in self._buffers.items()},
+            **self.stats
+        }
+
+    def shutdown(self):
+        for buffer in self._buffers.values():
+            buffer.stop()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+
+# Global instance
+clip_buffer_service = ClipBufferService()
+
+
+def get_clip_buffer_service() -> ClipBufferService:
+    """Get clip buffer service"""
+    return clip_buffer_service
@@ -0,0 +1,337 @@
+"""
+Config Snapshot Service
+Snapshot cấu hình bất biến (frozen) có version: đọc env 1 lần, merge override từ DB, swap atomic khi reload.
+Hot path (pipeline / dispatcher) chỉ đọc attribute của DetectionConfig, không parse os.getenv mỗi frame.
+
+- current() / for_camera(camera_id): snapshot hiện tại / DetectionConfig của camera (fallback defaults)
+- attach_database(service): nguồn override (get_connection / return_connection), reload ngay
+- request_reload(): reload nền, gộp nhiều request liên tiếp (dùng cho NOTIFY)
+- subscribe(fn): fn(old, new) sau mỗi lần swap
+
+Override (thứ tự ưu tiên tăng dần): env -> system_config global -> cameras.<CONFIG_CAMERA_COLUMN> (jsonb)
+-> system_config 'camera.<camera_id>.<field>'. Chỉ đọc row system_config có category = CONFIG_DB_CATEGORY.
+Thay đổi: trigger phía API gọi pg_notify('<CONFIG_NOTIFY_CHANNEL>', ...) -> alarm handler LISTEN -> request_reload().
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from dataclasses import dataclass, field, fields, replace
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+CAMERA_KEY_PREFIX = 'camera.'
+
+
+def _env_float(name: str, default: str) -> float:
+    return float(os.getenv(name, default))
+
+
+def _env_int(name: str, default: str) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() == 'true'
+
+
+def _coerce(value: Any, like: Any) -> Any:
+    """Ép giá trị override (text trong system_config / jsonb) về kiểu của field mặc định"""
+    if isinstance(like, bool):
+        if isinstance(value, str):
+            return value.strip().lower() in ('true', '1', 'yes', 'on')
+        return bool(value)
+    if isinstance(like, int):
+        return int(float(value))
+    if isinstance(like, float):
+        return float(value)
+    return value
+
+
+@dataclass(frozen=True)
+class DetectionConfig:
+    """Ngưỡng detection đã resolve cho 1 camera (bất biến, đọc trực tiếp trong hot path)"""
+    # Fall
+    fall_enabled: bool = True
+    fall_confidence_threshold: float = 0.7      # base confidence >= -> fall ngay
+    fall_confirm_threshold: float = 0.4         # smoothed confidence > -> +1 confirmation frame
+    fall_warning_threshold: float = 0.50        # fall_warning alert level
+    fall_cooldown_seconds: float = 8.0
+    fall_min_confirmation_frames: int = 4
+    fall_confirmation_frames: int = 5
+    # Seizure
+    seizure_enabled: bool = True
+    seizure_confidence_threshold: float = 0.6
+    seizure_threshold: float = 0.02             # final confidence > -> +1 confirmation frame
+    seizure_warning_threshold: float = 0.01
+    seizure_warning_alert_threshold: float = 0.45
+    seizure_warning_motion: float = 0.7
+    seizure_cooldown_seconds: float = 0.5
+    seizure_min_confirmation_frames: int = 1
+    seizure_confirmation_frames: int = 8
+    # Motion
+    significant_motion_threshold: float = 0.3
+    warning_motion_threshold: float = 0.2
+    # Severity / notification (dispatcher)
+    fall_severity_high: float = 0.35
+    fall_severity_medium: float = 0.25
+    fall_severity_low: float = 0.15
+    fall_notification_threshold: float = 0.40
+    seizure_severity_high: float = 0.30
+    seizure_severity_medium: float = 0.20
+    seizure_severity_low: float = 0.12
+    seizure_notification_threshold: float = 0.35
+    # Camera specific
+    fall_sensitivity_multiplier: float = 1.0
+    seizure_sensitivity_multiplier: float = 1.0
+    confidence_boost: float = 0.05
+    min_keypoints_visible: int = 8
+    min_pose_confidence: float = 0.35
+
+    @classmethod
+    def from_env(cls) -> 'DetectionConfig':
+        return cls(
+            fall_enabled=_env_bool('FALL_DETECTION_ENABLED', 'true'),
+            fall_confidence_threshold=_env_float('FALL_DETECTION_CONFIDENCE', '0.7'),
+            fall_confirm_threshold=_env_float('FALL_CONFIRM_THRESHOLD', '0.4'),
+            fall_warning_threshold=_env_float('FALL_WARNING_THRESHOLD', '0.50'),
+            fall_cooldown_seconds=_env_float('FALL_DETECTION_COOLDOWN_SECONDS', '8.0'),
+            fall_min_confirmation_frames=_env_int('FALL_MIN_CONFIRMATION_FRAMES', '4'),
+            fall_confirmation_frames=_env_int('FALL_CONFIRMATION_FRAMES', '5'),
+            seizure_enabled=_env_bool('SEIZURE_DETECTION_ENABLED', 'true'),
+            seizure_confidence_threshold=_env_float('SEIZURE_DETECTION_CONFIDENCE', '0.6'),
+            seizure_threshold=_env_float('SEIZURE_CONFIRM_THRESHOLD', '0.02'),
+            seizure_warning_threshold=_env_float('SEIZURE_WARNING_THRESHOLD', '0.01'),
+            seizure_warning_alert_threshold=_env_float('SEIZURE_WARNING_ALERT_THRESHOLD', '0.45'),
+            seizure_warning_motion=_env_float('SEIZURE_WARNING_MOTION', '0.7'),
+            seizure_cooldown_seconds=_env_float('SEIZURE_COOLDOWN_SECONDS', '0.5'),
+            seizure_min_confirmation_frames=_env_int('SEIZURE_MIN_CONFIRMATION_FRAMES', '1'),
+            seizure_confirmation_frames=_env_int('SEIZURE_CONFIRMATION_FRAMES', '8'),
+            significant_motion_threshold=_env_float('SIGNIFICANT_MOTION_THRESHOLD', '0.3'),
+            warning_motion_threshold=_env_float('WARNING_MOTION_THRESHOLD', '0.2'),
+            fall_severity_high=_env_float('FALL_THRESHOLD_HIGH', '0.35'),
+            fall_severity_medium=_env_float('FALL_THRESHOLD_MEDIUM', '0.25'),
+            fall_severity_low=_env_float('FALL_THRESHOLD_LOW', '0.15'),
+            fall_notification_threshold=_env_float('FALL_NOTIFICATION_THRESHOLD', '0.40'),
+            seizure_severity_high=_env_float('SEIZURE_THRESHOLD_HIGH', '0.30'),
+            seizure_severity_medium=_env_float('SEIZURE_THRESHOLD_MEDIUM', '0.20'),
+            seizure_severity_low=_env_float('SEIZURE_THRESHOLD_LOW', '0.12'),
+            seizure_notification_threshold=_env_float('SEIZURE_NOTIFICATION_THRESHOLD', '0.35'),
+            fall_sensitivity_multiplier=_env_float('DEFAULT_FALL_SENSITIVITY_MULTIPLIER', '1.0'),
+            seizure_sensitivity_multiplier=_env_float('DEFAULT_SEIZURE_SENSITIVITY_MULTIPLIER', '1.0'),
+            confidence_boost=_env_float('DEFAULT_CONFIDENCE_BOOST', '0.05'),
+            min_keypoints_visible=_env_int('MIN_KEYPOINTS_VISIBLE', '8'),
+            min_pose_confidence=_env_float('MIN_POSE_CONFIDENCE', '0.35'),
+        )
+
+    def with_overrides(self, overrides: Mapping[str, Any]) -> 'DetectionConfig':
+        """Copy với các field override (bỏ qua key không biết / giá trị lỗi)"""
+        changes = {}
+        for name, value in overrides.items():
+            if name not in _FIELD_NAMES or value is None:
+                continue
+            try:
+                changes[name] = _coerce(value, getattr(self, name))
+            except (TypeError, ValueError):
+                logger.warning(f"⚠️ Invalid config override {name}={value!r} - ignored")
+        return replace(self, **changes) if changes else self
+
+    def severity_thresholds(self, event_type: str) -> Dict[str, float]:
+        if event_type == 'fall':
+            return {'high': self.fall_severity_high, 'medium': self.fall_severity_medium, 'low': self.fall_severity_low}
+        return {'high': self.seizure_severity_high, 'medium': self.seizure_severity_medium,
+                'low': self.seizure_severity_low}
+
+    def notification_threshold(self, event_type: str) -> float:
+        return self.fall_notification_threshold if event_type == 'fall' else self.seizure_notification_threshold
+
+
+_FIELD_NAMES = frozenset(f.name for f in fields(DetectionConfig))
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Toàn bộ cấu hình tại 1 version; chỉ thay bằng snapshot mới, không sửa tại chỗ"""
+    version: int
+    loaded_at: float
+    source: str
+    defaults: DetectionConfig
+    cameras: Mapping[str, DetectionConfig] = field(default_factory=lambda: MappingProxyType({}))
+
+    def for_camera(self, camera_id: Optional[str]) -> DetectionConfig:
+        if camera_id is None:
+            return self.defaults
+        return self.cameras.get(str(camera_id), self.defaults)
+
+
+class ConfigStore:
+    """Giữ snapshot hiện tại; reader không lock (đọc 1 reference), writer swap dưới lock"""
+
+    def __init__(self):
+        self.db_category = os.getenv('CONFIG_DB_CATEGORY', 'detection')
+        self.camera_column = os.getenv('CONFIG_CAMERA_COLUMN', 'detection_config')
+        self.notify_channel = os.getenv('CONFIG_NOTIFY_CHANNEL', 'config_changed')
+
+        self._db_service = None
+        self._lock = threading.Lock()
+        self._subscribers: List[Callable[[ConfigSnapshot, ConfigSnapshot], None]] = []
+        self._worker_lock = threading.Lock()
+        self._reload_pending = False
+        self._reload_running = False
+        self.stats = {'reloads': 0, 'reload_failures': 0, 'notifications': 0, 'last_error': None}
+        self._snapshot = ConfigSnapshot(version=1, loaded_at=time.time(), source='env',
+                                        defaults=DetectionConfig.from_env())
+
+    # ------------------------------------------------------------------
+    # Read side (hot path)
+    # ------------------------------------------------------------------
+    def current(self) -> ConfigSnapshot:
+        return self._snapshot
+
+    def for_camera(self, camera_id: Optional[str]) -> DetectionConfig:
+        return self._snapshot.for_camera(camera_id)
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def subscribe(self, callback: Callable[[ConfigSnapshot, ConfigSnapshot], None]):
+        self._subscribers.append(callback)
+
+    # ------------------------------------------------------------------
+    # Reload
+    # ------------------------------------------------------------------
+    def attach_database(self, db_service) -> ConfigSnapshot:
+        """Dùng PostgreSQL service (connection pool) làm nguồn override và load lần đầu"""
+        self._db_service = db_service
+        return self.reload('attach')
+
+    def reload(self, reason: str = 'manual') -> ConfigSnapshot:
+        """Build snapshot mới (env + DB) rồi swap; lỗi DB -> giữ nguyên snapshot cũ"""
+        defaults = DetectionConfig.from_env()
+        cameras: Dict[str, DetectionConfig] = {}
+        source = 'env'
+        try:
+            overrides = self._load_database_overrides()
+            if overrides is not None:
+                global_overrides, camera_overrides = overrides
+                defaults = defaults.with_overrides(global_overrides)
+                cameras = {camera_id: defaults.with_overrides(values)
+                           for camera_id, values in camera_overrides.items()}
+                source = 'env+db'
+        except Exception as e:
+            self.stats['reload_failures'] += 1
+            self.stats['last_error'] = str(e)
+            logger.error(f"❌ Config reload ({reason}) failed: {e} - keeping version {self.version}")
+            return self._snapshot
+
+        with self._lock:
+            old = self._snapshot
+            new = ConfigSnapshot(version=old.version + 1, loaded_at=time.time(), source=source,
+                                 defaults=defaults, cameras=MappingProxyType(cameras))
+            self._snapshot = new
+        self.stats['reloads'] += 1
+        logger.info(f"⚙️ Config snapshot v{new.version} loaded ({reason}, {source}, "
+                    f"{len(cameras)} camera overrides)")
+
+        for callback in list(self._subscribers):
+            try:
+                callback(old, new)
+            except Exception as e:
+                logger.warning(f"⚠️ Config subscriber failed: {e}")
+        return new
+
+    def request_reload(self, payload: Optional[str] = None):
+        """Reload trên thread nền (NOTIFY / reconnect); các request dồn dập gộp thành 1 lần reload"""
+        self.stats['notifications'] += 1
+        if payload:
+            logger.info(f"⚙️ Config change notified: {payload[:200]}")
+        with self._worker_lock:
+            self._reload_pending = True
+            if self._reload_running:
+                return
+            self._reload_running = True
+        threading.Thread(target=self._reload_worker, name="ConfigReload", daemon=True).start()
+
+    def _reload_worker(self):
+        while True:
+            with self._worker_lock:
+                if not self._reload_pending:
+                    self._reload_running = False
+                    return
+                self._reload_pending = False
+            self.reload('notify')
+
+    def _load_database_overrides(self):
+        """Returns (global, {camera_id: overrides}) hoặc None khi chưa có DB"""
+        service = self._db_service
+        if service is None or not getattr(service, 'is_connected', False):
+            return None
+
+        conn = service.get_connection()
+        if conn is None:
+            return None
+        global_overrides: Dict[str, Any] = {}
+        camera_overrides: Dict[str, Dict[str, Any]] = {}
+        camera_keys: Dict[str, Dict[str, Any]] = {}
+        broken = False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT setting_key, setting_value FROM system_config WHERE category = %s",
+                    (self.db_category,)
+                )
+                for row in cursor.fetchall():
+                    key, value = (row['setting_key'], row['setting_value']) if isinstance(row, dict) else row
+                    if key.startswith(CAMERA_KEY_PREFIX):
+                        camera_id, _, name = key[len(CAMERA_KEY_PREFIX):].rpartition('.')
+                        if camera_id:
+                            camera_keys.setdefault(camera_id, {})[name] = value
+                    else:
+                        global_overrides[key] = value
+
+                # Cột jsonb per-camera là tùy chọn (schema do API backend quản lý)
+                cursor.execute(
+                    "SELECT 1 FROM information_schema.columns WHERE table_name = 'cameras' AND column_name = %s",
+                    (self.camera_column,)
+                )
+                if cursor.fetchone():
+                    cursor.execute(
+                        f'SELECT camera_id, "{self.camera_column}" AS overrides FROM cameras '
+                        f'WHERE "{self.camera_column}" IS NOT NULL'
+                    )
+                    for row in cursor.fetchall():
+                        camera_id, values = (row['camera_id'], row['overrides']) if isinstance(row, dict) else row
+                        if isinstance(values, str):
+                            values = json.loads(values)
+                        if isinstance(values, dict):
+                            camera_overrides[str(camera_id)] = dict(values)
+            conn.rollback()
+        except Exception:
+            broken = True
+            raise
+        finally:
+            service.return_connection(conn, close=broken)
+
+        for camera_id, values in camera_keys.items():
+            camera_overrides.setdefault(camera_id, {}).update(values)
+        return global_overrides, camera_overrides
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {'version': snapshot.version, 'source': snapshot.source, 'loaded_at': snapshot.loaded_at,
+                'camera_overrides': sorted(snapshot.cameras), 'notify_channel': self.notify_channel,
+                **self.stats}
+
+
+# Global instance
+config_store = ConfigStore()
+
+
+def get_config_store() -> ConfigStore:
+    """Get config snapshot store"""
+    return config_store
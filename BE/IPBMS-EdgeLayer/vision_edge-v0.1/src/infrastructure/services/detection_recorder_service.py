@@ -0,0 +1,237 @@
+"""
+Detection Recorder Service
+Ghi per-frame detections / keypoints / motion level / confidence của pipeline ra format cột nhị phân
+(1 file raw little-endian / cột, append-only) theo từng camera session, để replay và phân tích offline.
+
+Layout: <RECORDING_DIR>/<camera_id>/<YYYYmmdd_HHMMSS>/
+    header.json        schema (dtype + shape mỗi cột), camera, started_at
+    <column>.bin       N frame x shape cột (vd. keypoints.bin = N x 17 x 3 float32)
+    detections.bin     ragged: tất cả detection [x1, y1, x2, y2, conf, class_id] float32
+                       + cột detection_end (int64) = vị trí kết thúc của frame trong detections.bin
+
+- DetectionRecorder.append(...): ghi vào buffer cột preallocated, flush mỗi RECORDING_FLUSH_FRAMES
+  (1 lần write() / cột), không serialize JSON trong frame loop
+- RecordingReader(path): np.memmap mỗi cột (zero-copy), số frame = số row đầy đủ nhỏ nhất giữa các cột
+  (bỏ row ghi dở khi process chết giữa chừng)
+Bật bằng RECORDING_ENABLED=true, chỉ dùng numpy.
+"""
+
+import os
+import json
+import atexit
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+KEYPOINT_COUNT = 17
+DETECTION_FIELDS = ('x1', 'y1', 'x2', 'y2', 'confidence', 'class_id')
+
+# Flag bits (cột flags)
+FLAG_KEYFRAME = 1
+FLAG_FALL_DETECTED = 2
+FLAG_SEIZURE_DETECTED = 4
+FLAG_SEIZURE_READY = 8
+
+# name -> (dtype, shape mỗi frame); NaN = không có giá trị (không có người / pose lỗi / detector không chạy)
+COLUMNS = {
+    'timestamp': ('<f8', ()),
+    'frame_index': ('<i8', ()),
+    'flags': ('u1', ()),
+    'person_count': ('<u2', ()),
+    'motion_level': ('<f4', ()),
+    'bbox': ('<f4', (4,)),
+    'keypoints': ('<f4', (KEYPOINT_COUNT, 3)),
+    'fall_confidence': ('<f4', ()),
+    'seizure_confidence': ('<f4', ()),
+    'fall_final': ('<f4', ()),
+    'seizure_final': ('<f4', ()),
+    'detection_end': ('<i8', ()),
+}
+
+
+def recording_enabled() -> bool:
+    return os.getenv('RECORDING_ENABLED', 'false').lower() == 'true'
+
+
+class DetectionRecorder:
+    """Append-only writer cho 1 camera session (gọi từ frame thread của camera đó)"""
+
+    def __init__(self, camera_id: str, base_dir: Optional[str] = None, flush_frames: Optional[int] = None):
+        self.camera_id = str(camera_id)
+        self.flush_frames = flush_frames or int(os.getenv('RECORDING_FLUSH_FRAMES', '256'))
+        base_dir = base_dir or os.getenv('RECORDING_DIR', os.path.join('data', 'recordings'))
+        started_at = datetime.now()
+        self.path = os.path.join(base_dir, self.camera_id, started_at.strftime('%Y%m%d_%H%M%S'))
+        os.makedirs(self.path, exist_ok=True)
+
+        self._buffers = {name: np.empty((self.flush_frames,) + shape, dtype=dtype)
+                         for name, (dtype, shape) in COLUMNS.items()}
+        self._files = {name: open(os.path.join(self.path, f'{name}.bin'), 'ab') for name in COLUMNS}
+        self._detections_file = open(os.path.join(self.path, 'detections.bin'), 'ab')
+        self._pending_detections: List[np.ndarray] = []
+        self._rows = 0
+        self._detection_count = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.frames = 0
+        self.bytes_written = 0
+
+        header = {
+            'format_version': FORMAT_VERSION,
+            'camera_id': self.camera_id,
+            'started_at': started_at.isoformat(),
+            'columns': {name: {'dtype': dtype, 'shape': list(shape)} for name, (dtype, shape) in COLUMNS.items()},
+            'detections': {'dtype': '<f4', 'fields': list(DETECTION_FIELDS)},
+            'flags': {'keyframe': FLAG_KEYFRAME, 'fall_detected': FLAG_FALL_DETECTED,
+                      'seizure_detected': FLAG_SEIZURE_DETECTED, 'seizure_ready': FLAG_SEIZURE_READY},
+        }
+        with open(os.path.join(self.path, 'header.json'), 'w') as f:
+            json.dump(header, f, indent=2)
+        atexit.register(self.close)
+        logger.info(f"🎞️ Recording camera {self.camera_id} -> {self.path}")
+
+    def append(self, timestamp: float, frame_index: int, keyframe: bool = False,
+               detections: Optional[Iterable[Dict[str, Any]]] = None, bbox=None, keypoints=None,
+               motion_level: Optional[float] = None, fall_confidence: Optional[float] = None,
+               seizure_confidence: Optional[float] = None, fall_final: Optional[float] = None,
+               seizure_final: Optional[float] = None, fall_detected: bool = False,
+               seizure_detected: bool = False, seizure_ready: bool = False):
+        """Ghi 1 frame (giá trị None -> NaN)"""
+        if self._closed:
+            return
+        rows = []
+        for detection in detections or ():
+            box = detection.get('bbox', ())
+            if len(box) >= 4:
+                rows.append((box[0], box[1], box[2], box[3], detection.get('confidence', 0.0),
+                             detection.get('class_id', 0)))
+
+        with self._lock:
+            i = self._rows
+            b = self._buffers
+            b['timestamp'][i] = timestamp
+            b['frame_index'][i] = frame_index
+            b['flags'][i] = ((FLAG_KEYFRAME if keyframe else 0) | (FLAG_FALL_DETECTED if fall_detected else 0)
+                             | (FLAG_SEIZURE_DETECTED if seizure_detected else 0)
+                             | (FLAG_SEIZURE_READY if seizure_ready else 0))
+            b['person_count'][i] = len(rows)
+            b['motion_level'][i] = np.nan if motion_level is None else motion_level
+            b['bbox'][i] = np.nan if bbox is None else np.asarray(bbox, dtype=np.float32)[:4]
+            if keypoints is None:
+                b['keypoints'][i] = np.nan
+            else:
+                points = np.asarray(keypoints, dtype=np.float32).reshape(-1, 3)[:KEYPOINT_COUNT]
+                b['keypoints'][i, :len(points)] = points
+                b['keypoints'][i, len(points):] = np.nan
+            b['fall_confidence'][i] = np.nan if fall_confidence is None else fall_confidence
+            b['seizure_confidence'][i] = np.nan if seizure_confidence is None else seizure_confidence
+            b['fall_final'][i] = np.nan if fall_final is None else fall_final
+            b['seizure_final'][i] = np.nan if seizure_final is None else seizure_final
+            if rows:
+                self._pending_detections.append(np.asarray(rows, dtype=np.float32))
+                self._detection_count += len(rows)
+            b['detection_end'][i] = self._detection_count
+            self._rows += 1
+            if self._rows >= self.flush_frames:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._rows:
+            return
+        # detections trước, cột sau: reader không bao giờ thấy detection_end trỏ quá cuối detections.bin
+        if self._pending_detections:
+            data = np.concatenate(self._pending_detections).tobytes()
+            self._detections_file.write(data)
+            self._detections_file.flush()
+            self.bytes_written += len(data)
+            self._pending_detections = []
+        for name, buffer in self._buffers.items():
+            data = buffer[:self._rows].tobytes()
+            self._files[name].write(data)
+            self._files[name].flush()
+            self.bytes_written += len(data)
+        self.frames += self._rows
+        self._rows = 0
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_locked()
+            self._closed = True
+            for f in list(self._files.values()) + [self._detections_file]:
+                f.close()
+        logger.info(f"🎞️ Recording closed: {self.frames} frames, {self.bytes_written / 1024:.1f} KB ({self.path})")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'path': self.path, 'frames': self.frames + self._rows, 'bytes_written': self.bytes_written}
+
+
+class RecordingReader:
+    """Reader zero-copy: mỗi cột là np.memmap read-only trên file .bin"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'header.json')) as f:
+            self.header = json.load(f)
+
+        self.frames = None
+        specs = {}
+        for name, spec in self.header['columns'].items():
+            dtype, shape = np.dtype(spec['dtype']), tuple(spec['shape'])
+            row_bytes = dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+            complete = os.path.getsize(os.path.join(path, f'{name}.bin')) // row_bytes
+            self.frames = complete if self.frames is None else min(self.frames, complete)
+            specs[name] = (dtype, shape)
+
+        self.columns: Dict[str, np.ndarray] = {}
+        for name, (dtype, shape) in specs.items():
+            self.columns[name] = self._map(f'{name}.bin', dtype, (self.frames,) + shape)
+
+        detection_rows = int(self.columns['detection_end'][-1]) if self.frames else 0
+        self.detection_table = self._map('detections.bin', np.dtype('<f4'), (detection_rows, len(DETECTION_FIELDS)))
+
+    def _map(self, filename: str, dtype: np.dtype, shape: tuple) -> np.ndarray:
+        if shape[0] == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(os.path.join(self.path, filename), dtype=dtype, mode='r', shape=shape)
+
+    def __len__(self) -> int:
+        return self.frames
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def detections(self, frame: int) -> np.ndarray:
+        """Detections của 1 frame (view, shape (n, 6))"""
+        end = int(self.columns['detection_end'][frame])
+        start = int(self.columns['detection_end'][frame - 1]) if frame > 0 else 0
+        return self.detection_table[start:end]
+
+    def flag(self, name: str) -> np.ndarray:
+        return (self.columns['flags'] & self.header['flags'][name]) != 0
+
+    def to_session_arrays(self, keyframes_only: bool = True) -> Dict[str, np.ndarray]:
+        """Cột cho rescore_thresholds.Session (mặc định chỉ frame đã qua process_dual_detection)"""
+        mask = self.flag('keyframe') if keyframes_only else slice(None)
+        return {
+            'timestamp': np.asarray(self.columns['timestamp'][mask]),
+            'bbox': np.asarray(self.columns['bbox'][mask], dtype=np.float64),
+            'keypoints': np.asarray(self.columns['keypoints'][mask], dtype=np.float64),
+            'motion_level': np.nan_to_num(np.asarray(self.columns['motion_level'][mask], dtype=np.float64)),
+            'fall_confidence': np.nan_to_num(np.asarray(self.columns['fall_confidence'][mask], dtype=np.float64)),
+        }
+
+
+def is_recording(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, 'header.json'))
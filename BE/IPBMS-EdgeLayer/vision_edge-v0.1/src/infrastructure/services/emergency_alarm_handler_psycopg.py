@@ -2,22 +2,37 @@
 Emergency Alarm Handler - PostgreSQL LISTEN/NOTIFY with psycopg3
 Sử dụng PostgreSQL native LISTEN/NOTIFY để nhận realtime events
 Không polling, hiệu suất cao, độ trễ thấp (< 50ms)
+
+- 1 asyncio event loop (psycopg AsyncConnection): chờ notify trên socket, không spin / sleep
+- Xử lý alarm (siren + UPDATE event) chạy trên ThreadPoolExecutor, không chặn loop
+- Reconnect với exponential backoff + jitter
+- Latency notify -> dispatch / siren / db_update ghi vào pipeline_metrics (alarm_latency_seconds)
+- Cùng connection LISTEN thêm CONFIG_NOTIFY_CHANNEL -> config_store.request_reload() (hot-reload ngưỡng)
 """
 
 import psycopg
 import json
+import asyncio
 import logging
+import random
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional, Dict, Any
 import os
 from infrastructure.services.audio_alert_service import audio_alert_service
+from infrastructure.services.event_bus_service import event_bus, EVENT_ALARM_ACTIVATED, EVENT_FALL, EVENT_SEIZURE
+from infrastructure.services.metrics_service import pipeline_metrics
+from infrastructure.services.config_snapshot_service import config_store
 
 logger = logging.getLogger(__name__)
 
 class EmergencyAlarmHandlerPsycopg:
-    """Handler sử dụng PostgreSQL LISTEN/NOTIFY với psycopg3"""
+    """Handler sử dụng PostgreSQL LISTEN/NOTIFY với psycopg3 (async)"""
+    
+    BUS_GROUP = 'alarm'
+    BUS_EVENT_TYPES = (EVENT_FALL, EVENT_SEIZURE, EVENT_ALARM_ACTIVATED)
     
     def __init__(self, postgresql_service=None):
         self.postgresql_service = postgresql_service
@@ -26,7 +41,7 @@ class EmergencyAlarmHandlerPsycopg:
         self.last_cleanup_time = datetime.now()
         
         # PostgreSQL connection for LISTEN
-        self.listen_conn: Optional[psycopg.Connection] = None
+        self.listen_conn: Optional[psycopg.AsyncConnection] = None
         
         # Database credentials - MUST use DIRECT connection (port 5432) for LISTEN/NOTIFY
         # Pooler (port 6543) does NOT support LISTEN/NOTIFY
@@ -41,6 +56,18 @@ class EmergencyAlarmHandlerPsycopg:
         # Channel name - must match trigger function
         self.channel_name = 'system_alarm_channel'  # Match notify_alarm_trigger()
         
+        # Reconnect backoff + alarm workers
+        self.retry_base_delay = float(os.getenv('ALARM_LISTEN_RETRY_BASE', '1.0'))
+        self.retry_max_delay = float(os.getenv('ALARM_LISTEN_RETRY_MAX', '60.0'))
+        self.executor = ThreadPoolExecutor(max_workers=int(os.getenv('ALARM_HANDLER_WORKERS', '2')),
+                                           thread_name_prefix="AlarmHandler")
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._listen_task: Optional[asyncio.Task] = None
+        self.connected = threading.Event()
+        self.stats = {'notifications': 0, 'alarms': 0, 'reconnects': 0, 'last_notify_to_siren_ms': None}
+        
         logger.info("🎧 Emergency Alarm Handler initialized (PostgreSQL LISTEN/NOTIFY - psycopg3)")
         logger.info(f"   Using DIRECT connection (port 5432) for LISTEN/NOTIFY")
     
@@ -49,12 +76,26 @@ class EmergencyAlarmHandlerPsycopg:
         self.postgresql_service = service
         logger.info("✅ PostgreSQL service connected")
     
+    def start_in_background(self) -> threading.Thread:
+        """Chạy start_listening() trên 1 thread duy nhất host event loop của handler"""
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        self._thread = threading.Thread(target=lambda: asyncio.run(self.start_listening()),
+                                        name="EmergencyAlarmLoop", daemon=True)
+        self._thread.start()
+        return self._thread
+    
+    def wait_until_connected(self, timeout: float = 5.0) -> bool:
+        """Chờ LISTEN sẵn sàng (thay cho sleep cố định)"""
+        return self.connected.wait(timeout)
+    
     async def start_listening(self):
         """Bắt đầu lắng nghe PostgreSQL notifications"""
+        self._loop = asyncio.get_running_loop()
+        self.is_running = True
         
-        # Chạy listener trong thread riêng (vì psycopg đồng bộ)
-        listener_thread = threading.Thread(target=self._listen_loop, daemon=True)
-        listener_thread.start()
+        # Redis event bus: fall/seizure đã tạo alert + alarm_activated từ API/WebSocket servers (nếu bật)
+        self.start_event_bus_consumer()
         
         logger.info("=" * 80)
         logger.info("🚀 EMERGENCY ALARM HANDLER STARTED (LISTEN/NOTIFY)")
@@ -63,81 +104,103 @@ class EmergencyAlarmHandlerPsycopg:
         logger.info("💡 Waiting for notifications from PostgreSQL triggers...")
         logger.info("=" * 80)
         
-        # Keep running và cleanup cache
-        self.is_running = True
+        self._listen_task = asyncio.create_task(self._listen_loop())
+        cleanup_task = asyncio.create_task(self._cleanup_loop())
+        try:
+            await self._listen_task
+        except asyncio.CancelledError:
+            pass
+        finally:
+            cleanup_task.cancel()
+            self._loop = None
+    
+    async def _cleanup_loop(self):
+        """Cleanup cache định kỳ"""
         while self.is_running:
-            import asyncio
             await asyncio.sleep(60)
-            
             if (datetime.now() - self.last_cleanup_time).seconds > 300:
                 self._cleanup_processed_cache()
     
-    def _listen_loop(self):
-        """Main listener loop (chạy trong thread riêng)"""
-        
-        retry_delay = 5
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+    
+    async def _listen_loop(self):
+        """Main listener loop: await notify trên socket, reconnect với backoff"""
+        attempt = 0
         
-        while True:
+        while self.is_running:
             try:
                 logger.info(f"🔌 Connecting to PostgreSQL for LISTEN/NOTIFY...")
                 logger.info(f"   URL: {self.database_url[:50]}...")
                 
                 # Connect to PostgreSQL
-                self.listen_conn = psycopg.connect(self.database_url, autocommit=True)
+                # TCP keepalive để phát hiện connection chết khi đang chờ notify
+                self.listen_conn = await psycopg.AsyncConnection.connect(
+                    self.database_url, autocommit=True,
+                    keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3
+                )
                 
                 logger.info("✅ PostgreSQL connection established!")
                 
-                with self.listen_conn.cursor() as cur:
-                    # Start listening
-                    cur.execute(f"LISTEN {self.channel_name};")
-                    logger.info(f"✅ Listening on channel: {self.channel_name}")
-                    logger.info("⚡ Ready to receive instant notifications!")
-                    
-                    # Poll for notifications
-                    while self.is_running:
-                        # Wait for notification with timeout (1 second)
-                        gen = self.listen_conn.notifies(timeout=1.0)
-                        
-                        for notify in gen:
-                            # Process notification
-                            self._handle_notification(notify)
-                        
-                        # Small sleep to prevent tight loop
-                        time.sleep(0.01)
+                # Start listening
+                await self.listen_conn.execute(f"LISTEN {self.channel_name};")
+                await self.listen_conn.execute(f"LISTEN {config_store.notify_channel};")
+                logger.info(f"✅ Listening on channel: {self.channel_name} (+ {config_store.notify_channel})")
+                if self.stats['reconnects']:
+                    # Có thể đã lỡ config notify trong lúc mất kết nối
+                    config_store.request_reload('listener reconnected')
+                logger.info("⚡ Ready to receive instant notifications!")
+                attempt = 0
+                self.connected.set()
                 
-            except psycopg.OperationalError as e:
-                logger.error(f"❌ Connection lost: {e}")
-                logger.info(f"🔄 Retrying in {retry_delay}s...")
-                time.sleep(retry_delay)
+                # Event-driven: chỉ wake up khi socket có notify
+                async for notify in self.listen_conn.notifies():
+                    if notify.channel == config_store.notify_channel:
+                        config_store.request_reload(notify.payload)
+                        continue
+                    self._handle_notification(notify, received_at=time.perf_counter())
                 
-            except psycopg.InterfaceError as e:
-                logger.error(f"❌ Interface error: {e}")
-                logger.info(f"🔄 Retrying in {retry_delay}s...")
-                time.sleep(retry_delay)
+            except asyncio.CancelledError:
+                raise
+                
+            except (psycopg.OperationalError, psycopg.InterfaceError) as e:
+                logger.error(f"❌ Connection lost: {e}")
                 
             except Exception as e:
                 logger.error(f"❌ Unexpected error in listener: {e}")
                 import traceback
                 logger.error(traceback.format_exc())
-                time.sleep(retry_delay)
             
             finally:
+                self.connected.clear()
                 if self.listen_conn:
                     try:
-                        self.listen_conn.close()
-                    except:
+                        await self.listen_conn.close()
+                    except Exception:
                         pass
+                    self.listen_conn = None
+            
+            if self.is_running:
+                delay = self._backoff(attempt)
+                attempt += 1
+                self.stats['reconnects'] += 1
+                logger.info(f"🔄 Retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
     
-    def _handle_notification(self, notify):
+    def _handle_notification(self, notify, received_at: Optional[float] = None):
         """
-        Xử lý notification từ PostgreSQL
+        Xử lý notification từ PostgreSQL (trên event loop, không blocking)
         
         Args:
             notify: psycopg Notify object
                 - channel: tên channel
                 - payload: JSON string
+            received_at: time.perf_counter() lúc nhận notify
         """
+        received_at = received_at or time.perf_counter()
         try:
+            self.stats['notifications'] += 1
             logger.info("=" * 80)
             logger.info(f"🔔 NOTIFICATION RECEIVED!")
             logger.info(f"   Channel: {notify.channel}")
@@ -165,7 +228,9 @@ class EmergencyAlarmHandlerPsycopg:
             
             # Process alarm activation (trigger only fires for ALARM_ACTIVATED)
             if state == 'ALARM_ACTIVATED':
-                self._process_alarm_activated_sync(data)
+                # Đánh dấu ngay trên loop để notify trùng không dispatch 2 lần
+                self.processed_events.add(str(event_id))
+                self.executor.submit(self._process_alarm_activated_sync, data, received_at, 'notify')
             else:
                 logger.warning(f"⚠️ Unexpected state: {state}")
 
@@ -178,6 +243,70 @@ class EmergencyAlarmHandlerPsycopg:
             import traceback
             logger.error(traceback.format_exc())
     
+    def _play_alarm(self, user_id: str, triggered_by: str, duration: int = 10) -> Dict[str, Any]:
+        """Gửi lệnh play tới alarm loop của AudioAlertService (siren đã preload), chờ tới khi bắt đầu phát"""
+        return audio_alert_service.trigger_alarm(user_id=user_id, triggered_by=triggered_by,
+                                                 duration=duration).result(timeout=30)
+    
+    def start_event_bus_consumer(self) -> bool:
+        """Consume fall / seizure / alarm_activated events từ Redis Streams (consumer group 'alarm')"""
+        return event_bus.start_consumer(self.BUS_GROUP, self._handle_bus_event,
+                                        event_types=list(self.BUS_EVENT_TYPES))
+    
+    def _handle_bus_event(self, event):
+        """
+        Xử lý event từ Redis event bus
+
+        Args:
+            event: BusEvent - fall/seizure: payload của HealthcareEventPublisher._publish_to_event_bus,
+                alarm_activated: data giống payload của trigger notify_alarm_trigger
+        """
+        if event.type in (EVENT_FALL, EVENT_SEIZURE):
+            self._handle_detection_event(event)
+            return
+        
+        data = dict(event.data)
+        data.setdefault('user_id', event.user_id)
+        data.setdefault('camera_id', event.camera_id)
+        
+        event_id = data.get('event_id')
+        if event_id in self.processed_events:
+            logger.info(f"⏭️  Event {event_id} already processed, skipping (bus {event.id})")
+            return
+        
+        logger.info(f"🔔 EVENT BUS ALARM: {event_id} (stream id {event.id})")
+        self._process_alarm_activated_sync(data, time.perf_counter(), 'event_bus')
+    
+    def _handle_detection_event(self, event):
+        """Fall / seizure từ detection worker: chỉ bật siren khi dispatcher đã tạo alert (alert_created)"""
+        if not event.data.get('alert_created'):
+            return
+        
+        # Key riêng theo type: alarm_activated từ mobile cho cùng event_id vẫn được xử lý (ACKED)
+        key = f"{event.type}:{event.data.get('event_id') or event.id}"
+        if key in self.processed_events:
+            logger.info(f"⏭️  Detection {key} already alarmed, skipping (bus {event.id})")
+            return
+        self.processed_events.add(key)
+        
+        received_at = time.perf_counter()
+        logger.info(f"🔔 EVENT BUS {event.type.upper()}: {key} (camera {event.camera_id}, stream id {event.id})")
+        try:
+            alarm_result = self._play_alarm(user_id=str(event.user_id or ''),
+                                            triggered_by=f"{event.type}_detection", duration=10)
+        except Exception:
+            # Không ack -> event bus giao lại (quá max_deliveries -> dead-letter)
+            self.processed_events.discard(key)
+            raise
+        siren_latency = time.perf_counter() - received_at
+        pipeline_metrics.observe_alarm_latency('siren', siren_latency, 'event_bus')
+        
+        if alarm_result['success']:
+            self.stats['alarms'] += 1
+            logger.info(f"✅ {event.type.upper()} ALARM ACTIVATED ({siren_latency * 1000:.0f}ms)")
+        else:
+            logger.error(f"❌ ALARM FAILED for {key}: {alarm_result['message']}")
+    
     def _process_emergency_request_sync(self, event_data: Dict[str, Any]):
         """Xử lý manual_emergency event (synchronous)"""
         try:
@@ -188,13 +317,8 @@ class EmergencyAlarmHandlerPsycopg:
             
             logger.info(f"🚨 Processing MANUAL EMERGENCY: {event_id}")
             
-            # Trigger alarm (dùng asyncio.run để chạy async function)
-            import asyncio
-            alarm_result = asyncio.run(audio_alert_service.play_emergency_alarm(
-                user_id=user_id,
-                triggered_by='manual_emergency',
-                duration=10
-            ))
+            # Trigger alarm
+            alarm_result = self._play_alarm(user_id=user_id, triggered_by='manual_emergency', duration=10)
             
             if alarm_result['success']:
                 logger.info("✅ ✅ ✅ ALARM ACTIVATED SUCCESSFULLY! ✅ ✅ ✅")
@@ -227,8 +351,11 @@ class EmergencyAlarmHandlerPsycopg:
             import traceback
             logger.error(traceback.format_exc())
     
-    def _process_alarm_activated_sync(self, event_data: Dict[str, Any]):
-        """Xử lý alarm_activated event (synchronous)"""
+    def _process_alarm_activated_sync(self, event_data: Dict[str, Any], received_at: Optional[float] = None,
+                                      source: str = 'notify'):
+        """Xử lý alarm_activated event (synchronous, chạy trên worker thread)"""
+        received_at = received_at or time.perf_counter()
+        pipeline_metrics.observe_alarm_latency('dispatch', time.perf_counter() - received_at, source)
         try:
             event_id = str(event_data.get('event_id', ''))
             user_id = str(event_data.get('user_id', ''))
@@ -240,16 +367,16 @@ class EmergencyAlarmHandlerPsycopg:
             logger.info(f"   New state: {event_data.get('new_lifecycle_state')}")
             
             # Trigger alarm
-            import asyncio
-            alarm_result = asyncio.run(audio_alert_service.play_emergency_alarm(
-                user_id=user_id,
-                triggered_by='alarm_activation',
-                duration=10
-            ))
+            alarm_result = self._play_alarm(user_id=user_id, triggered_by='alarm_activation', duration=10)
+            siren_latency = time.perf_counter() - received_at
+            pipeline_metrics.observe_alarm_latency('siren', siren_latency, source)
             
             if alarm_result['success']:
+                self.stats['alarms'] += 1
+                self.stats['last_notify_to_siren_ms'] = round(siren_latency * 1000, 1)
                 logger.info("✅ ✅ ✅ ALARM ACTIVATED SUCCESSFULLY! ✅ ✅ ✅")
                 logger.info(f"   Volume: {alarm_result.get('volume', 1.0) * 100:.0f}%")
+                logger.info(f"   Notify -> siren: {siren_latency * 1000:.0f}ms")
                 
                 # Update event
                 self._update_event_status(
@@ -265,6 +392,7 @@ class EmergencyAlarmHandlerPsycopg:
                     lifecycle_state='CANCELED',
                     notes=f"Alarm activation failed: {alarm_result['message']}"
                 )
+            pipeline_metrics.observe_alarm_latency('db_update', time.perf_counter() - received_at, source)
             
             logger.info("=" * 80)
             
@@ -332,16 +460,23 @@ class EmergencyAlarmHandlerPsycopg:
             self.processed_events.clear()
             self.last_cleanup_time = datetime.now()
     
+    def get_stats(self) -> Dict[str, Any]:
+        return {'running': self.is_running, 'connected': self.connected.is_set(), 'channel': self.channel_name,
+                'processed_events': len(self.processed_events), **self.stats}
+    
     def stop(self):
         """Stop handler"""
         self.is_running = False
+        event_bus.stop_consumer(self.BUS_GROUP)
         
-        if self.listen_conn:
-            try:
-                self.listen_conn.close()
-                logger.info("✅ PostgreSQL connection closed")
-            except:
-                pass
+        # Huỷ listen task trên loop -> finally đóng connection
+        loop = self._loop
+        if loop is not None and loop.is_running() and self._listen_task is not None:
+            loop.call_soon_threadsafe(self._listen_task.cancel)
+            if self._thread and self._thread is not threading.current_thread():
+                self._thread.join(timeout=5.0)
+            logger.info("✅ PostgreSQL connection closed")
+        self.executor.shutdown(wait=False)
         
         logger.info("🛑 Emergency Alarm Handler stopped")
 
@@ -0,0 +1,428 @@
+"""
+Event Bus Service
+Redis Streams event bus giữa detection workers và API / WebSocket / alarm / DB writer
+
+- Producer: XADD vào 1 stream (MAXLEN ~ giới hạn bộ nhớ)
+- Consumer: consumer group + XACK; event chưa ack được đọc lại (replay) khi consumer restart,
+  event của consumer chết được claim lại bằng XAUTOCLAIM
+- Event handler lỗi quá EVENT_BUS_MAX_DELIVERIES lần (delivery count từ XPENDING) -> chuyển sang
+  dead-letter stream (EVENT_BUS_DEAD_LETTER_STREAM) rồi ack, không retry mãi
+Tắt mặc định: khi EVENT_BUS_ENABLED != true publish() chỉ là 1 attribute check.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import orjson
+
+    def _dumps(data: Any) -> str:
+        return orjson.dumps(data, default=str).decode('utf-8')
+
+    _loads = orjson.loads
+except ImportError:
+    import json
+
+    def _dumps(data: Any) -> str:
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+    _loads = json.loads
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Event types dùng chung giữa producers/consumers
+EVENT_FALL = 'fall'
+EVENT_SEIZURE = 'seizure'
+EVENT_SYSTEM_STATUS = 'system_status'
+EVENT_ALARM_ACTIVATED = 'alarm_activated'
+
+
+class RetryableEventError(Exception):
+    """Handler lỗi tạm thời (vd. DB mất kết nối): event giữ pending, không tính vào dead-letter"""
+
+
+class BusEvent:
+    """1 entry đọc từ stream"""
+
+    __slots__ = ('id', 'type', 'timestamp', 'camera_id', 'user_id', 'data')
+
+    def __init__(self, entry_id: str, fields: Dict[str, str]):
+        self.id = entry_id
+        self.type = fields.get('type', '')
+        self.timestamp = float(fields.get('ts', 0) or 0)
+        self.camera_id = fields.get('camera_id') or None
+        self.user_id = fields.get('user_id') or None
+        self.data = _loads(fields['data']) if fields.get('data') else {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'type': self.type,
+            'timestamp': self.timestamp,
+            'camera_id': self.camera_id,
+            'user_id': self.user_id,
+            'data': self.data
+        }
+
+
+class RedisEventBus:
+    """Redis Streams event bus (sync client, consumers chạy trong daemon threads)"""
+
+    def __init__(self, redis_url: Optional[str] = None, stream: Optional[str] = None, enabled: Optional[bool] = None):
+        self.enabled = (os.getenv('EVENT_BUS_ENABLED', 'false').lower() == 'true') if enabled is None else enabled
+        self.redis_url = redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+        self.stream = stream or os.getenv('EVENT_BUS_STREAM', 'healthcare:events')
+        self.maxlen = int(os.getenv('EVENT_BUS_MAXLEN', '100000'))
+        self.dead_letter_stream = os.getenv('EVENT_BUS_DEAD_LETTER_STREAM', f"{self.stream}:dead")
+        self.max_deliveries = int(os.getenv('EVENT_BUS_MAX_DELIVERIES', '5'))
+
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._consumers: Dict[str, Tuple[threading.Thread, threading.Event]] = {}
+        self._consumers_lock = threading.Lock()
+
+        self.stats = {'published': 0, 'publish_errors': 0, 'consumed': 0, 'acked': 0,
+                      'handler_errors': 0, 'claimed': 0, 'dead_lettered': 0}
+
+        if self.enabled and not REDIS_AVAILABLE:
+            logger.warning("⚠️ EVENT_BUS_ENABLED=true nhưng thiếu package redis - event bus disabled")
+            self.enabled = False
+
+    # ------------------------------------------------------------------
+    # Connection
+    # ------------------------------------------------------------------
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = redis.Redis.from_url(self.redis_url, decode_responses=True,
+                                                        socket_keepalive=True, health_check_interval=30)
+        return self._client
+
+    def ping(self) -> bool:
+        if not self.enabled:
+            return False
+        try:
+            return bool(self.client.ping())
+        except Exception as e:
+            logger.error(f"❌ Redis ping failed: {e}")
+            return False
+
+    # ------------------------------------------------------------------
+    # Producer
+    # ------------------------------------------------------------------
+    def _fields(self, event_type: str, data: Dict[str, Any], camera_id: Optional[str],
+                user_id: Optional[str]) -> Dict[str, str]:
+        return {
+            'type': event_type,
+            'ts': f"{time.time():.6f}",
+            'camera_id': str(camera_id or ''),
+            'user_id': str(user_id or ''),
+            'data': _dumps(data)
+        }
+
+    def publish(self, event_type: str, data: Dict[str, Any], camera_id: Optional[str] = None,
+                user_id: Optional[str] = None) -> Optional[str]:
+        """
+        Publish 1 event (best effort - lỗi Redis không được làm hỏng detection loop)
+
+        Returns:
+            Stream entry ID hoặc None
+        """
+        if not self.enabled:
+            return None
+        try:
+            entry_id = self.client.xadd(self.stream, self._fields(event_type, data, camera_id, user_id),
+                                        maxlen=self.maxlen, approximate=True)
+            self.stats['published'] += 1
+            return entry_id
+        except Exception as e:
+            self.stats['publish_errors'] += 1
+            logger.warning(f"⚠️ Event bus publish failed ({event_type}): {e}")
+            return None
+
+    def publish_many(self, events: Iterable[Dict[str, Any]]) -> List[str]:
+        """Publish nhiều event trong 1 round-trip (pipeline). events: dict(type, data, camera_id, user_id)"""
+        if not self.enabled:
+            return []
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            count = 0
+            for event in events:
+                pipe.xadd(self.stream, self._fields(event['type'], event.get('data', {}),
+                                                    event.get('camera_id'), event.get('user_id')),
+                          maxlen=self.maxlen, approximate=True)
+                count += 1
+            entry_ids = pipe.execute()
+            self.stats['published'] += count
+            return entry_ids
+        except Exception as e:
+            self.stats['publish_errors'] += 1
+            logger.warning(f"⚠️ Event bus batch publish failed: {e}")
+            return []
+
+    # ------------------------------------------------------------------
+    # Consumer groups
+    # ------------------------------------------------------------------
+    def ensure_group(self, group: str, start_id: str = '$') -> bool:
+        """
+        Tạo consumer group (MKSTREAM). start_id='0' để group mới đọc lại toàn bộ history
+        """
+        try:
+            self.client.xgroup_create(self.stream, group, id=start_id, mkstream=True)
+            logger.info(f"✅ Event bus group created: {group} @ {start_id}")
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                logger.error(f"❌ Failed to create group {group}: {e}")
+                return False
+        return True
+
+    def read_group(self, group: str, consumer: str, count: int = 64, block_ms: Optional[int] = 1000,
+                   pending: bool = False, start_id: str = '0') -> List[BusEvent]:
+        """
+        Đọc batch event cho consumer
+
+        Args:
+            pending: True = đọc lại event đã giao cho consumer này nhưng chưa ack (replay sau crash)
+            start_id: pending mode - chỉ đọc entry có ID > start_id
+        """
+        response = self.client.xreadgroup(group, consumer, {self.stream: start_id if pending else '>'},
+                                          count=count, block=None if pending else block_ms)
+        events = []
+        for _stream, entries in response or []:
+            for entry_id, fields in entries:
+                if fields:  # Entry đã bị trim khỏi stream -> fields rỗng
+                    events.append(BusEvent(entry_id, fields))
+                else:
+                    self.client.xack(self.stream, group, entry_id)
+        return events
+
+    def ack(self, group: str, *entry_ids: str) -> int:
+        if not entry_ids:
+            return 0
+        acked = self.client.xack(self.stream, group, *entry_ids)
+        self.stats['acked'] += acked
+        return acked
+
+    def claim_stale(self, group: str, consumer: str, min_idle_ms: int = 60000, count: int = 100) -> List[BusEvent]:
+        """Claim event của consumer khác đã treo quá min_idle_ms (consumer chết)"""
+        try:
+            result = self.client.xautoclaim(self.stream, group, consumer, min_idle_time=min_idle_ms,
+                                            start_id='0-0', count=count)
+        except Exception as e:
+            logger.debug(f"XAUTOCLAIM failed: {e}")
+            return []
+        entries = result[1] if len(result) > 1 else []
+        events = [BusEvent(entry_id, fields) for entry_id, fields in entries if fields]
+        self.stats['claimed'] += len(events)
+        return events
+
+    def delivery_count(self, group: str, entry_id: str) -> int:
+        """Số lần entry đã được giao cho group (XPENDING), 0 khi không còn pending / lỗi"""
+        try:
+            pending = self.client.xpending_range(self.stream, group, min=entry_id, max=entry_id, count=1)
+        except Exception as e:
+            logger.debug(f"XPENDING failed: {e}")
+            return 0
+        return int(pending[0]['times_delivered']) if pending else 0
+
+    def _dead_letter(self, group: str, event: BusEvent, deliveries: int, error: Exception) -> bool:
+        """Copy event sang dead-letter stream (kèm group / lỗi cuối / số lần giao)"""
+        try:
+            self.client.xadd(self.dead_letter_stream, {
+                'type': event.type,
+                'ts': f"{event.timestamp:.6f}",
+                'camera_id': str(event.camera_id or ''),
+                'user_id': str(event.user_id or ''),
+                'data': _dumps(event.data),
+                'source_id': event.id,
+                'group': group,
+                'deliveries': str(deliveries),
+                'error': str(error)[:500]
+            }, maxlen=self.maxlen, approximate=True)
+        except Exception as e:
+            logger.error(f"❌ Dead-letter failed for {event.id}: {e} (event stays pending)")
+            return False
+        self.stats['dead_lettered'] += 1
+        logger.error(f"☠️ Event {event.type} {event.id} failed {deliveries}x in [{group}] "
+                     f"-> moved to {self.dead_letter_stream}")
+        return True
+
+    def _dispatch(self, group: str, events: List[BusEvent], handler: Callable[[BusEvent], Any],
+                  event_types: Optional[set]):
+        """
+        Gọi handler, ack event thành công. Event lỗi giữ pending để retry, trừ khi đã giao
+        >= max_deliveries lần -> dead-letter + ack
+        """
+        done = []
+        for event in events:
+            if event_types and event.type not in event_types:
+                done.append(event.id)
+                continue
+            try:
+                handler(event)
+                done.append(event.id)
+                self.stats['consumed'] += 1
+            except Exception as e:
+                self.stats['handler_errors'] += 1
+                logger.error(f"❌ Event bus handler error [{group}] {event.type} {event.id}: {e}")
+                if self.max_deliveries > 0 and not isinstance(e, RetryableEventError):
+                    deliveries = self.delivery_count(group, event.id)
+                    if deliveries >= self.max_deliveries and self._dead_letter(group, event, deliveries, e):
+                        done.append(event.id)
+        self.ack(group, *done)
+
+    def consume(self, group: str, consumer: str, handler: Callable[[BusEvent], Any],
+                event_types: Optional[Iterable[str]] = None, count: int = 64, block_ms: int = 1000,
+                claim_idle_ms: int = 60000, stop_event: Optional[threading.Event] = None):
+        """
+        Blocking consume loop: replay pending -> claim stale -> đọc event mới
+
+        Args:
+            handler: callable(BusEvent); raise exception = không ack (retry lần sau, quá max_deliveries
+                -> dead-letter); raise RetryableEventError = retry không giới hạn
+            event_types: chỉ xử lý các type này (type khác ack luôn)
+        """
+        stop_event = stop_event or threading.Event()
+        types = set(event_types) if event_types else None
+        self.ensure_group(group)
+
+        # 1. Replay event đã nhận nhưng chưa ack trước khi restart
+        backoff = 1.0
+        last_id = '0'
+        while not stop_event.is_set():
+            try:
+                pending = self.read_group(group, consumer, count=count, pending=True, start_id=last_id)
+                if not pending:
+                    break
+                last_id = pending[-1].id  # Event lỗi vẫn pending, không đọc lại trong vòng này
+                self._dispatch(group, pending, handler, types)
+            except Exception as e:
+                logger.error(f"❌ Event bus replay error [{group}]: {e}")
+                stop_event.wait(backoff)
+                break
+
+        last_claim = 0.0
+        while not stop_event.is_set():
+            try:
+                # 2. Claim event của consumer đã chết (định kỳ)
+                if claim_idle_ms and time.time() - last_claim > claim_idle_ms / 1000.0:
+                    last_claim = time.time()
+                    stale = self.claim_stale(group, consumer, claim_idle_ms)
+                    if stale:
+                        logger.info(f"♻️ Claimed {len(stale)} stale events for {group}/{consumer}")
+                        self._dispatch(group, stale, handler, types)
+
+                # 3. Event mới
+                events = self.read_group(group, consumer, count=count, block_ms=block_ms)
+                if events:
+                    self._dispatch(group, events, handler, types)
+                backoff = 1.0
+            except Exception as e:
+                logger.error(f"❌ Event bus consume error [{group}]: {e} (retry in {backoff:.0f}s)")
+                stop_event.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    def start_consumer(self, group: str, handler: Callable[[BusEvent], Any],
+                       event_types: Optional[Iterable[str]] = None, consumer: Optional[str] = None,
+                       **kwargs) -> bool:
+        """Chạy consume() trong daemon thread (mỗi consumer có stop event riêng)"""
+        if not self.enabled:
+            return False
+        consumer = consumer or f"{os.uname().nodename if hasattr(os, 'uname') else 'edge'}-{os.getpid()}"
+        key = f"{group}/{consumer}"
+        with self._consumers_lock:
+            if key in self._consumers and self._consumers[key][0].is_alive():
+                return True
+
+            stop_event = threading.Event()
+            thread = threading.Thread(target=self.consume, args=(group, consumer, handler, event_types),
+                                      kwargs={**kwargs, 'stop_event': stop_event}, daemon=True,
+                                      name=f"EventBus-{group}")
+            self._consumers[key] = (thread, stop_event)
+            thread.start()
+        logger.info(f"🎧 Event bus consumer started: {key} (stream {self.stream})")
+        return True
+
+    def stop_consumer(self, group: str, consumer: Optional[str] = None, timeout: float = 2.0) -> int:
+        """Dừng consumer của 1 group (consumer=None -> mọi consumer của group), các group khác vẫn chạy"""
+        with self._consumers_lock:
+            keys = [key for key in self._consumers
+                    if key.split('/', 1)[0] == group and (consumer is None or key == f"{group}/{consumer}")]
+            stopped = [self._consumers.pop(key) for key in keys]
+        for _thread, stop_event in stopped:
+            stop_event.set()
+        for thread, _stop_event in stopped:
+            if thread is not threading.current_thread():
+                thread.join(timeout=timeout)
+        if stopped:
+            logger.info(f"🛑 Event bus consumer stopped: {', '.join(keys)}")
+        return len(stopped)
+
+    def stop(self):
+        """Dừng toàn bộ consumer (shutdown process)"""
+        with self._consumers_lock:
+            stopped = list(self._consumers.values())
+            self._consumers.clear()
+        for _thread, stop_event in stopped:
+            stop_event.set()
+        for thread, _stop_event in stopped:
+            if thread is not threading.current_thread():
+                thread.join(timeout=2.0)
+
+    # ------------------------------------------------------------------
+    # Replay / inspection
+    # ------------------------------------------------------------------
+    def replay(self, start_id: str = '-', end_id: str = '+', count: Optional[int] = None,
+               event_types: Optional[Iterable[str]] = None) -> List[BusEvent]:
+        """Đọc history (không ảnh hưởng consumer groups)"""
+        types = set(event_types) if event_types else None
+        entries = self.client.xrange(self.stream, min=start_id, max=end_id, count=count)
+        events = [BusEvent(entry_id, fields) for entry_id, fields in entries]
+        return [event for event in events if not types or event.type in types]
+
+    def dead_letters(self, count: Optional[int] = 100) -> List[BusEvent]:
+        """Đọc dead-letter stream (data gốc; source_id / group / error nằm trong fields của stream)"""
+        entries = self.client.xrange(self.dead_letter_stream, count=count)
+        return [BusEvent(entry_id, fields) for entry_id, fields in entries]
+
+    def reset_group(self, group: str, start_id: str = '0'):
+        """Tua consumer group về start_id để replay toàn bộ"""
+        self.client.xgroup_setid(self.stream, group, id=start_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {'enabled': self.enabled, 'stream': self.stream, **self.stats}
+        if not self.enabled:
+            return stats
+        try:
+            stats['length'] = self.client.xlen(self.stream)
+            stats['dead_letter_length'] = self.client.xlen(self.dead_letter_stream)
+            stats['groups'] = {
+                group['name']: {'pending': group['pending'], 'consumers': group['consumers'],
+                                'last_delivered_id': group['last-delivered-id'],
+                                'lag': group.get('lag')}
+                for group in self.client.xinfo_groups(self.stream)
+            }
+        except Exception as e:
+            stats['error'] = str(e)
+        return stats
+
+
+# Global instance
+event_bus = RedisEventBus()
+
+
+def get_event_bus() -> RedisEventBus:
+    """Get global event bus instance"""
+    return event_bus
@@ -0,0 +1,264 @@
+"""
+Frame Catalog Service
+Catalog SQLite (WAL) cho artifact do SimpleFrameSaver ghi (keyframe / detection / alert):
+1 row / file thay cho sidecar `_metadata.json`, file nằm trong thư mục shard theo ngày
+(<category>/YYYY/MM/DD/...), retention không cần walk thư mục.
+
+- add(category, rel_path, size, metadata): insert row, counter (count / bytes) theo category nằm trong
+  bảng category_totals do trigger cập nhật -> đúng cho mọi instance / process dùng chung catalog.db
+- Quota theo category (max_files / max_bytes): vượt quota -> range delete theo id (index category, id)
+  xuống còn CATALOG_EVICT_RATIO quota, cùng transaction (BEGIN IMMEDIATE) với INSERT
+- purge_older_than(cutoff): range delete theo created_at (index created_at), tự chạy mỗi purge_interval
+- Xóa file sau khi commit, thư mục ngày rỗng được rmdir luôn
+Chỉ dùng sqlite3 của stdlib.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_category_id ON artifacts (category, id);
+CREATE INDEX IF NOT EXISTS idx_artifacts_created_at ON artifacts (created_at);
+CREATE TABLE IF NOT EXISTS category_totals (
+    category TEXT PRIMARY KEY,
+    files INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TRIGGER IF NOT EXISTS trg_artifacts_insert AFTER INSERT ON artifacts BEGIN
+    INSERT INTO category_totals (category, files, bytes) VALUES (NEW.category, 1, NEW.size)
+    ON CONFLICT (category) DO UPDATE SET files = files + 1, bytes = bytes + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_artifacts_delete AFTER DELETE ON artifacts BEGIN
+    UPDATE category_totals SET files = files - 1, bytes = bytes - OLD.size WHERE category = OLD.category;
+END;
+"""
+
+# Catalog tạo trước khi có category_totals: seed 1 lần từ artifacts (idempotent, trong BEGIN IMMEDIATE)
+SEED_TOTALS = """
+INSERT INTO category_totals (category, files, bytes)
+SELECT category, COUNT(*), COALESCE(SUM(size), 0) FROM artifacts
+WHERE category NOT IN (SELECT category FROM category_totals)
+GROUP BY category
+"""
+
+# Evict xuống 90% quota (hysteresis) - tránh 1 range delete cho mỗi file mới khi đang đầy
+CATALOG_EVICT_RATIO = 0.9
+
+
+def _category_limit(name: str, category: str, default: float) -> float:
+    """Env override theo category (vd. FRAME_SAVER_MAX_FILES_ALERTS) rồi mới tới giá trị chung"""
+    value = os.getenv(f"{name}_{category.upper()}", os.getenv(name))
+    return float(value) if value not in (None, '') else default
+
+
+class FrameCatalog:
+    """Catalog artifact đã lưu: 1 connection / instance (lock), quota + retention bằng indexed range delete"""
+
+    def __init__(self, base_path: str, categories: List[str], max_files: int = 1000,
+                 max_bytes: int = 0, retention_days: float = 7.0, purge_interval: float = 300.0):
+        """
+        Args:
+            base_path: Thư mục gốc (catalog.db nằm ở đây, path trong row là relative)
+            categories: Các category được quản lý quota
+            max_files: Số file tối đa / category mặc định (0 = không giới hạn)
+            max_bytes: Dung lượng tối đa / category mặc định (0 = không giới hạn)
+            retention_days: Xóa artifact cũ hơn N ngày (0 = giữ mãi)
+            purge_interval: Chu kỳ (giây) tự chạy retention theo thời gian trong add()
+        """
+        self.base_path = base_path
+        self.retention_days = retention_days
+        self.purge_interval = purge_interval
+        self.quotas: Dict[str, Tuple[int, int]] = {
+            category: (int(_category_limit('FRAME_SAVER_MAX_FILES', category, max_files)),
+                       int(_category_limit('FRAME_SAVER_MAX_MB', category, max_bytes / (1024 * 1024)) * 1024 * 1024))
+            for category in categories
+        }
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self.stats = {'added': 0, 'evicted': 0, 'expired': 0, 'evicted_bytes': 0, 'last_purge_at': None}
+
+        self._open()
+
+    def _open(self):
+        os.makedirs(self.base_path, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.base_path, 'catalog.db'), check_same_thread=False,
+                                     isolation_level=None, timeout=10.0)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        with self._transaction():
+            self._conn.execute(SEED_TOTALS)
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE: giữ write lock của catalog.db (mọi connection / process) tới COMMIT"""
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+            self._conn.execute('COMMIT')
+        except Exception:
+            if self._conn.in_transaction:
+                self._conn.execute('ROLLBACK')
+            raise
+
+    def _totals(self, category: str) -> Tuple[int, int]:
+        row = self._conn.execute("SELECT files, bytes FROM category_totals WHERE category = ?",
+                                 (category,)).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    # ------------------------------------------------------------------
+    # Write side
+    # ------------------------------------------------------------------
+    def add(self, category: str, rel_path: str, size: int, metadata: Dict[str, Any],
+            created_at: Optional[float] = None) -> int:
+        """Insert 1 artifact rồi enforce quota của category (và retention nếu tới chu kỳ)"""
+        created_at = time.time() if created_at is None else created_at
+        data = json.dumps(metadata, default=str, ensure_ascii=False)
+        with self._lock, self._transaction():
+            cursor = self._conn.execute(
+                "INSERT INTO artifacts (category, created_at, path, size, metadata) VALUES (?, ?, ?, ?, ?)",
+                (category, created_at, rel_path, size, data)
+            )
+            removed = self._enforce_quota(category)
+        self.stats['added'] += 1
+        self.stats['evicted'] += len(removed)
+        self.stats['evicted_bytes'] += sum(item_size for _, item_size in removed)
+        self._remove_files(removed)
+
+        if self.retention_days and created_at - self._last_purge >= self.purge_interval:
+            self.purge_older_than(created_at - self.retention_days * 86400)
+        return cursor.lastrowid
+
+    def _enforce_quota(self, category: str) -> List[Tuple[str, int]]:
+        """Gọi trong _transaction: counter đọc từ DB nên tính cả artifact do instance khác ghi"""
+        max_files, max_bytes = self.quotas.get(category, (0, 0))
+        count, size = self._totals(category)
+        over_files = max_files and count > max_files
+        over_bytes = max_bytes and size > max_bytes
+        if not (over_files or over_bytes):
+            return []
+
+        cutoff_id = None
+        if over_files:
+            excess = count - int(max_files * CATALOG_EVICT_RATIO)
+            row = self._conn.execute(
+                "SELECT id FROM artifacts WHERE category = ? ORDER BY id LIMIT 1 OFFSET ?",
+                (category, excess - 1)
+            ).fetchone()
+            cutoff_id = row[0] if row else None
+        if over_bytes:
+            # Đi từ file cũ nhất tới khi giải phóng đủ bytes (chỉ đọc id, size qua index)
+            to_free = size - int(max_bytes * CATALOG_EVICT_RATIO)
+            freed = 0
+            for item_id, item_size in self._conn.execute(
+                    "SELECT id, size FROM artifacts WHERE category = ? ORDER BY id", (category,)):
+                freed += item_size
+                if freed >= to_free:
+                    cutoff_id = max(cutoff_id or 0, item_id)
+                    break
+        if cutoff_id is None:
+            return []
+        return self._delete_where("category = ? AND id <= ?", (category, cutoff_id))
+
+    def purge_older_than(self, cutoff: float) -> int:
+        """Retention theo thời gian: 1 range delete trên index created_at. Returns số artifact đã xóa"""
+        with self._lock:
+            with self._transaction():
+                removed = self._delete_where("created_at < ?", (cutoff,))
+            self._last_purge = time.time()
+        self.stats['expired'] += len(removed)
+        self.stats['last_purge_at'] = self._last_purge
+        self._remove_files(removed)
+        return len(removed)
+
+    def _delete_where(self, where: str, params: tuple) -> List[Tuple[str, int]]:
+        """Gọi trong _transaction: SELECT + DELETE cùng predicate (trigger trừ category_totals)"""
+        rows = self._conn.execute(f"SELECT path, size FROM artifacts WHERE {where}", params).fetchall()
+        if rows:
+            self._conn.execute(f"DELETE FROM artifacts WHERE {where}", params)
+        return rows
+
+    def _remove_files(self, removed: List[Tuple[str, int]]):
+        """Xóa file ngoài lock; rmdir thư mục ngày / tháng / năm khi đã rỗng"""
+        directories = set()
+        for rel_path, _ in removed:
+            full_path = os.path.join(self.base_path, rel_path)
+            try:
+                os.remove(full_path)
+            except OSError:
+                pass
+            directories.add(os.path.dirname(full_path))
+        for directory in sorted(directories, reverse=True):
+            # YYYY/MM/DD -> tối đa 3 cấp, dừng ở thư mục chưa rỗng
+            for _ in range(3):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+                directory = os.path.dirname(directory)
+
+    # ------------------------------------------------------------------
+    # Read side
+    # ------------------------------------------------------------------
+    def get_metadata(self, rel_path: str) -> Optional[Dict[str, Any]]:
+        """Metadata của 1 artifact (thay cho việc đọc sidecar _metadata.json)"""
+        with self._lock:
+            row = self._conn.execute("SELECT metadata FROM artifacts WHERE path = ?", (rel_path,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def query(self, category: str, since: Optional[float] = None, until: Optional[float] = None,
+              limit: int = 100) -> List[Dict[str, Any]]:
+        """Artifact mới nhất của category trong khoảng [since, until)"""
+        sql = "SELECT id, created_at, path, size, metadata FROM artifacts WHERE category = ?"
+        params: list = [category]
+        if since is not None:
+            sql += " AND created_at >= ?"
+            params.append(since)
+        if until is not None:
+            sql += " AND created_at < ?"
+            params.append(until)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{'id': item_id, 'created_at': created_at, 'path': path, 'size': size,
+                 'metadata': json.loads(metadata) if metadata else {}}
+                for item_id, created_at, path, size, metadata in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            totals = {category: (0, 0) for category in self.quotas}
+            totals.update((category, (count, size)) for category, count, size in
+                          self._conn.execute("SELECT category, files, bytes FROM category_totals"))
+        return {
+            'categories': {category: {'files': count, 'bytes': size,
+                                      'max_files': self.quotas.get(category, (0, 0))[0],
+                                      'max_bytes': self.quotas.get(category, (0, 0))[1]}
+                           for category, (count, size) in totals.items()},
+            'retention_days': self.retention_days,
+            **self.stats
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
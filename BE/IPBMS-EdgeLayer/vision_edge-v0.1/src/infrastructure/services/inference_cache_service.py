@@ -0,0 +1,292 @@
+"""
+Inference Cache Service
+Cache trên disk (SQLite WAL) cho output per-frame của YOLO detector / YOLOv8-Pose khi replay video test,
+để chạy lại test_video_runner.py / test_single_video.py sau khi sửa logic fall / seizure không phải
+chạy lại model cho frame đã thấy.
+
+Key = (video_key, frame_index, model_key)
+- video_key: sha1 nội dung file video + variant (vd. resolution camera resize), sha1 memo theo (path, size, mtime)
+- model_key: sha1(model name, sha1 file weights, params ảnh hưởng output như conf / healthcare_mode)
+- Weights đổi -> model_key mới; register_model() xóa luôn result của weights cũ cùng model name
+- Frame hiện tại do caller set: `with inference_cache.frame(key)` (AdvancedHealthcarePipeline, key từ
+  camera.get_replay_key()); camera live không có replay key -> không cache
+- cached(model_key, compute): hit -> trả kết quả đã lưu, miss -> compute() rồi lưu (ghi theo batch)
+Bật bằng INFERENCE_CACHE_ENABLED=true, chỉ dùng sqlite3 + pickle của stdlib (cache local, tin cậy).
+"""
+
+import os
+import json
+import time
+import atexit
+import pickle
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha1 TEXT NOT NULL,
+    PRIMARY KEY (path, size, mtime_ns)
+);
+CREATE TABLE IF NOT EXISTS models (
+    model_key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    weights_sha1 TEXT NOT NULL,
+    params TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    video_key TEXT NOT NULL,
+    model_key TEXT NOT NULL,
+    frame_index INTEGER NOT NULL,
+    payload BLOB NOT NULL,
+    PRIMARY KEY (video_key, model_key, frame_index)
+) WITHOUT ROWID;
+"""
+
+HASH_CHUNK = 1024 * 1024
+
+# (video_key, frame_index)
+FrameKey = Tuple[str, int]
+
+
+def _file_sha1(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class InferenceCache:
+    """Cache kết quả model theo frame của video replay: 1 connection dùng chung (lock), ghi batch"""
+
+    def __init__(self, cache_dir: Optional[str] = None, enabled: Optional[bool] = None):
+        self.enabled = (os.getenv('INFERENCE_CACHE_ENABLED', 'false').lower() == 'true') if enabled is None else enabled
+        self.cache_dir = cache_dir or os.getenv('INFERENCE_CACHE_DIR', os.path.join('data', 'inference_cache'))
+        self.batch_size = int(os.getenv('INFERENCE_CACHE_BATCH', '200'))
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pending: Dict[Tuple[str, str, int], bytes] = {}
+        self._models: Dict[str, str] = {}  # model_key -> model name (stats)
+        self._weights_digests: Dict[Tuple[str, int, int], str] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.invalidated = 0
+
+        if self.enabled:
+            try:
+                self._open()
+                atexit.register(self.flush)
+            except Exception as e:
+                logger.error(f"❌ Inference cache init failed ({self.cache_dir}): {e} - cache disabled")
+                self.enabled = False
+
+    def _open(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.cache_dir, 'inference_cache.db'), check_same_thread=False,
+                                     isolation_level=None, timeout=30.0)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    # ------------------------------------------------------------------
+    # Keys
+    # ------------------------------------------------------------------
+    def video_key(self, path: str, variant: str = '') -> Optional[str]:
+        """sha1 nội dung video (+ variant), None khi cache tắt / không đọc được file"""
+        if not self.enabled:
+            return None
+        try:
+            path = os.path.abspath(path)
+            st = os.stat(path)
+            with self._lock:
+                row = self._conn.execute("SELECT sha1 FROM videos WHERE path = ? AND size = ? AND mtime_ns = ?",
+                                         (path, st.st_size, st.st_mtime_ns)).fetchone()
+            if row:
+                sha1 = row[0]
+            else:
+                sha1 = _file_sha1(path)
+                with self._lock:
+                    self._conn.execute("INSERT OR REPLACE INTO videos (path, size, mtime_ns, sha1) VALUES (?, ?, ?, ?)",
+                                       (path, st.st_size, st.st_mtime_ns, sha1))
+            return f"{sha1}:{variant}" if variant else sha1
+        except Exception as e:
+            logger.warning(f"⚠️ Inference cache: cannot hash video {path}: {e}")
+            return None
+
+    def register_model(self, model: str, weights_path: Optional[str], params: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        model_key cho (model, weights, params). Result của weights cũ (cùng model name) bị xóa.
+
+        Returns:
+            model_key, hoặc None khi cache tắt / không tìm thấy file weights (không cache model này)
+        """
+        if not self.enabled:
+            return None
+        if not weights_path or not os.path.isfile(weights_path):
+            logger.warning(f"⚠️ Inference cache: weights of {model} not found ({weights_path}) - not cached")
+            return None
+        try:
+            st = os.stat(weights_path)
+            stat_key = (os.path.abspath(weights_path), st.st_size, st.st_mtime_ns)
+            weights_sha1 = self._weights_digests.get(stat_key)
+            if weights_sha1 is None:
+                weights_sha1 = self._weights_digests[stat_key] = _file_sha1(weights_path)
+
+            params_json = json.dumps(params or {}, sort_keys=True, default=str)
+            model_key = hashlib.sha1(f"{model}|{weights_sha1}|{params_json}".encode()).hexdigest()[:20]
+
+            with self._lock:
+                self._conn.execute('BEGIN')
+                try:
+                    stale = [row[0] for row in self._conn.execute(
+                        "SELECT model_key FROM models WHERE model = ? AND weights_sha1 != ?", (model, weights_sha1))]
+                    for stale_key in stale:
+                        self.invalidated += self._conn.execute(
+                            "DELETE FROM results WHERE model_key = ?", (stale_key,)).rowcount
+                        self._conn.execute("DELETE FROM models WHERE model_key = ?", (stale_key,))
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO models (model_key, model, weights_sha1, params, created_at) "
+                        "VALUES (?, ?, ?, ?, ?)", (model_key, model, weights_sha1, params_json, time.time()))
+                    self._conn.execute('COMMIT')
+                except Exception:
+                    if self._conn.in_transaction:
+                        self._conn.execute('ROLLBACK')
+                    raise
+            if stale:
+                logger.info(f"🗑️ Inference cache: weights of {model} changed, dropped {len(stale)} stale model key(s)")
+            self._models[model_key] = model
+            return model_key
+        except Exception as e:
+            logger.warning(f"⚠️ Inference cache: cannot register {model}: {e}")
+            return None
+
+    # ------------------------------------------------------------------
+    # Frame scope
+    # ------------------------------------------------------------------
+    @contextmanager
+    def frame(self, key: Optional[FrameKey]):
+        """Set frame hiện tại (thread-local) cho các lần gọi cached() bên trong"""
+        previous = getattr(self._local, 'key', None)
+        self._local.key = key if self.enabled else None
+        try:
+            yield
+        finally:
+            self._local.key = previous
+
+    def current_frame(self) -> Optional[FrameKey]:
+        return getattr(self._local, 'key', None)
+
+    # ------------------------------------------------------------------
+    # Lookup / store
+    # ------------------------------------------------------------------
+    def cached(self, model_key: Optional[str], compute: Callable[[], Any]) -> Any:
+        """Kết quả của model cho frame hiện tại: đọc cache, miss thì compute() và lưu lại"""
+        key = self.current_frame()
+        if model_key is None or key is None:
+            return compute()
+
+        row_key = (key[0], model_key, int(key[1]))
+        counters = self.stats.setdefault(self._models.get(model_key, model_key), {'hits': 0, 'misses': 0})
+        payload = self._lookup(row_key)
+        if payload is not None:
+            counters['hits'] += 1
+            return pickle.loads(payload)
+
+        counters['misses'] += 1
+        value = compute()
+        with self._lock:
+            self._pending[row_key] = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+        return value
+
+    def _lookup(self, row_key: Tuple[str, str, int]) -> Optional[bytes]:
+        with self._lock:
+            payload = self._pending.get(row_key)
+            if payload is None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT payload FROM results WHERE video_key = ? AND model_key = ? AND frame_index = ?",
+                        row_key).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Inference cache read error: {e}")
+                    row = None
+                payload = row[0] if row else None
+        return payload
+
+    def _flush_locked(self):
+        if not self._pending or self._conn is None:
+            return
+        try:
+            self._conn.execute('BEGIN')
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (video_key, model_key, frame_index, payload) VALUES (?, ?, ?, ?)",
+                [(video_key, model_key, frame_index, payload)
+                 for (video_key, model_key, frame_index), payload in self._pending.items()])
+            self._conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            if self._conn.in_transaction:
+                self._conn.execute('ROLLBACK')
+            logger.warning(f"⚠️ Inference cache write failed ({len(self._pending)} rows dropped): {e}")
+        self._pending.clear()
+
+    def flush(self):
+        """Ghi các result đang buffer (gọi khi hết video / exit)"""
+        with self._lock:
+            self._flush_locked()
+
+    # ------------------------------------------------------------------
+    # Stats / maintenance
+    # ------------------------------------------------------------------
+    def reset_stats(self):
+        self.stats = {}
+
+    def get_stats(self) -> Dict[str, Any]:
+        hits = sum(c['hits'] for c in self.stats.values())
+        misses = sum(c['misses'] for c in self.stats.values())
+        return {
+            'enabled': self.enabled,
+            'cache_dir': self.cache_dir,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'models': {model: {**counters, 'hit_rate': counters['hits'] / max(counters['hits'] + counters['misses'], 1)}
+                       for model, counters in self.stats.items()},
+            'invalidated': self.invalidated
+        }
+
+    def clear(self):
+        """Xóa toàn bộ result đã cache (giữ videos / models để vẫn invalidate được khi weights đổi)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._pending.clear()
+            self._conn.execute("DELETE FROM results")
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        self.enabled = False
+
+
+# Global instance
+inference_cache = InferenceCache()
+
+
+def get_inference_cache() -> InferenceCache:
+    """Get inference cache service"""
+    return inference_cache
@@ -0,0 +1,289 @@
+"""
+Local Spool Service
+Write-ahead spool tại edge (SQLite WAL + thư mục blob) cho event / snapshot khi PostgreSQL hoặc MinIO
+không truy cập được. Replayer nền drain lại theo đúng thứ tự ghi khi kết nối phục hồi.
+
+- enqueue(kind, payload, blob): ghi 1 row (+ blob JPEG) rồi return ngay, latency giới hạn bởi disk
+- has_backlog(): caller đi thẳng vào spool khi còn backlog để giữ thứ tự (snapshot trước event)
+- register_handler(kind, fn): fn(payload, blob) -> True khi đã ghi upstream;
+  raise UpstreamUnavailable / return False = upstream vẫn down -> dừng, backoff rồi thử lại
+- Row lỗi dữ liệu (exception khác) bị đánh dấu 'dead' sau SPOOL_MAX_ATTEMPTS để không chặn hàng đợi
+Bật mặc định (SPOOL_ENABLED=false để tắt), chỉ dùng sqlite3 của stdlib.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from datetime import datetime, date
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SPOOL_EVENT = 'event'
+SPOOL_SNAPSHOT = 'snapshot'
+SPOOL_CLIP = 'clip'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    blob_path TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_spool_status_id ON spool (status, id);
+"""
+
+
+class UpstreamUnavailable(Exception):
+    """PostgreSQL / MinIO không truy cập được - item nên được spool / giữ lại để replay"""
+
+
+def _json_default(value: Any):
+    """datetime / numpy -> JSON"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+class LocalSpool:
+    """SQLite WAL spool: 1 connection dùng chung (lock), blob ghi atomic (tmp + os.replace)"""
+
+    def __init__(self, spool_dir: Optional[str] = None, enabled: Optional[bool] = None):
+        self.enabled = (os.getenv('SPOOL_ENABLED', 'true').lower() == 'true') if enabled is None else enabled
+        self.spool_dir = spool_dir or os.getenv('SPOOL_DIR', os.path.join('data', 'spool'))
+        self.blob_dir = os.path.join(self.spool_dir, 'blobs')
+        self.max_items = int(os.getenv('SPOOL_MAX_ITEMS', '50000'))
+        self.max_attempts = int(os.getenv('SPOOL_MAX_ATTEMPTS', '5'))
+        self.batch_size = int(os.getenv('SPOOL_BATCH_SIZE', '100'))
+        self.replay_interval = float(os.getenv('SPOOL_REPLAY_INTERVAL', '5'))
+        self.max_backoff = float(os.getenv('SPOOL_MAX_BACKOFF', '60'))
+        self.synchronous = os.getenv('SPOOL_SYNCHRONOUS', 'NORMAL').upper()  # FULL = an toàn khi mất điện
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._handlers: Dict[str, Callable[[Dict[str, Any], Optional[bytes]], bool]] = {}
+        self._pending = 0
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._replayer: Optional[threading.Thread] = None
+        self.stats = {'enqueued': 0, 'replayed': 0, 'dead': 0, 'rejected': 0, 'replay_failures': 0,
+                      'last_replay_at': None}
+
+        if self.enabled:
+            try:
+                self._open()
+            except Exception as e:
+                logger.error(f"❌ Local spool init failed ({self.spool_dir}): {e} - spool disabled")
+                self.enabled = False
+
+    def _open(self):
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.spool_dir, 'spool.db'), check_same_thread=False,
+                                     isolation_level=None, timeout=10.0)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        self._conn.executescript(SCHEMA)
+        self._pending = self._conn.execute("SELECT COUNT(*) FROM spool WHERE status = 'pending'").fetchone()[0]
+        if self._pending:
+            logger.warning(f"📦 Local spool has {self._pending} pending items from previous run")
+
+    # ------------------------------------------------------------------
+    # Write side
+    # ------------------------------------------------------------------
+    def has_backlog(self) -> bool:
+        return self.enabled and self._pending > 0
+
+    def pending_count(self) -> int:
+        return self._pending
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], blob: Optional[bytes] = None,
+                blob_ext: str = 'jpg') -> Optional[int]:
+        """Ghi item vào spool. Returns spool id hoặc None (spool tắt / đầy / lỗi disk)"""
+        if not self.enabled:
+            return None
+        if self._pending >= self.max_items:
+            self.stats['rejected'] += 1
+            logger.error(f"❌ Local spool full ({self._pending} items) - dropping {kind}")
+            return None
+
+        blob_path = None
+        try:
+            if blob is not None:
+                blob_path = os.path.join(self.blob_dir, f"{uuid.uuid4().hex}.{blob_ext}")
+                tmp_path = blob_path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(blob)
+                    if self.synchronous == 'FULL':
+                        f.flush()
+                        os.fsync(f.fileno())
+                os.replace(tmp_path, blob_path)
+
+            data = json.dumps(payload, default=_json_default, ensure_ascii=False)
+            with self._lock:
+                cursor = self._conn.execute(
+                    "INSERT INTO spool (kind, payload, blob_path, created_at) VALUES (?, ?, ?, ?)",
+                    (kind, data, blob_path, time.time())
+                )
+                self._pending += 1
+            self.stats['enqueued'] += 1
+            return cursor.lastrowid
+        except Exception as e:
+            logger.error(f"❌ Local spool enqueue failed for {kind}: {e}")
+            if blob_path and os.path.exists(blob_path):
+                os.remove(blob_path)
+            return None
+
+    # ------------------------------------------------------------------
+    # Replay side
+    # ------------------------------------------------------------------
+    def register_handler(self, kind: str, handler: Callable[[Dict[str, Any], Optional[bytes]], bool]):
+        """Đăng ký handler replay cho 1 kind và start replayer nếu chưa chạy"""
+        self._handlers[kind] = handler
+        if self.enabled:
+            self.start_replayer()
+
+    def notify(self):
+        """Đánh thức replayer ngay (vd. khi biết kết nối upstream vừa phục hồi)"""
+        self._wakeup.set()
+
+    def _fetch_batch(self) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, kind, payload, blob_path, attempts FROM spool WHERE status = 'pending' "
+                "ORDER BY id LIMIT ?", (self.batch_size,)
+            ).fetchall()
+
+    def _complete(self, done_ids: List[int], blob_paths: List[str]):
+        """Xóa batch đã replay trong 1 transaction rồi mới xóa blob"""
+        if not done_ids:
+            return
+        with self._lock:
+            self._conn.execute('BEGIN')
+            self._conn.executemany("DELETE FROM spool WHERE id = ?", [(item_id,) for item_id in done_ids])
+            self._conn.execute('COMMIT')
+            self._pending = max(0, self._pending - len(done_ids))
+        self.stats['replayed'] += len(done_ids)
+        self.stats['last_replay_at'] = datetime.now().isoformat()
+        for blob_path in blob_paths:
+            try:
+                os.remove(blob_path)
+            except OSError:
+                pass
+
+    def _mark_failed(self, item_id: int, attempts: int, error: Exception) -> bool:
+        """Tăng attempts; quá max_attempts -> 'dead'. Returns True nếu row đã dead"""
+        dead = attempts + 1 >= self.max_attempts
+        with self._lock:
+            self._conn.execute("UPDATE spool SET attempts = ?, last_error = ?, status = ? WHERE id = ?",
+                               (attempts + 1, str(error)[:500], 'dead' if dead else 'pending', item_id))
+            if dead:
+                self._pending = max(0, self._pending - 1)
+        if dead:
+            self.stats['dead'] += 1
+            logger.error(f"💀 Spool item {item_id} moved to dead after {attempts + 1} attempts: {error}")
+        return dead
+
+    def drain_once(self) -> bool:
+        """
+        Replay 1 batch theo thứ tự id. Dừng ở item đầu tiên upstream chưa nhận (head-of-line)
+        để không ghi event trước snapshot của nó.
+
+        Returns:
+            True nếu batch không bị chặn (có thể còn batch tiếp), False khi upstream down / thiếu handler
+        """
+        rows = self._fetch_batch()
+        done_ids, blob_paths = [], []
+        blocked = False
+        replayed_before = self.stats['replayed']
+
+        for item_id, kind, payload, blob_path, attempts in rows:
+            handler = self._handlers.get(kind)
+            if handler is None:
+                blocked = True
+                break
+            try:
+                blob = None
+                if blob_path:
+                    with open(blob_path, 'rb') as f:
+                        blob = f.read()
+                if not handler(json.loads(payload), blob):
+                    blocked = True
+                    break
+                done_ids.append(item_id)
+                if blob_path:
+                    blob_paths.append(blob_path)
+            except UpstreamUnavailable as e:
+                logger.warning(f"📦 Spool replay paused at item {item_id}: {e}")
+                blocked = True
+                break
+            except Exception as e:
+                # Xóa batch trước đó trước khi ghi attempts để giữ đúng thứ tự
+                self._complete(done_ids, blob_paths)
+                done_ids, blob_paths = [], []
+                if not self._mark_failed(item_id, attempts, e):
+                    blocked = True
+                    break
+
+        self._complete(done_ids, blob_paths)
+        if self.stats['replayed'] > replayed_before:
+            logger.info(f"📦 Spool replayed {self.stats['replayed'] - replayed_before} items ({self._pending} pending)")
+        return bool(rows) and not blocked
+
+    def _replay_loop(self):
+        backoff = self.replay_interval
+        while not self._stop_event.is_set():
+            if self._pending:
+                try:
+                    while self.drain_once() and not self._stop_event.is_set():
+                        pass
+                except Exception as e:
+                    logger.error(f"❌ Spool replay error: {e}")
+                if self._pending:
+                    self.stats['replay_failures'] += 1
+                    backoff = min(self.max_backoff, backoff * 2)
+                else:
+                    backoff = self.replay_interval
+            self._wakeup.wait(backoff if self._pending else self.replay_interval)
+            self._wakeup.clear()
+
+    def start_replayer(self):
+        if self._replayer and self._replayer.is_alive():
+            return
+        self._stop_event.clear()
+        self._replayer = threading.Thread(target=self._replay_loop, name="LocalSpoolReplayer", daemon=True)
+        self._replayer.start()
+        logger.info(f"📦 Local spool replayer started ({self.spool_dir})")
+
+    def stop(self):
+        self._stop_event.set()
+        self._wakeup.set()
+        if self._replayer:
+            self._replayer.join(timeout=5.0)
+            self._replayer = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'enabled': self.enabled, 'spool_dir': self.spool_dir, 'pending': self._pending,
+                'handlers': sorted(self._handlers), **self.stats}
+
+
+# Global instance
+local_spool = LocalSpool()
+
+
+def get_local_spool() -> LocalSpool:
+    """Get local spool service"""
+    return local_spool
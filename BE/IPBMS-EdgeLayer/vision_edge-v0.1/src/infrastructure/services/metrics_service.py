@@ -0,0 +1,391 @@
+"""
+Pipeline Metrics Service
+Lightweight tracing + Prometheus text endpoint cho edge pipeline
+(stage spans, model latency histograms, queue depths, camera decode FPS)
+
+Tắt mặc định: khi METRICS_ENABLED != true mọi call chỉ là 1 attribute check.
+"""
+
+import os
+import time
+import bisect
+import logging
+import threading
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bucket (seconds) cho latency histograms - từ 1ms tới 10s
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NULL_SPAN = nullcontext()
+
+
+class _Histogram:
+    """Cumulative histogram theo format Prometheus"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # +Inf bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Span:
+    """Context manager đo thời gian 1 stage"""
+
+    __slots__ = ('_metrics', '_name', '_labels', '_start')
+
+    def __init__(self, metrics, name: str, labels: Tuple[Tuple[str, str], ...]):
+        self._metrics = metrics
+        self._name = name
+        self._labels = labels
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._metrics._observe(self._name, self._labels, time.perf_counter() - self._start)
+        return False
+
+
+class PipelineMetrics:
+    """Registry metrics in-process + HTTP exporter (Prometheus text format 0.0.4)"""
+
+    def __init__(self):
+        self.enabled = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+        self.host = os.getenv('METRICS_HOST', '127.0.0.1')
+        self.port = int(os.getenv('METRICS_PORT', '9108'))
+
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Tuple], _Histogram] = {}
+        self._gauges: Dict[Tuple[str, Tuple], float] = {}
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._help = {
+            'pipeline_stage_duration_seconds': ('histogram', 'Time spent in each pipeline stage'),
+            'model_inference_duration_seconds': ('histogram', 'Model inference latency'),
+            'pipeline_queue_depth': ('gauge', 'Current depth of pipeline queues and buffers'),
+            'camera_decode_fps': ('gauge', 'Frames decoded per second by camera stream'),
+            'camera_frames_total': ('counter', 'Frames decoded by camera stream'),
+            'camera_read_failures_total': ('counter', 'Failed frame reads by camera stream'),
+            'event_hop_latency_seconds': ('histogram', 'Latency of each hop from frame capture to persisted event'),
+            'event_end_to_end_latency_seconds': ('histogram', 'Latency from frame capture to persisted event'),
+            'alarm_latency_seconds': ('histogram', 'Latency from alarm notification received to dispatch / siren / DB update'),
+            'camera_connect_duration_seconds': ('histogram', 'Duration of camera connect attempts'),
+            'camera_connect_failures_total': ('counter', 'Failed camera connect attempts'),
+            'camera_time_to_first_frame_seconds': ('gauge', 'Time from camera bootstrap to first analyzed frame'),
+            'camera_restarts_total': ('counter', 'Capture restarts by camera supervisor'),
+            'clip_buffer_bytes': ('gauge', 'Memory used by the encoded packet ring buffer per camera'),
+            'camera_recovery_seconds': ('histogram', 'Time without frames from restart to reconnected capture'),
+        }
+
+        # Decode FPS window per camera: camera_id -> [window_start, frames]
+        self._fps_windows: Dict[str, list] = {}
+
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._server_thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------ #
+    # Recording API (hot path)
+    # ------------------------------------------------------------------ #
+
+    def span(self, stage: str, camera_id: Optional[str] = None):
+        """
+        Timing span cho 1 stage: `with pipeline_metrics.span('yolo'): ...`
+
+        Args:
+            stage: Tên stage (motion, keyframe, yolo, pose, fall, seizure, persistence, ...)
+            camera_id: Optional camera label
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        labels = (('stage', stage), ('camera', str(camera_id))) if camera_id else (('stage', stage),)
+        return _Span(self, 'pipeline_stage_duration_seconds', labels)
+
+    def observe_model_latency(self, model: str, seconds: float):
+        """Ghi latency 1 lần inference của model"""
+        if not self.enabled:
+            return
+        self._observe('model_inference_duration_seconds', (('model', model),), seconds)
+
+    def observe_event_latency(self, trace: 'LatencyTrace'):
+        """Ghi latency từng hop của 1 event (fall/seizure) vào histogram"""
+        if not self.enabled or trace is None:
+            return
+        event_label = (('event_type', trace.event_type),)
+        previous = trace.stamps[0][1]
+        for hop, timestamp in trace.stamps[1:]:
+            self._observe('event_hop_latency_seconds', event_label + (('hop', hop),), max(0.0, timestamp - previous))
+            previous = timestamp
+        self._observe('event_end_to_end_latency_seconds', event_label, trace.total_seconds())
+
+    def observe_alarm_latency(self, stage: str, seconds: float, source: str = 'notify'):
+        """Latency alarm: notification nhận được -> stage (dispatch, siren, db_update)"""
+        if not self.enabled:
+            return
+        self._observe('alarm_latency_seconds', (('source', source), ('stage', stage)), max(0.0, seconds))
+
+    def set_queue_depth(self, queue_name: str, depth: int, camera_id: Optional[str] = None):
+        """Cập nhật độ sâu queue/buffer"""
+        if not self.enabled:
+            return
+        labels = (('queue', queue_name), ('camera', str(camera_id))) if camera_id else (('queue', queue_name),)
+        with self._lock:
+            self._gauges[('pipeline_queue_depth', labels)] = float(depth)
+
+    def record_camera_frame(self, camera_id: str, success: bool = True):
+        """Đếm frame decode từ camera; FPS được tính lại mỗi giây"""
+        if not self.enabled:
+            return
+        camera_id = str(camera_id)
+        labels = (('camera', camera_id),)
+        now = time.monotonic()
+        with self._lock:
+            if not success:
+                key = ('camera_read_failures_total', labels)
+                self._counters[key] = self._counters.get(key, 0.0) + 1
+                return
+
+            key = ('camera_frames_total', labels)
+            self._counters[key] = self._counters.get(key, 0.0) + 1
+
+            window = self._fps_windows.get(camera_id)
+            if window is None:
+                self._fps_windows[camera_id] = [now, 0]
+                return
+            window[1] += 1
+            elapsed = now - window[0]
+            if elapsed >= 1.0:
+                self._gauges[('camera_decode_fps', labels)] = window[1] / elapsed
+                window[0] = now
+                window[1] = 0
+
+    def record_camera_connect(self, camera_id: str, success: bool, seconds: float):
+        """Ghi 1 lần connect camera (bootstrap / retry)"""
+        if not self.enabled:
+            return
+        labels = (('camera', str(camera_id)),)
+        self._observe('camera_connect_duration_seconds', labels + (('result', 'ok' if success else 'failed'),),
+                      max(0.0, seconds))
+        if not success:
+            with self._lock:
+                key = ('camera_connect_failures_total', labels)
+                self._counters[key] = self._counters.get(key, 0.0) + 1
+
+    def record_camera_restart(self, camera_id: str, reason: str):
+        """Supervisor restart capture (stream_failed / disconnected / stalled / frozen)"""
+        if not self.enabled:
+            return
+        key = ('camera_restarts_total', (('camera', str(camera_id)), ('reason', reason)))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + 1
+
+    def observe_camera_recovery(self, camera_id: str, seconds: float):
+        """Thời gian không có frame: từ lúc restart tới khi reconnect thành công"""
+        if not self.enabled:
+            return
+        self._observe('camera_recovery_seconds', (('camera', str(camera_id)),), max(0.0, seconds))
+
+    def set_clip_buffer_bytes(self, camera_id: str, size: int):
+        """Bộ nhớ ring buffer packet H.264 của camera"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[('clip_buffer_bytes', (('camera', str(camera_id)),))] = float(size)
+
+    def set_camera_first_frame(self, camera_id: str, seconds: float):
+        """Time-to-first-analyzed-frame của camera"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[('camera_time_to_first_frame_seconds', (('camera', str(camera_id)),))] = float(seconds)
+
+    def _observe(self, name: str, labels: Tuple, value: float):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = _Histogram(DEFAULT_LATENCY_BUCKETS)
+                self._histograms[(name, labels)] = histogram
+            histogram.observe(value)
+
+    # ------------------------------------------------------------------ #
+    # Export
+    # ------------------------------------------------------------------ #
+
+    @staticmethod
+    def _format_labels(labels: Tuple, extra: Tuple = ()) -> str:
+        pairs = tuple(labels) + tuple(extra)
+        if not pairs:
+            return ''
+        escaped = ('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+        return '{' + ','.join(escaped) + '}'
+
+    def render(self) -> str:
+        """Render toàn bộ metrics theo Prometheus text exposition format"""
+        with self._lock:
+            histograms = {key: (list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items()}
+            gauges = dict(self._gauges)
+            counters = dict(self._counters)
+
+        by_name: Dict[str, list] = {}
+        for (name, labels), value in histograms.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for (name, labels), value in gauges.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for (name, labels), value in counters.items():
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name in sorted(by_name):
+            metric_type, help_text = self._help.get(name, ('untyped', name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+                if metric_type == 'histogram':
+                    counts, total, count, buckets = value
+                    cumulative = 0
+                    for bound, bucket_count in zip(buckets, counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{self._format_labels(labels, (('le', repr(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{self._format_labels(labels, (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {total:.6f}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {count}")
+                else:
+                    lines.append(f"{name}{self._format_labels(labels)} {value:.6g}")
+        return '\n'.join(lines) + '\n'
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Snapshot dạng dict (mean latency theo stage) để log/print"""
+        with self._lock:
+            stages = {}
+            for (name, labels), histogram in self._histograms.items():
+                label_text = ','.join(f"{k}={v}" for k, v in labels)
+                stages[f"{name}[{label_text}]"] = {
+                    'count': histogram.count,
+                    'mean_ms': (histogram.sum / histogram.count * 1000.0) if histogram.count else 0.0
+                }
+            return {
+                'enabled': self.enabled,
+                'histograms': stages,
+                'gauges': {f"{n}[{','.join(f'{k}={v}' for k, v in l)}]": v for (n, l), v in self._gauges.items()},
+                'counters': {f"{n}[{','.join(f'{k}={v}' for k, v in l)}]": v for (n, l), v in self._counters.items()}
+            }
+
+    def start_server(self, host: Optional[str] = None, port: Optional[int] = None) -> bool:
+        """
+        Start HTTP endpoint /metrics trong daemon thread
+
+        Returns:
+            True nếu server đang chạy
+        """
+        if not self.enabled:
+            return False
+        if self._server is not None:
+            return True
+
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Không spam stdout mỗi lần Prometheus scrape
+
+        try:
+            self._server = ThreadingHTTPServer((host or self.host, port or self.port), MetricsHandler)
+            self._server.daemon_threads = True
+            self._server_thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+            self._server_thread.start()
+            logger.info(f"📈 Metrics endpoint: http://{host or self.host}:{port or self.port}/metrics")
+            return True
+        except OSError as e:
+            logger.error(f"❌ Failed to start metrics endpoint: {e}")
+            self._server = None
+            return False
+
+    def stop_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class LatencyTrace:
+    """
+    Latency stamps của 1 event từ lúc capture frame tới khi event được lưu DB.
+    Dùng wall clock (time.time) vì capture được stamp ở camera thread khác.
+    """
+
+    def __init__(self, event_type: str, capture_ts: Optional[float] = None):
+        self.event_type = event_type
+        self.stamps = [('capture', capture_ts if capture_ts else time.time())]
+        self._finish_callbacks = []
+
+    def mark(self, hop: str, timestamp: Optional[float] = None):
+        """Stamp 1 hop (thời điểm hop hoàn thành)"""
+        self.stamps.append((hop, timestamp if timestamp else time.time()))
+
+    def on_finish(self, callback):
+        """callback(trace) chạy khi finish() - vd. ghi breakdown đầy đủ vào DB ở writer nền"""
+        self._finish_callbacks.append(callback)
+
+    def finish(self, hop: str = 'published'):
+        """Stamp hop cuối rồi gọi các callback on_finish (lỗi callback chỉ log)"""
+        self.mark(hop)
+        for callback in self._finish_callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                logger.warning(f"Latency trace callback failed: {e}")
+
+    def total_seconds(self) -> float:
+        return self.stamps[-1][1] - self.stamps[0][1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Breakdown JSON-serializable để lưu vào context_data"""
+        origin = self.stamps[0][1]
+        hops_ms = {}
+        cumulative_ms = {}
+        previous = origin
+        for hop, timestamp in self.stamps[1:]:
+            hops_ms[hop] = round((timestamp - previous) * 1000.0, 2)
+            cumulative_ms[hop] = round((timestamp - origin) * 1000.0, 2)
+            previous = timestamp
+
+        slowest = max(hops_ms.items(), key=lambda item: item[1])[0] if hops_ms else None
+        return {
+            'capture_ts': origin,
+            'hops_ms': hops_ms,
+            'cumulative_ms': cumulative_ms,
+            'total_ms': round(self.total_seconds() * 1000.0, 2),
+            'slowest_hop': slowest
+        }
+
+
+# Global instance
+pipeline_metrics = PipelineMetrics()
+
+
+def get_pipeline_metrics() -> PipelineMetrics:
+    """Get global pipeline metrics instance"""
+    return pipeline_metrics
@@ -0,0 +1,348 @@
+"""
+Preview Service
+On-demand annotated preview (MJPEG over HTTP + optional WebSocket) cho edge box không có màn hình
+
+Pipeline chỉ publish (frame, renderer) - render overlay + JPEG encode chỉ chạy
+trong thread của viewer, khi có viewer đang xem camera đó, với FPS / width cap riêng.
+Tắt mặc định: khi PREVIEW_ENABLED != true publish() chỉ là 1 attribute check.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import cv2
+import numpy as np
+
+try:
+    import websockets
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
+    websockets = None
+
+logger = logging.getLogger(__name__)
+
+BOUNDARY = 'frame'
+
+
+def is_headless() -> bool:
+    """HEADLESS=true: không cv2.imshow, không vẽ overlay trong hot path"""
+    return os.getenv('HEADLESS', 'false').lower() in ('1', 'true', 'yes')
+
+
+class _PreviewSource:
+    """Frame mới nhất của 1 camera + renderer (chưa render)"""
+
+    __slots__ = ('frame', 'renderer', 'seq', 'timestamp')
+
+    def __init__(self, frame: np.ndarray, renderer: Optional[Callable[[np.ndarray], np.ndarray]], seq: int):
+        self.frame = frame
+        self.renderer = renderer
+        self.seq = seq
+        self.timestamp = time.time()
+
+
+class PreviewService:
+    """Latest-frame preview hub với per-viewer FPS / resolution cap"""
+
+    def __init__(self):
+        self.enabled = os.getenv('PREVIEW_ENABLED', 'false').lower() == 'true'
+        self.host = os.getenv('PREVIEW_HOST', '127.0.0.1')
+        self.port = int(os.getenv('PREVIEW_PORT', '9109'))
+        self.ws_port = int(os.getenv('PREVIEW_WS_PORT', '9110'))
+        self.max_fps = float(os.getenv('PREVIEW_MAX_FPS', '10'))
+        self.max_width = int(os.getenv('PREVIEW_MAX_WIDTH', '960'))
+        self.jpeg_quality = int(os.getenv('PREVIEW_JPEG_QUALITY', '70'))
+
+        self._sources: Dict[str, _PreviewSource] = {}
+        self._viewers: Dict[str, int] = {}
+        self._condition = threading.Condition()
+        self._seq = 0
+
+        # (camera_id, seq) -> annotated frame, (camera_id, seq, width) -> JPEG bytes
+        self._rendered: Dict[str, Tuple[int, np.ndarray]] = {}
+        self._encoded: Dict[Tuple[str, int], Tuple[int, bytes]] = {}
+        self._render_lock = threading.Lock()
+
+        self.stats = {'renders': 0, 'encodes': 0, 'frames_sent': 0, 'viewers_total': 0}
+
+        self._server = None
+        self._ws_thread = None
+        self._ws_loop = None
+
+    # ------------------------------------------------------------------
+    # Pipeline side
+    # ------------------------------------------------------------------
+    def has_viewers(self, camera_id: str) -> bool:
+        return self.enabled and self._viewers.get(camera_id, 0) > 0
+
+    def publish(self, camera_id: str, frame: np.ndarray,
+                renderer: Optional[Callable[[np.ndarray], np.ndarray]] = None):
+        """
+        Publish frame mới nhất của camera (không copy, không vẽ)
+
+        Args:
+            camera_id: Camera ID
+            frame: Frame BGR (không được sửa in-place sau khi publish)
+            renderer: callable(frame) -> annotated frame, chỉ gọi khi có viewer
+        """
+        if not self.enabled or not self._viewers.get(camera_id):
+            return
+        with self._condition:
+            self._seq += 1
+            self._sources[camera_id] = _PreviewSource(frame, renderer, self._seq)
+            self._condition.notify_all()
+
+    # ------------------------------------------------------------------
+    # Viewer side
+    # ------------------------------------------------------------------
+    def _add_viewer(self, camera_id: str):
+        with self._condition:
+            self._viewers[camera_id] = self._viewers.get(camera_id, 0) + 1
+            self.stats['viewers_total'] += 1
+        logger.info(f"👀 Preview viewer connected: {camera_id} ({self._viewers[camera_id]} active)")
+
+    def _remove_viewer(self, camera_id: str):
+        with self._condition:
+            self._viewers[camera_id] = max(0, self._viewers.get(camera_id, 0) - 1)
+            if self._viewers[camera_id] == 0:
+                # Không giữ frame khi không còn ai xem
+                self._sources.pop(camera_id, None)
+                self._rendered.pop(camera_id, None)
+                for key in [key for key in self._encoded if key[0] == camera_id]:
+                    self._encoded.pop(key, None)
+        logger.info(f"👋 Preview viewer left: {camera_id}")
+
+    def _wait_for_frame(self, camera_id: str, last_seq: int, timeout: float) -> Optional[_PreviewSource]:
+        """Block tới khi có frame mới hơn last_seq (hoặc timeout)"""
+        with self._condition:
+            source = self._sources.get(camera_id)
+            if source is None or source.seq <= last_seq:
+                self._condition.wait(timeout)
+                source = self._sources.get(camera_id)
+            if source is None or source.seq <= last_seq:
+                return None
+            return source
+
+    def _encode(self, camera_id: str, source: _PreviewSource, width: int) -> Optional[bytes]:
+        """Render (1 lần / frame) + resize + JPEG encode (1 lần / frame / width), dùng chung giữa viewers"""
+        width = min(width, self.max_width) if width > 0 else self.max_width
+        with self._render_lock:
+            cached = self._encoded.get((camera_id, width))
+            if cached and cached[0] == source.seq:
+                return cached[1]
+
+            rendered = self._rendered.get(camera_id)
+            if rendered and rendered[0] == source.seq:
+                annotated = rendered[1]
+            else:
+                try:
+                    annotated = source.renderer(source.frame) if source.renderer else source.frame
+                except Exception as e:
+                    logger.warning(f"Preview render failed for {camera_id}: {e}")
+                    annotated = source.frame
+                self._rendered[camera_id] = (source.seq, annotated)
+                self.stats['renders'] += 1
+
+            height, frame_width = annotated.shape[:2]
+            if frame_width > width:
+                annotated = cv2.resize(annotated, (width, int(height * width / frame_width)),
+                                       interpolation=cv2.INTER_AREA)
+            ok, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                return None
+            jpeg = buffer.tobytes()
+            self._encoded[(camera_id, width)] = (source.seq, jpeg)
+            self.stats['encodes'] += 1
+            return jpeg
+
+    def _parse_limits(self, query: Dict[str, Any]) -> Tuple[float, int]:
+        """Per-viewer fps/width, luôn bị chặn bởi PREVIEW_MAX_FPS / PREVIEW_MAX_WIDTH"""
+        try:
+            fps = float(query.get('fps', [self.max_fps])[0])
+        except (TypeError, ValueError):
+            fps = self.max_fps
+        try:
+            width = int(query.get('width', [self.max_width])[0])
+        except (TypeError, ValueError):
+            width = self.max_width
+        return max(0.5, min(fps, self.max_fps)), max(64, min(width, self.max_width))
+
+    def iter_frames(self, camera_id: str, fps: float, width: int):
+        """Generator JPEG frames cho 1 viewer (đã đăng ký viewer)"""
+        interval = 1.0 / fps
+        last_seq = 0
+        next_time = 0.0
+        while self._server is not None or self._ws_loop is not None:
+            delay = next_time - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            source = self._wait_for_frame(camera_id, last_seq, timeout=1.0)
+            if source is None:
+                yield None  # Keep-alive chance cho caller
+                continue
+            last_seq = source.seq
+            next_time = time.time() + interval
+            jpeg = self._encode(camera_id, source, width)
+            if jpeg:
+                self.stats['frames_sent'] += 1
+                yield jpeg
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'viewers': {camera_id: count for camera_id, count in self._viewers.items() if count},
+            'max_fps': self.max_fps,
+            'max_width': self.max_width,
+            **self.stats
+        }
+
+    # ------------------------------------------------------------------
+    # Servers
+    # ------------------------------------------------------------------
+    def start_server(self, host: Optional[str] = None, port: Optional[int] = None) -> bool:
+        """
+        Start MJPEG endpoint /preview/<camera_id>?fps=5&width=640 (+ WebSocket nếu có websockets)
+
+        Returns:
+            True nếu server đang chạy
+        """
+        if not self.enabled:
+            return False
+        if self._server is not None:
+            return True
+
+        preview = self
+
+        class PreviewHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path in ('/', '/preview', '/preview/'):
+                    body = json.dumps(preview.get_stats()).encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                if not parsed.path.startswith('/preview/'):
+                    self.send_error(404)
+                    return
+
+                camera_id = parsed.path[len('/preview/'):].rstrip('/')
+                if camera_id.endswith('.mjpg'):
+                    camera_id = camera_id[:-len('.mjpg')]
+                fps, width = preview._parse_limits(parse_qs(parsed.query))
+
+                self.send_response(200)
+                self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+                self.send_header('Cache-Control', 'no-cache, private')
+                self.send_header('Pragma', 'no-cache')
+                self.end_headers()
+
+                preview._add_viewer(camera_id)
+                try:
+                    for jpeg in preview.iter_frames(camera_id, fps, width):
+                        if jpeg is None:
+                            continue
+                        self.wfile.write(f'--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n'
+                                         f'Content-Length: {len(jpeg)}\r\n\r\n'.encode('ascii'))
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b'\r\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    preview._remove_viewer(camera_id)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host or self.host, port or self.port), PreviewHandler)
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, daemon=True, name='PreviewHTTP').start()
+            logger.info(f"📺 Preview endpoint: http://{host or self.host}:{port or self.port}/preview/<camera_id>")
+        except OSError as e:
+            logger.error(f"❌ Failed to start preview endpoint: {e}")
+            self._server = None
+            return False
+
+        if WEBSOCKETS_AVAILABLE:
+            self._start_ws_server(host or self.host)
+        return True
+
+    def _start_ws_server(self, host: str):
+        """WebSocket: ws://host:PREVIEW_WS_PORT/<camera_id>?fps=5&width=640 -> binary JPEG messages"""
+        preview = self
+
+        async def handler(websocket, path=None):
+            path = path or getattr(getattr(websocket, 'request', None), 'path', '/')
+            parsed = urlparse(path)
+            camera_id = parsed.path.strip('/')
+            if not camera_id:
+                await websocket.close(code=1008, reason='camera_id required')
+                return
+            fps, width = preview._parse_limits(parse_qs(parsed.query))
+            interval = 1.0 / fps
+            loop = asyncio.get_running_loop()
+            last_seq = 0
+
+            preview._add_viewer(camera_id)
+            try:
+                while True:
+                    started = loop.time()
+                    source = await loop.run_in_executor(None, preview._wait_for_frame, camera_id, last_seq, 1.0)
+                    if source is not None:
+                        last_seq = source.seq
+                        jpeg = await loop.run_in_executor(None, preview._encode, camera_id, source, width)
+                        if jpeg:
+                            await websocket.send(jpeg)
+                            preview.stats['frames_sent'] += 1
+                    await asyncio.sleep(max(0.0, interval - (loop.time() - started)))
+            except websockets.exceptions.ConnectionClosed:
+                pass
+            finally:
+                preview._remove_viewer(camera_id)
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            self._ws_loop = loop
+            try:
+                loop.run_until_complete(websockets.serve(handler, host, self.ws_port, max_size=2 ** 16))
+                logger.info(f"📺 Preview WebSocket: ws://{host}:{self.ws_port}/<camera_id>")
+                loop.run_forever()
+            except OSError as e:
+                logger.error(f"❌ Failed to start preview WebSocket: {e}")
+            finally:
+                self._ws_loop = None
+
+        self._ws_thread = threading.Thread(target=run, daemon=True, name='PreviewWS')
+        self._ws_thread.start()
+
+    def stop_server(self):
+        if self._server is not None:
+            server = self._server
+            self._server = None
+            server.shutdown()
+            server.server_close()
+        if self._ws_loop is not None:
+            self._ws_loop.call_soon_threadsafe(self._ws_loop.stop)
+        with self._condition:
+            self._condition.notify_all()
+
+
+# Global instance
+preview_service = PreviewService()
+
+
+def get_preview_service() -> PreviewService:
+    """Get global preview service instance"""
+    return preview_service
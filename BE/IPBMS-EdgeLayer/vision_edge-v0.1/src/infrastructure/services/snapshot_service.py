@@ -8,12 +8,16 @@ import logging
 import json
 from datetime import datetime
 from typing import Optional, Dict, Any, Tuple
+import cv2
 import numpy as np
 from sqlalchemy.orm import Session
 from sqlalchemy import create_engine, MetaData
+from sqlalchemy import exc as sa_exc
 from sqlalchemy.orm import sessionmaker
 
 from ..storage.minio_service import get_minio_service
+from .stats_rollup_service import stats_rollup
+from .local_spool_service import local_spool, UpstreamUnavailable, SPOOL_SNAPSHOT, SPOOL_CLIP
 
 # Import models with relative paths
 import sys
@@ -64,6 +68,10 @@ class SnapshotService:
             logger.error(f"SnapshotService: MinIO initialization failed: {e}")
             self.minio_service = None
             
+        # Replay snapshot đã spool local khi MinIO / DB down
+        local_spool.register_handler(SPOOL_SNAPSHOT, self._replay_spooled_snapshot)
+        local_spool.register_handler(SPOOL_CLIP, self._replay_spooled_clip)
+        
         logger.info("SnapshotService initialized")
     
     def create_detection_snapshot(
@@ -73,7 +81,8 @@ class SnapshotService:
         event_type: str,
         confidence: float,
         frame: np.ndarray,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        snapshot_id: Optional[str] = None
     ) -> Tuple[str, str]:
         """
         Create snapshot and upload image when detection occurs
@@ -85,22 +94,26 @@ class SnapshotService:
             confidence: Detection confidence
             frame: OpenCV frame to save
             metadata: Additional metadata
+            snapshot_id: Pre-assigned UUID (replay từ local spool)
         
         Returns:
             Tuple of (snapshot_id, image_id)
+        
+        Raises:
+            UpstreamUnavailable: MinIO / database không truy cập được
         """
         db = self.SessionLocal()
         try:
             # Generate UUIDs
-            snapshot_id = str(uuid.uuid4())
+            snapshot_id = snapshot_id or str(uuid.uuid4())
             image_id = str(uuid.uuid4())
             
             # Upload image to MinIO
             if not self.minio_service:
-                raise Exception("MinIO service not available")
+                raise UpstreamUnavailable("MinIO service not available")
                 
             logger.info(f"Uploading {event_type} detection image to MinIO...")
-            upload_result = self.minio_service.upload_frame_image(
+            upload_result = self.minio_service.upload_frame_renditions(
                 frame=frame,
                 camera_id=camera_id,
                 event_type=event_type,
@@ -114,9 +127,11 @@ class SnapshotService:
             )
             
             if upload_result is None:
-                raise Exception("MinIO upload failed - all retry attempts exhausted")
+                raise UpstreamUnavailable("MinIO upload failed - all retry attempts exhausted")
                 
-            object_name, cloud_url, file_size = upload_result
+            object_name = upload_result['object_name']
+            cloud_url = upload_result['cloud_url']
+            file_size = upload_result['file_size']
             
             # Create snapshot record with cleaned metadata
             metadata_dict = {
@@ -125,6 +140,10 @@ class SnapshotService:
                 'detection_time': datetime.now().isoformat(),
                 **(metadata or {})
             }
+            if upload_result.get('thumbnail_url'):
+                # Thumbnail rendition cho event list trên mobile
+                metadata_dict['thumbnail_url'] = upload_result['thumbnail_url']
+                metadata_dict['thumbnail_object'] = upload_result['thumbnail_object']
             
             # Clean metadata to be JSON serializable
             cleaned_metadata = clean_metadata_for_json(metadata_dict)
@@ -145,7 +164,7 @@ class SnapshotService:
                 snapshot_id=snapshot_id,
                 camera_id=camera_id,
                 user_id=user_id,
-                meta_data=json.dumps(cleaned_metadata),  # Use proper JSON serialization
+                snapshot_metadata=json.dumps(cleaned_metadata),  # Use proper JSON serialization
                 capture_type=db_capture_type,  # Use mapped value
                 captured_at=datetime.now(),
                 processed_at=datetime.now(),
@@ -156,6 +175,7 @@ class SnapshotService:
             snapshot_image = SnapshotImages(
                 image_id=image_id,
                 snapshot_id=snapshot_id,
+                is_primary=True,
                 image_path=object_name,  # MinIO object name
                 cloud_url=cloud_url,
                 created_at=datetime.now(),
@@ -173,12 +193,19 @@ class SnapshotService:
             db.commit()
             logger.info(f"✅ Snapshot image record created: {image_id}")
             
+            stats_rollup.record_snapshot(user_id=user_id, camera_id=camera_id, snapshot_type=event_type,
+                                         images=1, size_bytes=file_size, captured_at=snapshot.captured_at)
+            
             logger.info(f"✅ Successfully created {event_type} snapshot: {snapshot_id}")
             logger.info(f"📸 Image uploaded to MinIO: {object_name}")
             logger.info(f"🔗 Cloud URL: {cloud_url}")
             
             return snapshot_id, image_id
             
+        except (sa_exc.OperationalError, sa_exc.InterfaceError) as e:
+            db.rollback()
+            logger.error(f"❌ Database unavailable while creating detection snapshot: {e}")
+            raise UpstreamUnavailable(f"Database unavailable: {e}") from e
         except Exception as e:
             db.rollback()
             logger.error(f"❌ Error creating detection snapshot: {e}")
@@ -186,6 +213,34 @@ class SnapshotService:
         finally:
             db.close()
     
+    def _replay_spooled_snapshot(self, payload: Dict[str, Any], blob: Optional[bytes]) -> bool:
+        """Spool replay handler: upload ảnh đã spool + tạo snapshot với snapshot_id gốc"""
+        db = self.SessionLocal()
+        try:
+            exists = db.query(Snapshots.snapshot_id).filter(Snapshots.snapshot_id == payload['snapshot_id']).first()
+        except (sa_exc.OperationalError, sa_exc.InterfaceError) as e:
+            raise UpstreamUnavailable(f"Database unavailable: {e}") from e
+        finally:
+            db.close()
+        if exists:
+            # Đã ghi ở lần replay trước (crash trước khi xoá khỏi spool)
+            return True
+        
+        frame = cv2.imdecode(np.frombuffer(blob or b'', np.uint8), cv2.IMREAD_COLOR) if blob else None
+        if frame is None:
+            raise ValueError(f"Spooled snapshot {payload['snapshot_id']} has no decodable image")
+        
+        self.create_detection_snapshot(
+            camera_id=payload['camera_id'],
+            user_id=payload['user_id'],
+            event_type=payload['event_type'],
+            confidence=payload['confidence'],
+            frame=frame,
+            metadata=payload.get('metadata'),
+            snapshot_id=payload['snapshot_id']
+        )
+        return True
+    
     def create_manual_snapshot(
         self,
         camera_id: str,
@@ -214,6 +269,82 @@ class SnapshotService:
             metadata=metadata
         )
     
+    def attach_clip(self, snapshot_id: str, object_name: str, cloud_url: str, file_size: int) -> Optional[str]:
+        """
+        Gắn video clip (MP4 trước/sau event) vào snapshot: thêm SnapshotImages row + clip_url trong metadata.
+        Snapshot còn trong local spool / DB down -> spool clip phía sau, replay gắn sau khi snapshot đã ghi
+        
+        Returns:
+            image_id của clip hoặc None (chưa gắn: đã spool / snapshot không tồn tại / lỗi)
+        """
+        clip = {'snapshot_id': str(snapshot_id), 'object_name': object_name, 'cloud_url': cloud_url,
+                'file_size': int(file_size)}
+        try:
+            image_id = self._attach_clip(**clip)
+        except UpstreamUnavailable as e:
+            return self._spool_clip(clip, str(e))
+        if image_id is None and local_spool.has_backlog():
+            # Snapshot được pipeline spool lúc MinIO/DB down, chưa replay xong
+            return self._spool_clip(clip, f"snapshot not replayed yet ({local_spool.pending_count()} pending)")
+        if image_id is None:
+            logger.warning(f"Snapshot {snapshot_id} not found - clip {object_name} not attached")
+        return image_id
+    
+    def _spool_clip(self, clip: Dict[str, Any], reason: str) -> None:
+        spool_id = local_spool.enqueue(SPOOL_CLIP, clip)
+        if spool_id is not None:
+            logger.warning(f"📦 Clip {clip['object_name']} for snapshot {clip['snapshot_id']} "
+                           f"spooled #{spool_id} ({reason})")
+        return None
+    
+    def _replay_spooled_clip(self, payload: Dict[str, Any], blob: Optional[bytes] = None) -> bool:
+        """Spool replay handler: snapshot đã replay trước (thứ tự spool) nên phải tồn tại"""
+        if self._attach_clip(**payload) is None:
+            raise ValueError(f"Snapshot {payload['snapshot_id']} not found for clip {payload['object_name']}")
+        return True
+    
+    def _attach_clip(self, snapshot_id: str, object_name: str, cloud_url: str, file_size: int) -> Optional[str]:
+        """Returns image_id, None khi snapshot không tồn tại / lỗi dữ liệu; raise UpstreamUnavailable khi DB down"""
+        db = self.SessionLocal()
+        try:
+            snapshot = db.query(Snapshots).filter(Snapshots.snapshot_id == uuid.UUID(snapshot_id)).first()
+            if not snapshot:
+                return None
+            
+            image_id = str(uuid.uuid4())
+            db.add(SnapshotImages(
+                image_id=uuid.UUID(image_id),
+                snapshot_id=snapshot.snapshot_id,
+                is_primary=False,  # Ảnh detection là primary, clip chỉ là rendition bổ sung
+                image_path=object_name,
+                cloud_url=cloud_url,
+                created_at=datetime.now(),
+                file_size=str(file_size)
+            ))
+            try:
+                metadata = json.loads(snapshot.snapshot_metadata) if snapshot.snapshot_metadata else {}
+            except (TypeError, ValueError):
+                metadata = {}
+            metadata['clip_url'] = cloud_url
+            metadata['clip_object'] = object_name
+            snapshot.snapshot_metadata = json.dumps(metadata)
+            db.commit()
+            
+            stats_rollup.record_snapshot(user_id=str(snapshot.user_id), camera_id=str(snapshot.camera_id),
+                                         images=1, size_bytes=file_size, captured_at=snapshot.captured_at,
+                                         count=0)
+            logger.info(f"🎬 Clip attached to snapshot {snapshot_id}: {cloud_url}")
+            return image_id
+        except (sa_exc.OperationalError, sa_exc.InterfaceError) as e:
+            db.rollback()
+            raise UpstreamUnavailable(f"Database unavailable: {e}") from e
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ Error attaching clip to snapshot {snapshot_id}: {e}")
+            return None
+        finally:
+            db.close()
+    
     def get_snapshot_by_id(self, snapshot_id: str) -> Optional[Dict[str, Any]]:
         """Get snapshot details by ID"""
         db = self.SessionLocal()
@@ -301,6 +432,7 @@ class SnapshotService:
         db = self.SessionLocal()
         try:
             # Get snapshot images to delete from MinIO
+            snapshot = db.query(Snapshots).filter(Snapshots.snapshot_id == snapshot_id).first()
             images = db.query(SnapshotImages).filter(SnapshotImages.snapshot_id == snapshot_id).all()
             
             # Delete images from MinIO
@@ -314,6 +446,12 @@ class SnapshotService:
             db.query(Snapshots).filter(Snapshots.snapshot_id == snapshot_id).delete()
             db.commit()
             
+            if snapshot is not None:
+                size_bytes = sum(int(image.file_size) for image in images if str(image.file_size or '').isdigit())
+                stats_rollup.record_snapshot(user_id=str(snapshot.user_id), camera_id=str(snapshot.camera_id),
+                                             snapshot_type=self._snapshot_type(snapshot), images=-len(images),
+                                             size_bytes=-size_bytes, captured_at=snapshot.captured_at, count=-1)
+            
             logger.info(f"Successfully deleted snapshot: {snapshot_id}")
             return True
             
@@ -324,8 +462,33 @@ class SnapshotService:
         finally:
             db.close()
     
+    @staticmethod
+    def _snapshot_type(snapshot) -> Optional[str]:
+        """event_type trong metadata (fall/seizure/manual), fallback capture_type - giống rollup backfill"""
+        try:
+            raw = getattr(snapshot, 'snapshot_metadata', None)
+            meta = json.loads(raw) if isinstance(raw, str) else (raw or {})
+            return meta.get('event_type') or snapshot.capture_type
+        except Exception:
+            return snapshot.capture_type
+    
     def get_storage_stats(self) -> Dict[str, Any]:
-        """Get storage statistics"""
+        """Get storage statistics (O(1) từ stats rollup khi đã backfill, fallback count queries)"""
+        if stats_rollup.is_ready():
+            rollup = stats_rollup.get('total')
+            return {
+                'database': {
+                    'total_snapshots': rollup.get('snapshots', 0),
+                    'total_images': rollup.get('images', 0),
+                    'total_image_bytes': rollup.get('bytes', 0),
+                    'fall_snapshots': rollup.get('snapshots:fall', 0),
+                    'seizure_snapshots': rollup.get('snapshots:seizure', 0),
+                    'manual_snapshots': rollup.get('snapshots:manual', 0)
+                },
+                'minio': self.minio_service.get_storage_stats() if self.minio_service else
+                         {'error': 'MinIO service not available'}
+            }
+        
         db = self.SessionLocal()
         try:
             # Database stats
@@ -0,0 +1,350 @@
+"""
+Stats Rollup Service
+Counters per total / user / camera / user+camera / day (+ ngày) (Redis hashes), cập nhật khi ghi event / upload,
+để /api/stats và storage stats đọc O(1) thay vì COUNT(*) / list toàn bộ objects.
+
+- record_event(): sau khi INSERT event_detections commit
+- record_snapshot(): sau khi tạo snapshot (+ images, bytes)
+- record_object(): sau khi upload/xoá object MinIO (objects, bytes theo bucket)
+- rebuild_from_database() / set_bucket_totals(): backfill 1 lần (O(n)) khi rollup chưa có dữ liệu
+Tắt mặc định (STATS_ROLLUP_ENABLED=true để bật); khi chưa ready các endpoint dùng query cũ.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime, date
+from typing import Any, Dict, Iterable, Optional
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Event type trong DB -> nhóm hiển thị (abnormal_behavior = co giật)
+EVENT_TYPE_GROUPS = {
+    'fall': 'fall',
+    'seizure': 'seizure',
+    'abnormal_behavior': 'seizure'
+}
+
+# Marker backfill; đổi version khi thêm scope mới để rollup cũ được rebuild lại 1 lần
+DATABASE_MARKER = 'database:v2'
+
+# latest_event_at chỉ tăng: event replay / ghi trễ không kéo lùi thời điểm mới nhất
+_SET_LATEST_LUA = """
+local current = redis.call('HGET', KEYS[1], 'latest_event_at')
+if not current or tonumber(current) < tonumber(ARGV[1]) then
+    redis.call('HSET', KEYS[1], 'latest_event_at', ARGV[1])
+end
+return 0
+"""
+
+
+def _day_key(value: Any) -> str:
+    """datetime/date/epoch/None -> 'YYYY-MM-DD'"""
+    if value is None:
+        return date.today().isoformat()
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value).date().isoformat()
+    return str(value)[:10]
+
+
+def _epoch(value: Any) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    return time.time()
+
+
+def _row_values(row, columns: Iterable[str]) -> tuple:
+    """RealDictCursor row hoặc tuple -> tuple theo thứ tự columns"""
+    if isinstance(row, dict):
+        return tuple(row[column] for column in columns)
+    return tuple(row)
+
+
+class StatsRollupService:
+    """Rollup counters trên Redis hashes: 1 HINCRBY pipeline khi ghi, 1 HGETALL khi đọc"""
+
+    def __init__(self, redis_url: Optional[str] = None, prefix: Optional[str] = None, enabled: Optional[bool] = None):
+        self.enabled = (os.getenv('STATS_ROLLUP_ENABLED', 'false').lower() == 'true') if enabled is None else enabled
+        self.redis_url = redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+        self.prefix = prefix or os.getenv('STATS_ROLLUP_PREFIX', 'healthcare:stats')
+        self.day_ttl = int(os.getenv('STATS_ROLLUP_DAY_TTL_DAYS', '400')) * 86400
+
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._set_latest = None
+
+        if self.enabled and not REDIS_AVAILABLE:
+            logger.warning("⚠️ STATS_ROLLUP_ENABLED=true nhưng thiếu package redis - rollup disabled")
+            self.enabled = False
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = redis.Redis.from_url(self.redis_url, decode_responses=True,
+                                                        socket_keepalive=True, health_check_interval=30)
+        return self._client
+
+    @property
+    def set_latest(self):
+        """Lua script (EVALSHA, tự SCRIPT LOAD khi chạy trong pipeline)"""
+        if self._set_latest is None:
+            self._set_latest = self.client.register_script(_SET_LATEST_LUA)
+        return self._set_latest
+
+    # ------------------------------------------------------------------
+    # Keys
+    # ------------------------------------------------------------------
+    def key(self, scope: str = 'total', scope_id: Optional[str] = None, day: Any = None,
+            camera_id: Optional[str] = None) -> str:
+        """
+        Args:
+            scope: 'total' | 'user' | 'camera' | 'day' | 'bucket'
+            scope_id: user_id / camera_id / bucket name
+            day: thêm chiều ngày cho user/camera (YYYY-MM-DD)
+            camera_id: với scope='user' -> key user+camera
+        """
+        if scope == 'day':
+            return f"{self.prefix}:day:{_day_key(day if day is not None else scope_id)}"
+        parts = [self.prefix, scope]
+        if scope_id is not None:
+            parts.append(str(scope_id))
+        if scope == 'user' and camera_id is not None:
+            parts.extend(['camera', str(camera_id)])
+        if day is not None:
+            parts.extend(['day', _day_key(day)])
+        return ':'.join(parts)
+
+    def _scope_keys(self, user_id: Optional[str], camera_id: Optional[str], day: str):
+        """(key, is_daily) cho mọi scope bị ảnh hưởng bởi 1 bản ghi"""
+        keys = [(self.key('total'), False), (self.key('day', day=day), True)]
+        if user_id:
+            keys.append((self.key('user', user_id), False))
+            keys.append((self.key('user', user_id, day), True))
+        if camera_id:
+            keys.append((self.key('camera', camera_id), False))
+            keys.append((self.key('camera', camera_id, day), True))
+        if user_id and camera_id:
+            keys.append((self.key('user', user_id, camera_id=camera_id), False))
+            keys.append((self.key('user', user_id, day, camera_id=camera_id), True))
+        return keys
+
+    def _increment(self, user_id: Optional[str], camera_id: Optional[str], day: str,
+                   increments: Dict[str, int], latest: Optional[float] = None):
+        pipe = self.client.pipeline(transaction=False)
+        for key, is_daily in self._scope_keys(user_id, camera_id, day):
+            for field, amount in increments.items():
+                if amount:
+                    pipe.hincrby(key, field, amount)
+            if latest is not None:
+                self.set_latest(keys=[key], args=[f"{latest:.3f}"], client=pipe)
+            if is_daily and self.day_ttl:
+                pipe.expire(key, self.day_ttl)
+        pipe.execute()
+
+    # ------------------------------------------------------------------
+    # Writers (best effort - lỗi Redis không làm hỏng luồng ghi DB)
+    # ------------------------------------------------------------------
+    def record_event(self, event_type: str, user_id: Optional[str] = None, camera_id: Optional[str] = None,
+                     detected_at: Any = None, count: int = 1):
+        if not self.enabled:
+            return
+        try:
+            group = EVENT_TYPE_GROUPS.get(str(event_type), str(event_type))
+            self._increment(user_id, camera_id, _day_key(detected_at),
+                            {'events': count, f'events:{group}': count},
+                            latest=_epoch(detected_at) if count > 0 else None)
+        except Exception as e:
+            logger.warning(f"⚠️ Stats rollup record_event failed: {e}")
+
+    def record_snapshot(self, user_id: Optional[str] = None, camera_id: Optional[str] = None,
+                        snapshot_type: Optional[str] = None, images: int = 0, size_bytes: int = 0,
+                        captured_at: Any = None, count: int = 1):
+        """count=-1 / images, size_bytes âm khi xoá snapshot"""
+        if not self.enabled:
+            return
+        try:
+            increments = {'snapshots': count, 'images': images, 'bytes': int(size_bytes or 0)}
+            if snapshot_type:
+                increments[f'snapshots:{snapshot_type}'] = count
+            self._increment(user_id, camera_id, _day_key(captured_at), increments)
+        except Exception as e:
+            logger.warning(f"⚠️ Stats rollup record_snapshot failed: {e}")
+
+    def record_object(self, bucket: str, size_bytes: int, count: int = 1):
+        """MinIO object upload (count=1) / delete (count=-1, size âm)"""
+        if not self.enabled:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            key = self.key('bucket', bucket)
+            pipe.hincrby(key, 'objects', count)
+            pipe.hincrby(key, 'bytes', int(size_bytes or 0))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Stats rollup record_object failed: {e}")
+
+    # ------------------------------------------------------------------
+    # Readers - O(1)
+    # ------------------------------------------------------------------
+    def get(self, scope: str = 'total', scope_id: Optional[str] = None, day: Any = None,
+            camera_id: Optional[str] = None) -> Dict[str, Any]:
+        raw = self.client.hgetall(self.key(scope, scope_id, day, camera_id))
+        return {field: (float(value) if field == 'latest_event_at' else int(value)) for field, value in raw.items()}
+
+    def is_ready(self, what: str = DATABASE_MARKER) -> bool:
+        """True khi đã backfill (what=DATABASE_MARKER hoặc 'bucket:<name>')"""
+        if not self.enabled:
+            return False
+        try:
+            return bool(self.client.hexists(f"{self.prefix}:meta", f"{what}:rebuilt_at"))
+        except Exception as e:
+            logger.debug(f"Stats rollup not reachable: {e}")
+            return False
+
+    def get_event_stats(self, user_id: Optional[str] = None, camera_id: Optional[str] = None,
+                        day: Any = None) -> Dict[str, Any]:
+        """Cùng format với /api/stats (total_events, fall_events, seizure_events, latest_event_time)"""
+        if user_id:
+            rollup = self.get('user', user_id, day, camera_id or None)
+        elif camera_id:
+            rollup = self.get('camera', camera_id, day)
+        elif day is not None:
+            rollup = self.get('day', day=day)
+        else:
+            rollup = self.get('total')
+        latest = rollup.get('latest_event_at')
+        return {
+            'total_events': rollup.get('events', 0),
+            'fall_events': rollup.get('events:fall', 0),
+            'seizure_events': rollup.get('events:seizure', 0),
+            'latest_event_time': datetime.fromtimestamp(latest).astimezone() if latest else None
+        }
+
+    def get_bucket_stats(self, bucket: str) -> Dict[str, int]:
+        rollup = self.get('bucket', bucket)
+        return {'objects': rollup.get('objects', 0), 'bytes': rollup.get('bytes', 0)}
+
+    # ------------------------------------------------------------------
+    # Backfill
+    # ------------------------------------------------------------------
+    def _acquire_rebuild_lock(self, name: str, ttl: int = 300) -> bool:
+        return bool(self.client.set(f"{self.prefix}:lock:{name}", str(os.getpid()), nx=True, ex=ttl))
+
+    def rebuild_from_database(self, conn) -> bool:
+        """
+        Tính lại toàn bộ counters event/snapshot từ PostgreSQL (GROUP BY, chạy 1 lần)
+
+        Args:
+            conn: psycopg2 connection (tuple hoặc RealDictCursor)
+        """
+        if not self.enabled or not self._acquire_rebuild_lock('database'):
+            return False
+
+        started = time.time()
+        totals: Dict[str, Dict[str, float]] = {}
+        daily_keys = set()
+
+        def add(user_id, camera_id, day, increments, latest=None):
+            for key, is_daily in self._scope_keys(user_id and str(user_id), camera_id and str(camera_id), day):
+                bucket = totals.setdefault(key, {})
+                for field, amount in increments.items():
+                    bucket[field] = bucket.get(field, 0) + amount
+                if latest is not None:
+                    bucket['latest_event_at'] = max(bucket.get('latest_event_at', 0.0), latest)
+                if is_daily:
+                    daily_keys.add(key)
+
+        try:
+            with conn.cursor() as cursor:
+                columns = ('user_id', 'camera_id', 'day', 'event_type', 'n', 'latest')
+                cursor.execute("""
+                    SELECT user_id, camera_id, DATE(detected_at) AS day, event_type::text AS event_type,
+                           COUNT(*) AS n, MAX(detected_at) AS latest
+                    FROM event_detections
+                    GROUP BY 1, 2, 3, 4
+                """)
+                for row in cursor.fetchall():
+                    user_id, camera_id, day, event_type, n, latest = _row_values(row, columns)
+                    group = EVENT_TYPE_GROUPS.get(event_type, event_type)
+                    add(user_id, camera_id, _day_key(day), {'events': n, f'events:{group}': n},
+                        _epoch(latest) if latest else None)
+
+                columns = ('user_id', 'camera_id', 'day', 'snapshot_type', 'n', 'images', 'bytes')
+                cursor.execute("""
+                    SELECT s.user_id, s.camera_id, DATE(s.captured_at) AS day,
+                           COALESCE(s.metadata::jsonb ->> 'event_type', s.capture_type::text) AS snapshot_type,
+                           COUNT(DISTINCT s.snapshot_id) AS n, COUNT(i.image_id) AS images,
+                           COALESCE(SUM(NULLIF(i.file_size, '')::bigint), 0) AS bytes
+                    FROM snapshots s
+                    LEFT JOIN snapshot_images i ON i.snapshot_id = s.snapshot_id
+                    GROUP BY 1, 2, 3, 4
+                """)
+                for row in cursor.fetchall():
+                    user_id, camera_id, day, snapshot_type, n, images, size = _row_values(row, columns)
+                    add(user_id, camera_id, _day_key(day),
+                        {'snapshots': n, f'snapshots:{snapshot_type}': n, 'images': images, 'bytes': int(size)})
+            conn.commit()
+
+            # Thay toàn bộ keys cũ (trừ bucket/meta) trong 1 transaction
+            stale = [key for key in self.client.scan_iter(match=f"{self.prefix}:*", count=1000)
+                     if key.split(':')[len(self.prefix.split(':'))] not in ('bucket', 'meta', 'lock')]
+            pipe = self.client.pipeline(transaction=True)
+            if stale:
+                pipe.delete(*stale)
+            for key, fields in totals.items():
+                mapping = {field: (f"{value:.3f}" if field == 'latest_event_at' else int(value))
+                           for field, value in fields.items()}
+                pipe.hset(key, mapping=mapping)
+                if key in daily_keys and self.day_ttl:
+                    pipe.expire(key, self.day_ttl)
+            pipe.hset(f"{self.prefix}:meta", f'{DATABASE_MARKER}:rebuilt_at', f"{time.time():.3f}")
+            pipe.execute()
+
+            logger.info(f"✅ Stats rollup rebuilt: {len(totals)} keys in {time.time() - started:.1f}s")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Stats rollup rebuild failed: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            return False
+        finally:
+            self.client.delete(f"{self.prefix}:lock:database")
+
+    def set_bucket_totals(self, bucket: str, objects: int, size_bytes: int):
+        """Backfill bucket totals (sau 1 lần list_objects)"""
+        if not self.enabled:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=True)
+            pipe.hset(self.key('bucket', bucket), mapping={'objects': int(objects), 'bytes': int(size_bytes)})
+            pipe.hset(f"{self.prefix}:meta", f'bucket:{bucket}:rebuilt_at', f"{time.time():.3f}")
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Stats rollup set_bucket_totals failed: {e}")
+
+
+# Global instance
+stats_rollup = StatsRollupService()
+
+
+def get_stats_rollup() -> StatsRollupService:
+    """Get stats rollup service"""
+    return stats_rollup
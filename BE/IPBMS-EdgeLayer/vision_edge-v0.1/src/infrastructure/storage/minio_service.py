@@ -1,24 +1,62 @@
 """
 MinIO Storage Service for Healthcare Vision Edge System
 Handles image upload, storage, and management in MinIO object storage.
+
+Upload engine:
+- 1 pooled urllib3 client dùng chung cho mọi camera (MINIO_HTTP_POOL_SIZE connections)
+- ThreadPoolExecutor (MINIO_UPLOAD_WORKERS) cho upload song song / async giữa các camera
+- Thumbnail chạy trên pool riêng: upload_frame_renditions (có thể đang chạy trên upload pool) chờ
+  thumbnail future mà không chiếm worker của chính pool đó -> không deadlock khi pool đầy
+- Exponential backoff + jitter khi retry, multipart cho object lớn (MINIO_MULTIPART_THRESHOLD_MB)
+- Mỗi frame upload 2 renditions: ảnh full + thumbnail nhỏ (<user_id>/thumbs/<file>) cho event list trên mobile
 """
 
 import os
 import io
 import cv2
 import uuid
+import time
+import random
+import threading
 import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional, Tuple, Dict, Any
 from minio import Minio
 from minio.error import S3Error
+import urllib3
 import logging
 
+from ..services.stats_rollup_service import stats_rollup
+
 logger = logging.getLogger(__name__)
 
+# S3 error codes không nên retry (cấu hình / quyền sai)
+NON_RETRYABLE_S3_CODES = {'AccessDenied', 'NoSuchBucket', 'InvalidAccessKeyId', 'SignatureDoesNotMatch',
+                          'InvalidBucketName', 'InvalidObjectName'}
+
+
+def _build_http_client(pool_size: int, secure: bool) -> urllib3.PoolManager:
+    """Pooled HTTP client (keep-alive) dùng chung cho mọi upload"""
+    kwargs = {
+        'num_pools': 4,
+        'maxsize': pool_size,
+        'timeout': urllib3.Timeout(connect=5.0, read=60.0),
+        # Retry tầng kết nối ngắn; backoff chính nằm ở _put_with_retry
+        'retries': urllib3.Retry(total=2, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504])
+    }
+    if secure:
+        try:
+            import certifi
+            kwargs.update(cert_reqs='CERT_REQUIRED', ca_certs=os.environ.get('SSL_CERT_FILE') or certifi.where())
+        except ImportError:
+            kwargs.update(cert_reqs='CERT_REQUIRED')
+    return urllib3.PoolManager(**kwargs)
+
+
 class MinIOService:
     """Service for managing image storage in MinIO"""
-    
+
     def __init__(self):
         """Initialize MinIO client"""
         self.endpoint = os.getenv('MINIO_ENDPOINT', 'localhost:9000')
@@ -26,123 +64,368 @@ class MinIOService:
         self.secret_key = os.getenv('MINIO_SECRET_KEY')
         self.bucket_name = os.getenv('MINIO_BUCKET_NAME', 'healthcare-snapshots')
         self.secure = os.getenv('MINIO_SECURE', 'False').lower() == 'true'
-        
+        self.public_base_url = os.getenv('MINIO_PUBLIC_BASE_URL', 'https://nas.cicca.dpdns.org/cdn-image').rstrip('/')
+
+        # Renditions
+        self.jpeg_quality = int(os.getenv('MINIO_JPEG_QUALITY', '95'))
+        self.thumbnail_width = int(os.getenv('MINIO_THUMBNAIL_WIDTH', '320'))  # 0 = không tạo thumbnail
+        self.thumbnail_quality = int(os.getenv('MINIO_THUMBNAIL_QUALITY', '70'))
+
+        # Upload engine
+        self.upload_workers = int(os.getenv('MINIO_UPLOAD_WORKERS', '4'))
+        self.http_pool_size = int(os.getenv('MINIO_HTTP_POOL_SIZE', str(max(10, self.upload_workers * 2))))
+        self.max_retries = int(os.getenv('MINIO_MAX_RETRIES', '4'))
+        self.retry_base_delay = float(os.getenv('MINIO_RETRY_BASE_DELAY', '0.25'))
+        self.retry_max_delay = float(os.getenv('MINIO_RETRY_MAX_DELAY', '8.0'))
+        self.part_size = int(os.getenv('MINIO_PART_SIZE_MB', '8')) * 1024 * 1024
+        self.multipart_threshold = int(os.getenv('MINIO_MULTIPART_THRESHOLD_MB', '16')) * 1024 * 1024
+        self.parallel_parts = int(os.getenv('MINIO_PARALLEL_PARTS', '3'))
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thumbnail_executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.upload_stats = {
+            'uploads': 0, 'failures': 0, 'retries': 0, 'bytes': 0,
+            'thumbnails': 0, 'thumbnail_bytes': 0, 'multipart_uploads': 0, 'last_upload_ms': 0.0
+        }
+
         if not self.access_key or not self.secret_key:
             logger.error("MinIO credentials not found in environment variables")
             self.client = None
             return
-        
+
         # Initialize MinIO client
         try:
             self.client = Minio(
                 self.endpoint,
                 access_key=self.access_key,
                 secret_key=self.secret_key,
-                secure=self.secure
+                secure=self.secure,
+                http_client=_build_http_client(self.http_pool_size, self.secure)
             )
-            
+
             # Ensure bucket exists
             if not self.client.bucket_exists(self.bucket_name):
                 logger.info(f"Creating bucket: {self.bucket_name}")
                 self.client.make_bucket(self.bucket_name)
             else:
                 logger.info(f"Bucket exists: {self.bucket_name}")
-                
+
         except Exception as e:
             logger.error(f"MinIO client initialization failed: {e}")
             self.client = None
 
-    def upload_frame_image(self, frame: np.ndarray, user_id: str, camera_id: str, 
-                          event_type: str, confidence: float, 
-                          metadata: Optional[Dict[str, str]] = None) -> Optional[Tuple[str, str, int]]:
-        """Upload frame image to MinIO with simplified folder structure: user_id/filename
-        
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.upload_workers,
+                                                        thread_name_prefix="MinIOUpload")
+        return self._executor
+
+    @property
+    def thumbnail_executor(self) -> ThreadPoolExecutor:
+        """Pool riêng cho thumbnail (task lá, không submit thêm gì) - tránh chờ lồng trên upload pool"""
+        if self._thumbnail_executor is None:
+            with self._executor_lock:
+                if self._thumbnail_executor is None:
+                    self._thumbnail_executor = ThreadPoolExecutor(max_workers=self.upload_workers,
+                                                                  thread_name_prefix="MinIOThumb")
+        return self._thumbnail_executor
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for key, value in increments.items():
+                self.upload_stats[key] += value
+
+    # ------------------------------------------------------------------
+    # Naming / encoding
+    # ------------------------------------------------------------------
+    def build_object_name(self, user_id: str, camera_id: str, event_type: str, confidence: float,
+                          extension: str = 'jpg') -> str:
+        """user_id/event_camera_timestamp_id_confidence.jpg"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        unique_id = str(uuid.uuid4())[:8]
+        return f"{user_id}/{event_type}_{camera_id}_{timestamp}_{unique_id}_{confidence:.3f}.{extension}"
+
+    @staticmethod
+    def thumbnail_object_name(object_name: str) -> str:
+        """user_id/file.jpg -> user_id/thumbs/file.jpg (client có thể tự suy ra từ ảnh full)"""
+        folder, _, filename = object_name.rpartition('/')
+        return f"{folder}/thumbs/{filename}" if folder else f"thumbs/{filename}"
+
+    def public_url(self, object_name: str) -> str:
+        return f"{self.public_base_url}/{object_name}"
+
+    @staticmethod
+    def _encode_jpeg(frame: np.ndarray, quality: int) -> Optional[bytes]:
+        success, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return buffer.tobytes() if success else None
+
+    def _encode_thumbnail(self, frame: np.ndarray) -> Optional[bytes]:
+        """Thumbnail rộng thumbnail_width (giữ tỉ lệ, INTER_AREA)"""
+        if self.thumbnail_width <= 0:
+            return None
+        height, width = frame.shape[:2]
+        if width > self.thumbnail_width:
+            scale = self.thumbnail_width / float(width)
+            frame = cv2.resize(frame, (self.thumbnail_width, max(1, int(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        return self._encode_jpeg(frame, self.thumbnail_quality)
+
+    # ------------------------------------------------------------------
+    # Upload engine
+    # ------------------------------------------------------------------
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff + full jitter"""
+        delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    def _put_with_retry(self, object_name: str, data: bytes, content_type: str,
+                        metadata: Optional[Dict[str, str]] = None) -> bool:
+        """put_object với exponential backoff; multipart khi object > multipart_threshold"""
+        if not self.client:
+            return False
+
+        size = len(data)
+        multipart = size > self.multipart_threshold
+        start = time.perf_counter()
+
+        for attempt in range(self.max_retries):
+            try:
+                self.client.put_object(
+                    bucket_name=self.bucket_name,
+                    object_name=object_name,
+                    data=io.BytesIO(data),
+                    length=size,
+                    content_type=content_type,
+                    metadata=metadata,
+                    part_size=self.part_size if multipart else 0,
+                    num_parallel_uploads=self.parallel_parts if multipart else 1
+                )
+                self._count(uploads=1, bytes=size, multipart_uploads=int(multipart))
+                with self._stats_lock:
+                    self.upload_stats['last_upload_ms'] = round((time.perf_counter() - start) * 1000, 1)
+                stats_rollup.record_object(self.bucket_name, size)
+                return True
+
+            except S3Error as s3_error:
+                if s3_error.code in NON_RETRYABLE_S3_CODES:
+                    logger.error(f"Error uploading {object_name} to MinIO (not retryable): {s3_error}")
+                    break
+                last_error = s3_error
+            except Exception as upload_error:
+                last_error = upload_error
+
+            if attempt < self.max_retries - 1:
+                delay = self._backoff(attempt)
+                self._count(retries=1)
+                logger.warning(f"Upload attempt {attempt + 1} for {object_name} failed: {last_error}, "
+                               f"retrying in {delay:.2f}s...")
+                time.sleep(delay)
+            else:
+                logger.error(f"Error uploading image to MinIO: {last_error}")
+
+        self._count(failures=1)
+        return False
+
+    def upload_bytes(self, object_name: str, data: bytes, content_type: str = 'application/octet-stream',
+                     metadata: Optional[Dict[str, str]] = None) -> Optional[Tuple[str, str, int]]:
+        """Upload bytes. Returns (object_name, cloud_url, size) hoặc None"""
+        if self._put_with_retry(object_name, data, content_type, metadata):
+            return object_name, self.public_url(object_name), len(data)
+        return None
+
+    def upload_file(self, file_path: str, object_name: str, content_type: str = 'application/octet-stream',
+                    metadata: Optional[Dict[str, str]] = None) -> Optional[Tuple[str, str, int]]:
+        """Upload file lớn (video clip...) qua fput_object multipart song song, có backoff"""
+        if not self.client:
+            logger.error("MinIO client not available")
+            return None
+
+        size = os.path.getsize(file_path)
+        for attempt in range(self.max_retries):
+            try:
+                self.client.fput_object(self.bucket_name, object_name, file_path, content_type=content_type,
+                                        metadata=metadata, part_size=self.part_size,
+                                        num_parallel_uploads=self.parallel_parts)
+                self._count(uploads=1, bytes=size, multipart_uploads=int(size > self.part_size))
+                stats_rollup.record_object(self.bucket_name, size)
+                return object_name, self.public_url(object_name), size
+            except Exception as e:
+                if isinstance(e, S3Error) and e.code in NON_RETRYABLE_S3_CODES:
+                    logger.error(f"Error uploading {file_path} to MinIO (not retryable): {e}")
+                    break
+                if attempt < self.max_retries - 1:
+                    self._count(retries=1)
+                    time.sleep(self._backoff(attempt))
+                else:
+                    logger.error(f"Error uploading {file_path} to MinIO: {e}")
+
+        self._count(failures=1)
+        return None
+
+    def upload_frame_renditions(self, frame: np.ndarray, user_id: str, camera_id: str,
+                                event_type: str, confidence: float,
+                                metadata: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Upload ảnh full + thumbnail song song
+
         Returns:
-            Tuple of (object_name, cloud_url, file_size) if successful, None if failed
+            Dict (object_name, cloud_url, file_size, thumbnail_object, thumbnail_url, thumbnail_size)
+            hoặc None khi upload ảnh full thất bại (thumbnail lỗi không làm fail)
         """
-        
         if not self.client:
             logger.error("MinIO client not available")
             return None
-            
+
         try:
-            # Generate simplified object name: user_id/event_camera_timestamp_id_confidence.jpg
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            unique_id = str(uuid.uuid4())[:8]
-            confidence_str = f'{confidence:.3f}'
-            
-            object_name = f"{user_id}/{event_type}_{camera_id}_{timestamp}_{unique_id}_{confidence_str}.jpg"
-            
+            object_name = self.build_object_name(user_id, camera_id, event_type, confidence)
+            object_metadata = {
+                'user_id': user_id or 'unknown',
+                'camera_id': camera_id,
+                'event_type': event_type,
+                'confidence': str(confidence),
+                'upload_time': datetime.now().strftime('%Y%m%d_%H%M%S')  # Simplified timestamp
+            }
+
+            # Thumbnail encode + upload trên thumbnail pool, song song với ảnh full
+            thumbnail_future: Optional[Future] = None
+            if self.thumbnail_width > 0:
+                thumbnail_object = self.thumbnail_object_name(object_name)
+                thumbnail_future = self.thumbnail_executor.submit(self._upload_thumbnail, frame, thumbnail_object,
+                                                                  {**object_metadata, 'rendition': 'thumbnail'})
+
             # Encode frame as JPEG
-            success, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
-            if not success:
+            image_bytes = self._encode_jpeg(frame, self.jpeg_quality)
+            if image_bytes is None:
                 logger.error("Failed to encode frame as JPEG")
                 return None
-            
-            # Convert to bytes
-            image_bytes = buffer.tobytes()
             file_size = len(image_bytes)
-            
-            # Debug: Log image info
             logger.info(f"Image encoded successfully: size={file_size} bytes, frame_shape={frame.shape}")
-            
-            # Upload to MinIO with retry mechanism
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    # Create fresh stream for each attempt
-                    image_stream = io.BytesIO(image_bytes)
-                    
-                    result = self.client.put_object(
-                        bucket_name=self.bucket_name,
-                        object_name=object_name,
-                        data=image_stream,
-                        length=file_size,
-                        content_type='image/jpeg',
-                        metadata={
-                            'user_id': user_id or 'unknown',
-                            'camera_id': camera_id,
-                            'event_type': event_type,
-                            'confidence': str(confidence),
-                            'upload_time': datetime.now().strftime('%Y%m%d_%H%M%S')  # Simplified timestamp
-                        }
-                    )
-                    
-                    # Generate cloud URL using public domain
-                    cloud_url = f"https://nas.cicca.dpdns.org/cdn-image/{object_name}"
-                    
-                    logger.info(f"Successfully uploaded image to MinIO: {object_name}")
-                    return object_name, cloud_url, file_size
-                    
-                except Exception as upload_error:
-                    if attempt < max_retries - 1:
-                        logger.warning(f"Upload attempt {attempt + 1} failed: {upload_error}, retrying...")
-                        continue
-                    else:
-                        logger.error(f"Error uploading image to MinIO: {upload_error}")
-                        return None
-            
+
+            if not self._put_with_retry(object_name, image_bytes, 'image/jpeg', object_metadata):
+                return None
+            logger.info(f"Successfully uploaded image to MinIO: {object_name}")
+
+            result = {
+                'object_name': object_name,
+                'cloud_url': self.public_url(object_name),
+                'file_size': file_size,
+                'thumbnail_object': None,
+                'thumbnail_url': None,
+                'thumbnail_size': 0
+            }
+            if thumbnail_future is not None:
+                thumbnail = thumbnail_future.result()
+                if thumbnail:
+                    result.update(thumbnail_object=thumbnail[0], thumbnail_url=thumbnail[1],
+                                  thumbnail_size=thumbnail[2])
+            return result
+
+        except Exception as e:
+            logger.error(f"Unexpected error in upload_frame_renditions: {e}")
+            return None
+
+    def _upload_thumbnail(self, frame: np.ndarray, object_name: str,
+                          metadata: Dict[str, str]) -> Optional[Tuple[str, str, int]]:
+        try:
+            thumbnail_bytes = self._encode_thumbnail(frame)
+            if thumbnail_bytes is None:
+                return None
+            result = self.upload_bytes(object_name, thumbnail_bytes, 'image/jpeg', metadata)
+            if result:
+                self._count(thumbnails=1, thumbnail_bytes=len(thumbnail_bytes))
+            return result
         except Exception as e:
-            logger.error(f"Unexpected error in upload_frame_image: {e}")
+            logger.warning(f"Thumbnail upload failed for {object_name}: {e}")
             return None
 
+    def upload_frame_image(self, frame: np.ndarray, user_id: str, camera_id: str,
+                          event_type: str, confidence: float,
+                          metadata: Optional[Dict[str, str]] = None) -> Optional[Tuple[str, str, int]]:
+        """Upload frame image to MinIO with simplified folder structure: user_id/filename
+
+        Returns:
+            Tuple of (object_name, cloud_url, file_size) if successful, None if failed
+        """
+        result = self.upload_frame_renditions(frame, user_id, camera_id, event_type, confidence, metadata)
+        if result is None:
+            return None
+        return result['object_name'], result['cloud_url'], result['file_size']
+
+    def upload_frame_image_async(self, frame: np.ndarray, user_id: str, camera_id: str,
+                                 event_type: str, confidence: float,
+                                 metadata: Optional[Dict[str, str]] = None) -> Future:
+        """Non-blocking upload (Future -> kết quả của upload_frame_renditions)
+
+        Frame phải không bị sửa sau khi gọi (truyền copy nếu caller tái sử dụng buffer)
+        """
+        return self.executor.submit(self.upload_frame_renditions, frame, user_id, camera_id,
+                                    event_type, confidence, metadata)
+
+    def delete_image(self, object_name: str) -> bool:
+        """Xóa ảnh full + thumbnail rendition (nếu có)"""
+        if not self.client:
+            return False
+
+        deleted = True
+        for name in (object_name, self.thumbnail_object_name(object_name)):
+            try:
+                size = self.client.stat_object(self.bucket_name, name).size or 0
+            except S3Error as e:
+                if e.code != 'NoSuchKey':
+                    logger.error(f"Error deleting {name} from MinIO: {e}")
+                    deleted = False
+                continue
+            try:
+                self.client.remove_object(self.bucket_name, name)
+                stats_rollup.record_object(self.bucket_name, -size, count=-1)
+            except Exception as e:
+                logger.error(f"Error deleting {name} from MinIO: {e}")
+                deleted = False
+        return deleted
+
+    def get_upload_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return dict(self.upload_stats)
+
+    def shutdown(self, wait: bool = True):
+        """Chờ các upload đang chạy xong rồi dừng worker pools (upload trước, vì nó chờ thumbnail)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+        if self._thumbnail_executor is not None:
+            self._thumbnail_executor.shutdown(wait=wait)
+            self._thumbnail_executor = None
+
     def get_storage_stats(self) -> Dict[str, Any]:
-        """Get storage statistics from MinIO"""
+        """Get storage statistics from MinIO (O(1) từ stats rollup, list bucket chỉ 1 lần để backfill)"""
         if not self.client:
             return {'error': 'MinIO client not available'}
-            
+
         try:
-            # Get bucket statistics
-            objects = list(self.client.list_objects(self.bucket_name))
-            total_objects = len(objects)
-            total_size = sum(obj.size for obj in objects if obj.size)
-            
+            if stats_rollup.is_ready(f'bucket:{self.bucket_name}'):
+                rollup = stats_rollup.get_bucket_stats(self.bucket_name)
+                total_objects, total_size = rollup['objects'], rollup['bytes']
+            else:
+                # Stream listing (không giữ toàn bộ object list trong RAM)
+                total_objects = 0
+                total_size = 0
+                for obj in self.client.list_objects(self.bucket_name, recursive=True):
+                    total_objects += 1
+                    total_size += obj.size or 0
+                stats_rollup.set_bucket_totals(self.bucket_name, total_objects, total_size)
+
             return {
                 'bucket_name': self.bucket_name,
                 'total_objects': total_objects,
                 'total_size_bytes': total_size,
                 'total_size_mb': round(total_size / (1024 * 1024), 2),
-                'connection_status': 'connected'
+                'connection_status': 'connected',
+                'uploads': self.get_upload_stats()
             }
         except Exception as e:
             return {'error': f'Failed to get storage stats: {e}'}
@@ -151,7 +434,7 @@ class MinIOService:
         """Test MinIO connection"""
         if not self.client:
             return False
-            
+
         try:
             self.client.bucket_exists(self.bucket_name)
             return True
@@ -173,5 +456,5 @@ def get_minio_service() -> Optional[MinIOService]:
         except Exception as e:
             logger.error(f"Failed to create MinIO service: {e}")
             _minio_service_instance = None
-    
+
     return _minio_service_instance
\ No newline at end of file
@@ -12,6 +12,7 @@ import sys
 import uuid
 import os
 import logging
+import functools
 from pathlib import Path
 from service.advanced_healthcare_pipeline import AdvancedHealthcarePipeline
 
@@ -151,6 +152,19 @@ if __name__ == "__main__":
         print("❌ DEFAULT_USER_ID not found in .env file")
         exit(1)
     
+    # Metrics endpoint (METRICS_ENABLED=true -> http://127.0.0.1:9108/metrics)
+    from infrastructure.services.metrics_service import pipeline_metrics
+    if pipeline_metrics.start_server():
+        print(f"📈 Metrics endpoint: http://{pipeline_metrics.host}:{pipeline_metrics.port}/metrics")
+    
+    # HEADLESS=true -> không imshow / không vẽ overlay; PREVIEW_ENABLED=true -> MJPEG/WebSocket preview on-demand
+    from infrastructure.services.preview_service import preview_service, is_headless
+    HEADLESS = is_headless()
+    if HEADLESS:
+        print("🖥️ Headless mode: monitor windows disabled")
+    if preview_service.start_server():
+        print(f"📺 Preview: http://{preview_service.host}:{preview_service.port}/preview/<camera_id>?fps=5&width=640")
+    
     # Load cameras from database and determine mode
     from service.clean_camera_service import camera_service
     
@@ -196,9 +210,13 @@ if __name__ == "__main__":
         # Main processing loop for all cameras - Each camera with its own services
         cameras_data = []
         
-        for i, cam in enumerate(all_cameras):
-            print(f"🔧 Setting up processing for Camera {i+1}: {cam['name']}")
-            
+        # Connect tất cả camera song song (chạy nền trong lúc load model); supervisor retry / restart nền
+        from service.camera_service import CameraService
+        from service.camera_supervisor_service import camera_supervisor
+        from infrastructure.services.clip_buffer_service import clip_buffer_service
+        bootstrap_cameras = {}
+        
+        for cam in all_cameras:
             # Parse resolution from database
             resolution_str = cam.get('resolution', '1920x1080')
             try:
@@ -217,19 +235,23 @@ if __name__ == "__main__":
                 'camera_id': cam['id'],
                 'camera_name': cam['name']
             }
+            bootstrap_cameras[cam['id']] = CameraService(camera_config)
+            camera_supervisor.register(cam['id'], cam['name'], bootstrap_cameras[cam['id']])
+            clip_buffer_service.add_camera(cam['id'], cam['rtsp_url'])
+        
+        for i, cam in enumerate(all_cameras):
+            print(f"🔧 Setting up processing for Camera {i+1}: {cam['name']}")
             
             processor_config = 120
             alerts_folder = "examples/data/saved_frames/alerts"
             
             # Initialize services for THIS camera
-            from service.camera_service import CameraService
             from service.video_processing_service import VideoProcessingService
             from service.fall_detection_service import FallDetectionService
             from service.seizure_detection_service import SeizureDetectionService
             from seizure_detection.seizure_predictor import SeizurePredictor
             
-            individual_camera = CameraService(camera_config)
-            individual_camera.connect()
+            individual_camera = bootstrap_cameras[cam['id']]
             individual_video_processor = VideoProcessingService(processor_config)
             individual_fall_detector = FallDetectionService()
             individual_seizure_detector = SeizureDetectionService()
@@ -258,7 +280,9 @@ if __name__ == "__main__":
             
             print(f"✅ Camera {i+1} ({cam['name']}) processing setup complete!")
         
-        print(f"🎥 All {len(cameras_data)} cameras ready for processing!")
+        ready_count = sum(1 for cam_data in cameras_data if camera_supervisor.is_ready(cam_data['id']))
+        print(f"🎥 All {len(cameras_data)} cameras ready for processing! ({ready_count} connected, "
+              f"{len(cameras_data) - ready_count} connecting/retrying in background)")
         
         # 🔊 Initialize Emergency Alarm Handler (PostgreSQL LISTEN/NOTIFY - psycopg3)
         print("\n🔊 Initializing Emergency Alarm System (REALTIME MODE)...")
@@ -272,6 +296,11 @@ if __name__ == "__main__":
         # Connect PostgreSQL service to alarm handler (use first camera's pipeline)
         emergency_alarm_handler.set_postgresql_service(cameras_data[0]['pipeline'].event_publisher.postgresql_service)
         
+        # Redis event bus (EVENT_BUS_ENABLED=true): ghi lại events chưa persist khi DB lỗi
+        from service.event_bus_db_writer import EventBusDBWriter
+        if EventBusDBWriter(cameras_data[0]['pipeline'].event_publisher.postgresql_service).start():
+            print("   ✅ Event bus DB writer consuming Redis stream")
+        
         # Check audio device status
         audio_status = audio_alert_service.get_status()
         if audio_status['enabled']:
@@ -286,8 +315,6 @@ if __name__ == "__main__":
             print(f"   ⚠️ Audio system disabled - check logs for details")
         
         # Start emergency alarm handler in background (LISTEN/NOTIFY)
-        import asyncio
-        import threading
         import logging
         
         # Enable logging for handler
@@ -296,34 +323,42 @@ if __name__ == "__main__":
             format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         )
         
-        def run_emergency_handler():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(emergency_alarm_handler.start_listening())
-        
-        alarm_thread = threading.Thread(target=run_emergency_handler, daemon=True)
-        alarm_thread.start()
+        # 1 thread host event loop của handler (LISTEN async + reconnect backoff)
+        emergency_alarm_handler.start_in_background()
         
         # Wait for handler to connect
         print("   ⏳ Waiting for handler to connect...")
-        time.sleep(3)
+        if not emergency_alarm_handler.wait_until_connected(timeout=5.0):
+            print("   ⚠️ LISTEN not connected yet - handler keeps retrying in background")
         
         print("   ✅ Emergency alarm handler started (PostgreSQL LISTEN/NOTIFY)!")
         print("   📡 Channel: 'system_alarm_channel'")
         print("   🔌 Connection: Direct (port 5432)")
-        print("   📱 Ready for mobile app triggers (< 50ms response)")
+        # Đo trigger -> first sample (buffer im lặng, không phát tiếng) thay vì chỉ ghi "< 50ms"
+        probe_ms = audio_alert_service.probe_latency()
+        if probe_ms is not None:
+            print(f"   📱 Ready for mobile app triggers (siren trigger -> first sample: {probe_ms:.1f}ms measured)")
+        else:
+            print("   📱 Ready for mobile app triggers (< 50ms response)")
         print("\n" + "=" * 80)
         print("💡 Handler logs will appear above when alarm is triggered")
         print("=" * 80 + "\n")
         
         while True:
             for cam_data in cameras_data:
+                if not camera_supervisor.is_ready(cam_data['id']):
+                    continue
                 try:
-                    frame = cam_data['camera'].get_frame()
+                    camera = cam_data['camera']
+                    if hasattr(camera, 'get_frame_with_timestamp'):
+                        frame, capture_ts = camera.get_frame_with_timestamp()
+                    else:
+                        frame, capture_ts = camera.get_frame(), None
                     if frame is None:
                         continue
                     
-                    result = cam_data['pipeline'].process_frame(frame)
+                    result = cam_data['pipeline'].process_frame(frame, capture_ts=capture_ts)
+                    camera_supervisor.mark_first_frame(cam_data['id'])
                     detection_result = result["detection_result"]
                     person_detections = result["person_detections"]
                     
@@ -397,6 +432,15 @@ if __name__ == "__main__":
                         confidence = detection_result.get('fall_confidence', 0) if 'fall' in emergency_type else detection_result.get('seizure_confidence', 0)
                         print(f"⚠️ WARNING ALERT in {cam_data['name']}: {emergency_type.upper()} detected (confidence: {confidence:.2f})")
                     
+                    # Preview server: overlay chỉ render khi có viewer (trong thread của viewer)
+                    if preview_service.has_viewers(cam_data['id']):
+                        preview_service.publish(cam_data['id'], frame, functools.partial(
+                            cam_data['pipeline'].render_analysis_view,
+                            detection_result=detection_result, person_detections=person_detections))
+                    
+                    if HEADLESS:
+                        continue
+                    
                     # Display windows for each camera (using unique window names)
                     normal_window_name = f"Camera {cam_data['name']} - Normal View"
                     analysis_window_name = f"Camera {cam_data['name']} - Analysis View"
@@ -404,8 +448,7 @@ if __name__ == "__main__":
                     cv2.imshow(normal_window_name, result["normal_window"])
                     
                     # Analysis view with statistics overlay
-                    analysis_view = cam_data['pipeline'].visualize_dual_detection(frame, detection_result, person_detections)
-                    analysis_view = cam_data['pipeline'].draw_statistics_overlay(analysis_view, cam_data['pipeline'].stats)
+                    analysis_view = cam_data['pipeline'].render_analysis_view(frame, detection_result, person_detections)
                     
                     cv2.imshow(analysis_window_name, analysis_view)
                     
@@ -413,6 +456,10 @@ if __name__ == "__main__":
                     print(f"❌ Error processing {cam_data['name']}: {e}")
                     continue
             
+            if HEADLESS:
+                time.sleep(0.001)  # Nhường CPU như waitKey(1)
+                continue
+            
             # Check keyboard input (same as single mode)
             key = cv2.waitKey(1) & 0xFF
             if key == ord('q'):
@@ -423,6 +470,9 @@ if __name__ == "__main__":
                 for cam_data in cameras_data:
                     print(f"\n📊 Statistics for {cam_data['name']}:")
                     cam_data['pipeline'].print_final_statistics()
+                    session = camera_supervisor.get_stats().get(str(cam_data['id']), {})
+                    print(f"   📹 Capture: {session.get('state')} | restarts {session.get('restarts', 0)} "
+                          f"({session.get('last_restart_reason')}) | downtime {session.get('downtime_seconds', 0.0):.1f}s")
         
         print("📱 Notifications stopped")
         print("🏥 Multi-camera healthcare monitoring stopped")
@@ -467,7 +517,11 @@ if __name__ == "__main__":
         from service.seizure_detection_service import SeizureDetectionService
 
         camera = CameraService(camera_config)
-        camera.connect()
+        # Connect nền (timeout giới hạn) trong lúc load model; supervisor retry / restart với backoff
+        from service.camera_supervisor_service import camera_supervisor
+        from infrastructure.services.clip_buffer_service import clip_buffer_service
+        camera_supervisor.register(primary_camera['id'], primary_camera['name'], camera)
+        clip_buffer_service.add_camera(primary_camera['id'], primary_camera['rtsp_url'])
         video_processor = VideoProcessingService(processor_config)
         fall_detector = FallDetectionService()
         seizure_detector = SeizureDetectionService()
@@ -509,6 +563,11 @@ if __name__ == "__main__":
         # Connect PostgreSQL service to alarm handler
         emergency_alarm_handler.set_postgresql_service(pipeline.event_publisher.postgresql_service)
         
+        # Redis event bus (EVENT_BUS_ENABLED=true): ghi lại events chưa persist khi DB lỗi
+        from service.event_bus_db_writer import EventBusDBWriter
+        if EventBusDBWriter(pipeline.event_publisher.postgresql_service).start():
+            print("   ✅ Event bus DB writer consuming Redis stream")
+        
         # Check audio device status
         audio_status = audio_alert_service.get_status()
         if audio_status['enabled']:
@@ -523,8 +582,6 @@ if __name__ == "__main__":
             print(f"   ⚠️ Audio system disabled - check logs for details")
         
         # Start emergency alarm handler in background (LISTEN/NOTIFY)
-        import asyncio
-        import threading
         import logging
         
         # Enable logging for handler
@@ -533,22 +590,23 @@ if __name__ == "__main__":
             format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         )
         
-        def run_emergency_handler():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(emergency_alarm_handler.start_listening())
-        
-        alarm_thread = threading.Thread(target=run_emergency_handler, daemon=True)
-        alarm_thread.start()
+        # 1 thread host event loop của handler (LISTEN async + reconnect backoff)
+        emergency_alarm_handler.start_in_background()
         
         # Wait for handler to connect
         print("   ⏳ Waiting for handler to connect...")
-        time.sleep(3)
+        if not emergency_alarm_handler.wait_until_connected(timeout=5.0):
+            print("   ⚠️ LISTEN not connected yet - handler keeps retrying in background")
         
         print("   ✅ Emergency alarm handler started (PostgreSQL LISTEN/NOTIFY)!")
         print("   📡 Channel: 'system_alarm_channel'")
         print("   🔌 Connection: Direct (port 5432)")
-        print("   📱 Ready for mobile app triggers (< 50ms response)")
+        # Đo trigger -> first sample (buffer im lặng, không phát tiếng) thay vì chỉ ghi "< 50ms"
+        probe_ms = audio_alert_service.probe_latency()
+        if probe_ms is not None:
+            print(f"   📱 Ready for mobile app triggers (siren trigger -> first sample: {probe_ms:.1f}ms measured)")
+        else:
+            print("   📱 Ready for mobile app triggers (< 50ms response)")
         print("\n" + "=" * 80)
         print("💡 Handler logs will appear above when alarm is triggered")
         print("=" * 80 + "\n")
@@ -592,12 +650,20 @@ if __name__ == "__main__":
     frame_count = 0
 
     while True:
-        frame = camera.get_frame()
+        if not camera_supervisor.is_ready(primary_camera['id']):
+            time.sleep(0.05)  # Camera đang connect / retry nền
+            continue
+        if hasattr(camera, 'get_frame_with_timestamp'):
+            frame, capture_ts = camera.get_frame_with_timestamp()
+        else:
+            frame, capture_ts = camera.get_frame(), None
         if frame is None:
-            break
+            time.sleep(0.01)  # Stream thread chưa có frame đầu tiên
+            continue
         
         frame_count += 1
-        result = pipeline.process_frame(frame)
+        result = pipeline.process_frame(frame, capture_ts=capture_ts)
+        camera_supervisor.mark_first_frame(primary_camera['id'])
         detection_result = result["detection_result"]
         person_detections = result["person_detections"]
         
@@ -715,12 +781,20 @@ if __name__ == "__main__":
                 import traceback
                 traceback.print_exc()
         
+        # Preview server: overlay chỉ render khi có viewer (trong thread của viewer)
+        if preview_service.has_viewers(primary_camera['id']):
+            preview_service.publish(primary_camera['id'], frame, functools.partial(
+                pipeline.render_analysis_view,
+                detection_result=detection_result, person_detections=person_detections))
+        
+        if HEADLESS:
+            continue
+        
         # Hiển thị Normal View
         cv2.imshow("Healthcare Monitor - Normal View", result["normal_window"])
         
         # Hiển thị Analysis View với statistics overlay
-        analysis_view = pipeline.visualize_dual_detection(frame, detection_result, person_detections)
-        analysis_view = pipeline.draw_statistics_overlay(analysis_view, pipeline.stats)
+        analysis_view = pipeline.render_analysis_view(frame, detection_result, person_detections)
         
         # Add intelligent action status to analysis view
         if INTELLIGENT_ACTIONS_AVAILABLE and caption_pipeline:
@@ -764,13 +838,14 @@ if __name__ == "__main__":
             print("   This will play a 5-second test alarm")
             try:
                 test_user_id = os.getenv('DEFAULT_USER_ID', 'test_user')
-                test_result = asyncio.run(audio_alert_service.play_emergency_alarm(
+                test_result = audio_alert_service.trigger_alarm(
                     user_id=test_user_id,
                     triggered_by='manual_test',
                     duration=5  # Short 5-second test
-                ))
+                ).result(timeout=10)
                 if test_result['success']:
                     print(f"   ✅ Test alarm played successfully!")
+                    print(f"      Trigger -> first sample: {test_result.get('first_sample_ms', 0):.1f}ms")
                     print(f"      Volume: {test_result.get('volume', 1.0) * 100:.0f}%")
                     print(f"      Duration: {test_result.get('duration', 5)}s")
                 else:
@@ -6,6 +6,9 @@ Combines MediaPipe, YOLOv8-Pose, Professional Models, and fallback methods for m
 import cv2
 import numpy as np
 import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from typing import Optional, List, Tuple, Union, Dict
 import time
 
@@ -47,7 +50,10 @@ class UltimatePoseEstimator:
                  use_yolo: bool = True, 
                  use_fallback: bool = True,
                  auto_switch: bool = True,
-                 performance_mode: bool = False):
+                 performance_mode: bool = False,
+                 latency_budget_ms: Optional[float] = None,
+                 race_methods: bool = False,
+                 stats_window: int = 50):
         """
         Initialize ultimate pose estimator
         
@@ -57,6 +63,9 @@ class UltimatePoseEstimator:
             use_fallback: Enable fallback methods
             auto_switch: Automatically switch to best performing method
             performance_mode: Enable performance optimizations (faster but simpler)
+            latency_budget_ms: Default per-call deadline (None = no deadline)
+            race_methods: Run the two best model methods in parallel, take first valid result
+            stats_window: Number of recent calls per method used for p95 and success rate
         """
         self.logger = logging.getLogger(__name__)
         self.use_mediapipe = use_mediapipe and MEDIAPIPE_AVAILABLE
@@ -72,6 +81,20 @@ class UltimatePoseEstimator:
             'fallback': {'success': 0, 'total': 0, 'avg_time': 0, 'confidence_sum': 0}
         }
         
+        # Deadline-aware selection: rolling (latency, success, confidence) per method, guarded by _stats_lock
+        self.latency_budget_ms = latency_budget_ms
+        self.race_methods = race_methods
+        self.stats_window = stats_window
+        self.min_samples = 5
+        self.reorder_interval = 10
+        self._rolling_stats: Dict[str, deque] = {m: deque(maxlen=stats_window) for m in self.performance_stats}
+        self._method_order_cache: Optional[Tuple[int, List[str]]] = None
+        self._calls = 0
+        self._deadline_stats = {'calls': 0, 'deadline_misses': 0, 'skipped_over_budget': 0, 'races': 0}
+        self._stats_lock = threading.Lock()
+        self._method_locks = {m: threading.Lock() for m in ('mediapipe', 'yolo', 'fallback')}
+        self._race_executor = None
+        
         # Current preferred method (auto-adjusted based on performance)
         self.preferred_method = 'mediapipe' if self.use_mediapipe else 'yolo' if self.use_yolo else 'fallback'
         
@@ -171,70 +194,179 @@ class UltimatePoseEstimator:
             26: 14, # right_knee
         }
     
-    def extract_keypoints(self, frame: np.ndarray, person_bbox: Optional[List[int]] = None) -> Optional[np.ndarray]:
+    def extract_keypoints(self, frame: np.ndarray, person_bbox: Optional[List[int]] = None,
+                          budget_ms: Optional[float] = None) -> Optional[np.ndarray]:
         """
         Extract keypoints using the best available method
-        Tries methods in order of preference and performance
+        Methods are ordered by rolling p95 latency and success rate;
+        methods whose p95 no longer fits the remaining budget are skipped
         
         Args:
             frame: Input frame (H, W, 3)
             person_bbox: Optional person bounding box [x1, y1, x2, y2]
+            budget_ms: Per-call deadline, overrides latency_budget_ms
             
         Returns:
             np.ndarray: Keypoints (15, 3) with [x, y, confidence] or None
         """
+        budget_ms = budget_ms if budget_ms is not None else self.latency_budget_ms
+        deadline = time.time() + budget_ms / 1000.0 if budget_ms else None
         methods_to_try = self._get_method_order()
+        self._count_deadline('calls')
+        
+        # Race the two best model methods, keep the rest as sequential fallback
+        if self.race_methods:
+            race_candidates = [m for m in methods_to_try if m != 'fallback'][:2]
+            if len(race_candidates) == 2:
+                keypoints = self._race_extract(frame, race_candidates, person_bbox, deadline)
+                if keypoints is not None:
+                    return keypoints
+                methods_to_try = [m for m in methods_to_try if m not in race_candidates]
         
         for method in methods_to_try:
-            try:
-                start_time = time.time()
-                keypoints = self._extract_with_method(frame, method, person_bbox)
-                processing_time = time.time() - start_time
-                
-                # Update performance stats
-                self.performance_stats[method]['total'] += 1
-                
-                if keypoints is not None and self._validate_keypoints(keypoints):
-                    self.performance_stats[method]['success'] += 1
-                    self.performance_stats[method]['avg_time'] = (
-                        (self.performance_stats[method]['avg_time'] * 
-                         (self.performance_stats[method]['success'] - 1) + processing_time) /
-                        self.performance_stats[method]['success']
-                    )
-                    self.performance_stats[method]['confidence_sum'] += np.mean(keypoints[:, 2])
-                    
-                    # Update preferred method if auto_switch enabled
-                    if self.auto_switch:
-                        self._update_preferred_method()
-                    
-                    return keypoints
-                    
-            except Exception as e:
-                self.logger.warning(f"Method {method} failed: {e}")
-                continue
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._count_deadline('deadline_misses')
+                    return None
+                p95 = self._method_p95(method)
+                if p95 is not None and p95 > remaining and method != methods_to_try[-1]:
+                    self._count_deadline('skipped_over_budget')
+                    continue
+            
+            keypoints = self._run_method(frame, method, person_bbox)
+            if keypoints is not None:
+                return keypoints
         
         # All methods failed
         return None
     
+    def _count_deadline(self, key: str):
+        with self._stats_lock:
+            self._deadline_stats[key] += 1
+    
+    def _run_method(self, frame: np.ndarray, method: str, person_bbox: Optional[List[int]]) -> Optional[np.ndarray]:
+        """Run one method, record latency/success, return validated keypoints"""
+        # Loser of a previous race may still be running on this estimator
+        if not self._method_locks[method].acquire(blocking=False):
+            return None
+        
+        start_time = time.time()
+        keypoints = None
+        try:
+            keypoints = self._extract_with_method(frame, method, person_bbox)
+            if keypoints is not None and not self._validate_keypoints(keypoints):
+                keypoints = None
+        except Exception as e:
+            self.logger.warning(f"Method {method} failed: {e}")
+            keypoints = None
+        finally:
+            self._method_locks[method].release()
+        
+        self._record_result(method, time.time() - start_time, keypoints)
+        return keypoints
+    
+    def _race_extract(self, frame: np.ndarray, methods: List[str], person_bbox: Optional[List[int]],
+                      deadline: Optional[float]) -> Optional[np.ndarray]:
+        """Run methods in parallel, return the first valid result (losers finish in background)"""
+        if self._race_executor is None:
+            self._race_executor = ThreadPoolExecutor(max_workers=len(methods), thread_name_prefix='pose-race')
+        self._count_deadline('races')
+        
+        pending = {self._race_executor.submit(self._run_method, frame, method, person_bbox)
+                   for method in methods}
+        while pending:
+            timeout = max(0.0, deadline - time.time()) if deadline is not None else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                self._count_deadline('deadline_misses')
+                return None
+            for future in done:
+                keypoints = future.result()
+                if keypoints is not None:
+                    return keypoints
+        return None
+    
+    def _record_result(self, method: str, processing_time: float, keypoints: Optional[np.ndarray]):
+        """Update global and rolling stats for one method call (race losers write from pool threads)"""
+        success = keypoints is not None
+        confidence = float(np.mean(keypoints[:, 2])) if success else 0.0
+        with self._stats_lock:
+            stats = self.performance_stats[method]
+            stats['total'] += 1
+            if success:
+                stats['success'] += 1
+                stats['avg_time'] = (stats['avg_time'] * (stats['success'] - 1) + processing_time) / stats['success']
+                stats['confidence_sum'] += confidence
+            
+            self._rolling_stats[method].append((processing_time, success, confidence))
+            
+            # Head method failing -> force re-order on next call
+            cached = self._method_order_cache
+            if not success and cached and cached[1] and cached[1][0] == method:
+                self._method_order_cache = None
+        
+        if success and self.auto_switch:
+            self._update_preferred_method()
+    
+    def _samples(self, method: str) -> List[Tuple[float, bool, float]]:
+        """Snapshot rolling samples của 1 method (copy dưới lock, deque có thể đang bị append)"""
+        with self._stats_lock:
+            return list(self._rolling_stats[method])
+    
+    def _method_p95(self, method: str, samples: Optional[List] = None) -> Optional[float]:
+        """Rolling p95 latency (seconds) of a method"""
+        samples = self._samples(method) if samples is None else samples
+        if len(samples) < self.min_samples:
+            return None
+        return float(np.percentile([sample[0] for sample in samples], 95))
+    
+    def _method_success_rate(self, method: str, samples: Optional[List] = None) -> Optional[float]:
+        """Rolling success rate of a method"""
+        samples = self._samples(method) if samples is None else samples
+        if len(samples) < self.min_samples:
+            return None
+        return sum(1 for sample in samples if sample[1]) / len(samples)
+    
+    def _method_confidence(self, method: str, samples: Optional[List] = None) -> float:
+        """Rolling mean keypoint confidence of successful calls"""
+        samples = self._samples(method) if samples is None else samples
+        confidences = [sample[2] for sample in samples if sample[1]]
+        return float(np.mean(confidences)) if confidences else 0.0
+    
     def _get_method_order(self) -> List[str]:
+        """Cached method order, recomputed every reorder_interval calls"""
+        with self._stats_lock:
+            self._calls += 1
+            calls = self._calls
+            cached = self._method_order_cache
+        if cached and calls - cached[0] < self.reorder_interval:
+            return cached[1]
+        
+        order = self._compute_method_order()
+        with self._stats_lock:
+            self._method_order_cache = (calls, order)
+        return order
+    
+    def _compute_method_order(self) -> List[str]:
         """Get the order of methods to try based on performance and preference"""
         available_methods = []
         
         if self.auto_switch:
-            # Sort by performance score (success rate / avg_time)
+            # Sort by rolling performance score (p95 instead of mean time)
             method_scores = {}
+            default_scores = {'mediapipe': 0.9, 'yolo': 0.8, 'fallback': 0.3}
             
-            for method, stats in self.performance_stats.items():
-                if stats['total'] > 0:
-                    success_rate = stats['success'] / stats['total']
-                    avg_time = stats['avg_time'] if stats['avg_time'] > 0 else 1.0
-                    confidence_avg = stats['confidence_sum'] / stats['success'] if stats['success'] > 0 else 0
-                    
-                    # Combined score: success_rate * confidence * (1/time)
-                    method_scores[method] = success_rate * confidence_avg * (1.0 / avg_time)
+            for method in self.performance_stats:
+                samples = self._samples(method)
+                success_rate = self._method_success_rate(method, samples)
+                p95 = self._method_p95(method, samples)
+                if success_rate is not None and p95 is not None:
+                    # Combined score: success_rate * confidence * (1/p95)
+                    confidence_avg = self._method_confidence(method, samples)
+                    method_scores[method] = success_rate * confidence_avg * (1.0 / max(p95, 1e-3))
                 else:
                     # No data yet, use default priority
-                    default_scores = {'mediapipe': 0.9, 'yolo': 0.8, 'fallback': 0.3}
                     method_scores[method] = default_scores.get(method, 0.1)
             
             # Sort by score (highest first)
@@ -639,10 +771,31 @@ class UltimatePoseEstimator:
                     'successful_attempts': perf_stats['success']
                 }
         
+        # Deadline / rolling window details
+        stats['latency_budget_ms'] = self.latency_budget_ms
+        stats['race_methods'] = self.race_methods
+        with self._stats_lock:
+            stats['deadline'] = dict(self._deadline_stats)
+        stats['method_order'] = self._compute_method_order()
+        stats['rolling'] = {}
+        for method in self._rolling_stats:
+            samples = self._samples(method)
+            if not samples:
+                continue
+            p95 = self._method_p95(method, samples)
+            success_rate = self._method_success_rate(method, samples)
+            stats['rolling'][method] = {
+                'p95_ms': p95 * 1000 if p95 is not None else None,
+                'success_rate': success_rate * 100 if success_rate is not None else None,
+                'samples': len(samples)
+            }
+        
         return stats
     
     def __del__(self):
         """Cleanup resources"""
+        if getattr(self, '_race_executor', None):
+            self._race_executor.shutdown(wait=False)
         if self.mediapipe_estimator:
             try:
                 self.mediapipe_estimator.close()
@@ -655,7 +808,9 @@ def get_ultimate_pose_estimator(
     use_mediapipe: bool = True,
     use_yolo: bool = True, 
     use_fallback: bool = True,
-    auto_switch: bool = True
+    auto_switch: bool = True,
+    latency_budget_ms: Optional[float] = None,
+    race_methods: bool = False
 ) -> UltimatePoseEstimator:
     """
     Factory function to get ultimate pose estimator
@@ -665,6 +820,8 @@ def get_ultimate_pose_estimator(
         use_yolo: Enable YOLOv8 pose estimation
         use_fallback: Enable fallback methods
         auto_switch: Auto-optimize method selection
+        latency_budget_ms: Per-call deadline in milliseconds
+        race_methods: Race the two best methods in parallel
         
     Returns:
         UltimatePoseEstimator: Configured ultimate pose estimator
@@ -673,5 +830,7 @@ def get_ultimate_pose_estimator(
         use_mediapipe=use_mediapipe,
         use_yolo=use_yolo,
         use_fallback=use_fallback,
-        auto_switch=auto_switch
+        auto_switch=auto_switch,
+        latency_budget_ms=latency_budget_ms,
+        race_methods=race_methods
     )
@@ -27,6 +27,7 @@ except ImportError as e:
     VSVIG_AVAILABLE = False
 
 from .yolov8_pose_estimator import YOLOv8PoseEstimator
+from infrastructure.services.metrics_service import pipeline_metrics
 
 class VSViGSeizureDetector:
     """
@@ -222,6 +223,7 @@ class VSViGSeizureDetector:
             # Maintain temporal window
             if len(self.frame_buffer) > self.temporal_window:
                 self.frame_buffer.pop(0)
+            pipeline_metrics.set_queue_depth('seizure_temporal_buffer', len(self.frame_buffer))
             
             # Debug: Show buffer filling progress every 5 frames
             if len(self.frame_buffer) % 5 == 0 and len(self.frame_buffer) < self.temporal_window:
@@ -545,6 +547,19 @@ class VSViGSeizureDetector:
         self.frame_buffer.clear()
         self.logger.info("Temporal buffer reset")
     
+    def reset(self):
+        """Reset toàn bộ state theo video / session (giữ model đã load)"""
+        self.frame_buffer.clear()
+        self.last_seizure_detection_time = 0
+        self.current_seizure_state = False
+        self.stats = {
+            'total_frames_processed': 0,
+            'seizures_detected': 0,
+            'average_confidence': 0.0,
+            'last_seizure_time': None,
+            'pose_extraction_failures': 0
+        }
+    
     def get_statistics(self) -> Dict:
         """
         Get seizure detection statistics
@@ -2,6 +2,8 @@ import cv2
 import numpy as np
 import time
 import os
+import uuid
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 
@@ -11,6 +13,17 @@ from service.emergency_notification_dispatcher import HealthcareEventPublisher
 # Import snapshot service for image storage
 from infrastructure.services.snapshot_service import get_snapshot_service
 
+# Per-stage tracing (no-op khi METRICS_ENABLED=false)
+from infrastructure.services.metrics_service import pipeline_metrics, LatencyTrace
+from video_processing.frame_context import FrameContext
+from infrastructure.services.preview_service import is_headless
+from infrastructure.services.event_bus_service import event_bus, EVENT_SYSTEM_STATUS
+from infrastructure.services.local_spool_service import local_spool, UpstreamUnavailable, SPOOL_SNAPSHOT
+from infrastructure.services.config_snapshot_service import config_store
+from infrastructure.services.clip_buffer_service import clip_buffer_service
+from infrastructure.services.detection_recorder_service import DetectionRecorder, recording_enabled
+from infrastructure.services.inference_cache_service import inference_cache
+
 class AdvancedHealthcarePipeline:
     def __init__(self, camera, video_processor, fall_detector, seizure_detector, seizure_predictor, alerts_folder, camera_id=None, user_id=None):
         self.camera = camera
@@ -81,24 +94,77 @@ class AdvancedHealthcarePipeline:
             'seizure_detection_time': 0.0,
             'total_detection_time': 0.0
         }
+        
+        # Capture -> persisted event latency (fall/seizure)
+        self._frame_capture_ts = None
+        self._frame_received_ts = None
+        self.latency_history = deque(maxlen=100)
+        
+        # System status event lên event bus (EVENT_BUS_ENABLED=true)
+        self.status_interval = float(os.getenv('EVENT_BUS_STATUS_INTERVAL', '30'))
+        self._last_status_publish = 0.0
+        
+        # HEADLESS=true: không vẽ normal_window trong hot path (preview render on-demand)
+        self.headless = is_headless()
+        
+        # Frame hiện tại / trước (reference, không copy) + FrameContext của chúng cho motion level
+        self._current_frame = None
+        self._frame_context = None
+        self._prev_frame = None
+        self._prev_context = None
+        
+        # Per-frame recording (RECORDING_ENABLED=true): giá trị raw của frame hiện tại cho recorder
+        self.recorder = None
+        if recording_enabled():
+            try:
+                self.recorder = DetectionRecorder(camera_id or 'default')
+            except Exception as e:
+                print(f"⚠️ Detection recorder unavailable: {e}")
+        self._frame_record = {}
 
-    def process_frame(self, frame):
-        """Process frame với skip frame logic và keyframe detection như file mẫu"""
+    def process_frame(self, frame, capture_ts=None):
+        """Process frame với skip frame logic và keyframe detection như file mẫu
+        
+        Args:
+            frame: Frame BGR
+            capture_ts: time.time() lúc camera decode frame (None = hỏi camera / dùng now)
+        """
+        # Replay video (camera có get_replay_key): YOLO / pose output lấy từ inference cache nếu đã có
+        replay_key = self.camera.get_replay_key() if hasattr(self.camera, 'get_replay_key') else None
+        with pipeline_metrics.span('frame', self.camera_id), inference_cache.frame(replay_key):
+            return self._process_frame(frame, capture_ts)
+
+    def _process_frame(self, frame, capture_ts=None):
+        # Capture timestamp cho fall/seizure latency tracking
+        self._frame_received_ts = time.time()
+        if capture_ts is None and hasattr(self.camera, 'get_frame_timestamp'):
+            capture_ts = self.camera.get_frame_timestamp()
+        self._frame_capture_ts = capture_ts or self._frame_received_ts
+        
         # Cập nhật total frames
         self.stats['total_frames'] += 1
+        if event_bus.enabled:
+            self._maybe_publish_status()
+        
+        # Derived images (gray/resized/blurred) tính một lần, dùng chung cho mọi analyzer
+        frame_context = FrameContext(frame, self._frame_capture_ts)
         
-        # Lưu frame trước và hiện tại để tính motion  
-        prev_frame = getattr(self, '_prev_frame', None)
-        self._current_frame = frame.copy()  # Store current frame for motion calc
-        self._prev_frame = frame.copy()
+        # Frame trước = frame hiện tại của lần gọi trước (giữ reference + context trước khi ghi đè, không copy;
+        # camera trả array mới mỗi frame và pipeline không vẽ in-place lên frame)
+        self._prev_frame = self._current_frame
+        self._prev_context = self._frame_context
+        self._current_frame = frame
+        self._frame_context = frame_context
 
         # SKIP FRAME LOGIC - chỉ xử lý keyframe quan trọng
-        processing_result = self.video_processor.process_frame(frame)
+        processing_result = self.video_processor.process_frame(frame, frame_context=frame_context)
         
         # Nếu không phải keyframe, trả về kết quả đơn giản
         if not processing_result['processed']:
-            normal_window = self.create_normal_camera_window(frame, [])
-            ai_window = frame.copy()
+            normal_window = None if self.headless else self.create_normal_camera_window(frame, [])
+            ai_window = self._readonly_view(frame)
+            if self.recorder is not None:
+                self.recorder.append(self._frame_capture_ts, self.stats['total_frames'])
             return {
                 "normal_window": normal_window, 
                 "ai_window": ai_window,
@@ -116,14 +182,17 @@ class AdvancedHealthcarePipeline:
         persons = processing_result.get('person_detections', processing_result.get('detections', []))
         
         # Process dual detection như file mẫu
+        self._frame_record = {}
         detection_result = self.process_dual_detection(frame, persons)
+        if self.recorder is not None:
+            self._record_frame(persons, detection_result)
         
         # Update statistics
         self.update_statistics(detection_result, len(persons))
 
         # Vẽ overlay
-        normal_window = self.create_normal_camera_window(frame, persons)
-        ai_window = frame.copy()
+        normal_window = None if self.headless else self.create_normal_camera_window(frame, persons)
+        ai_window = self._readonly_view(frame)
 
         return {
             "normal_window": normal_window,
@@ -148,15 +217,19 @@ class AdvancedHealthcarePipeline:
             self.detection_history['fall_confirmation_frames'] = 0
             self.detection_history['seizure_confirmation_frames'] = 0
             return result
+        
+        # Ngưỡng của camera từ config snapshot hiện tại (1 lần / frame, hot-reload qua NOTIFY)
+        config = config_store.for_camera(self.camera_id)
             
         # Calculate motion level for enhanced detection
         motion_level = self.calculate_motion_level_person(person_detections)
+        self._frame_record['motion_level'] = motion_level
         self.detection_history['motion_levels'].append(motion_level)
         if len(self.detection_history['motion_levels']) > self.detection_history['max_history']:
             self.detection_history['motion_levels'].pop(0)
             
         # Update significant motion tracker
-        if motion_level > 0.3:
+        if motion_level > config.significant_motion_threshold:
             self.detection_history['last_significant_motion'] = time.time()
             
         # Get primary person (largest detection)
@@ -166,6 +239,7 @@ class AdvancedHealthcarePipeline:
             int(primary_person['bbox'][0] + primary_person['bbox'][2]),
             int(primary_person['bbox'][1] + primary_person['bbox'][3])
         ]
+        self._frame_record['bbox'] = primary_person['bbox'][:4]
         
         # Fall detection with improvements và COOLDOWN LOGIC
         fall_start = time.time()
@@ -173,25 +247,29 @@ class AdvancedHealthcarePipeline:
         # COOLDOWN: Prevent fall detection spam - INCREASED
         current_time = time.time()
         if (self.stats['last_fall_time'] and 
-            current_time - self.stats['last_fall_time'] < 8.0):  # Tăng lên 8s để giảm spam
+            current_time - self.stats['last_fall_time'] < config.fall_cooldown_seconds):  # 8s mặc định để giảm spam
             result['fall_confidence'] = 0.0  # Force reset để tránh spam
         else:
             try:
-                fall_result = self.fall_detector.detect_fall(frame, primary_person)
+                with pipeline_metrics.span('fall', self.camera_id):
+                    fall_result = self.fall_detector.detect_fall(frame, primary_person,
+                                                                 frame_context=self._frame_context)
                 base_fall_confidence = fall_result['confidence']
+                self._frame_record['fall_confidence'] = base_fall_confidence
                 
                 # Debug: Log fall detection attempt (disabled to reduce noise)
                 # if self.stats['total_frames'] % 300 == 0:  # Every 10 seconds (disabled)
                 #     print(f"🔍 Fall Detection Debug: Confidence={base_fall_confidence:.3f}, Motion={motion_level:.3f}")
                 
                 # HIGH THRESHOLD: Prevent false positives
-                if base_fall_confidence >= 0.7:  # Tăng lên 0.7 để giảm false positive
+                if base_fall_confidence >= config.fall_confidence_threshold:  # 0.7 mặc định để giảm false positive
                     result['fall_detected'] = True
                     result['fall_confidence'] = base_fall_confidence
                     self.stats['fall_detections'] += 1
                     self.stats['last_fall_time'] = time.time()
                     print(f"🚨 FALL DETECTED! Confidence: {base_fall_confidence:.2f} | Motion: {motion_level:.2f} | Direct Detection")
                     print(f"📊 Alert Level: HIGH | Emergency Type: Fall")
+                    latency_trace = self._start_latency_trace('fall')
                     
                     # Save detection snapshot to MinIO
                     snapshot_id = self.save_detection_snapshot(
@@ -206,6 +284,7 @@ class AdvancedHealthcarePipeline:
                     )
                     if snapshot_id:
                         print(f"📸 Fall image saved to MinIO: {snapshot_id[:8]}...")
+                    latency_trace.mark('snapshot_saved')
                     
                     # Publish fall detection to Supabase realtime
                     try:
@@ -219,11 +298,14 @@ class AdvancedHealthcarePipeline:
                             'description': f'Fall activity detected with {base_fall_confidence:.1%} confidence'  # Add description
                         }
                         
-                        response = self.event_publisher.publish_fall_detection(
-                            confidence=base_fall_confidence,
-                            bounding_boxes=bounding_boxes,
-                            context=context_data
-                        )
+                        with pipeline_metrics.span('publish', self.camera_id):
+                            response = self.event_publisher.publish_fall_detection(
+                                confidence=base_fall_confidence,
+                                bounding_boxes=bounding_boxes,
+                                context=context_data,
+                                latency_trace=latency_trace
+                            )
+                        self._finish_latency_trace(latency_trace, response)
                         
                         if response.get('alert_created'):
                             print(f"📡 Fall alert created: Priority {response.get('priority_level')}")
@@ -239,14 +321,14 @@ class AdvancedHealthcarePipeline:
                     smoothed_fall_confidence = self.smooth_detection_confidence(enhanced_fall_confidence, 'fall')
                     
                     # BALANCED THRESHOLD: Reduce false positives while keeping sensitivity
-                    fall_threshold = 0.4  # Tăng từ 0.1 lên 0.4 để giảm false positive
+                    fall_threshold = config.fall_confirm_threshold  # 0.4 mặc định để giảm false positive
                     if smoothed_fall_confidence > fall_threshold:
                         self.detection_history['fall_confirmation_frames'] += 1
                     else:
                         self.detection_history['fall_confirmation_frames'] = max(0, self.detection_history['fall_confirmation_frames'] - 1)
                     
                     # REQUIRE MORE FRAMES: More confirmation frames to reduce spam
-                    min_confirmation_frames = 4  # Tăng từ 2 lên 4 để chắc chắn hơn
+                    min_confirmation_frames = config.fall_min_confirmation_frames  # 4 mặc định để chắc chắn hơn
                     if self.detection_history['fall_confirmation_frames'] >= min_confirmation_frames:
                         result['fall_detected'] = True
                         result['fall_confidence'] = smoothed_fall_confidence
@@ -254,6 +336,7 @@ class AdvancedHealthcarePipeline:
                         self.stats['last_fall_time'] = time.time()
                         print(f"🚨 FALL DETECTED! Confidence: {smoothed_fall_confidence:.2f} | Motion: {motion_level:.2f} | Frames: {self.detection_history['fall_confirmation_frames']}")
                         print(f"📊 Alert Level: HIGH | Emergency Type: Fall | Enhanced Detection")
+                        latency_trace = self._start_latency_trace('fall')
                         
                         # Save detection snapshot to MinIO
                         snapshot_id = self.save_detection_snapshot(
@@ -269,6 +352,7 @@ class AdvancedHealthcarePipeline:
                         )
                         if snapshot_id:
                             print(f"📸 Fall confirmation image saved: {snapshot_id[:8]}...")
+                        latency_trace.mark('snapshot_saved')
                         
                         # Publish fall detection to Supabase realtime
                         try:
@@ -283,11 +367,14 @@ class AdvancedHealthcarePipeline:
                                 'description': f'Fall activity detected with {smoothed_fall_confidence:.1%} confidence'  # Add description
                             }
                             
-                            response = self.event_publisher.publish_fall_detection(
-                                confidence=smoothed_fall_confidence,
-                                bounding_boxes=bounding_boxes,
-                                context=context_data
-                            )
+                            with pipeline_metrics.span('publish', self.camera_id):
+                                response = self.event_publisher.publish_fall_detection(
+                                    confidence=smoothed_fall_confidence,
+                                    bounding_boxes=bounding_boxes,
+                                    context=context_data,
+                                    latency_trace=latency_trace
+                                )
+                            self._finish_latency_trace(latency_trace, response)
                             
                             if response.get('alert_created'):
                                 print(f"📡 Fall alert created: Priority {response.get('priority_level')}")
@@ -312,9 +399,11 @@ class AdvancedHealthcarePipeline:
         
         if self.seizure_detector is not None:
             try:
-                seizure_result = self.seizure_detector.detect_seizure(frame, person_bbox)
+                with pipeline_metrics.span('seizure', self.camera_id):
+                    seizure_result = self.seizure_detector.detect_seizure(frame, person_bbox)
                 result['seizure_ready'] = seizure_result.get('temporal_ready', False)
                 result['keypoints'] = seizure_result.get('keypoints')
+                self._frame_record['seizure_confidence'] = seizure_result.get('confidence') if result['seizure_ready'] else None
                 
                 # Debug: Always show seizure detector status with instructions
                 if self.stats['total_frames'] % 60 == 0:  # Every 2 seconds
@@ -343,8 +432,8 @@ class AdvancedHealthcarePipeline:
                         print(f"🔍 Seizure Debug: Base={base_seizure_confidence:.3f}, Final={final_seizure_confidence:.3f}, Motion={motion_level:.3f}, Temporal={seizure_result.get('temporal_ready', False)}")
                     
                     # EXTREMELY SENSITIVE: Super low thresholds for easy detection
-                    seizure_threshold = 0.02   # Cực thấp để dễ detect
-                    warning_threshold = 0.01  # Cực thấp để có cảnh báo
+                    seizure_threshold = config.seizure_threshold   # 0.02 mặc định - cực thấp để dễ detect
+                    warning_threshold = config.seizure_warning_threshold  # 0.01 mặc định - cực thấp để có cảnh báo
                     
                     if final_seizure_confidence > seizure_threshold:
                         self.detection_history['seizure_confirmation_frames'] += 1
@@ -359,18 +448,19 @@ class AdvancedHealthcarePipeline:
                         self.detection_history['seizure_confirmation_frames'] = 0
                     
                     # MORE SENSITIVE: Fewer confirmation frames needed
-                    min_seizure_confirmation = 1  # Chỉ cần 1 frame để confirm - siêu nhạy
+                    min_seizure_confirmation = config.seizure_min_confirmation_frames  # 1 frame mặc định - siêu nhạy
                     if self.detection_history['seizure_confirmation_frames'] >= min_seizure_confirmation:
                         # COOLDOWN CHECK: Shorter cooldown for testing  
                         current_time = time.time()
                         if (self.stats['last_seizure_time'] is None or 
-                            current_time - self.stats['last_seizure_time'] > 0.5):  # Chỉ 0.5 giây cooldown - rất nhạy
+                            current_time - self.stats['last_seizure_time'] > config.seizure_cooldown_seconds):  # 0.5s mặc định - rất nhạy
                             result['seizure_detected'] = True
                             result['seizure_confidence'] = final_seizure_confidence
                             self.stats['seizure_detections'] += 1
                             self.stats['last_seizure_time'] = time.time()
                             print(f"🚨 SEIZURE DETECTED! Confidence: {final_seizure_confidence:.2f} | Motion: {motion_level:.2f} | Frames: {self.detection_history['seizure_confirmation_frames']}")
                             print(f"📊 Alert Level: CRITICAL | Emergency Type: Seizure")
+                            latency_trace = self._start_latency_trace('seizure')
                             
                             # Save detection snapshot to MinIO
                             snapshot_id = self.save_detection_snapshot(
@@ -388,6 +478,7 @@ class AdvancedHealthcarePipeline:
                             )
                             if snapshot_id:
                                 print(f"📸 Seizure image saved to MinIO: {snapshot_id[:8]}...")
+                            latency_trace.mark('snapshot_saved')
                             
                             # Publish seizure detection to Supabase realtime
                             try:
@@ -403,11 +494,14 @@ class AdvancedHealthcarePipeline:
                                     'description': f'Seizure activity detected with {final_seizure_confidence:.1%} confidence'  # Add description
                                 }
                                 
-                                response = self.event_publisher.publish_seizure_detection(
-                                    confidence=final_seizure_confidence,
-                                    bounding_boxes=bounding_boxes,
-                                    context=context_data
-                                )
+                                with pipeline_metrics.span('publish', self.camera_id):
+                                    response = self.event_publisher.publish_seizure_detection(
+                                        confidence=final_seizure_confidence,
+                                        bounding_boxes=bounding_boxes,
+                                        context=context_data,
+                                        latency_trace=latency_trace
+                                    )
+                                self._finish_latency_trace(latency_trace, response)
                                 
                                 if response.get('alert_created'):
                                     print(f"📡 Seizure alert created: Priority {response.get('priority_level')}")
@@ -422,7 +516,7 @@ class AdvancedHealthcarePipeline:
                         else:
                             # Still in cooldown period
                             result['seizure_confidence'] = final_seizure_confidence
-                    elif final_seizure_confidence > warning_threshold and motion_level > 0.2:  # Giảm motion threshold
+                    elif final_seizure_confidence > warning_threshold and motion_level > config.warning_motion_threshold:
                         result['seizure_confidence'] = final_seizure_confidence
                         self.stats['seizure_warnings'] += 1
                         print(f"⚠️ SEIZURE WARNING! Confidence: {final_seizure_confidence:.2f} | Motion: {motion_level:.2f}")
@@ -450,12 +544,13 @@ class AdvancedHealthcarePipeline:
             result['emergency_type'] = 'fall'
             # Save fall alert image
             self.save_alert_image(frame, 'fall_detected', result['fall_confidence'])
-        elif result['seizure_confidence'] > 0.45 and motion_level > 0.7:  # Giảm từ 0.5 xuống 0.45, từ 0.8 xuống 0.7 để nhạy hơn
+        elif (result['seizure_confidence'] > config.seizure_warning_alert_threshold and
+              motion_level > config.seizure_warning_motion):  # 0.45 / 0.7 mặc định để nhạy hơn
             result['alert_level'] = 'warning'
             result['emergency_type'] = 'seizure_warning'
             # Save seizure warning image
             self.save_alert_image(frame, 'seizure_warning', result['seizure_confidence'])
-        elif result['fall_confidence'] > 0.50:  # Tăng từ 0.18 lên 0.50 để giảm false positive
+        elif result['fall_confidence'] > config.fall_warning_threshold:  # 0.50 mặc định để giảm false positive
             result['alert_level'] = 'warning'
             result['emergency_type'] = 'fall_warning'
             self.save_alert_image(frame, 'fall_warning', result['fall_confidence'])
@@ -471,13 +566,89 @@ class AdvancedHealthcarePipeline:
         self.performance['total_detection_time'] = time.time() - start_time
         return result
 
+    def _maybe_publish_status(self):
+        """Publish system_status định kỳ (heartbeat + counters) cho API/WebSocket consumers"""
+        now = time.time()
+        if now - self._last_status_publish < self.status_interval:
+            return
+        self._last_status_publish = now
+        event_bus.publish(EVENT_SYSTEM_STATUS, {
+            'uptime_s': round(now - self.stats['start_time'], 1),
+            'fps': round(self.stats['fps'], 2),
+            'total_frames': self.stats['total_frames'],
+            'keyframes_detected': self.stats['keyframes_detected'],
+            'fall_detections': self.stats['fall_detections'],
+            'seizure_detections': self.stats['seizure_detections'],
+            'alert_type': self.stats['alert_type']
+        }, camera_id=self.camera_id, user_id=self.user_id)
+
+    def _start_latency_trace(self, event_type):
+        """Bắt đầu latency trace cho event vừa detect (capture -> pipeline -> detected)"""
+        trace = LatencyTrace(event_type, self._frame_capture_ts)
+        trace.mark('pipeline_received', self._frame_received_ts)
+        trace.mark('detected')
+        return trace
+
+    def _finish_latency_trace(self, trace, response=None):
+        """Kết thúc trace sau khi publish (breakdown đầy đủ ghi DB ở writer nền); lưu history + metrics"""
+        trace.finish('published')
+        breakdown = trace.to_dict()
+        breakdown['event_type'] = trace.event_type
+        breakdown['event_id'] = response.get('event_id') if isinstance(response, dict) else None
+        self.latency_history.append(breakdown)
+        pipeline_metrics.observe_event_latency(trace)
+        print(f"⏱️ {trace.event_type.upper()} capture→published: {breakdown['total_ms']:.0f}ms "
+              f"(slowest: {breakdown['slowest_hop']} {breakdown['hops_ms'].get(breakdown['slowest_hop'], 0):.0f}ms)")
+
+    def get_latency_stats(self):
+        """p50/p95 latency theo từng hop của các event gần đây"""
+        if not self.latency_history:
+            return {}
+        
+        stats = {'events': len(self.latency_history), 'hops': {}}
+        hop_names = []
+        for breakdown in self.latency_history:
+            for hop in breakdown['hops_ms']:
+                if hop not in hop_names:
+                    hop_names.append(hop)
+        for hop in hop_names:
+            values = [b['hops_ms'][hop] for b in self.latency_history if hop in b['hops_ms']]
+            stats['hops'][hop] = {
+                'p50_ms': float(np.percentile(values, 50)),
+                'p95_ms': float(np.percentile(values, 95))
+            }
+        totals = [b['total_ms'] for b in self.latency_history]
+        stats['total'] = {
+            'p50_ms': float(np.percentile(totals, 50)),
+            'p95_ms': float(np.percentile(totals, 95)),
+            'max_ms': float(max(totals))
+        }
+        return stats
+
+    def _record_frame(self, persons, detection_result):
+        """Append keyframe hiện tại vào recorder (raw confidence + kết quả cuối của process_dual_detection)"""
+        try:
+            record = self._frame_record
+            self.recorder.append(
+                self._frame_capture_ts, self.stats['total_frames'], keyframe=True, detections=persons,
+                bbox=record.get('bbox'), keypoints=detection_result.get('keypoints'),
+                motion_level=record.get('motion_level'), fall_confidence=record.get('fall_confidence'),
+                seizure_confidence=record.get('seizure_confidence'),
+                fall_final=detection_result.get('fall_confidence'),
+                seizure_final=detection_result.get('seizure_confidence'),
+                fall_detected=detection_result.get('fall_detected', False),
+                seizure_detected=detection_result.get('seizure_detected', False),
+                seizure_ready=detection_result.get('seizure_ready', False)
+            )
+        except Exception as e:
+            print(f"⚠️ Recording error: {e}")
+
     def calculate_motion_level_person(self, person_detections):
         """Calculate motion level based on person detections như file mẫu - FIXED"""
         # Use actual motion calculation instead of variance
-        if hasattr(self, '_prev_frame') and self._prev_frame is not None:
-            current_frame = getattr(self, '_current_frame', None)
-            if current_frame is not None:
-                return self.calculate_motion_level(self._prev_frame, current_frame)
+        if self._prev_frame is not None and self._current_frame is not None:
+            return self.calculate_motion_level(self._prev_frame, self._current_frame,
+                                               self._prev_context, self._frame_context)
         
         # Fallback: use motion variance if no frame data
         if not self.detection_history['motion_levels'] or len(self.detection_history['motion_levels']) < 2:
@@ -552,21 +723,22 @@ class AdvancedHealthcarePipeline:
             time_diff = self.stats['frame_times'][-1] - self.stats['frame_times'][0]
             self.stats['fps'] = len(self.stats['frame_times']) / time_diff if time_diff > 0 else 0
 
-    def calculate_motion_level(self, prev_frame, current_frame):
-        """Calculate motion level between frames như file mẫu"""
+    def calculate_motion_level(self, prev_frame, current_frame, prev_context=None, current_context=None):
+        """Calculate motion level between frames như file mẫu
+        
+        prev_context/current_context: FrameContext của 2 frame (dùng lại ảnh 1/4 gray đã cache)
+        """
         if prev_frame is None:
             return 0.0
             
-        # Resize frames for faster processing
+        # Resize frames for faster processing + grayscale (cached per frame)
         height, width = prev_frame.shape[:2]
-        small_height, small_width = height // 4, width // 4
+        small_size = (width // 4, height // 4)
         
-        prev_small = cv2.resize(prev_frame, (small_width, small_height))
-        curr_small = cv2.resize(current_frame, (small_width, small_height))
-        
-        # Convert to grayscale
-        prev_gray = cv2.cvtColor(prev_small, cv2.COLOR_BGR2GRAY)
-        curr_gray = cv2.cvtColor(curr_small, cv2.COLOR_BGR2GRAY)
+        prev_context = prev_context or FrameContext(prev_frame)
+        current_context = current_context or FrameContext(current_frame)
+        prev_gray = prev_context.gray_resized(small_size)
+        curr_gray = current_context.gray_resized(small_size)
         
         # Calculate absolute difference
         diff = cv2.absdiff(prev_gray, curr_gray)
@@ -578,6 +750,18 @@ class AdvancedHealthcarePipeline:
         
         return motion_level
 
+    @staticmethod
+    def _readonly_view(frame):
+        """Zero-copy read-only view cho ai_window - consumer muốn vẽ phải tự copy"""
+        view = frame.view()
+        view.flags.writeable = False
+        return view
+
+    def render_analysis_view(self, frame, detection_result, person_detections):
+        """Analysis view (detection overlay + statistics) - dùng cho monitor window và preview server"""
+        analysis_view = self.visualize_dual_detection(frame, detection_result, person_detections)
+        return self.draw_statistics_overlay(analysis_view, self.stats)
+
     def visualize_dual_detection(self, frame, detection_result, person_detections):
         """Visualize dual detection với full overlay như file mẫu"""
         frame_vis = frame.copy()
@@ -808,6 +992,15 @@ class AdvancedHealthcarePipeline:
         print("🚨 ALERTS:")
         print(f"   Critical: {self.stats['critical_alerts']} | Total: {self.stats['total_alerts']}")
         print(f"   Status: {self.stats['alert_type']}")
+        
+        latency_stats = self.get_latency_stats()
+        if latency_stats:
+            print()
+            print("⏱️ CAPTURE → EVENT LATENCY:")
+            print(f"   Events: {latency_stats['events']} | p50: {latency_stats['total']['p50_ms']:.0f}ms | "
+                  f"p95: {latency_stats['total']['p95_ms']:.0f}ms | max: {latency_stats['total']['max_ms']:.0f}ms")
+            for hop, hop_stats in latency_stats['hops'].items():
+                print(f"   {hop}: p50 {hop_stats['p50_ms']:.0f}ms | p95 {hop_stats['p95_ms']:.0f}ms")
         print("="*50)
 
     def send_emergency_notification(self, detection_result):
@@ -864,8 +1057,32 @@ class AdvancedHealthcarePipeline:
         if not self.camera_id or not self.user_id:
             print(f"⚠️ Cannot save snapshot - missing camera_id or user_id")
             return None
-            
+        
+        with pipeline_metrics.span('persistence', self.camera_id):
+            snapshot_id = self._save_detection_snapshot(frame, event_type, confidence, metadata)
+        
+        # Clip trước/sau event từ ring buffer packet (CLIP_ENABLED=true), gắn vào snapshot khi upload xong
+        if snapshot_id and not str(snapshot_id).startswith(('local_', 'fallback_')):
+            clip_buffer_service.request_clip(self.camera_id, self.user_id, event_type, confidence,
+                                             snapshot_id=snapshot_id, event_ts=self._frame_capture_ts)
+        return snapshot_id
+
+    def _save_detection_snapshot(self, frame, event_type, confidence, metadata=None):
+        snapshot_metadata = {
+            'detection_time': datetime.now().isoformat(),
+            'frame_number': self.stats['total_frames'],
+            'processing_stats': {
+                'fps': self.stats['fps'],
+                'total_detections': self.stats[f'{event_type}_detections']
+            },
+            **(metadata or {})
+        }
         try:
+            if self.snapshot_service and local_spool.has_backlog():
+                # Spool còn backlog (MinIO/DB vừa down) -> xếp hàng sau để giữ thứ tự
+                snapshot_id = self._spool_detection_snapshot(frame, event_type, confidence, snapshot_metadata)
+                if snapshot_id:
+                    return snapshot_id
             if self.snapshot_service:
                 snapshot_id, image_id = self.snapshot_service.create_detection_snapshot(
                     camera_id=self.camera_id,
@@ -873,15 +1090,7 @@ class AdvancedHealthcarePipeline:
                     event_type=event_type,
                     confidence=confidence,
                     frame=frame,
-                    metadata={
-                        'detection_time': datetime.now().isoformat(),
-                        'frame_number': self.stats['total_frames'],
-                        'processing_stats': {
-                            'fps': self.stats['fps'],
-                            'total_detections': self.stats[f'{event_type}_detections']
-                        },
-                        **(metadata or {})
-                    }
+                    metadata=snapshot_metadata
                 )
                 
                 print(f"📸 {event_type.upper()} snapshot saved: {snapshot_id[:8]}... (confidence: {confidence:.3f})")
@@ -897,17 +1106,52 @@ class AdvancedHealthcarePipeline:
                 print(f"📸 {event_type.upper()} image saved locally: {filename}")
                 return f"local_{timestamp}"
                 
-        except Exception as e:
+        except UpstreamUnavailable as e:
+            # MinIO / DB down -> spool, replay khi kết nối phục hồi
             print(f"❌ Error saving {event_type} snapshot: {e}")
-            # Fallback: save to local alerts folder
-            try:
-                import cv2
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{event_type}_{self.camera_id}_{timestamp}_{confidence:.3f}_fallback.jpg"
-                local_path = os.path.join(self.alert_save_path, filename)
-                cv2.imwrite(local_path, frame)
-                print(f"📸 {event_type.upper()} image saved locally (fallback): {filename}")
-                return f"fallback_{timestamp}"
-            except Exception as fallback_error:
-                print(f"❌ Fallback save also failed: {fallback_error}")
+            snapshot_id = self._spool_detection_snapshot(frame, event_type, confidence, snapshot_metadata)
+            if snapshot_id:
+                return snapshot_id
+            return self._save_detection_snapshot_locally(frame, event_type, confidence)
+        except Exception as e:
+            # Lỗi dữ liệu / code: replay cũng sẽ lỗi (poison item) -> không spool, chỉ lưu ảnh local
+            print(f"❌ Error saving {event_type} snapshot (not spooled): {e}")
+            return self._save_detection_snapshot_locally(frame, event_type, confidence)
+
+    def _save_detection_snapshot_locally(self, frame, event_type, confidence):
+        """Fallback cuối: ghi ảnh vào alerts folder"""
+        try:
+            import cv2
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"{event_type}_{self.camera_id}_{timestamp}_{confidence:.3f}_fallback.jpg"
+            local_path = os.path.join(self.alert_save_path, filename)
+            cv2.imwrite(local_path, frame)
+            print(f"📸 {event_type.upper()} image saved locally (fallback): {filename}")
+            return f"fallback_{timestamp}"
+        except Exception as fallback_error:
+            print(f"❌ Fallback save also failed: {fallback_error}")
+            return None
+
+    def _spool_detection_snapshot(self, frame, event_type, confidence, metadata):
+        """Ghi snapshot vào local spool, SnapshotService replay lên MinIO/DB khi kết nối phục hồi"""
+        try:
+            import cv2
+            success, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+            if not success:
                 return None
+            snapshot_id = str(uuid.uuid4())
+            spool_id = local_spool.enqueue(SPOOL_SNAPSHOT, {
+                'snapshot_id': snapshot_id,
+                'camera_id': self.camera_id,
+                'user_id': self.user_id,
+                'event_type': event_type,
+                'confidence': float(confidence),
+                'metadata': metadata
+            }, blob=buffer.tobytes())
+            if spool_id is None:
+                return None
+            print(f"📦 {event_type.upper()} snapshot spooled locally #{spool_id}: {snapshot_id[:8]}...")
+            return snapshot_id
+        except Exception as e:
+            print(f"❌ Spool {event_type} snapshot failed: {e}")
+            return None
@@ -10,6 +10,7 @@ import time
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
 from service.camera_service import CameraService
+from video_processing.frame_context import FrameContext
 
 @dataclass
 class CameraFrame:
@@ -21,6 +22,7 @@ class CameraFrame:
     motion_level: float = 0.0
     brightness: float = 0.0
     sharpness: float = 0.0
+    frame_context: Optional[FrameContext] = None  # Derived images already computed for this frame
 
 @dataclass
 class CameraConfig:
@@ -38,18 +40,19 @@ class FrameQualityAnalyzer:
     def __init__(self):
         self.prev_frames = {}  # Store previous frames for motion calculation
     
-    def analyze_frame_quality(self, camera_id: str, frame: np.ndarray) -> Dict[str, float]:
+    def analyze_frame_quality(self, camera_id: str, frame: np.ndarray,
+                              frame_context: Optional[FrameContext] = None) -> Dict[str, float]:
         """Analyze frame quality metrics"""
         try:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            frame_context = FrameContext.ensure(frame, frame_context)
+            gray = frame_context.gray()
             
             # 1. Brightness analysis
-            brightness = gray.mean()  # Use numpy array method
+            brightness = frame_context.brightness()
             brightness_score = self._score_brightness(brightness)
             
             # 2. Sharpness analysis (Laplacian variance)
-            laplacian = cv2.Laplacian(gray, cv2.CV_64F)
-            sharpness = laplacian.var()
+            sharpness = frame_context.laplacian_var()
             sharpness_score = self._score_sharpness(sharpness)
             
             # 3. Motion analysis
@@ -113,8 +116,8 @@ class FrameQualityAnalyzer:
             motion_pixels = cv2.countNonZero(diff)
             motion_ratio = motion_pixels / (gray_frame.shape[0] * gray_frame.shape[1])
             
-            # Update previous frame
-            self.prev_frames[camera_id] = gray_frame.copy()
+            # Update previous frame (cached gray is never modified in place)
+            self.prev_frames[camera_id] = gray_frame
             
             # Score motion (moderate motion is preferred for detection)
             if 0.02 <= motion_ratio <= 0.15:  # Good motion range
@@ -221,17 +224,19 @@ class MultiCameraManager:
                 frame = camera.get_frame()
                 if frame is not None:
                     # Analyze frame quality
-                    quality_metrics = self.frame_analyzer.analyze_frame_quality(camera_id, frame)
+                    frame_context = FrameContext(frame)
+                    quality_metrics = self.frame_analyzer.analyze_frame_quality(camera_id, frame, frame_context)
                     
                     # Create camera frame object
                     camera_frame = CameraFrame(
                         camera_id=camera_id,
                         frame=frame,
-                        timestamp=time.time(),
+                        timestamp=frame_context.timestamp,
                         quality_score=quality_metrics['quality_score'],
                         motion_level=quality_metrics['motion_score'],
                         brightness=quality_metrics['brightness'],
-                        sharpness=quality_metrics['sharpness']
+                        sharpness=quality_metrics['sharpness'],
+                        frame_context=frame_context
                     )
                     
                     # Update frame buffer
@@ -7,5 +7,13 @@ class CameraService:
         return self.camera.connect()
     def get_frame(self):
         return self.camera.get_frame()
+    def get_frame_with_timestamp(self):
+        return self.camera.get_frame_with_timestamp()
+    def get_frame_timestamp(self):
+        return self.camera.get_frame_timestamp()
+    def get_health(self):
+        return self.camera.get_health()
+    def enable_supervision(self):
+        self.camera.supervised = True
     def disconnect(self):
         self.camera.disconnect()
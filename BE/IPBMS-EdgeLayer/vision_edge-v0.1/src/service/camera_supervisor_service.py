@@ -0,0 +1,204 @@
+"""
+Camera Supervisor Service
+1 supervisor sở hữu toàn bộ capture session: connect song song lúc khởi động (timeout có giới hạn),
+phát hiện stream chết / đứng hình và restart với exponential backoff + jitter.
+
+- register(camera_id, name, camera): submit connect() vào pool ngay (chạy song song với việc load model)
+- Monitor thread (1 cho mọi camera): mỗi CAMERA_SUPERVISOR_INTERVAL kiểm tra get_health() của camera
+  connected -> restart khi stream lỗi, không có frame mới quá CAMERA_STALL_TIMEOUT_MS,
+  hoặc CAMERA_FROZEN_FRAMES frame giống hệt liên tiếp; đồng thời chạy các lần retry đến hạn
+- Restart đầu tiên chạy ngay, các lần lỗi tiếp theo backoff (CAMERA_RETRY_BASE_DELAY .. CAMERA_RETRY_MAX_DELAY)
+- is_ready(camera_id): main loop chỉ phân tích camera đã connect
+- mark_first_frame(camera_id): ghi time-to-first-analyzed-frame (từ lúc register) 1 lần / camera
+"""
+
+import os
+import time
+import heapq
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from infrastructure.services.metrics_service import pipeline_metrics
+
+
+class CameraSupervisor:
+    """Pool connect/restart song song + 1 monitor thread (health check + heap retry theo thời điểm)"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or int(os.getenv('CAMERA_BOOTSTRAP_WORKERS', '8'))
+        self.retry_base_delay = float(os.getenv('CAMERA_RETRY_BASE_DELAY', '5'))
+        self.retry_max_delay = float(os.getenv('CAMERA_RETRY_MAX_DELAY', '120'))
+        self.check_interval = float(os.getenv('CAMERA_SUPERVISOR_INTERVAL', '0.5'))
+        self.stall_timeout = float(os.getenv('CAMERA_STALL_TIMEOUT_MS', '5000')) / 1000.0
+        self.frozen_frames = int(os.getenv('CAMERA_FROZEN_FRAMES', '100'))
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="CameraConnect")
+        self._cond = threading.Condition()
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._retry_heap: List[tuple] = []
+        self._monitor_thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def register(self, camera_id: str, name: str, camera) -> None:
+        """Đăng ký camera (CameraService) cho supervisor và bắt đầu connect nền ngay"""
+        camera_id = str(camera_id)
+        if hasattr(camera, 'enable_supervision'):
+            camera.enable_supervision()
+        with self._cond:
+            self._sessions[camera_id] = {
+                'camera': camera, 'name': name, 'state': 'connecting', 'attempts': 0, 'failures': 0,
+                'restarts': 0, 'last_restart_reason': None, 'registered_at': time.monotonic(),
+                'connected_after': None, 'first_frame_after': None, 'down_since': None,
+                'downtime_seconds': 0.0, 'last_error': None
+            }
+            if self._monitor_thread is None or not self._monitor_thread.is_alive():
+                self._monitor_thread = threading.Thread(target=self._monitor_loop, name="CameraSupervisor",
+                                                        daemon=True)
+                self._monitor_thread.start()
+        self._executor.submit(self._connect, camera_id)
+
+    # ------------------------------------------------------------------
+    # Connect / restart (pool workers)
+    # ------------------------------------------------------------------
+    def _connect(self, camera_id: str):
+        session = self._sessions[camera_id]
+        session['attempts'] += 1
+        started = time.monotonic()
+        try:
+            connected = bool(session['camera'].connect())
+        except Exception as e:
+            connected = False
+            session['last_error'] = str(e)
+        now = time.monotonic()
+        pipeline_metrics.record_camera_connect(camera_id, connected, now - started)
+
+        if connected:
+            with self._cond:
+                session['failures'] = 0
+                session['state'] = 'connected'
+                if session['connected_after'] is None:
+                    session['connected_after'] = now - session['registered_at']
+                if session['down_since'] is not None:
+                    recovery = now - session['down_since']
+                    session['downtime_seconds'] += recovery
+                    session['down_since'] = None
+                    pipeline_metrics.observe_camera_recovery(camera_id, recovery)
+                    print(f"✅ Camera {session['name']} recovered after {recovery:.1f}s without frames")
+                else:
+                    print(f"✅ Camera {session['name']} connected after {session['connected_after']:.1f}s "
+                          f"(attempt {session['attempts']})")
+            return
+
+        with self._cond:
+            session['failures'] += 1
+            delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** (session['failures'] - 1)))
+            delay *= 0.5 + random.random() / 2
+            session['state'] = 'retrying'
+            if not self._stopped:
+                heapq.heappush(self._retry_heap, (time.monotonic() + delay, camera_id))
+                self._cond.notify()
+        print(f"⚠️ Camera {session['name']} offline (attempt {session['attempts']}) - retry in {delay:.1f}s")
+
+    def _restart(self, camera_id: str, reason: str):
+        """Gọi trong _cond: đánh dấu down và submit reconnect ngay (không chờ backoff lần đầu)"""
+        session = self._sessions[camera_id]
+        session['state'] = 'restarting'
+        session['restarts'] += 1
+        session['last_restart_reason'] = reason
+        if session['down_since'] is None:
+            session['down_since'] = time.monotonic()
+        pipeline_metrics.record_camera_restart(camera_id, reason)
+        print(f"🔄 Camera {session['name']} {reason} - restarting capture")
+        self._executor.submit(self._connect, camera_id)
+
+    # ------------------------------------------------------------------
+    # Monitor thread
+    # ------------------------------------------------------------------
+    def _health_reason(self, session: Dict[str, Any]) -> Optional[str]:
+        camera = session['camera']
+        if not hasattr(camera, 'get_health'):
+            return None
+        health = camera.get_health()
+        if health['stream_failed']:
+            return 'stream_failed'
+        if not health['connected']:
+            return 'disconnected'
+        if health['frame_age'] is not None and health['frame_age'] > self.stall_timeout:
+            return 'stalled'
+        if self.frozen_frames and health['identical_frames'] >= self.frozen_frames:
+            return 'frozen'
+        return None
+
+    def _monitor_loop(self):
+        next_check = time.monotonic()
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                while self._retry_heap and self._retry_heap[0][0] <= now:
+                    _, camera_id = heapq.heappop(self._retry_heap)
+                    self._sessions[camera_id]['state'] = 'connecting'
+                    self._executor.submit(self._connect, camera_id)
+
+                if now >= next_check:
+                    for camera_id, session in self._sessions.items():
+                        if session['state'] != 'connected':
+                            continue
+                        try:
+                            reason = self._health_reason(session)
+                        except Exception as e:
+                            reason = None
+                            session['last_error'] = str(e)
+                        if reason:
+                            self._restart(camera_id, reason)
+                    next_check = now + self.check_interval
+
+                wait = next_check - time.monotonic()
+                if self._retry_heap:
+                    wait = min(wait, self._retry_heap[0][0] - time.monotonic())
+                if wait > 0:
+                    self._cond.wait(wait)
+
+    # ------------------------------------------------------------------
+    # Main loop API
+    # ------------------------------------------------------------------
+    def is_ready(self, camera_id: str) -> bool:
+        session = self._sessions.get(str(camera_id))
+        return session is not None and session['state'] == 'connected'
+
+    def mark_first_frame(self, camera_id: str) -> Optional[float]:
+        """Gọi sau mỗi frame phân tích; chỉ lần đầu ghi time-to-first-analyzed-frame. Returns giây hoặc None"""
+        session = self._sessions.get(str(camera_id))
+        if session is None or session['first_frame_after'] is not None:
+            return None
+        session['first_frame_after'] = time.monotonic() - session['registered_at']
+        pipeline_metrics.set_camera_first_frame(camera_id, session['first_frame_after'])
+        print(f"⏱️ Camera {session['name']}: first analyzed frame after {session['first_frame_after']:.2f}s")
+        return session['first_frame_after']
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        stats = {}
+        for camera_id, session in list(self._sessions.items()):
+            entry = {key: value for key, value in session.items() if key not in ('camera', 'down_since')}
+            if session['down_since'] is not None:
+                entry['downtime_seconds'] += now - session['down_since']
+            stats[camera_id] = entry
+        return stats
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            self._retry_heap.clear()
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False)
+
+
+# Global instance
+camera_supervisor = CameraSupervisor()
+
+
+def get_camera_supervisor() -> CameraSupervisor:
+    """Get camera supervisor"""
+    return camera_supervisor
@@ -9,11 +9,24 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+from infrastructure.services.config_snapshot_service import config_store, ConfigSnapshot, DetectionConfig
+
 class DatabaseConfigService:
     """Configuration service that uses database and environment variables"""
     
     def __init__(self):
+        # Dict build 1 lần cho mỗi version của config snapshot (không đọc env mỗi lần gọi)
         self._detection_settings = None
+        self._system_config = None
+        self._snapshot_version = None
+    
+    def _sync_snapshot(self):
+        """Rebuild dict compatibility khi config_store đã swap sang version mới"""
+        snapshot = config_store.current()
+        if snapshot.version != self._snapshot_version:
+            self._system_config = self._build_system_config(snapshot.defaults)
+            self._detection_settings = self._build_detection_settings(snapshot)
+            self._snapshot_version = snapshot.version
     
     def get_database_config(self) -> Dict[str, Any]:
         """Get database configuration from environment variables"""
@@ -32,8 +45,12 @@ class DatabaseConfigService:
     def load_system_config(self) -> Dict[str, Any]:
         """
         Load system configuration from environment variables and defaults
-        Replaces config.json dependency
+        Replaces config.json dependency (cached per config snapshot version - không sửa dict trả về)
         """
+        self._sync_snapshot()
+        return self._system_config
+    
+    def _build_system_config(self, detection: DetectionConfig) -> Dict[str, Any]:
         return {
             'database': {
                 'connection': self.get_database_config()['connection'],
@@ -52,14 +69,15 @@ class DatabaseConfigService:
                 },
                 'ai_models': {
                     'fall_detection': {
-                        'enabled': os.getenv('FALL_DETECTION_ENABLED', 'true').lower() == 'true',
-                        'confidence_threshold': float(os.getenv('FALL_DETECTION_CONFIDENCE', '0.7')),
+                        'enabled': detection.fall_enabled,
+                        'confidence_threshold': detection.fall_confidence_threshold,
                         'device': os.getenv('FALL_DETECTION_DEVICE', 'cpu'),
-                        'cooldown_seconds': float(os.getenv('FALL_DETECTION_COOLDOWN_SECONDS', '5.0'))
+                        'cooldown_seconds': detection.fall_cooldown_seconds
                     },
                     'seizure_detection': {
-                        'enabled': os.getenv('SEIZURE_DETECTION_ENABLED', 'true').lower() == 'true',
-                        'confidence_threshold': float(os.getenv('SEIZURE_DETECTION_CONFIDENCE', '0.6'))
+                        'enabled': detection.seizure_enabled,
+                        'confidence_threshold': detection.seizure_confidence_threshold,
+                        'cooldown_seconds': detection.seizure_cooldown_seconds
                     }
                 },
                 'performance': {
@@ -86,60 +104,57 @@ class DatabaseConfigService:
         }
     
     def load_detection_settings(self) -> Dict[str, Any]:
-        """Load detection settings from environment variables"""
-        if self._detection_settings is None:
-            self._detection_settings = {
-                "detection_thresholds": {
-                    "fall": {
-                        "severity_mapping": {
-                            "high": float(os.getenv('FALL_THRESHOLD_HIGH', '0.35')),
-                            "medium": float(os.getenv('FALL_THRESHOLD_MEDIUM', '0.25')),
-                            "low": float(os.getenv('FALL_THRESHOLD_LOW', '0.15'))
-                        },
-                        "notification_threshold": float(os.getenv('FALL_NOTIFICATION_THRESHOLD', '0.40'))
-                    },
-                    "seizure": {
-                        "severity_mapping": {
-                            "high": float(os.getenv('SEIZURE_THRESHOLD_HIGH', '0.30')),
-                            "medium": float(os.getenv('SEIZURE_THRESHOLD_MEDIUM', '0.20')),
-                            "low": float(os.getenv('SEIZURE_THRESHOLD_LOW', '0.12'))
-                        },
-                        "notification_threshold": float(os.getenv('SEIZURE_NOTIFICATION_THRESHOLD', '0.35'))
-                    }
-                },
-                "priority_system": {
-                    "base_priorities": {
-                        "high": int(os.getenv('PRIORITY_HIGH', '5')),
-                        "medium": int(os.getenv('PRIORITY_MEDIUM', '3')),
-                        "low": int(os.getenv('PRIORITY_LOW', '2')),
-                        "resolved": int(os.getenv('PRIORITY_RESOLVED', '0'))
-                    },
-                    "priority_reduction": {
-                        "acknowledged": int(os.getenv('PRIORITY_REDUCTION_ACKNOWLEDGED', '1')),
-                        "resolved": int(os.getenv('PRIORITY_REDUCTION_RESOLVED', '5'))
-                    }
+        """Load detection settings (env + DB overrides) từ config snapshot hiện tại"""
+        self._sync_snapshot()
+        return self._detection_settings
+    
+    def _build_detection_settings(self, snapshot: ConfigSnapshot) -> Dict[str, Any]:
+        detection = snapshot.defaults
+        camera_specific = {'default': self._camera_settings(detection)}
+        for camera_id, camera_config in snapshot.cameras.items():
+            camera_specific[camera_id] = self._camera_settings(camera_config)
+        
+        return {
+            "detection_thresholds": {
+                event_type: {
+                    "severity_mapping": detection.severity_thresholds(event_type),
+                    "notification_threshold": detection.notification_threshold(event_type)
+                }
+                for event_type in ('fall', 'seizure')
+            },
+            "priority_system": {
+                "base_priorities": {
+                    "high": int(os.getenv('PRIORITY_HIGH', '5')),
+                    "medium": int(os.getenv('PRIORITY_MEDIUM', '3')),
+                    "low": int(os.getenv('PRIORITY_LOW', '2')),
+                    "resolved": int(os.getenv('PRIORITY_RESOLVED', '0'))
                 },
-                "camera_specific": {
-                    "default": {
-                        "fall_sensitivity_multiplier": float(os.getenv('DEFAULT_FALL_SENSITIVITY_MULTIPLIER', '1.0')),
-                        "seizure_sensitivity_multiplier": float(os.getenv('DEFAULT_SEIZURE_SENSITIVITY_MULTIPLIER', '1.0')),
-                        "confidence_boost": float(os.getenv('DEFAULT_CONFIDENCE_BOOST', '0.05')),
-                        "enabled": True
-                    }
+                "priority_reduction": {
+                    "acknowledged": int(os.getenv('PRIORITY_REDUCTION_ACKNOWLEDGED', '1')),
+                    "resolved": int(os.getenv('PRIORITY_REDUCTION_RESOLVED', '5'))
+                }
+            },
+            "camera_specific": camera_specific,
+            "advanced_settings": {
+                "temporal_filtering": {
+                    "fall_confirmation_frames": detection.fall_confirmation_frames,
+                    "seizure_confirmation_frames": detection.seizure_confirmation_frames
                 },
-                "advanced_settings": {
-                    "temporal_filtering": {
-                        "fall_confirmation_frames": int(os.getenv('FALL_CONFIRMATION_FRAMES', '5')),
-                        "seizure_confirmation_frames": int(os.getenv('SEIZURE_CONFIRMATION_FRAMES', '8'))
-                    },
-                    "pose_quality_thresholds": {
-                        "min_keypoints_visible": int(os.getenv('MIN_KEYPOINTS_VISIBLE', '8')),
-                        "min_pose_confidence": float(os.getenv('MIN_POSE_CONFIDENCE', '0.35'))
-                    }
+                "pose_quality_thresholds": {
+                    "min_keypoints_visible": detection.min_keypoints_visible,
+                    "min_pose_confidence": detection.min_pose_confidence
                 }
             }
-        
-        return self._detection_settings
+        }
+    
+    @staticmethod
+    def _camera_settings(detection: DetectionConfig) -> Dict[str, Any]:
+        return {
+            "fall_sensitivity_multiplier": detection.fall_sensitivity_multiplier,
+            "seizure_sensitivity_multiplier": detection.seizure_sensitivity_multiplier,
+            "confidence_boost": detection.confidence_boost,
+            "enabled": detection.fall_enabled or detection.seizure_enabled
+        }
     
     def get_detection_thresholds(self, event_type: str) -> Dict[str, Any]:
         """Get detection thresholds for specific event type"""
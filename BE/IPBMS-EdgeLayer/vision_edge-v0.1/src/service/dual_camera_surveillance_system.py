@@ -13,6 +13,7 @@ from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
 from service.camera_service import CameraService
 from service.ai_vision_description_service import get_professional_caption_pipeline
+from infrastructure.services.preview_service import preview_service, is_headless
 
 @dataclass
 class DetectionResult:
@@ -66,8 +67,8 @@ class SameRoomDualDetection:
         self.last_emergency_time = 0
         self.emergency_cooldown = 2.0  # Seconds between emergency alerts
         
-        # Monitor display settings
-        self.show_monitors = True
+        # Monitor display settings (HEADLESS=true -> không imshow, chỉ preview on-demand)
+        self.show_monitors = not is_headless()
         self.show_statistics = True
         self.show_keypoints = True  # Enable keypoints by default
         self.monitor_windows = {}
@@ -625,6 +626,12 @@ class SameRoomDualDetection:
                     elif position == 'right':
                         self.stats['right_camera_detections'] += 1
                     
+                    # Preview server: chỉ render khi có viewer (trong thread của viewer)
+                    if preview_service.has_viewers(camera_id):
+                        camera_name = config.get('name', camera_id)
+                        preview_service.publish(camera_id, frame, lambda f, d=detection_result, n=camera_name, c=camera_id:
+                                                self.draw_statistics_overlay(self.visualize_camera_detection(f, d, n), c))
+                    
                     # Display monitoring windows
                     if self.show_monitors:
                         self._display_camera_monitors(camera_id, frame, detection_result, persons, config)
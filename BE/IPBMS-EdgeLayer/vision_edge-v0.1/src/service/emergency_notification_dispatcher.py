@@ -10,6 +10,8 @@ import logging
 
 # Import config loader
 from service.database_config_service import config_loader
+from infrastructure.services.config_snapshot_service import config_store
+from infrastructure.services.event_bus_service import event_bus, EVENT_FALL, EVENT_SEIZURE
 
 # Import image caption service for intelligent action generation
 try:
@@ -59,21 +61,13 @@ class HealthcareEventPublisher:
         # Start event listeners
         self._setup_event_listeners()
     
-    def _map_confidence_to_severity(self, confidence: float, event_type: str) -> str:
-        """Map confidence score to database severity using config"""
-        detection_config = config_loader.get_detection_thresholds(event_type)
-        thresholds = detection_config.get('severity_mapping', {})
+    def _map_confidence_to_severity(self, confidence: float, event_type: str, camera_id: Optional[str] = None) -> str:
+        """Map confidence score to database severity using config snapshot (per-camera override)"""
+        thresholds = config_store.for_camera(camera_id or self.default_camera_id).severity_thresholds(event_type)
         
-        # Fallback to defaults if config not found
-        if not thresholds:
-            if event_type == 'fall':
-                thresholds = {'high': 0.60, 'medium': 0.40, 'low': 0.20}
-            else:  # seizure
-                thresholds = {'high': 0.50, 'medium': 0.30, 'low': 0.10}
-        
-        if confidence >= thresholds.get('high', 0.6):
+        if confidence >= thresholds['high']:
             return 'high'
-        elif confidence >= thresholds.get('medium', 0.4):
+        elif confidence >= thresholds['medium']:
             return 'medium'
         else:
             return 'low'
@@ -115,10 +109,11 @@ class HealthcareEventPublisher:
             logger.error(f"Error getting highest priority alert: {e}")
             return None
     
-    def _should_create_alert(self, confidence: float, event_type: str, user_id: str) -> tuple[bool, str]:
+    def _should_create_alert(self, confidence: float, event_type: str, user_id: str,
+                             camera_id: Optional[str] = None) -> tuple[bool, str]:
         """Determine if alert should be created based on priority comparison"""
         # Calculate new event priority
-        severity = self._map_confidence_to_severity(confidence, event_type)
+        severity = self._map_confidence_to_severity(confidence, event_type, camera_id)
         new_priority = self._calculate_priority_level(severity, 'active')
         
         # Get highest existing priority
@@ -204,6 +199,25 @@ class HealthcareEventPublisher:
             logger.debug(f"Failed to find alert image: {e}")
             return None
 
+    def _publish_to_event_bus(self, event_type: str, event_data: Dict[str, Any], response: Dict[str, Any],
+                              persisted: bool):
+        """Fan-out event qua Redis Streams (WebSocket / alarm / DB writer consumers)
+        
+        persisted=False -> DB write thất bại / mock mode, DB writer consumer sẽ ghi lại
+        """
+        if not event_bus.enabled:
+            return
+        payload = {
+            'event_id': response.get('event_id'),
+            'persisted': persisted,
+            'severity': response.get('severity'),
+            'alert_created': response.get('alert_created', False),
+            'alert': {key: response.get(key) for key in ('imageUrl', 'status', 'action', 'time')},
+            'event_data': {key: value for key, value in event_data.items() if key != 'latency_trace'}
+        }
+        event_bus.publish(event_type, payload, camera_id=event_data.get('camera_id'),
+                          user_id=event_data.get('user_id'))
+
     def _create_event_response(self, event_id: Optional[str], status: str, event_type: str, 
                               confidence: float, camera_id: str, snapshot_timestamp: datetime,
                               image_path: Optional[str] = None) -> Dict[str, Any]:
@@ -339,7 +353,8 @@ class HealthcareEventPublisher:
 
     def publish_fall_detection(self, confidence: float, bounding_boxes: List[Dict], 
                               context: Optional[Dict] = None, camera_id: Optional[str] = None, 
-                              room_id: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
+                              room_id: Optional[str] = None, user_id: Optional[str] = None,
+                              latency_trace=None) -> Dict[str, Any]:
         """Publish fall detection with priority-based alert system"""
         try:
             print(f"\n{'='*60}")
@@ -358,7 +373,9 @@ class HealthcareEventPublisher:
             current_time = datetime.now()
             
             # Determine if alert should be created and get severity
-            should_create_alert, severity = self._should_create_alert(confidence, 'fall', final_user_id)
+            should_create_alert, severity = self._should_create_alert(confidence, 'fall', final_user_id, final_camera_id)
+            if latency_trace is not None:
+                latency_trace.mark('alert_priority_checked')
             
             # Always create event detection (for audit trail)
             event_data = {
@@ -375,15 +392,18 @@ class HealthcareEventPublisher:
                 'context': context or {},
                 'camera_id': final_camera_id,
                 'room_id': final_room_id,
-                'user_id': final_user_id
+                'user_id': final_user_id,
+                'latency_trace': latency_trace
             }
             
             # Publish event to database
             if hasattr(self.postgresql_service, 'publish_event_detection'):
                 event_result = self.postgresql_service.publish_event_detection(event_data)
                 event_id = event_result.get('event_id') if isinstance(event_result, dict) else str(event_result)
+                persisted = isinstance(event_result, dict)
             else:
                 event_id = str(uuid.uuid4())  # Fallback for mock mode
+                persisted = False
             
             # Create mobile response format
             mobile_status = self._map_status_for_mobile(severity)
@@ -406,6 +426,7 @@ class HealthcareEventPublisher:
             response['severity'] = severity
             response['priority_level'] = self._calculate_priority_level(severity, 'active')
             response['event_id'] = event_id  # Add event_id to response
+            self._publish_to_event_bus(EVENT_FALL, event_data, response, persisted)
             
             # Create alert only if priority check passed
             if should_create_alert:
@@ -432,8 +453,7 @@ class HealthcareEventPublisher:
                     logger.warning(f"Fall alert publication failed: {e}")
             
             # Send mobile notification based on conditions (removed since Supabase Realtime handles this)
-            fall_threshold_config = config_loader.get_detection_thresholds('fall')
-            notification_threshold = fall_threshold_config.get('notification_threshold', 0.70)
+            notification_threshold = config_store.for_camera(final_camera_id).fall_notification_threshold
             
             should_notify = (
                 should_create_alert or  # Alert was created
@@ -460,7 +480,8 @@ class HealthcareEventPublisher:
 
     def publish_seizure_detection(self, confidence: float, bounding_boxes: List[Dict],
                                  context: Optional[Dict] = None, camera_id: Optional[str] = None,
-                                 room_id: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
+                                 room_id: Optional[str] = None, user_id: Optional[str] = None,
+                                 latency_trace=None) -> Dict[str, Any]:
         """Publish seizure detection with priority-based alert system"""
         try:
             print(f"\n{'='*60}")
@@ -479,7 +500,9 @@ class HealthcareEventPublisher:
             current_time = datetime.now()
             
             # Determine if alert should be created and get severity
-            should_create_alert, severity = self._should_create_alert(confidence, 'seizure', final_user_id)
+            should_create_alert, severity = self._should_create_alert(confidence, 'seizure', final_user_id, final_camera_id)
+            if latency_trace is not None:
+                latency_trace.mark('alert_priority_checked')
                 
             # Always create event detection (for audit trail)
             event_data = {
@@ -497,15 +520,18 @@ class HealthcareEventPublisher:
                 'context': context or {},
                 'camera_id': final_camera_id,
                 'room_id': final_room_id,
-                'user_id': final_user_id
+                'user_id': final_user_id,
+                'latency_trace': latency_trace
             }
             
             # Publish event to database
             if hasattr(self.postgresql_service, 'publish_event_detection'):
                 event_result = self.postgresql_service.publish_event_detection(event_data)
                 event_id = event_result.get('event_id') if isinstance(event_result, dict) else str(event_result)
+                persisted = isinstance(event_result, dict)
             else:
                 event_id = str(uuid.uuid4())  # Fallback for mock mode
+                persisted = False
             
             # Create mobile response format
             mobile_status = self._map_status_for_mobile(severity)
@@ -528,6 +554,7 @@ class HealthcareEventPublisher:
             response['severity'] = severity
             response['priority_level'] = self._calculate_priority_level(severity, 'active')
             response['event_id'] = event_id  # Add event_id to response for seizure
+            self._publish_to_event_bus(EVENT_SEIZURE, event_data, response, persisted)
             
             # Create alert only if priority check passed
             if should_create_alert and hasattr(self.postgresql_service, 'publish_alert'):
@@ -550,8 +577,7 @@ class HealthcareEventPublisher:
                 self.postgresql_service.publish_alert(alert_data)
             
             # Send mobile notification based on conditions (removed since Supabase Realtime handles this)
-            seizure_threshold_config = config_loader.get_detection_thresholds('seizure')
-            notification_threshold = seizure_threshold_config.get('notification_threshold', 0.60)
+            notification_threshold = config_store.for_camera(final_camera_id).seizure_notification_threshold
             
             should_notify = (
                 should_create_alert or  # Alert was created
@@ -14,6 +14,9 @@ from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
 import numpy as np
 
+from infrastructure.services.metrics_service import pipeline_metrics
+from infrastructure.services.preview_service import preview_service, is_headless
+
 @dataclass
 class CameraEvent:
     """Event from individual camera"""
@@ -119,7 +122,7 @@ class EnhancedMultiCameraSystem:
     
     def __init__(self, camera_configs: List[Dict], enable_monitors: bool = True):
         self.camera_configs = camera_configs
-        self.enable_monitors = enable_monitors
+        self.enable_monitors = enable_monitors and not is_headless()
         self.running = False
         
         # Threading components
@@ -168,7 +171,7 @@ class EnhancedMultiCameraSystem:
             }
         
         print(f"🎥 Enhanced Multi-Camera System initialized for {len(camera_configs)} cameras")
-        if enable_monitors:
+        if self.enable_monitors:
             print("🖥️ Display monitors enabled")
         else:
             print("🚫 Display monitors disabled")
@@ -334,6 +337,11 @@ class EnhancedMultiCameraSystem:
                     
                     persons = result.get('person_detections', [])
                     
+                    # Preview server: chỉ render khi có viewer (trong thread của viewer)
+                    if preview_service.has_viewers(camera_id):
+                        preview_service.publish(camera_id, frame, lambda f, n=camera_name, p=persons:
+                                                self._render_preview_frame(n, f, p))
+                    
                     # Update person detection stats
                     if persons:
                         camera_stats['person_detections'] += len(persons)
@@ -355,6 +363,7 @@ class EnhancedMultiCameraSystem:
                         )
                         try:
                             self.display_queue.put_nowait(display_frame)
+                            pipeline_metrics.set_queue_depth('display', self.display_queue.qsize())
                             # Debug: Show queue status occasionally
                             if frame_count % 300 == 0:  # Every 300 frames
                                 print(f"📺 [{camera_name}] Frame queued for display, Queue size: {self.display_queue.qsize()}")
@@ -411,6 +420,7 @@ class EnhancedMultiCameraSystem:
                         
                         try:
                             self.event_queues[camera_id].put_nowait(event)
+                            pipeline_metrics.set_queue_depth('camera_events', self.event_queues[camera_id].qsize(), camera_id)
                             last_event_time = current_time
                         except queue.Full:
                             pass
@@ -669,6 +679,19 @@ class EnhancedMultiCameraSystem:
         """Legacy method - now calls enhanced version"""
         self._display_camera_frame_with_stats(camera_id, camera_name, frame, persons, {})
     
+    def _render_preview_frame(self, camera_name: str, frame: np.ndarray, persons: List[Dict]) -> np.ndarray:
+        """Overlay giống display thread, trên bản copy (dùng cho preview server)"""
+        display_img = frame.copy()
+        for person in persons:
+            if 'bbox' in person:
+                x1, y1, x2, y2 = person['bbox']
+                cv2.rectangle(display_img, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
+        cv2.putText(display_img, camera_name, (10, 30), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        cv2.putText(display_img, f"P:{len(persons)}", (10, 60), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        return display_img
+    
     def _display_thread(self):
         """Optimized thread for OpenCV display management"""
         print("🖥️ Display thread started - waiting for frames...")
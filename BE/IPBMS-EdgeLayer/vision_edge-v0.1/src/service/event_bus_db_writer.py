@@ -0,0 +1,63 @@
+"""
+Event Bus DB Writer
+Consumer group 'db_writer': ghi lại fall/seizure events chưa persist (DB lỗi / mock mode)
+Handler raise exception khi insert thất bại -> event giữ pending, được replay khi restart;
+insert lỗi quá EVENT_BUS_MAX_DELIVERIES lần -> event bus chuyển sang dead-letter stream
+(DB mất kết nối = RetryableEventError, không dead-letter)
+"""
+
+import logging
+from typing import Any, Dict
+
+from infrastructure.services.event_bus_service import event_bus, EVENT_FALL, EVENT_SEIZURE, RetryableEventError
+
+logger = logging.getLogger(__name__)
+
+
+class EventBusDBWriter:
+    """Persist detection events từ Redis Streams vào PostgreSQL"""
+
+    GROUP = 'db_writer'
+
+    def __init__(self, postgresql_service, bus=None):
+        self.postgresql_service = postgresql_service
+        self.bus = bus or event_bus
+        self.stats = {'written': 0, 'skipped': 0, 'failed': 0}
+
+    def start(self) -> bool:
+        """Start consumer thread (no-op khi event bus tắt)"""
+        started = self.bus.start_consumer(self.GROUP, self.handle_event,
+                                          event_types=[EVENT_FALL, EVENT_SEIZURE])
+        if started:
+            logger.info("💾 Event bus DB writer started")
+        return started
+
+    def handle_event(self, event):
+        """
+        Args:
+            event: BusEvent với data = payload của HealthcareEventPublisher._publish_to_event_bus
+        """
+        data: Dict[str, Any] = event.data
+        if data.get('persisted', True):
+            self.stats['skipped'] += 1
+            return
+
+        event_data = dict(data.get('event_data') or {})
+        if not event_data:
+            self.stats['skipped'] += 1
+            return
+
+        if not getattr(self.postgresql_service, 'is_connected', False):
+            self.stats['failed'] += 1
+            raise RetryableEventError("PostgreSQL not connected, event stays pending")
+
+        result = self.postgresql_service.publish_event_detection(event_data)
+        if not isinstance(result, dict):
+            self.stats['failed'] += 1
+            raise RuntimeError(f"Insert failed for bus event {event.id}")
+
+        self.stats['written'] += 1
+        logger.info(f"💾 Persisted bus event {event.id} -> {result.get('event_id')}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
@@ -8,6 +8,7 @@ import json
 import logging
 import time
 import os
+import queue
 from datetime import datetime, timezone
 from typing import Dict, Any, Optional, List
 import psycopg2
@@ -24,6 +25,10 @@ load_dotenv()
 
 # Import configuration
 from service.database_config_service import config_loader
+from infrastructure.services.stats_rollup_service import stats_rollup
+from infrastructure.services.local_spool_service import local_spool, UpstreamUnavailable, SPOOL_EVENT
+from infrastructure.services.event_bus_service import event_bus, EVENT_FALL, EVENT_SEIZURE
+from infrastructure.services.config_snapshot_service import config_store
 
 try:
     from config.supabase_config import supabase_config
@@ -66,9 +71,21 @@ class PostgreSQLHealthcareService:
         self.db_port = os.getenv('DB_PORT', '5432')
         self.db_name = os.getenv('DB_NAME', 'postgres')
         
+        # Latency breakdown đầy đủ (db_committed + published) ghi bằng writer nền, không chặn hot path
+        self._latency_queue = queue.Queue(maxsize=int(os.getenv('LATENCY_WRITER_QUEUE', '1000')))
+        self._latency_writer = None
+        self._latency_writer_lock = threading.Lock()
+        
         # Initialize connection
         self._initialize_connection()
         
+        # Replay event đã spool local khi DB down (giữ thứ tự ghi)
+        local_spool.register_handler(SPOOL_EVENT, self._replay_spooled_event)
+        
+        # Override ngưỡng detection (system_config / cameras) vào config snapshot
+        if self.is_connected:
+            config_store.attach_database(self)
+        
         # Note: We now use real database cameras instead of ensuring default entities
     
     def _initialize_connection(self):
@@ -180,10 +197,10 @@ class PostgreSQLHealthcareService:
             return self.connection_pool.getconn()
         return None
     
-    def return_connection(self, conn):
-        """Return connection to pool"""
+    def return_connection(self, conn, close: bool = False):
+        """Return connection to pool (close=True để bỏ connection hỏng)"""
         if self.connection_pool and conn:
-            self.connection_pool.putconn(conn)
+            self.connection_pool.putconn(conn, close=close)
     
     def subscribe_to_events(self, table: str, event_type: str, handler):
         """Subscribe to table changes using polling"""
@@ -353,6 +370,8 @@ class PostgreSQLHealthcareService:
                 
                 result = cursor.fetchone()
                 conn.commit()
+                if result:
+                    stats_rollup.record_snapshot(user_id=user_id, camera_id=camera_id)
                 return str(result['snapshot_id']) if result else None
         except Exception as e:
             logger.error(f"Error creating minimal snapshot: {e}")
@@ -399,6 +418,8 @@ class PostgreSQLHealthcareService:
                 conn.commit()
                 
                 if result:
+                    stats_rollup.record_snapshot(user_id=user_id, camera_id=camera_id,
+                                                 snapshot_type='alert_triggered')
                     return result['snapshot_id'] if isinstance(result, dict) else result[0]
                     
         except Exception as e:
@@ -729,22 +750,84 @@ class PostgreSQLHealthcareService:
                 return f"Phát hiện sự kiện {event_type} (tin cậy: {confidence:.0%})"
     
     def publish_event_detection(self, event_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Insert event detection into database"""
+        """Insert event detection into database (spool local khi DB không truy cập được)
+        
+        Returns:
+            Event row, {'event_id', 'spooled': True, 'spool_id'} khi đã spool, hoặc None
+        """
+        # Optional LatencyTrace (capture -> DB commit), không serialize trực tiếp
+        latency_trace = event_data.pop('latency_trace', None)
+        
+        # event_id + detected_at cố định từ lúc phát hiện để replay giữ nguyên (idempotent)
+        event_data.setdefault('event_id', str(uuid.uuid4()))
+        event_data.setdefault('detected_at', datetime.now(timezone.utc))
+        
+        if local_spool.has_backlog():
+            return self._spool_event(event_data, f"{local_spool.pending_count()} items pending")
+        
+        try:
+            return self._insert_event_detection(event_data, latency_trace)
+        except UpstreamUnavailable as e:
+            logger.error(f"PostgreSQL unavailable: {e}")
+            return self._spool_event(event_data, str(e))
+    
+    def _spool_event(self, event_data: Dict[str, Any], reason: str) -> Optional[Dict[str, Any]]:
+        spool_id = local_spool.enqueue(SPOOL_EVENT, event_data)
+        if spool_id is None:
+            return None
+        logger.warning(f"📦 Event {event_data['event_id']} spooled locally #{spool_id} ({reason})")
+        return {'event_id': event_data['event_id'], 'spooled': True, 'spool_id': spool_id}
+    
+    def _replay_spooled_event(self, payload: Dict[str, Any], blob: Optional[bytes] = None) -> bool:
+        """Spool replay handler: raise UpstreamUnavailable khi DB vẫn down"""
+        if not self.is_connected:
+            self._initialize_connection()
+            if not self.is_connected:
+                raise UpstreamUnavailable("PostgreSQL not connected")
+        if isinstance(payload.get('detected_at'), str):
+            payload['detected_at'] = datetime.fromisoformat(payload['detected_at'])
+        if self._insert_event_detection(payload) is None:
+            logger.warning(f"Spooled event {payload.get('event_id')} was not inserted - dropping")
+            return True
+        self._publish_replayed_event(payload)
+        return True
+
+    def _publish_replayed_event(self, event_data: Dict[str, Any]):
+        """
+        Báo event vừa replay lên event bus: detected_at gốc nằm sau keyset cursor của client
+        (/api/events/stream) nên client chỉ thấy khi được đánh thức và đọc theo created_at.
+        alert_created=False - alert đã fan-out lúc phát hiện, không gửi lại cho mobile.
+        """
+        if not event_bus.enabled:
+            return
+        event_type = EVENT_FALL if event_data.get('event_type') == 'fall' else EVENT_SEIZURE
+        event_bus.publish(event_type, {
+            'event_id': event_data.get('event_id'),
+            'persisted': True,
+            'replayed': True,
+            'alert_created': False,
+            'event_data': event_data
+        }, camera_id=event_data.get('camera_id'), user_id=event_data.get('user_id'))
+    
+    def _insert_event_detection(self, event_data: Dict[str, Any], latency_trace=None) -> Optional[Dict[str, Any]]:
+        """INSERT event_detections; raise UpstreamUnavailable khi mất kết nối DB"""
         
         # Add unique detection key for duplicate prevention
-        import time
         detection_key = f"{event_data.get('event_type')}_{event_data.get('confidence', 0):.3f}_{int(time.time() * 1000)}"
         logger.info(f"🔍 Publishing event detection: {detection_key}")
         
         if not self.is_connected:
-            logger.error("PostgreSQL not connected")
-            return None
+            raise UpstreamUnavailable("PostgreSQL not connected")
         
-        conn = self.get_connection()
+        try:
+            conn = self.get_connection()
+        except (psycopg2.OperationalError, pool.PoolError) as e:
+            raise UpstreamUnavailable(f"Could not get database connection: {e}")
         if not conn:
-            logger.error("Could not get database connection")
-            return None
+            raise UpstreamUnavailable("Could not get database connection")
         
+        detected_at = event_data.get('detected_at') or datetime.now(timezone.utc)
+        broken_connection = False
         try:
             # Get user's real camera_id from database
             user_id = event_data.get('user_id')
@@ -802,30 +885,35 @@ class PostgreSQLHealthcareService:
                 return None
                 
             # Check for recent duplicate events (same type, user, camera within 5 seconds)
+            # Dùng lại connection hiện tại (không lấy / trả connection thứ 2 từ pool)
             try:
-                conn = self.get_connection()
                 with conn.cursor() as cursor:
+                    # detected_at gốc (không phải NOW()) để replay từ spool vẫn dedupe đúng
                     duplicate_check_sql = """
                     SELECT event_id FROM event_detections 
-                    WHERE event_type = %s AND user_id = %s AND camera_id = %s 
-                    AND detected_at > NOW() - INTERVAL '5 seconds'
+                    WHERE event_id = %s OR (event_type = %s AND user_id = %s AND camera_id = %s 
+                    AND detected_at > %s - INTERVAL '5 seconds' AND detected_at <= %s)
                     ORDER BY detected_at DESC LIMIT 1
                     """
                     cursor.execute(duplicate_check_sql, (
+                        event_data.get('event_id'),
                         event_data.get('event_type'),
                         user_id,
-                        camera_id
+                        camera_id,
+                        detected_at,
+                        detected_at
                     ))
                     recent_event = cursor.fetchone()
                     
                     if recent_event:
                         logger.warning(f"❌ Skipping duplicate event detection - similar {event_data.get('event_type')} within 5 seconds")
-                        self.return_connection(conn)
-                        return {'event_id': recent_event[0], 'duplicate_skipped': True}
-                        
-                self.return_connection(conn)
+                        duplicate_id = recent_event['event_id'] if isinstance(recent_event, dict) else recent_event[0]
+                        return {'event_id': duplicate_id, 'duplicate_skipped': True}
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                raise
             except Exception as dup_error:
                 logger.warning(f"Duplicate check failed: {dup_error}")
+                conn.rollback()
             
             # Validate final IDs (user_id and camera_id already processed above)
             
@@ -837,9 +925,14 @@ class PostgreSQLHealthcareService:
                 context=event_data.get('context', {})
             )
             
+            context = dict(event_data.get('context') or {})
+            if latency_trace is not None:
+                latency_trace.mark('event_prepared')
+                context['latency'] = latency_trace.to_dict()
+            
             # Prepare record with validated values
             record = {
-                'event_id': str(uuid.uuid4()),
+                'event_id': event_data.get('event_id') or str(uuid.uuid4()),
                 'user_id': user_id,
                 'camera_id': camera_id,
                 'snapshot_id': snapshot_id,
@@ -853,8 +946,8 @@ class PostgreSQLHealthcareService:
                     event_data.get('confidence', 0.0),
                     event_data.get('event_type', '')
                 ),
-                'context_data': json.dumps(event_data.get('context', {})),
-                'detected_at': datetime.now(timezone.utc),
+                'context_data': json.dumps(context),
+                'detected_at': detected_at,
                 'created_at': datetime.now(timezone.utc),
                 # Required fields with NOT NULL constraint
                 'lifecycle_state': 'NOTIFIED',  # Initial state when event is created
@@ -891,6 +984,16 @@ class PostgreSQLHealthcareService:
                 result = cursor.fetchone()
                 conn.commit()
                 
+                if result and latency_trace is not None:
+                    # INSERT đã có breakdown tới event_prepared; db_committed / published bổ sung ở writer nền
+                    latency_trace.mark('db_committed')
+                    event_id = record['event_id']
+                    latency_trace.on_finish(lambda trace: self._queue_event_latency(event_id, context, trace))
+                
+                if result:
+                    stats_rollup.record_event(record['event_type'], user_id=user_id, camera_id=camera_id,
+                                              detected_at=record['detected_at'])
+                
                 if result:
                     logger.info(f"✅ Event detection published: {record['event_type']} with confidence {record['confidence_score']}")
                     print(f"💾 ✅ DATABASE SAVE SUCCESS!")
@@ -906,12 +1009,65 @@ class PostgreSQLHealthcareService:
                     print(f"❌ DATABASE SAVE FAILED - No result returned")
                     return None
                     
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            broken_connection = True
+            raise UpstreamUnavailable(f"Database connection lost: {e}")
         except Exception as e:
             logger.error(f"Error publishing event detection: {e}")
             conn.rollback()
             return None
         finally:
-            self.return_connection(conn)
+            self.return_connection(conn, close=broken_connection)
+    
+    def _queue_event_latency(self, event_id: str, context: Dict[str, Any], latency_trace) -> None:
+        """LatencyTrace.finish() callback: đưa breakdown đầy đủ (tới published) cho writer nền"""
+        context = dict(context, latency=latency_trace.to_dict())
+        try:
+            self._latency_queue.put_nowait((event_id, json.dumps(context)))
+        except queue.Full:
+            logger.warning(f"Latency writer queue full - breakdown of {event_id} not stored")
+            return
+        # Lock: 2 frame thread cùng thấy writer chưa chạy không được start 2 thread
+        with self._latency_writer_lock:
+            if self._latency_writer is None or not self._latency_writer.is_alive():
+                self._latency_writer = threading.Thread(target=self._latency_writer_loop,
+                                                        name="EventLatencyWriter", daemon=True)
+                self._latency_writer.start()
+    
+    def _latency_writer_loop(self):
+        """Gom các UPDATE context_data đang chờ thành 1 transaction"""
+        while True:
+            batch = [self._latency_queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self._latency_queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            conn = None
+            broken_connection = False
+            try:
+                conn = self.get_connection()
+                if not conn:
+                    raise UpstreamUnavailable("Could not get database connection")
+                with conn.cursor() as cursor:
+                    cursor.executemany(
+                        "UPDATE event_detections SET context_data = %s WHERE event_id = %s",
+                        [(context_json, event_id) for event_id, context_json in batch]
+                    )
+                conn.commit()
+            except Exception as e:
+                logger.warning(f"Could not store latency breakdown for {len(batch)} event(s): {e}")
+                if conn:
+                    # Connection chết: rollback cũng raise -> không để writer thread chết theo
+                    try:
+                        conn.rollback()
+                    except Exception as rollback_error:
+                        broken_connection = True
+                        logger.debug(f"Latency writer rollback failed: {rollback_error}")
+            finally:
+                if conn:
+                    self.return_connection(conn, close=broken_connection)
     
     def publish_alert(self, alert_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Insert alert into event_detections table instead of alerts"""
@@ -37,3 +37,7 @@ class SeizureDetectionService:
         return self.detector.detect_seizure(frame, bbox)
     def update_prediction(self, confidence):
         return self.predictor.update_prediction(confidence)
+    def reset(self):
+        for component in (self.detector, self.predictor):
+            if hasattr(component, 'reset'):
+                component.reset()
@@ -4,7 +4,7 @@ except ImportError:
     class InternalIntegratedVideoProcessor:
         def __init__(self, config):
             self.config = config
-        def process_frame(self, frame):
+        def process_frame(self, frame, frame_context=None):
             return {
                 'processed': True,
                 'person_detections': [],
@@ -18,5 +18,8 @@ class VideoProcessingService:
             self.processor = ExternalIntegratedVideoProcessor(config)
         else:
             self.processor = InternalIntegratedVideoProcessor(config)
-    def process_frame(self, frame):
-        return self.processor.process_frame(frame)
+    def process_frame(self, frame, frame_context=None):
+        return self.processor.process_frame(frame, frame_context=frame_context)
+    def reset(self):
+        if hasattr(self.processor, 'reset'):
+            self.processor.reset()
@@ -1,6 +1,7 @@
 # Video Processing Module
 # Simple processing components for healthcare monitoring
 
+from .frame_context import FrameContext
 from .simple_processing import (
     SimpleMotionDetector,
     SimpleYOLODetector, 
@@ -13,6 +14,7 @@ from .simple_processing import (
 )
 
 __all__ = [
+    'FrameContext',
     'SimpleMotionDetector',
     'SimpleYOLODetector',
     'SimpleVideoProcessor', 
@@ -0,0 +1,96 @@
+"""
+Per-frame derived image cache
+Gray / resized / pyramid / blurred images are computed lazily, at most once per frame,
+and shared by motion, keyframe, motion level, frame quality and fall analyzers
+"""
+
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class FrameContext:
+    """Lazy, memoized derived images for one BGR frame"""
+
+    def __init__(self, frame: np.ndarray, timestamp: Optional[float] = None):
+        """
+        Args:
+            frame: Input frame (BGR, H x W x 3). Must not be modified in place while the context is used
+            timestamp: Capture timestamp (time.time())
+        """
+        self.frame = frame
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self._cache: Dict[Hashable, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def ensure(cls, frame: np.ndarray, frame_context: Optional['FrameContext'] = None) -> 'FrameContext':
+        """Reuse the caller's context when it wraps this frame, otherwise create a private one"""
+        if frame_context is not None and frame_context.frame is frame:
+            return frame_context
+        return cls(frame)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.frame.shape
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Generic memoization for analyzer-specific derived data"""
+        if key in self._cache:
+            self.hits += 1
+            return self._cache[key]
+        self.misses += 1
+        value = factory()
+        self._cache[key] = value
+        return value
+
+    def gray(self) -> np.ndarray:
+        """Full resolution grayscale (cv2.COLOR_BGR2GRAY)"""
+        if self.frame.ndim == 2:
+            return self.frame
+        return self.get('gray', lambda: cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY))
+
+    def resized(self, size: Tuple[int, int]) -> np.ndarray:
+        """BGR frame resized to size=(width, height)"""
+        size = (int(size[0]), int(size[1]))
+        return self.get(('resized', size), lambda: cv2.resize(self.frame, size))
+
+    def gray_resized(self, size: Tuple[int, int]) -> np.ndarray:
+        """Grayscale resized to size=(width, height)"""
+        size = (int(size[0]), int(size[1]))
+        return self.get(('gray_resized', size), lambda: cv2.cvtColor(self.resized(size), cv2.COLOR_BGR2GRAY)
+                        if self.frame.ndim == 3 else cv2.resize(self.frame, size))
+
+    def gray_scaled(self, divisor: int) -> np.ndarray:
+        """Grayscale at 1/divisor of the original width/height (integer division like the analyzers)"""
+        height, width = self.frame.shape[:2]
+        return self.gray_resized((width // divisor, height // divisor))
+
+    def pyramid(self, level: int) -> np.ndarray:
+        """Gray Gaussian pyramid level (0 = full resolution, each level halves width/height)"""
+        if level <= 0:
+            return self.gray()
+        return self.get(('pyramid', level), lambda: cv2.pyrDown(self.pyramid(level - 1)))
+
+    def blurred(self, ksize: int = 9, sigma: float = 0.0) -> np.ndarray:
+        """Gaussian blurred full resolution grayscale"""
+        return self.get(('blurred', ksize, sigma), lambda: cv2.GaussianBlur(self.gray(), (ksize, ksize), sigma))
+
+    def laplacian_var(self) -> float:
+        """Variance of Laplacian on grayscale (sharpness)"""
+        return self.get('laplacian_var', lambda: float(cv2.Laplacian(self.gray(), cv2.CV_64F).var()))
+
+    def brightness(self) -> float:
+        """Mean gray level"""
+        return self.get('brightness', lambda: float(self.gray().mean()))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache statistics for this frame"""
+        return {
+            'cached_items': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses
+        }
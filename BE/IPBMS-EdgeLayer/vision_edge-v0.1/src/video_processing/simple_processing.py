@@ -11,6 +11,11 @@ from datetime import datetime
 from typing import Optional, Dict, Any, Tuple
 import peakutils
 
+from infrastructure.services.metrics_service import pipeline_metrics
+from infrastructure.services.frame_catalog_service import FrameCatalog
+from infrastructure.services.inference_cache_service import inference_cache
+from .frame_context import FrameContext
+
 # Import fall detection
 try:
     from fall_detection import SimpleFallDetector
@@ -42,11 +47,11 @@ class SimpleMotionDetector:
         self.frame_count = 0
         self.motion_detected = False
         
-    def detect_motion(self, frame: np.ndarray) -> Dict[str, Any]:
+    def detect_motion(self, frame: np.ndarray, frame_context: Optional[FrameContext] = None) -> Dict[str, Any]:
         """Detect motion in frame"""
         try:
-            # Resize frame for performance
-            resized = cv2.resize(frame, self.resolution)
+            # Resize frame for performance (shared per-frame cache)
+            resized = FrameContext.ensure(frame, frame_context).resized(self.resolution)
             
             # Apply background subtraction
             fg_mask = self.bg_subtractor.apply(resized)
@@ -115,19 +120,19 @@ class SimpleKeyframeDetector:
         
         print(f"🎬 Keyframe detector initialized (threshold: {threshold})")
         
-    def is_keyframe(self, frame: np.ndarray) -> Tuple[bool, float]:
+    def is_keyframe(self, frame: np.ndarray, frame_context: Optional[FrameContext] = None) -> Tuple[bool, float]:
         """Real-time keyframe detection based on frame difference
         
         Args:
             frame: Input frame (BGR)
+            frame_context: Shared derived image cache of this frame (optional)
             
         Returns:
             (is_keyframe, confidence_score)
         """
         try:
-            # Convert to grayscale and blur
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            blur_gray = cv2.GaussianBlur(gray, (9, 9), 0.0)
+            # Grayscale + blur (shared per-frame cache, never modified in place)
+            blur_gray = FrameContext.ensure(frame, frame_context).blurred(9, 0.0)
             
             self.frame_count += 1
             
@@ -145,7 +150,7 @@ class SimpleKeyframeDetector:
             normalized_diff = diff_magnitude / (frame.shape[0] * frame.shape[1])
             
             self.diff_history.append(normalized_diff)
-            self.last_frame = blur_gray.copy()
+            self.last_frame = blur_gray
             
             # Keep history manageable
             if len(self.diff_history) > 50:
@@ -177,25 +182,43 @@ class SimpleKeyframeDetector:
 
 
 class SimpleFrameSaver:
-    """Simple Frame Saver for important frames"""
+    """Simple Frame Saver for important frames
+    
+    File nằm trong thư mục shard theo ngày (<category>/YYYY/MM/DD), metadata là row trong
+    FrameCatalog (SQLite) thay cho sidecar _metadata.json; quota / retention là indexed range delete.
+    """
+    
+    CATEGORIES = ('keyframes', 'detections', 'alerts')
     
     def __init__(self, base_path="data/saved_frames", max_files_per_folder=1000):
         """Initialize frame saver
         
         Args:
             base_path: Base directory for saving frames
-            max_files_per_folder: Maximum files per category folder
+            max_files_per_folder: Maximum files per category (FRAME_SAVER_MAX_FILES[_<CATEGORY>] override)
         """
         self.base_path = base_path
         self.max_files_per_folder = max_files_per_folder
+        self.retention_days = float(os.getenv('FRAME_SAVER_RETENTION_DAYS', '7'))
         
-        # Create directories
+        # Category root directories (shard theo ngày được tạo khi ghi)
         self.keyframes_path = os.path.join(base_path, "keyframes")
         self.detections_path = os.path.join(base_path, "detections") 
         self.alerts_path = os.path.join(base_path, "alerts")
         
         self._create_directories()
         
+        try:
+            self.catalog = FrameCatalog(
+                base_path, list(self.CATEGORIES),
+                max_files=max_files_per_folder,
+                retention_days=self.retention_days,
+                purge_interval=float(os.getenv('FRAME_SAVER_PURGE_INTERVAL', '300'))
+            )
+        except Exception as e:
+            self.catalog = None
+            print(f"⚠️ Frame catalog unavailable ({e}) - falling back to metadata sidecars")
+        
         print(f"💾 Frame saver initialized: {base_path}")
     
     def _create_directories(self):
@@ -203,13 +226,36 @@ class SimpleFrameSaver:
         for path in [self.keyframes_path, self.detections_path, self.alerts_path]:
             os.makedirs(path, exist_ok=True)
     
-    def _get_timestamp_filename(self, prefix: str, suffix: str = "") -> str:
+    def _get_timestamp_filename(self, prefix: str, suffix: str = "", now: Optional[datetime] = None) -> str:
         """Generate timestamp-based filename"""
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S-%f")[:-3]  # Remove last 3 digits of microseconds
+        timestamp = (now or datetime.now()).strftime("%Y-%m-%d_%H-%M-%S-%f")[:-3]  # Remove last 3 digits of microseconds
         if suffix:
             return f"{prefix}_{timestamp}_{suffix}.jpg"
         return f"{prefix}_{timestamp}.jpg"
     
+    def _save(self, category: str, prefix: str, suffix: str, frame: np.ndarray,
+              metadata: Dict[str, Any]) -> bool:
+        """Encode JPEG vào <category>/YYYY/MM/DD rồi ghi 1 row catalog (hoặc sidecar khi catalog tắt)"""
+        now = datetime.now()
+        rel_path = os.path.join(category, now.strftime("%Y"), now.strftime("%m"), now.strftime("%d"),
+                                self._get_timestamp_filename(prefix, suffix, now))
+        filepath = os.path.join(self.base_path, rel_path)
+        
+        success, buffer = cv2.imencode('.jpg', frame)
+        if not success:
+            return False
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'wb') as f:
+            f.write(buffer)
+        
+        if 'timestamp' not in metadata:
+            metadata['timestamp'] = now.isoformat()
+        if self.catalog is not None:
+            self.catalog.add(category, rel_path, len(buffer), metadata, created_at=now.timestamp())
+        else:
+            self._save_metadata(filepath, metadata)
+        return True
+    
     def save_keyframe(self, frame: np.ndarray, metadata: Dict[str, Any]) -> bool:
         """Save keyframe with metadata
         
@@ -222,18 +268,7 @@ class SimpleFrameSaver:
         """
         try:
             confidence = metadata.get('confidence', 0.0)
-            filename = self._get_timestamp_filename("keyframe", f"conf_{confidence:.3f}")
-            filepath = os.path.join(self.keyframes_path, filename)
-            
-            # Save image
-            success = cv2.imwrite(filepath, frame)
-            
-            if success:
-                # Save metadata
-                self._save_metadata(filepath, metadata)
-                return True
-            
-            return False
+            return self._save('keyframes', "keyframe", f"conf_{confidence:.3f}", frame, metadata)
             
         except Exception as e:
             print(f"❌ Error saving keyframe: {e}")
@@ -245,16 +280,8 @@ class SimpleFrameSaver:
             person_count = len(metadata.get('persons', []))
             confidence = metadata.get('max_confidence', 0.0)
             
-            filename = self._get_timestamp_filename("detection", f"persons_{person_count}_conf_{confidence:.3f}")
-            filepath = os.path.join(self.detections_path, filename)
-            
-            success = cv2.imwrite(filepath, frame)
-            
-            if success:
-                self._save_metadata(filepath, metadata)
-                return True
-                
-            return False
+            return self._save('detections', "detection", f"persons_{person_count}_conf_{confidence:.3f}",
+                              frame, metadata)
             
         except Exception as e:
             print(f"❌ Error saving detection: {e}")
@@ -266,51 +293,58 @@ class SimpleFrameSaver:
             alert_type = metadata.get('alert_type', 'unknown')
             confidence = metadata.get('confidence', 0.0)
             
-            filename = self._get_timestamp_filename("alert", f"{alert_type}_conf_{confidence:.3f}")
-            filepath = os.path.join(self.alerts_path, filename)
-            
-            success = cv2.imwrite(filepath, frame)
-            
-            if success:
-                self._save_metadata(filepath, metadata)
-                return True
-                
-            return False
+            return self._save('alerts', "alert", f"{alert_type}_conf_{confidence:.3f}", frame, metadata)
             
         except Exception as e:
             print(f"❌ Error saving alert: {e}")
             return False
     
     def _save_metadata(self, image_path: str, metadata: Dict[str, Any]):
-        """Save metadata as JSON file"""
+        """Save metadata as JSON file (fallback khi catalog không mở được)"""
         try:
             metadata_path = image_path.replace('.jpg', '_metadata.json')
             
-            # Add timestamp if not present
-            if 'timestamp' not in metadata:
-                metadata['timestamp'] = datetime.now().isoformat()
-            
             with open(metadata_path, 'w') as f:
                 json.dump(metadata, f, indent=2, default=str)
                 
         except Exception as e:
             print(f"⚠️ Error saving metadata: {e}")
     
-    def cleanup_old_files(self, days_old=7):
-        """Clean up files older than specified days"""
+    def get_metadata(self, rel_path: str) -> Optional[Dict[str, Any]]:
+        """Metadata của frame đã lưu (path relative với base_path)"""
+        if self.catalog is not None:
+            return self.catalog.get_metadata(rel_path)
         try:
+            with open(os.path.join(self.base_path, rel_path).replace('.jpg', '_metadata.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def cleanup_old_files(self, days_old=None):
+        """Clean up files older than specified days (mặc định FRAME_SAVER_RETENTION_DAYS)"""
+        try:
+            days_old = self.retention_days if days_old is None else days_old
             cutoff_time = time.time() - (days_old * 24 * 60 * 60)
+            removed = self.catalog.purge_older_than(cutoff_time) if self.catalog is not None else 0
             
+            # File phẳng từ bản cũ (chưa có catalog / shard): chỉ quét tầng trên cùng của category
             for folder in [self.keyframes_path, self.detections_path, self.alerts_path]:
-                for filename in os.listdir(folder):
-                    filepath = os.path.join(folder, filename)
-                    if os.path.getctime(filepath) < cutoff_time:
-                        os.remove(filepath)
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_file() and entry.stat().st_mtime < cutoff_time:
+                            os.remove(entry.path)
+                            removed += 1
                         
-            print(f"🧹 Cleaned up files older than {days_old} days")
+            print(f"🧹 Cleaned up {removed} files older than {days_old} days")
             
         except Exception as e:
             print(f"⚠️ Error during cleanup: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get frame saver statistics"""
+        if self.catalog is not None:
+            return self.catalog.get_stats()
+        return {'catalog': False, 'base_path': self.base_path}
 
 
 class SimpleYOLODetector:
@@ -325,6 +359,7 @@ class SimpleYOLODetector:
         
         self.model = None
         self.class_names = None
+        self.cache_key = None
         
         # Load model
         self._load_model()
@@ -340,57 +375,93 @@ class SimpleYOLODetector:
             
             print(f"✅ YOLO model loaded: {len(self.class_names)} classes")
             
+            # Replay inference cache (INFERENCE_CACHE_ENABLED=true): key theo weights + params ảnh hưởng output
+            self.cache_key = inference_cache.register_model(
+                self.model_name, getattr(self.model, 'ckpt_path', None) or f"{self.model_name}.pt",
+                {'confidence': self.confidence, 'healthcare_mode': self.healthcare_mode})
+            
         except Exception as e:
             print(f"❌ YOLO model loading error: {e}")
             
-    def detect(self, frame: np.ndarray) -> Dict[str, Any]:
-        """Detect objects in frame"""
+    def detect(self, frame: np.ndarray, annotate: bool = False) -> Dict[str, Any]:
+        """Detect objects in frame
+        
+        Args:
+            frame: Input frame (BGR)
+            annotate: Also return 'annotated_frame' (copy + drawing). Hot path để False,
+                      display consumer gọi annotate() khi cần
+            
+        Returns:
+            {'detections': [...]} (+ 'annotated_frame' nếu annotate=True)
+        """
         try:
             if self.model is None:
-                return {'detections': [], 'annotated_frame': frame}
-            
-            # Run inference
-            results = self.model(frame, conf=self.confidence, verbose=False)
-            
-            detections = []
-            annotated_frame = frame.copy()
-            
-            for result in results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        # Extract box info
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        confidence = box.conf[0].cpu().numpy()
-                        class_id = int(box.cls[0].cpu().numpy())
-                        class_name = self.class_names.get(class_id, 'unknown') if self.class_names else 'unknown'
-                        
-                        # Healthcare mode: focus on person
-                        if self.healthcare_mode and class_name != 'person':
-                            continue
-                            
-                        # Add detection
-                        detection = {
-                            'bbox': [int(x1), int(y1), int(x2), int(y2)],
-                            'confidence': float(confidence),
-                            'class_id': class_id,
-                            'class_name': class_name
-                        }
-                        detections.append(detection)
-                        
-                        # Draw on frame
-                        cv2.rectangle(annotated_frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-                        cv2.putText(annotated_frame, f"{class_name}: {confidence:.2f}", 
-                                   (int(x1), int(y1)-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+                return {'detections': [], 'annotated_frame': frame} if annotate else {'detections': []}
             
-            return {
-                'detections': detections,
-                'annotated_frame': annotated_frame
-            }
+            # Run inference (replay cache hit -> bỏ qua model)
+            detections = inference_cache.cached(self.cache_key, lambda: self._infer(frame))
+            
+            result = {'detections': detections}
+            if annotate:
+                result['annotated_frame'] = self.annotate(frame, detections)
+            return result
             
         except Exception as e:
             print(f"❌ YOLO detection error: {e}")
-            return {'detections': [], 'annotated_frame': frame}
+            return {'detections': [], 'annotated_frame': frame} if annotate else {'detections': []}
+    
+    def _infer(self, frame: np.ndarray) -> list:
+        """Chạy model, trả về list detection (bbox / confidence / class)"""
+        inference_start = time.perf_counter()
+        results = self.model(frame, conf=self.confidence, verbose=False)
+        pipeline_metrics.observe_model_latency(self.model_name, time.perf_counter() - inference_start)
+        
+        detections = []
+        
+        for result in results:
+            boxes = result.boxes
+            if boxes is not None:
+                for box in boxes:
+                    # Extract box info
+                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+                    confidence = box.conf[0].cpu().numpy()
+                    class_id = int(box.cls[0].cpu().numpy())
+                    class_name = self.class_names.get(class_id, 'unknown') if self.class_names else 'unknown'
+                    
+                    # Healthcare mode: focus on person
+                    if self.healthcare_mode and class_name != 'person':
+                        continue
+                        
+                    # Add detection
+                    detection = {
+                        'bbox': [int(x1), int(y1), int(x2), int(y2)],
+                        'confidence': float(confidence),
+                        'class_id': class_id,
+                        'class_name': class_name
+                    }
+                    detections.append(detection)
+        
+        return detections
+    
+    @staticmethod
+    def annotate(frame: np.ndarray, detections, copy: bool = True) -> np.ndarray:
+        """Draw detection boxes/labels on demand
+        
+        Args:
+            frame: Input frame (BGR)
+            detections: Detections from detect() (bbox = [x1, y1, x2, y2])
+            copy: Draw on a copy (False = draw in place)
+            
+        Returns:
+            Annotated frame
+        """
+        annotated_frame = frame.copy() if copy else frame
+        for detection in detections:
+            x1, y1, x2, y2 = detection['bbox'][:4]
+            cv2.rectangle(annotated_frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
+            cv2.putText(annotated_frame, f"{detection.get('class_name', 'unknown')}: {detection.get('confidence', 0):.2f}", 
+                       (int(x1), int(y1)-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+        return annotated_frame
     
     def get_stats(self) -> Dict[str, Any]:
         """Get YOLO detector statistics"""
@@ -418,18 +489,20 @@ class SimpleVideoProcessor:
         self.motion_frames = 0
         self.detection_frames = 0
         
-    def process_frame(self, frame: np.ndarray) -> Dict[str, Any]:
-        """Process single frame"""
+    def process_frame(self, frame: np.ndarray, frame_context: Optional[FrameContext] = None,
+                      annotate: bool = False) -> Dict[str, Any]:
+        """Process single frame (annotate=True -> 'annotated_frame' có vẽ detections)"""
         try:
             self.total_frames += 1
+            frame_context = FrameContext.ensure(frame, frame_context)
             
             # Step 1: Motion detection
-            motion_result = self.motion_detector.detect_motion(frame)
+            motion_result = self.motion_detector.detect_motion(frame, frame_context=frame_context)
             
             # Step 2: YOLO detection (if motion detected)
             if motion_result.get('motion_detected', False):
                 self.motion_frames += 1
-                yolo_result = self.yolo_detector.detect(frame)
+                yolo_result = self.yolo_detector.detect(frame, annotate=annotate)
                 
                 if yolo_result.get('detections'):
                     self.detection_frames += 1
@@ -587,7 +660,8 @@ class IntegratedVideoProcessor:
         print(f"   🤖 YOLO confidence: {yolo_confidence}")
         print(f"   💾 Frame saving: {'Enabled' if save_frames else 'Disabled'}")
     
-    def process_frame(self, frame: np.ndarray, save_keyframes=True) -> Dict[str, Any]:
+    def process_frame(self, frame: np.ndarray, save_keyframes=True,
+                      frame_context: Optional[FrameContext] = None) -> Dict[str, Any]:
         """Process frame through the integrated pipeline
         
         Pipeline: Motion Detection → Keyframe Detection → YOLO → Healthcare Analysis
@@ -595,27 +669,32 @@ class IntegratedVideoProcessor:
         Args:
             frame: Input frame
             save_keyframes: Whether to save detected keyframes
+            frame_context: Shared derived image cache of this frame (created if None)
             
         Returns:
             Processing results with all analysis data
         """
         
         self.stats['total_frames'] += 1
+        frame_context = FrameContext.ensure(frame, frame_context)
         
         # Stage 1: Motion Detection (quick filter)
-        motion_result = self.motion_detector.detect_motion(frame)
+        with pipeline_metrics.span('motion'):
+            motion_result = self.motion_detector.detect_motion(frame, frame_context=frame_context)
         
         if motion_result['motion_detected']:
             self.stats['motion_frames'] += 1
             
             # Stage 2: Keyframe Detection (important frame filter)
-            is_keyframe, keyframe_confidence = self.keyframe_detector.is_keyframe(frame)
+            with pipeline_metrics.span('keyframe'):
+                is_keyframe, keyframe_confidence = self.keyframe_detector.is_keyframe(frame, frame_context=frame_context)
             
             if is_keyframe:
                 self.stats['keyframes'] += 1
                 
                 # Stage 3: YOLO Detection (only on keyframes)
-                yolo_result = self.yolo_detector.detect(frame)
+                with pipeline_metrics.span('yolo'):
+                    yolo_result = self.yolo_detector.detect(frame)
                 detections = yolo_result.get('detections', [])
                 self.stats['yolo_processed'] += 1
                 
@@ -625,7 +704,8 @@ class IntegratedVideoProcessor:
                     for person_detection in person_detections:
                         try:
                             # Extract keypoints using pose estimator
-                            keypoints = self.pose_estimator.extract_keypoints(frame, confidence_threshold=0.3)
+                            with pipeline_metrics.span('pose'):
+                                keypoints = self.pose_estimator.extract_keypoints(frame, confidence_threshold=0.3)
                             if keypoints is not None:
                                 # Convert keypoints to flat list [x1, y1, conf1, x2, y2, conf2, ...]
                                 keypoints_flat = []
@@ -653,7 +733,8 @@ class IntegratedVideoProcessor:
                             bbox = best_person.get('bbox', [])
                             if len(bbox) >= 4:
                                 # Run fall detection
-                                fall_result = self.fall_detector.detect_fall(frame, bbox)
+                                with pipeline_metrics.span('fall_prefilter'):
+                                    fall_result = self.fall_detector.detect_fall(frame, bbox, frame_context=frame_context)
                                 fall_detected = fall_result.get('fall_detected', False)
                                 fall_confidence = fall_result.get('confidence', 0.0)
                                 fall_analysis = fall_result
@@ -691,33 +772,33 @@ class IntegratedVideoProcessor:
                 
                 # Save frames if enabled
                 if self.save_frames and self.frame_saver:
-                    
-                    # Save keyframe
-                    if save_keyframes and keyframe_confidence > 0.5:
-                        self.frame_saver.save_keyframe(frame, {
-                            'confidence': keyframe_confidence,
-                            'motion_pixels': motion_result['motion_pixels'],
-                            'detections': len(detections),
-                            'person_count': person_count
-                        })
-                    
-                    # Save detection frame if persons detected
-                    if person_count > 0:
-                        max_conf = max([d.get('confidence', 0) for d in detections], default=0)
-                        self.frame_saver.save_detection(frame, {
-                            'persons': [d for d in detections if d.get('class_name') == 'person'],
-                            'max_confidence': max_conf,
-                            'keyframe_confidence': keyframe_confidence
-                        })
-                    
-                    # Save alert frame if alerts generated
-                    if alerts:
-                        for alert in alerts:
-                            self.frame_saver.save_alert(frame, {
-                                'alert_type': alert.get('type', 'unknown'),
-                                'confidence': alert.get('confidence', 0),
+                    with pipeline_metrics.span('persistence'):
+                        # Save keyframe
+                        if save_keyframes and keyframe_confidence > 0.5:
+                            self.frame_saver.save_keyframe(frame, {
+                                'confidence': keyframe_confidence,
+                                'motion_pixels': motion_result['motion_pixels'],
+                                'detections': len(detections),
+                                'person_count': person_count
+                            })
+                        
+                        # Save detection frame if persons detected
+                        if person_count > 0:
+                            max_conf = max([d.get('confidence', 0) for d in detections], default=0)
+                            self.frame_saver.save_detection(frame, {
+                                'persons': [d for d in detections if d.get('class_name') == 'person'],
+                                'max_confidence': max_conf,
                                 'keyframe_confidence': keyframe_confidence
                             })
+                        
+                        # Save alert frame if alerts generated
+                        if alerts:
+                            for alert in alerts:
+                                self.frame_saver.save_alert(frame, {
+                                    'alert_type': alert.get('type', 'unknown'),
+                                    'confidence': alert.get('confidence', 0),
+                                    'keyframe_confidence': keyframe_confidence
+                                })
                 
                 return {
                     'processed': True,
@@ -755,6 +836,15 @@ class IntegratedVideoProcessor:
                 'processing_stats': self.get_processing_stats()
             }
     
+    def reset(self):
+        """Reset state theo video (motion background, keyframe history, stats), giữ YOLO / pose model"""
+        self.motion_detector = SimpleMotionDetector(threshold=self.motion_detector.threshold)
+        self.keyframe_detector = SimpleKeyframeDetector(threshold=self.keyframe_detector.threshold)
+        self.healthcare_analyzer = SimpleHealthcareAnalyzer()
+        if self.fall_detector is not None:
+            self.fall_detector.reset()
+        self.stats = {key: 0 for key in self.stats}
+    
     def get_processing_stats(self) -> Dict[str, Any]:
         """Get processing statistics"""
         total = max(self.stats['total_frames'], 1)
@@ -0,0 +1,13 @@
+"""
+Pytest setup: import như main.py (src/ trên sys.path).
+Test không cần camera / GPU / DB; test phụ thuộc optional package (cv2, redis, sqlalchemy...) tự skip.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+# Global singletons (local_spool...) không ghi vào data/ của repo khi import trong test
+os.environ.setdefault("SPOOL_ENABLED", "false")
@@ -0,0 +1,74 @@
+"""AudioAlertService (pydub backend): re-trigger cùng siren không để 2 play loop phát chồng nhau"""
+
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+from infrastructure.services.audio_alert_service import AudioAlertService, _PcmBuffer
+
+
+class FakePlayObject:
+    """simpleaudio.PlayObject giả: buffer 'phát' 10ms rồi tự kết thúc"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+    def wait_done(self):
+        self.done.wait(0.01)
+        self.done.set()
+
+    def stop(self):
+        self.done.set()
+
+    def is_playing(self):
+        return not self.done.is_set()
+
+
+@pytest.fixture
+def service(monkeypatch):
+    created = []
+
+    def play_buffer(data, channels, sample_width, frame_rate):
+        play_obj = FakePlayObject()
+        created.append(play_obj)
+        return play_obj
+
+    monkeypatch.setitem(sys.modules, 'simpleaudio', types.SimpleNamespace(play_buffer=play_buffer))
+    monkeypatch.setenv('AUDIO_ALERT_ENABLED', 'false')
+    service = AudioAlertService()
+    service.audio_backend = 'pydub'
+    service.created = created
+    yield service
+    service._stop_playback()
+
+
+def max_concurrent_playing(play_objects, seconds=0.2):
+    peak = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        peak = max(peak, sum(obj.is_playing() for obj in list(play_objects)))
+        time.sleep(0.002)
+    return peak
+
+
+def test_retrigger_same_sound_keeps_single_loop(service):
+    siren = _PcmBuffer(b'\x00' * 16, 1, 2, 8000)
+    service._start_playback(siren)
+    time.sleep(0.05)
+
+    # Như _handle_play khi alarm đang phát: stop rồi start lại cùng sound (cache)
+    service._stop_playback()
+    service._start_playback(siren)
+    assert max_concurrent_playing(service.created) == 1
+    loops = [t for t in threading.enumerate() if t.name == 'AudioPlayLoop']
+    assert len(loops) == 1
+
+    service._stop_playback()
+    created = len(service.created)
+    time.sleep(0.05)
+    assert len(service.created) == created
+    assert not any(obj.is_playing() for obj in service.created)
+    assert not [t for t in threading.enumerate() if t.name == 'AudioPlayLoop']
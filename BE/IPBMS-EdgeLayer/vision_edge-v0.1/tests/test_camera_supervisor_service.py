@@ -0,0 +1,89 @@
+"""CameraSupervisor: retry backoff khi connect lỗi, restart camera stalled / frozen, không cần camera thật"""
+
+import time
+
+import pytest
+
+from service.camera_supervisor_service import CameraSupervisor
+
+
+class FakeCamera:
+    """connect() theo kịch bản + get_health() giống SimpleIMOUCamera"""
+
+    def __init__(self, connect_results):
+        self.connect_results = list(connect_results)
+        self.connect_calls = 0
+        self.supervised = False
+        self.health = {'connected': False, 'stream_failed': False, 'frame_age': 0.0, 'identical_frames': 0}
+
+    def enable_supervision(self):
+        self.supervised = True
+
+    def connect(self):
+        self.connect_calls += 1
+        ok = self.connect_results.pop(0) if self.connect_results else True
+        self.health = {'connected': ok, 'stream_failed': False, 'frame_age': 0.0, 'identical_frames': 0}
+        return ok
+
+    def get_health(self):
+        return dict(self.health)
+
+
+def wait_until(predicate, timeout=3.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def supervisor(monkeypatch):
+    monkeypatch.setenv('CAMERA_RETRY_BASE_DELAY', '0.02')
+    monkeypatch.setenv('CAMERA_RETRY_MAX_DELAY', '0.1')
+    monkeypatch.setenv('CAMERA_SUPERVISOR_INTERVAL', '0.01')
+    monkeypatch.setenv('CAMERA_STALL_TIMEOUT_MS', '500')
+    monkeypatch.setenv('CAMERA_FROZEN_FRAMES', '50')
+    supervisor = CameraSupervisor(max_workers=2)
+    yield supervisor
+    supervisor.shutdown()
+
+
+def test_failed_connects_are_retried_with_backoff(supervisor):
+    camera = FakeCamera([False, False, True])
+    supervisor.register('cam1', 'Living room', camera)
+    assert camera.supervised
+
+    assert wait_until(lambda: supervisor.is_ready('cam1'))
+    stats = supervisor.get_stats()['cam1']
+    assert camera.connect_calls == 3
+    assert stats['attempts'] == 3 and stats['failures'] == 0 and stats['restarts'] == 0
+    assert stats['connected_after'] >= 0.02 * 0.5 + 0.04 * 0.5  # 2 lần backoff (jitter >= 50%)
+
+
+@pytest.mark.parametrize('health, reason', [
+    ({'frame_age': 2.0}, 'stalled'),
+    ({'identical_frames': 60}, 'frozen'),
+    ({'stream_failed': True}, 'stream_failed'),
+])
+def test_unhealthy_stream_is_restarted(supervisor, health, reason):
+    camera = FakeCamera([True])
+    supervisor.register('cam1', 'Bedroom', camera)
+    assert wait_until(lambda: supervisor.is_ready('cam1'))
+
+    camera.health.update(health)
+    assert wait_until(lambda: supervisor.get_stats()['cam1']['restarts'] == 1 and supervisor.is_ready('cam1'))
+    stats = supervisor.get_stats()['cam1']
+    assert stats['last_restart_reason'] == reason
+    assert camera.connect_calls == 2
+    assert stats['downtime_seconds'] > 0
+
+
+def test_first_frame_recorded_once(supervisor):
+    supervisor.register('cam1', 'Hall', FakeCamera([True]))
+    assert wait_until(lambda: supervisor.is_ready('cam1'))
+    first = supervisor.mark_first_frame('cam1')
+    assert first is not None and first >= 0
+    assert supervisor.mark_first_frame('cam1') is None
+    assert supervisor.mark_first_frame('unknown') is None
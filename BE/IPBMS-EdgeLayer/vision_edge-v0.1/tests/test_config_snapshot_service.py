@@ -0,0 +1,159 @@
+"""ConfigStore: env -> system_config -> cameras jsonb -> camera key, swap atomic, lỗi DB giữ snapshot cũ"""
+
+import threading
+import time
+
+import pytest
+
+from infrastructure.services.config_snapshot_service import ConfigStore, DetectionConfig
+
+CAMERA_A = '11111111-1111-1111-1111-111111111111'
+CAMERA_B = '22222222-2222-2222-2222-222222222222'
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        if self.db.fail:
+            raise RuntimeError('connection reset')
+        if 'FROM system_config' in sql:
+            self._rows = [{'setting_key': key, 'setting_value': value} for key, value in self.db.system_config]
+        elif 'information_schema' in sql:
+            self._rows = [(1,)] if self.db.cameras is not None else []
+        else:
+            self._rows = [{'camera_id': camera_id, 'overrides': values}
+                          for camera_id, values in (self.db.cameras or {}).items()]
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def rollback(self):
+        pass
+
+
+class FakeDatabase:
+    """get_connection / return_connection như PostgreSQLHealthcareService"""
+
+    def __init__(self, system_config=(), cameras=None):
+        self.is_connected = True
+        self.system_config = list(system_config)
+        self.cameras = cameras
+        self.fail = False
+        self.returned = []
+
+    def get_connection(self):
+        return FakeConnection(self)
+
+    def return_connection(self, conn, close=False):
+        self.returned.append(close)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setenv('FALL_DETECTION_CONFIDENCE', '0.65')
+    monkeypatch.setenv('SEIZURE_CONFIRMATION_FRAMES', '6')
+    return ConfigStore()
+
+
+def test_env_defaults_without_database(store):
+    snapshot = store.current()
+    assert snapshot.source == 'env' and snapshot.version == 1
+    assert store.for_camera(CAMERA_A) is snapshot.defaults
+    assert snapshot.defaults.fall_confidence_threshold == 0.65
+    assert snapshot.defaults.seizure_confirmation_frames == 6
+    assert DetectionConfig().fall_confidence_threshold == 0.7
+
+
+def test_override_precedence_per_camera(store):
+    db = FakeDatabase(
+        system_config=[('fall_cooldown_seconds', '12'),
+                       ('fall_enabled', 'false'),
+                       ('seizure_threshold', 'not-a-number'),
+                       (f'camera.{CAMERA_A}.fall_confidence_threshold', '0.9')],
+        cameras={CAMERA_A: {'fall_confidence_threshold': 0.5, 'min_keypoints_visible': 10},
+                 CAMERA_B: '{"seizure_cooldown_seconds": 2}'})
+    snapshot = store.attach_database(db)
+
+    assert snapshot.source == 'env+db' and snapshot.version == 2
+    defaults = snapshot.defaults
+    assert defaults.fall_cooldown_seconds == 12.0 and defaults.fall_enabled is False
+    assert defaults.seizure_threshold == 0.02  # giá trị lỗi bị bỏ qua
+
+    camera_a = store.for_camera(CAMERA_A)
+    assert camera_a.fall_confidence_threshold == 0.9  # system_config camera key > jsonb
+    assert camera_a.min_keypoints_visible == 10
+    assert camera_a.fall_cooldown_seconds == 12.0  # kế thừa global override
+    assert store.for_camera(CAMERA_B).seizure_cooldown_seconds == 2.0
+    assert store.for_camera('unknown-camera') is defaults
+    assert db.returned == [False]
+
+
+def test_database_error_keeps_previous_snapshot(store):
+    db = FakeDatabase(system_config=[('fall_cooldown_seconds', '12')])
+    store.attach_database(db)
+    previous = store.current()
+
+    db.fail = True
+    assert store.reload('notify') is previous
+    assert store.version == previous.version
+    assert store.stats['reload_failures'] == 1
+    assert db.returned[-1] is True  # connection lỗi bị đóng, không trả vào pool
+
+
+def test_subscribers_see_old_and_new_snapshot(store):
+    db = FakeDatabase()
+    store.attach_database(db)
+    seen = []
+    store.subscribe(lambda old, new: seen.append((old.version, new.version, new.defaults.fall_cooldown_seconds)))
+
+    db.system_config = [('fall_cooldown_seconds', '3')]
+    store.reload()
+    assert seen == [(2, 3, 3.0)]
+
+
+def test_request_reload_coalesces_bursts(store, monkeypatch):
+    store.attach_database(FakeDatabase())
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    original_reload = store.reload
+
+    def slow_reload(reason='manual'):
+        calls.append(reason)
+        started.set()
+        release.wait(2.0)
+        return original_reload(reason)
+
+    monkeypatch.setattr(store, 'reload', slow_reload)
+    store.request_reload('first')
+    assert started.wait(2.0)
+    for _ in range(10):
+        store.request_reload('burst')
+    release.set()
+
+    for _ in range(200):
+        if not store._reload_running:
+            break
+        time.sleep(0.01)
+    assert calls == ['notify', 'notify']
+    assert store.stats['notifications'] == 11
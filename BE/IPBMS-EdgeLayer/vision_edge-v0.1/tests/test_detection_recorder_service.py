@@ -0,0 +1,110 @@
+"""DetectionRecorder ghi cột nhị phân -> RecordingReader memmap đọc lại đúng giá trị, bỏ row ghi dở"""
+
+import os
+
+import numpy as np
+import pytest
+
+from infrastructure.services.detection_recorder_service import (
+    DetectionRecorder, RecordingReader, KEYPOINT_COUNT, is_recording
+)
+
+
+def make_frames(count, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for index in range(count):
+        people = index % 3          # 0, 1, 2 detection -> ragged
+        detections = [{'bbox': rng.uniform(0, 640, 4).tolist(), 'confidence': float(rng.random()), 'class_id': 0}
+                      for _ in range(people)]
+        frames.append({
+            'timestamp': 1_700_000_000.0 + index / 15.0,
+            'frame_index': index,
+            'keyframe': index % 2 == 0,
+            'detections': detections,
+            'bbox': detections[0]['bbox'] if detections else None,
+            'keypoints': rng.uniform(0, 640, (KEYPOINT_COUNT, 3)) if people else None,
+            'motion_level': float(rng.random()),
+            'fall_confidence': float(rng.random()) if index % 4 else None,
+            'fall_detected': index == 5,
+            'seizure_ready': index >= 3,
+        })
+    return frames
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    recorder = DetectionRecorder('cam-1', base_dir=str(tmp_path), flush_frames=4)
+    yield recorder
+    recorder.close()
+
+
+def test_write_then_memmap_read_roundtrip(recorder):
+    frames = make_frames(10)   # 2 flush đầy + 2 frame flush lúc close
+    for frame in frames:
+        recorder.append(**frame)
+    recorder.close()
+
+    assert is_recording(recorder.path)
+    reader = RecordingReader(recorder.path)
+    assert len(reader) == 10
+    assert isinstance(reader['keypoints'], np.memmap)
+    assert np.array_equal(reader['timestamp'], [frame['timestamp'] for frame in frames])
+    assert np.array_equal(reader['frame_index'], np.arange(10))
+    assert np.array_equal(reader['person_count'], [len(frame['detections']) for frame in frames])
+    assert np.array_equal(reader['motion_level'], np.float32([frame['motion_level'] for frame in frames]))
+    assert np.array_equal(reader.flag('keyframe'), [frame['keyframe'] for frame in frames])
+    assert np.array_equal(reader.flag('fall_detected'), [frame['fall_detected'] for frame in frames])
+    assert np.array_equal(reader.flag('seizure_ready'), [frame['seizure_ready'] for frame in frames])
+
+    for index, frame in enumerate(frames):
+        expected_fall = np.nan if frame['fall_confidence'] is None else np.float32(frame['fall_confidence'])
+        assert np.array_equal(reader['fall_confidence'][index], expected_fall, equal_nan=True)
+        if frame['detections']:
+            assert np.array_equal(reader['bbox'][index], np.float32(frame['bbox']))
+            assert np.array_equal(reader['keypoints'][index], np.float32(frame['keypoints']))
+        else:
+            assert np.isnan(reader['bbox'][index]).all() and np.isnan(reader['keypoints'][index]).all()
+        expected = np.float32([d['bbox'] + [d['confidence'], d['class_id']] for d in frame['detections']])
+        assert np.array_equal(reader.detections(index), expected.reshape(-1, 6))
+
+
+def test_reader_ignores_partial_rows(recorder):
+    for frame in make_frames(6):
+        recorder.append(**frame)
+    recorder.flush()
+    # Process chết giữa lúc ghi keypoints: nửa row cuối
+    with open(os.path.join(recorder.path, 'keypoints.bin'), 'ab') as f:
+        f.write(b'\0' * (KEYPOINT_COUNT * 3 * 4 // 2))
+
+    reader = RecordingReader(recorder.path)
+    assert len(reader) == 6
+    assert reader['keypoints'].shape == (6, KEYPOINT_COUNT, 3)
+    assert recorder.get_stats()['frames'] == 6
+
+
+def test_unflushed_frames_are_not_visible_until_flush(recorder):
+    for frame in make_frames(3):
+        recorder.append(**frame)
+    assert len(RecordingReader(recorder.path)) == 0
+    assert recorder.get_stats()['frames'] == 3
+
+    recorder.flush()
+    assert len(RecordingReader(recorder.path)) == 3
+
+
+def test_session_arrays_keep_keyframes_only(recorder):
+    frames = make_frames(8)
+    for frame in frames:
+        recorder.append(**frame)
+    recorder.close()
+
+    arrays = RecordingReader(recorder.path).to_session_arrays()
+    keyframes = [frame for frame in frames if frame['keyframe']]
+    assert np.array_equal(arrays['timestamp'], [frame['timestamp'] for frame in keyframes])
+    assert arrays['keypoints'].dtype == np.float64 and arrays['keypoints'].shape == (4, KEYPOINT_COUNT, 3)
+    assert not np.isnan(arrays['fall_confidence']).any()   # NaN -> 0 cho rescore
+    assert len(RecordingReader(recorder.path).to_session_arrays(keyframes_only=False)['timestamp']) == 8
+
+    recorder.append(**frames[0])   # sau close: bỏ qua
+    assert len(RecordingReader(recorder.path)) == 8
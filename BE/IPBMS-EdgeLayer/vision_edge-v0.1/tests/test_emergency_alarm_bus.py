@@ -0,0 +1,92 @@
+"""EmergencyAlarmHandlerPsycopg trên event bus: fall/seizure đã tạo alert -> siren, stop() chỉ dừng group 'alarm'"""
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("psycopg")
+
+from infrastructure.services import emergency_alarm_handler_psycopg as alarm_module
+from infrastructure.services.event_bus_service import EVENT_FALL, EVENT_SEIZURE, EVENT_SYSTEM_STATUS
+from test_event_bus_dead_letter import FakeStreamClient, make_bus
+
+
+class BlockingStreamClient(FakeStreamClient):
+    """XGROUP CREATE / XREADGROUP rỗng (chờ block ms) để consume() chạy được trong thread"""
+
+    def xgroup_create(self, stream, group, id='$', mkstream=True):
+        return True
+
+    def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        time.sleep((block or 0) / 1000.0)
+        return []
+
+    def xautoclaim(self, *args, **kwargs):
+        return ['0-0', []]
+
+
+@pytest.fixture
+def bus(monkeypatch):
+    bus = make_bus()
+    bus.enabled = True
+    monkeypatch.setattr(alarm_module, 'event_bus', bus)
+    yield bus
+    bus.stop()
+
+
+@pytest.fixture
+def handler(bus, monkeypatch):
+    handler = alarm_module.EmergencyAlarmHandlerPsycopg()
+    handler.sirens = []
+
+    def play_alarm(user_id, triggered_by, duration=10):
+        handler.sirens.append((user_id, triggered_by))
+        return {'success': True}
+
+    monkeypatch.setattr(handler, '_play_alarm', play_alarm)
+    yield handler
+    handler.executor.shutdown(wait=False)
+
+
+def deliver_to_alarm_group(bus, handler):
+    subscribed = {}
+    bus.start_consumer = lambda group, callback, event_types=None, **kwargs: subscribed.update(
+        group=group, callback=callback, types=set(event_types)) or True
+    assert handler.start_event_bus_consumer()
+    bus._dispatch(subscribed['group'], bus.client.deliver(bus.stream), subscribed['callback'], subscribed['types'])
+
+
+def test_fall_event_with_alert_triggers_siren(bus, handler):
+    bus.publish(EVENT_FALL, {'event_id': 'evt-1', 'alert_created': True, 'severity': 'high'},
+                camera_id='cam1', user_id='user-1')
+    bus.publish(EVENT_SEIZURE, {'event_id': 'evt-2', 'alert_created': False}, camera_id='cam1', user_id='user-1')
+    bus.publish(EVENT_SYSTEM_STATUS, {'status': 'ok'})
+
+    deliver_to_alarm_group(bus, handler)
+    assert handler.sirens == [('user-1', 'fall_detection')]
+    assert handler.get_stats()['alarms'] == 1
+    assert bus.client.acked == {'1-0', '2-0', '3-0'}
+
+    # Giao lại cùng event (replay sau crash) -> không bật siren lần 2
+    bus.client.acked.clear()
+    deliver_to_alarm_group(bus, handler)
+    assert len(handler.sirens) == 1
+
+
+def test_stop_only_stops_alarm_consumer(monkeypatch, handler):
+    bus = make_bus()
+    bus.enabled = True
+    bus._client = BlockingStreamClient()
+    monkeypatch.setattr(alarm_module, 'event_bus', bus)
+
+    assert handler.start_event_bus_consumer()
+    assert bus.start_consumer('db_writer', lambda event: None, block_ms=10)
+    assert bus.start_consumer('websocket', lambda event: None, block_ms=10)
+
+    handler.stop()
+    running = {thread.name for thread in threading.enumerate() if thread.name.startswith('EventBus-')}
+    assert 'EventBus-alarm' not in running
+    assert {'EventBus-db_writer', 'EventBus-websocket'} <= running
+    bus.stop()
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith('EventBus-')]
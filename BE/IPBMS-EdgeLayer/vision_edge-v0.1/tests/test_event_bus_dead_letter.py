@@ -0,0 +1,104 @@
+"""RedisEventBus: event lỗi quá max_deliveries lần -> dead-letter stream + ack (fake Redis client)"""
+
+import itertools
+
+from infrastructure.services.event_bus_service import BusEvent, RedisEventBus, _dumps
+from service.event_bus_db_writer import EventBusDBWriter
+
+
+class FakeStreamClient:
+    """Subset XADD / XACK / XPENDING / XAUTOCLAIM / XRANGE của 1 consumer group, in-memory"""
+
+    def __init__(self):
+        self.streams = {}
+        self.delivered = {}  # entry_id -> times_delivered
+        self.acked = set()
+        self._ids = itertools.count(1)
+
+    def xadd(self, stream, fields, maxlen=None, approximate=True):
+        entry_id = f"{next(self._ids)}-0"
+        self.streams.setdefault(stream, []).append((entry_id, dict(fields)))
+        return entry_id
+
+    def deliver(self, stream):
+        """Giao lại mọi entry chưa ack (XREADGROUP lần đầu / XAUTOCLAIM)"""
+        events = []
+        for entry_id, fields in self.streams.get(stream, []):
+            if entry_id not in self.acked:
+                self.delivered[entry_id] = self.delivered.get(entry_id, 0) + 1
+                events.append(BusEvent(entry_id, fields))
+        return events
+
+    def xpending_range(self, stream, group, min, max, count):
+        if min in self.delivered and min not in self.acked:
+            return [{'message_id': min, 'consumer': 'c1', 'time_since_delivered': 0,
+                     'times_delivered': self.delivered[min]}]
+        return []
+
+    def xack(self, stream, group, *entry_ids):
+        self.acked.update(entry_ids)
+        return len(entry_ids)
+
+    def xrange(self, stream, min='-', max='+', count=None):
+        return list(self.streams.get(stream, []))[:count]
+
+
+def make_bus(max_deliveries=3):
+    bus = RedisEventBus(stream='test:events', enabled=False)
+    bus.max_deliveries = max_deliveries
+    bus.dead_letter_stream = 'test:events:dead'
+    bus._client = FakeStreamClient()
+    return bus
+
+
+def publish(bus, event_type, data):
+    bus.client.xadd(bus.stream, {'type': event_type, 'ts': '1.0', 'camera_id': 'cam1', 'user_id': '',
+                                 'data': _dumps(data)})
+
+
+def run_deliveries(bus, handler, rounds):
+    for _ in range(rounds):
+        events = bus.client.deliver(bus.stream)
+        if events:
+            bus._dispatch('db_writer', events, handler, None)
+
+
+def test_poison_event_moves_to_dead_letter_after_max_deliveries():
+    bus = make_bus(max_deliveries=3)
+    publish(bus, 'fall', {'bad': True})
+    publish(bus, 'fall', {'bad': False})
+    handled = []
+
+    def handler(event):
+        if event.data['bad']:
+            raise ValueError('invalid payload')
+        handled.append(event.id)
+
+    run_deliveries(bus, handler, rounds=2)
+    assert bus.dead_letters() == []
+    assert handled == ['2-0']
+
+    run_deliveries(bus, handler, rounds=5)
+    dead = bus.dead_letters()
+    assert len(dead) == 1
+    assert dead[0].data == {'bad': True}
+    fields = bus.client.streams['test:events:dead'][0][1]
+    assert fields['source_id'] == '1-0' and fields['group'] == 'db_writer'
+    assert fields['deliveries'] == '3' and 'invalid payload' in fields['error']
+    assert '1-0' in bus.client.acked
+    assert bus.stats['dead_lettered'] == 1 and bus.stats['handler_errors'] == 3
+
+
+class DisconnectedPostgres:
+    is_connected = False
+
+
+def test_db_outage_is_retried_not_dead_lettered():
+    bus = make_bus(max_deliveries=2)
+    writer = EventBusDBWriter(DisconnectedPostgres(), bus=bus)
+    publish(bus, 'fall', {'persisted': False, 'event_data': {'event_type': 'fall'}})
+
+    run_deliveries(bus, writer.handle_event, rounds=5)
+    assert bus.dead_letters() == []
+    assert '1-0' not in bus.client.acked
+    assert writer.get_stats()['failed'] == 5
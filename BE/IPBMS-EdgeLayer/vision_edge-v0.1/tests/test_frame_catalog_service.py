@@ -0,0 +1,126 @@
+"""FrameCatalog: evict theo quota (file / bytes) xuống 90%, retention theo thời gian, counter sau restart"""
+
+import os
+
+import pytest
+
+from infrastructure.services.frame_catalog_service import FrameCatalog
+
+
+def write_artifact(catalog, category, index, size=100, created_at=None, day='2026/10/19'):
+    rel_path = os.path.join(category, day, f"frame_{index:04d}.jpg")
+    full_path = os.path.join(catalog.base_path, rel_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, 'wb') as f:
+        f.write(b'\0' * size)
+    catalog.add(category, rel_path, size, {'index': index}, created_at=created_at)
+    return rel_path
+
+
+@pytest.fixture
+def make_catalog(tmp_path, monkeypatch):
+    for name in ('FRAME_SAVER_MAX_FILES', 'FRAME_SAVER_MAX_MB', 'FRAME_SAVER_MAX_FILES_ALERTS'):
+        monkeypatch.delenv(name, raising=False)
+    catalogs = []
+
+    def make(**kwargs):
+        kwargs.setdefault('retention_days', 0)
+        catalog = FrameCatalog(str(tmp_path), ['keyframes', 'alerts'], **kwargs)
+        catalogs.append(catalog)
+        return catalog
+
+    yield make
+    for catalog in catalogs:
+        catalog.close()
+
+
+def test_file_quota_evicts_oldest_down_to_ratio(make_catalog):
+    catalog = make_catalog(max_files=10)
+    paths = [write_artifact(catalog, 'keyframes', i) for i in range(11)]
+    write_artifact(catalog, 'alerts', 0)
+
+    # 11 > 10 -> giữ 9 (90%), xóa 2 file cũ nhất
+    remaining = [item['path'] for item in catalog.query('keyframes', limit=100)]
+    assert sorted(remaining) == sorted(paths[2:])
+    assert not any(os.path.exists(os.path.join(catalog.base_path, p)) for p in paths[:2])
+    assert all(os.path.exists(os.path.join(catalog.base_path, p)) for p in paths[2:])
+    stats = catalog.get_stats()
+    assert stats['categories']['keyframes']['files'] == 9
+    assert stats['categories']['alerts']['files'] == 1  # category khác không bị evict
+    assert stats['evicted'] == 2 and stats['evicted_bytes'] == 200
+
+
+def test_byte_quota_and_per_category_env_override(make_catalog, monkeypatch):
+    monkeypatch.setenv('FRAME_SAVER_MAX_FILES_ALERTS', '0')
+    catalog = make_catalog(max_files=5, max_bytes=1000)
+    assert catalog.quotas['alerts'] == (0, 1000)
+
+    for i in range(4):
+        write_artifact(catalog, 'alerts', i, size=300)
+    # 1200 > 1000 -> giải phóng tới <= 900 bytes: xóa 1 file cũ nhất
+    assert catalog.get_stats()['categories']['alerts'] == {'files': 3, 'bytes': 900, 'max_files': 0,
+                                                           'max_bytes': 1000}
+    assert catalog.get_metadata(os.path.join('alerts', '2026/10/19', 'frame_0000.jpg')) is None
+    assert catalog.get_metadata(os.path.join('alerts', '2026/10/19', 'frame_0003.jpg')) == {'index': 3}
+
+
+def test_retention_purges_old_artifacts_and_empty_day_dirs(make_catalog):
+    catalog = make_catalog(max_files=0)
+    now = 1_800_000_000.0
+    for i in range(3):
+        write_artifact(catalog, 'keyframes', i, created_at=now - 10 * 86400, day='2026/01/01')
+    new = write_artifact(catalog, 'keyframes', 3, created_at=now, day='2026/01/11')
+
+    assert catalog.purge_older_than(now - 7 * 86400) == 3
+    assert [item['path'] for item in catalog.query('keyframes')] == [new]
+    assert not os.path.exists(os.path.join(catalog.base_path, 'keyframes', '2026', '01', '01'))
+    assert os.path.exists(os.path.join(catalog.base_path, new))
+    assert catalog.get_stats()['expired'] == 3
+    assert catalog.query('keyframes', since=now - 86400, until=now + 1)[0]['path'] == new
+
+
+def test_counters_survive_restart(make_catalog):
+    catalog = make_catalog(max_files=10)
+    for i in range(5):
+        write_artifact(catalog, 'keyframes', i, size=50)
+    catalog.close()
+
+    reopened = make_catalog(max_files=10)
+    assert reopened.get_stats()['categories']['keyframes']['files'] == 5
+    assert reopened.get_stats()['categories']['keyframes']['bytes'] == 250
+    for i in range(5, 11):
+        write_artifact(reopened, 'keyframes', i, size=50)
+    assert reopened.get_stats()['categories']['keyframes']['files'] == 9
+
+
+def test_two_instances_share_quota_and_counters(make_catalog):
+    first, second = make_catalog(max_files=10), make_catalog(max_files=10)
+    for i in range(30):
+        write_artifact(first if i % 2 else second, 'keyframes', i, size=10)
+
+        rows = first._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts WHERE category = 'keyframes'").fetchone()
+        assert rows[0] <= 10
+        for catalog in (first, second):
+            stats = catalog.get_stats()['categories']['keyframes']
+            assert (stats['files'], stats['bytes']) == rows
+
+    remaining = sorted(item['path'] for item in second.query('keyframes', limit=100))
+    assert remaining == sorted(os.path.relpath(os.path.join(root, name), first.base_path)
+                               for root, _, names in os.walk(os.path.join(first.base_path, 'keyframes'))
+                               for name in names)
+
+
+def test_counters_seeded_for_catalog_without_totals_table(make_catalog):
+    catalog = make_catalog(max_files=0)
+    for i in range(3):
+        write_artifact(catalog, 'alerts', i, size=70)
+    catalog._conn.executescript("DROP TRIGGER trg_artifacts_insert; DROP TRIGGER trg_artifacts_delete;"
+                                "DROP TABLE category_totals;")
+    catalog.close()
+
+    reopened = make_catalog(max_files=0)
+    assert reopened.get_stats()['categories']['alerts']['files'] == 3
+    assert reopened.get_stats()['categories']['alerts']['bytes'] == 210
+    write_artifact(reopened, 'alerts', 3, size=70)
+    assert reopened.get_stats()['categories']['alerts']['files'] == 4
@@ -0,0 +1,113 @@
+"""InferenceCache: hit khi replay lại, invalidate khi weights đổi, flush lỗi không ROLLBACK sai"""
+
+import sqlite3
+
+import pytest
+
+from infrastructure.services.inference_cache_service import InferenceCache
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(b"fake video content")
+    return str(path)
+
+
+@pytest.fixture
+def weights(tmp_path):
+    path = tmp_path / "yolov8n.pt"
+    path.write_bytes(b"weights v1")
+    return path
+
+
+def replay(cache, video_key, model_key, frames, calls):
+    def compute(i):
+        calls.append(i)
+        return {'frame': i, 'boxes': [[i, i, i + 10, i + 10]]}
+
+    results = []
+    for i in range(frames):
+        with cache.frame((video_key, i)):
+            results.append(cache.cached(model_key, lambda i=i: compute(i)))
+    cache.flush()
+    return results
+
+
+def test_second_replay_hits_cache_across_restart(tmp_path, video, weights):
+    cache = InferenceCache(cache_dir=str(tmp_path / "cache"), enabled=True)
+    video_key = cache.video_key(video)
+    model_key = cache.register_model('yolo', str(weights), {'conf': 0.5})
+    calls = []
+    first = replay(cache, video_key, model_key, 5, calls)
+    assert calls == [0, 1, 2, 3, 4]
+    cache.close()
+
+    cache = InferenceCache(cache_dir=str(tmp_path / "cache"), enabled=True)
+    assert cache.video_key(video) == video_key
+    assert cache.register_model('yolo', str(weights), {'conf': 0.5}) == model_key
+    calls = []
+    assert replay(cache, video_key, model_key, 5, calls) == first
+    assert calls == []
+    assert cache.get_stats()['hits'] == 5
+    cache.close()
+
+
+def test_weights_change_invalidates_old_results(tmp_path, video, weights):
+    cache = InferenceCache(cache_dir=str(tmp_path / "cache"), enabled=True)
+    video_key = cache.video_key(video)
+    old_key = cache.register_model('yolo', str(weights))
+    replay(cache, video_key, old_key, 3, [])
+
+    weights.write_bytes(b"weights v2 - retrained")
+    new_key = cache.register_model('yolo', str(weights))
+    assert new_key != old_key
+    assert cache.invalidated == 3
+
+    calls = []
+    replay(cache, video_key, new_key, 3, calls)
+    assert calls == [0, 1, 2]
+    cache.close()
+
+
+def test_no_frame_scope_or_model_key_bypasses_cache(tmp_path):
+    cache = InferenceCache(cache_dir=str(tmp_path / "cache"), enabled=True)
+    calls = []
+    assert cache.cached('any', lambda: calls.append(1) or 'live') == 'live'
+    with cache.frame(('video', 0)):
+        assert cache.cached(None, lambda: calls.append(2) or 'uncached') == 'uncached'
+    assert calls == [1, 2]
+    assert cache.get_stats()['hits'] == cache.get_stats()['misses'] == 0
+    cache.close()
+
+
+class FailingBeginConnection:
+    """Proxy sqlite3 connection: BEGIN lỗi (vd. database locked) -> không có transaction nào mở"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, sql, *args):
+        if sql == 'BEGIN':
+            raise sqlite3.OperationalError('database is locked')
+        return self._conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def test_flush_after_failed_begin_drops_batch_without_rollback(tmp_path, video, weights):
+    cache = InferenceCache(cache_dir=str(tmp_path / "cache"), enabled=True)
+    video_key = cache.video_key(video)
+    model_key = cache.register_model('yolo', str(weights))
+    real_conn = cache._conn
+    cache._conn = FailingBeginConnection(real_conn)
+
+    with cache.frame((video_key, 0)):
+        cache.cached(model_key, lambda: 'value')
+    cache.flush()  # không raise "cannot rollback - no transaction is active"
+    assert cache._pending == {}
+
+    cache._conn = real_conn
+    assert real_conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 0
+    cache.close()
@@ -0,0 +1,110 @@
+"""Latency writer nền của PostgreSQLHealthcareService: 1 thread duy nhất, sống sót khi connection chết"""
+
+import queue
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+from service.postgresql_healthcare_service import PostgreSQLHealthcareService
+
+
+class FakeTrace:
+    def to_dict(self):
+        return {'total_ms': 12.5}
+
+
+class DeadConnection:
+    """executemany / rollback đều raise như connection bị server đóng"""
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def executemany(self, sql, rows):
+        raise RuntimeError('server closed the connection unexpectedly')
+
+    def rollback(self):
+        raise RuntimeError('connection already closed')
+
+
+class GoodConnection(DeadConnection):
+    def __init__(self, written):
+        self.written = written
+
+    def executemany(self, sql, rows):
+        self.written.extend(event_id for _context, event_id in rows)
+
+    def commit(self):
+        pass
+
+
+def make_service():
+    service = PostgreSQLHealthcareService.__new__(PostgreSQLHealthcareService)
+    service._latency_queue = queue.Queue(maxsize=100)
+    service._latency_writer = None
+    service._latency_writer_lock = threading.Lock()
+    return service
+
+
+def wait_until(predicate, timeout=3.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_concurrent_callers_start_single_writer(monkeypatch):
+    service = make_service()
+    release = threading.Event()
+    starts = []
+    original_start = threading.Thread.start
+
+    def counting_start(thread):
+        if thread.name == 'EventLatencyWriter':
+            starts.append(thread)
+        original_start(thread)
+
+    monkeypatch.setattr(threading.Thread, 'start', counting_start)
+    monkeypatch.setattr(service, '_latency_writer_loop', lambda: release.wait(2.0))
+    barrier = threading.Barrier(8)
+
+    def call(index):
+        barrier.wait()
+        service._queue_event_latency(f"evt-{index}", {}, FakeTrace())
+
+    callers = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+    release.set()
+    assert len(starts) == 1
+    assert service._latency_queue.qsize() == 8
+
+
+def test_writer_survives_failed_rollback():
+    service = make_service()
+    written, returned = [], []
+    connections = [DeadConnection()]
+    service.get_connection = lambda: connections.pop(0) if connections else GoodConnection(written)
+    service.return_connection = lambda conn, close=False: returned.append((type(conn).__name__, close))
+
+    service._queue_event_latency('evt-1', {}, FakeTrace())
+    assert wait_until(lambda: returned)
+    writer = service._latency_writer
+
+    service._queue_event_latency('evt-2', {'camera_id': 'cam1'}, FakeTrace())
+    assert wait_until(lambda: written == ['evt-2'])
+    assert writer.is_alive() and service._latency_writer is writer
+    assert returned == [('DeadConnection', True), ('GoodConnection', False)]
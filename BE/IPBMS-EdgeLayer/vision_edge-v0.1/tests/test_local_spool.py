@@ -0,0 +1,102 @@
+"""LocalSpool: enqueue, replay đúng thứ tự, dead-letter item lỗi dữ liệu, giữ backlog qua restart"""
+
+import os
+
+from infrastructure.services.local_spool_service import (LocalSpool, UpstreamUnavailable, SPOOL_EVENT,
+                                                         SPOOL_SNAPSHOT)
+
+
+def make_spool(spool_dir, monkeypatch, max_attempts=3):
+    monkeypatch.setenv('SPOOL_MAX_ATTEMPTS', str(max_attempts))
+    spool = LocalSpool(spool_dir=str(spool_dir), enabled=True)
+    # Drain bằng drain_once() trong test, không chạy replayer nền
+    monkeypatch.setattr(spool, 'start_replayer', lambda: None)
+    return spool
+
+
+def test_enqueue_and_drain_in_write_order(tmp_path, monkeypatch):
+    spool = make_spool(tmp_path, monkeypatch)
+    replayed = []
+    spool.register_handler(SPOOL_SNAPSHOT, lambda payload, blob: replayed.append(('snapshot', payload['n'], blob)) or True)
+    spool.register_handler(SPOOL_EVENT, lambda payload, blob: replayed.append(('event', payload['n'], blob)) or True)
+
+    assert spool.enqueue(SPOOL_SNAPSHOT, {'n': 1}, blob=b'jpeg-1') is not None
+    spool.enqueue(SPOOL_EVENT, {'n': 2})
+    spool.enqueue(SPOOL_SNAPSHOT, {'n': 3}, blob=b'jpeg-3')
+    assert spool.has_backlog() and spool.pending_count() == 3
+
+    assert spool.drain_once() is True
+    assert replayed == [('snapshot', 1, b'jpeg-1'), ('event', 2, None), ('snapshot', 3, b'jpeg-3')]
+    assert spool.pending_count() == 0
+    assert os.listdir(spool.blob_dir) == []
+
+
+def test_upstream_down_blocks_head_of_line(tmp_path, monkeypatch):
+    spool = make_spool(tmp_path, monkeypatch)
+    upstream_up = False
+    replayed = []
+
+    def handler(payload, blob):
+        if not upstream_up:
+            raise UpstreamUnavailable('PostgreSQL not connected')
+        replayed.append(payload['n'])
+        return True
+
+    spool.register_handler(SPOOL_EVENT, handler)
+    for n in range(3):
+        spool.enqueue(SPOOL_EVENT, {'n': n})
+
+    for _ in range(10):
+        assert spool.drain_once() is False
+    assert spool.pending_count() == 3 and spool.stats['dead'] == 0
+
+    upstream_up = True
+    spool.drain_once()
+    assert replayed == [0, 1, 2]
+
+
+def test_poison_item_is_dead_lettered_and_unblocks_queue(tmp_path, monkeypatch):
+    spool = make_spool(tmp_path, monkeypatch, max_attempts=3)
+    replayed = []
+
+    def handler(payload, blob):
+        if payload.get('poison'):
+            raise ValueError('bad payload')
+        replayed.append(payload['n'])
+        return True
+
+    spool.register_handler(SPOOL_EVENT, handler)
+    spool.enqueue(SPOOL_EVENT, {'n': 0})
+    spool.enqueue(SPOOL_EVENT, {'n': 1, 'poison': True})
+    spool.enqueue(SPOOL_EVENT, {'n': 2})
+
+    while spool.pending_count() and spool.stats['dead'] == 0:
+        spool.drain_once()
+    spool.drain_once()
+
+    assert replayed == [0, 2]
+    assert spool.stats['dead'] == 1 and spool.pending_count() == 0
+    status, attempts, last_error = spool._conn.execute(
+        "SELECT status, attempts, last_error FROM spool").fetchone()
+    assert (status, attempts) == ('dead', 3) and 'bad payload' in last_error
+
+
+def test_backlog_survives_restart(tmp_path, monkeypatch):
+    spool = make_spool(tmp_path, monkeypatch)
+    spool.enqueue(SPOOL_SNAPSHOT, {'n': 1}, blob=b'jpeg-1')
+    spool.enqueue(SPOOL_EVENT, {'n': 2, 'detected_at': '2026-01-01T00:00:00+00:00'})
+    spool._conn.close()
+
+    restarted = make_spool(tmp_path, monkeypatch)
+    assert restarted.has_backlog() and restarted.pending_count() == 2
+    replayed = []
+    restarted.register_handler(SPOOL_SNAPSHOT, lambda payload, blob: replayed.append((payload, blob)) or True)
+    restarted.register_handler(SPOOL_EVENT, lambda payload, blob: replayed.append((payload, blob)) or True)
+    restarted.drain_once()
+    assert replayed == [({'n': 1}, b'jpeg-1'), ({'n': 2, 'detected_at': '2026-01-01T00:00:00+00:00'}, None)]
+
+
+def test_disabled_spool_rejects_enqueue(tmp_path):
+    spool = LocalSpool(spool_dir=str(tmp_path), enabled=False)
+    assert spool.enqueue(SPOOL_EVENT, {'n': 1}) is None
+    assert not spool.has_backlog()
@@ -0,0 +1,43 @@
+"""MinIOService: upload async khi upload pool đầy không deadlock vì chờ thumbnail (fake MinIO client)"""
+
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("minio")
+pytest.importorskip("cv2")
+
+from infrastructure.storage.minio_service import MinIOService
+
+
+class FakeMinio:
+    def __init__(self):
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def put_object(self, bucket_name, object_name, data, length, **kwargs):
+        with self._lock:
+            self.objects[object_name] = data.read()
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.delenv('MINIO_ACCESS_KEY', raising=False)
+    monkeypatch.setenv('MINIO_UPLOAD_WORKERS', '1')
+    service = MinIOService()  # Không có credentials -> client None, gắn fake client
+    service.client = FakeMinio()
+    yield service
+    service.shutdown()
+
+
+def test_async_uploads_on_single_worker_pool_finish(service):
+    frame = np.full((360, 640, 3), 127, dtype=np.uint8)
+    futures = [service.upload_frame_image_async(frame, 'user1', 'cam1', 'fall', 0.9) for _ in range(4)]
+
+    results = [future.result(timeout=10) for future in futures]
+    for result in results:
+        assert result['object_name'] in service.client.objects
+        assert result['thumbnail_object'] == service.thumbnail_object_name(result['object_name'])
+        assert result['thumbnail_object'] in service.client.objects
+    assert service.get_upload_stats()['thumbnails'] == 4
@@ -0,0 +1,70 @@
+"""UltimatePoseEstimator: rolling stats per method ghi/đọc dưới cùng lock, thứ tự method theo p95 + success rate"""
+
+import importlib.util
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+# Load trực tiếp file (package seizure_detection import torch trong __init__)
+_spec = importlib.util.spec_from_file_location(
+    "pose_estimator_under_test",
+    Path(__file__).parent.parent / "src" / "seizure_detection" / "pose_estimator.py")
+pose_module = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(pose_module)
+
+FRAME = np.zeros((120, 160, 3), dtype=np.uint8)
+GOOD_KEYPOINTS = np.tile([50.0, 60.0, 0.9], (15, 1))
+
+
+def make_estimator(results):
+    estimator = pose_module.UltimatePoseEstimator(use_mediapipe=False, use_yolo=False)
+    estimator.yolo_model = object()     # giả lập 2 method có model
+    estimator.min_samples = 3
+    estimator.reorder_interval = 1
+    estimator._extract_with_method = lambda frame, method, person_bbox=None: results[method]()
+    return estimator
+
+
+def test_failing_method_moves_behind_working_one():
+    estimator = make_estimator({'yolo': lambda: None, 'fallback': lambda: GOOD_KEYPOINTS})
+    estimator.preferred_method = 'yolo'
+
+    for _ in range(6):
+        assert estimator.extract_keypoints(FRAME) is not None
+
+    stats = estimator.get_comprehensive_stats()
+    assert stats['method_order'][0] == 'fallback'
+    assert stats['rolling']['fallback']['success_rate'] == 100.0
+    assert stats['rolling']['fallback']['samples'] == 6
+    assert stats['deadline']['calls'] == 6
+
+
+def test_concurrent_records_and_reads_keep_counts():
+    estimator = make_estimator({'yolo': lambda: GOOD_KEYPOINTS, 'fallback': lambda: GOOD_KEYPOINTS})
+    estimator.stats_window = 10_000
+    estimator._rolling_stats = {m: pose_module.deque(maxlen=10_000) for m in estimator._rolling_stats}
+    errors = []
+
+    def call():
+        try:
+            for _ in range(200):
+                estimator.extract_keypoints(FRAME)
+                estimator.get_comprehensive_stats()
+        except Exception as e:      # deque mutated during iteration, ...
+            errors.append(e)
+
+    workers = [threading.Thread(target=call) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors == []
+    stats = estimator.get_comprehensive_stats()
+    assert stats['deadline']['calls'] == 800
+    assert sum(entry['samples'] for entry in stats['rolling'].values()) == sum(
+        perf['total'] for perf in estimator.performance_stats.values())
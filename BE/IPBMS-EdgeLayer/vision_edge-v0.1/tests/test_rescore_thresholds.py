@@ -0,0 +1,119 @@
+"""rescore_thresholds: logic vectorized khớp detector gốc, grid P setting cùng lúc == chạy từng setting"""
+
+import logging
+import sys
+import types
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "examples" / "test"))
+
+import rescore_thresholds as rescore
+
+
+def falling_session(fps=2.0):
+    """Đứng yên 4s -> ngã dần trong 2s -> nằm, có người ở mọi frame"""
+    count = int(12 * fps)
+    standing = np.array([400.0, 200.0, 520.0, 560.0])
+    lying = np.array([330.0, 440.0, 650.0, 580.0])
+    bbox = np.tile(standing, (count, 1))
+    start, end = int(4 * fps), int(6 * fps)
+    for step, t in enumerate(range(start, end)):
+        alpha = (step + 1) / (end - start)
+        bbox[t] = (1 - alpha) * standing + alpha * lying
+    bbox[end:] = lying
+    keypoints = np.zeros((count, 17, 3))
+    return rescore.Session('fall', np.arange(count) / fps, bbox, keypoints, np.zeros(count))
+
+
+def test_parse_grid_is_cartesian_product():
+    base = rescore.default_params()
+    grid = rescore.parse_grid(['fall_confidence_threshold=0.5:0.7:0.1', 'seizure_threshold=0.01,0.05'], base)
+
+    assert len(grid['fall_confidence_threshold']) == 6
+    assert sorted(zip(grid['fall_confidence_threshold'], grid['seizure_threshold'])) == [
+        (0.5, 0.01), (0.5, 0.05), (0.6, 0.01), (0.6, 0.05), (0.7, 0.01), (0.7, 0.05)]
+    assert (grid['predictor_smoothing'] == base['predictor_smoothing']).all()
+    with pytest.raises(ValueError):
+        rescore.parse_grid(['unknown=1'], base)
+
+
+def test_runs_to_event_intervals():
+    mask = np.array([0, 1, 1, 0, 0, 1, 0, 1], dtype=bool)
+    assert rescore._runs(mask) == [(1, 3), (5, 6), (7, 8)]
+    assert rescore._runs(np.zeros(4, dtype=bool)) == []
+
+
+def test_fall_confidence_matches_simple_fall_detector():
+    from fall_detection.simple_fall_detector import SimpleFallDetector
+
+    session = falling_session()
+    grid = rescore.parse_grid([], rescore.default_params())
+    vectorized = rescore.fall_raw_confidence(session, grid)[0]
+
+    detector = SimpleFallDetector(confidence_threshold=rescore.DETECTOR_DEFAULTS['fall_detector_threshold'])
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    expected = []
+    for timestamp, bbox in zip(session.timestamp, session.bbox):
+        result = detector.detect_fall(frame, timestamp=timestamp, person_bbox=bbox.tolist())
+        expected.append(result['confidence'] if result['fall_detected'] else 0.0)
+
+    assert np.allclose(vectorized, expected)
+    assert (vectorized > 0).any()
+
+
+def test_seizure_scores_match_motion_pattern_analysis():
+    pytest.importorskip("torch")
+    from seizure_detection.vsvig_detector import VSViGSeizureDetector
+
+    session = rescore.synthetic_session(3, seconds=60.0)
+    grid = rescore.parse_grid([], rescore.default_params())
+    ready_idx, confidence = rescore.seizure_raw_confidence(session, grid, window=15)
+
+    owner = types.SimpleNamespace(logger=logging.getLogger(__name__))
+    compact = session.keypoints[session.has_keypoints]
+    expected = [VSViGSeizureDetector._analyze_motion_patterns(owner, compact[i - 14:i + 1])
+                for i in range(14, len(compact))]
+    assert len(ready_idx) == len(expected)
+    assert np.allclose(confidence[0], expected)
+
+
+def test_seizure_scores_still_vs_shaking_pose():
+    rng = np.random.default_rng(0)
+    still = np.tile(rng.uniform(200, 400, (1, 1, 17, 2)), (1, 15, 1, 1))
+    phase = rng.uniform(0, 2 * np.pi, (17, 2))
+    shaking = still + 25 * np.sin(2 * np.pi * 0.4 * np.arange(15)[None, :, None, None] + phase)
+    windows = np.concatenate([still, shaking])
+
+    grid = rescore.parse_grid([], rescore.default_params())
+    scores = rescore.seizure_scores(rescore.seizure_window_features(windows), grid)
+    assert scores.shape == (1, 2)
+    assert scores[0, 0] == 0.0 and scores[0, 1] > rescore.DETECTOR_DEFAULTS['seizure_min_score']
+
+
+def test_grid_simulation_equals_per_setting_runs():
+    sessions = [rescore.synthetic_session(index, seconds=90.0) for index in range(4)]
+    grid = rescore.parse_grid(['fall_confidence_threshold=0.4,0.8', 'fall_min_confirmation_frames=1,3',
+                               'predictor_smoothing=0.5,0.8'], rescore.default_params())
+
+    for session in sessions:
+        together = rescore.simulate(session, grid)
+        for row in range(len(grid['predictor_smoothing'])):
+            single = rescore.simulate(session, {name: values[row:row + 1] for name, values in grid.items()})
+            for decision in rescore.DECISIONS:
+                assert (together[decision][row] == single[decision][0]).all(), (session.name, row, decision)
+
+
+def test_rescore_synthetic_sessions_finds_falls():
+    sessions = [rescore.synthetic_session(index, seconds=120.0) for index in range(6)]
+    grid = rescore.parse_grid(['fall_confidence_threshold=0.3,0.99'], rescore.default_params())
+    summary = rescore.rescore(sessions, grid)
+
+    fall = summary['fall']
+    assert set(summary) == set(rescore.DECISIONS)
+    assert fall['recall'][0] > 0
+    hours = sum(session.duration for session in sessions) / 3600.0
+    assert np.allclose(fall['false_alarms_per_hour'], fall['false_alarms'] / hours)
+    assert ((fall['precision'] >= 0) & (fall['precision'] <= 1)).all()
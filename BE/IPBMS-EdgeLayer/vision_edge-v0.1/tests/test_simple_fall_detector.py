@@ -0,0 +1,53 @@
+"""SimpleFallDetector: thumbnail giữ aspect ratio của frame"""
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("PIL")
+
+from fall_detection.simple_fall_detector import SimpleFallDetector
+
+
+def isotropic_motion_pair(width=1280, height=720, sigma=20.0, seed=0):
+    """2 frame noise blur Gaussian đẳng hướng: chuyển động không ưu tiên phương nào (ratio ~ 1)"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(2):
+        noise = rng.uniform(0, 255, (height, width)).astype(np.float32)
+        blurred = cv2.GaussianBlur(noise, (0, 0), sigma)
+        blurred = cv2.normalize(blurred, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+        frames.append(cv2.cvtColor(blurred, cv2.COLOR_GRAY2BGR))
+    return frames
+
+
+def test_thumbnail_keeps_frame_aspect_ratio():
+    detector = SimpleFallDetector()
+    detector.detect_fall(np.zeros((720, 1280, 3), dtype=np.uint8), timestamp=0.0)
+    assert detector.thumbnail_size == (80, 45)
+
+    # Resolution change -> buffer cấp phát lại, không so sánh thumbnail khác kích thước
+    detector.detect_fall(np.zeros((480, 640, 3), dtype=np.uint8), timestamp=1.0)
+    assert detector.thumbnail_size == (80, 60)
+    assert detector.get_stats()['buffer_size'] == 1
+
+
+def test_movement_ratio_matches_full_resolution():
+    frame1, frame2 = isotropic_motion_pair()
+    gray1, gray2 = (cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in (frame1, frame2))
+    full_ratio = SimpleFallDetector._movement_ratio(cv2.absdiff(gray2, gray1))
+
+    # Trước: thumbnail cố định 4:3 trên frame 16:9 -> trục x bị nén, ratio lệch lên gần ngưỡng 1.3
+    fixed1, fixed2 = (cv2.resize(gray, (80, 60), interpolation=cv2.INTER_AREA) for gray in (gray1, gray2))
+    fixed_ratio = SimpleFallDetector._movement_ratio(cv2.absdiff(fixed2, fixed1))
+
+    # Sau: thumbnail của detector theo aspect ratio của frame
+    detector = SimpleFallDetector()
+    detector.thumbnail_size = detector._thumbnail_size_for(frame1)
+    thumb1, thumb2 = (detector._make_thumbnail(frame) for frame in (frame1, frame2))
+    preserved_ratio = SimpleFallDetector._movement_ratio(cv2.absdiff(thumb2, thumb1))
+
+    assert thumb1.shape == (45, 80)
+    assert abs(full_ratio - 1.0) < 0.1
+    assert abs(preserved_ratio - full_ratio) < 0.1
+    assert fixed_ratio - full_ratio > 0.15
@@ -0,0 +1,102 @@
+"""SnapshotService.attach_clip trên snapshot row thật (SQLite), kể cả snapshot còn nằm trong local spool"""
+
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("minio")
+pytest.importorskip("cv2")
+
+from infrastructure.services import snapshot_service as snapshot_module
+from infrastructure.services.local_spool_service import LocalSpool, SPOOL_SNAPSHOT
+from models.generated.snapshots import Snapshots
+from models.generated.snapshot_images import SnapshotImages
+
+CAMERA_ID = str(uuid.uuid4())
+USER_ID = str(uuid.uuid4())
+
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    spool = LocalSpool(spool_dir=str(tmp_path / "spool"), enabled=True)
+    monkeypatch.setattr(spool, 'start_replayer', lambda: None)
+    monkeypatch.setattr(snapshot_module, 'local_spool', spool)
+    return spool
+
+
+@pytest.fixture
+def service(tmp_path, spool, monkeypatch):
+    monkeypatch.setattr(snapshot_module, 'get_minio_service', lambda: None)
+    service = snapshot_module.SnapshotService(f"sqlite:///{tmp_path / 'snapshots.db'}")
+    Snapshots.metadata.create_all(service.engine)
+    SnapshotImages.metadata.create_all(service.engine)
+    return service
+
+
+def insert_snapshot(service, snapshot_id, metadata):
+    """Snapshot + ảnh primary như create_detection_snapshot ghi"""
+    db = service.SessionLocal()
+    try:
+        db.add(Snapshots(snapshot_id=uuid.UUID(snapshot_id), camera_id=uuid.UUID(CAMERA_ID),
+                         user_id=uuid.UUID(USER_ID), snapshot_metadata=json.dumps(metadata),
+                         capture_type='alert_triggered', captured_at=datetime.now(), is_processed=True))
+        db.add(SnapshotImages(image_id=uuid.uuid4(), snapshot_id=uuid.UUID(snapshot_id), is_primary=True,
+                              image_path=f"{USER_ID}/{snapshot_id}.jpg", cloud_url="https://cdn/snapshot.jpg",
+                              created_at=datetime.now(), file_size='1234'))
+        db.commit()
+    finally:
+        db.close()
+
+
+def load(service, snapshot_id):
+    db = service.SessionLocal()
+    try:
+        snapshot = db.query(Snapshots).filter(Snapshots.snapshot_id == uuid.UUID(snapshot_id)).one()
+        images = db.query(SnapshotImages).filter(SnapshotImages.snapshot_id == uuid.UUID(snapshot_id)).all()
+        return json.loads(snapshot.snapshot_metadata), sorted(images, key=lambda image: not image.is_primary)
+    finally:
+        db.close()
+
+
+def test_attach_clip_to_detection_snapshot(service):
+    snapshot_id = str(uuid.uuid4())
+    insert_snapshot(service, snapshot_id, {'event_type': 'fall', 'frame_number': 7})
+
+    image_id = service.attach_clip(snapshot_id, f"{USER_ID}/fall_clip.mp4", "https://cdn/fall_clip.mp4", 2048)
+    assert image_id is not None
+
+    metadata, (primary, clip) = load(service, snapshot_id)
+    assert metadata['event_type'] == 'fall' and metadata['frame_number'] == 7
+    assert metadata['clip_url'] == "https://cdn/fall_clip.mp4"
+    assert metadata['clip_object'] == f"{USER_ID}/fall_clip.mp4"
+    assert primary.is_primary is True
+    assert (str(clip.image_id), clip.is_primary, clip.file_size) == (image_id, False, '2048')
+
+
+def test_clip_for_spooled_snapshot_attaches_after_replay(service, spool):
+    snapshot_id = str(uuid.uuid4())
+    # Pipeline spool snapshot lúc MinIO/DB down (payload như _spool_detection_snapshot)
+    spool.enqueue(SPOOL_SNAPSHOT, {'snapshot_id': snapshot_id, 'camera_id': CAMERA_ID, 'user_id': USER_ID,
+                                   'event_type': 'seizure', 'confidence': 0.8, 'metadata': {}},
+                  blob=b'jpeg')
+
+    clip_url = "https://cdn/seizure_clip.mp4"
+    assert service.attach_clip(snapshot_id, f"{USER_ID}/seizure_clip.mp4", clip_url, 4096) is None
+    assert spool.pending_count() == 2
+
+    # Replay snapshot (MinIO upload + DB) thay bằng insert trực tiếp, clip dùng handler thật
+    spool.register_handler(SPOOL_SNAPSHOT, lambda payload, blob: insert_snapshot(
+        service, payload['snapshot_id'], {'event_type': payload['event_type']}) or True)
+    spool.drain_once()
+    assert spool.pending_count() == 0 and spool.stats['dead'] == 0
+    metadata, (primary, clip) = load(service, snapshot_id)
+    assert metadata['clip_url'] == clip_url
+    assert primary.is_primary and not clip.is_primary
+
+
+def test_clip_for_unknown_snapshot_is_not_spooled(service, spool):
+    assert service.attach_clip(str(uuid.uuid4()), "u/clip.mp4", "https://cdn/clip.mp4", 1) is None
+    assert spool.pending_count() == 0
@@ -0,0 +1,50 @@
+"""StatsRollupService: lọc user+camera, latest_event_at không bị event replay kéo lùi"""
+
+from datetime import datetime
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from infrastructure.services.stats_rollup_service import StatsRollupService, DATABASE_MARKER
+
+NOW = datetime(2026, 10, 19, 9, 30).timestamp()
+
+
+@pytest.fixture
+def rollup():
+    service = StatsRollupService(prefix='test:stats', enabled=True)
+    service._client = fakeredis.FakeRedis(decode_responses=True)
+    return service
+
+
+def test_user_and_camera_filters_combine(rollup):
+    rollup.record_event('fall', user_id='u1', camera_id='cam1', detected_at=NOW)
+    rollup.record_event('abnormal_behavior', user_id='u1', camera_id='cam2', detected_at=NOW + 60)
+    rollup.record_event('fall', user_id='u2', camera_id='cam1', detected_at=NOW + 120)
+
+    stats = rollup.get_event_stats(user_id='u1', camera_id='cam1')
+    assert (stats['total_events'], stats['fall_events'], stats['seizure_events']) == (1, 1, 0)
+    assert stats['latest_event_time'].timestamp() == pytest.approx(NOW)
+
+    assert rollup.get_event_stats(user_id='u1')['total_events'] == 2
+    assert rollup.get_event_stats(camera_id='cam1')['total_events'] == 2
+    assert rollup.get_event_stats(user_id='u1', camera_id='cam2', day=NOW)['seizure_events'] == 1
+
+
+def test_replayed_old_event_keeps_latest(rollup):
+    rollup.record_event('fall', user_id='u1', camera_id='cam1', detected_at=NOW)
+    rollup.record_event('fall', user_id='u1', camera_id='cam1', detected_at=NOW - 3600)
+
+    for stats in (rollup.get_event_stats(), rollup.get_event_stats(user_id='u1'),
+                  rollup.get_event_stats(user_id='u1', camera_id='cam1')):
+        assert stats['total_events'] == 2
+        assert stats['latest_event_time'].timestamp() == pytest.approx(NOW)
+
+
+def test_rebuild_marker_is_versioned(rollup):
+    rollup.client.hset('test:stats:meta', 'database:rebuilt_at', '1.0')
+    assert not rollup.is_ready()
+    rollup.client.hset('test:stats:meta', f'{DATABASE_MARKER}:rebuilt_at', '2.0')
+    assert rollup.is_ready()
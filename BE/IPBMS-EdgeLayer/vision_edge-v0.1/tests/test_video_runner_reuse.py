@@ -0,0 +1,84 @@
+"""Video test runner: reset() giữa các video không giữ state cũ, gom progress / run summary của process pool"""
+
+import json
+import queue
+import sys
+import types
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from service.fall_detection_service import FallDetectionService
+from service.seizure_detection_service import SeizureDetectionService
+
+STANDING = [400.0, 200.0, 520.0, 560.0]
+LYING = [330.0, 440.0, 650.0, 580.0]
+FRAME = np.zeros((480, 640, 3), dtype=np.uint8)
+
+
+def detect(service, timestamp, bbox):
+    return service.detector.detect_fall(FRAME, timestamp=timestamp, person_bbox=bbox)
+
+
+def test_fall_service_reset_drops_previous_video_frames():
+    service = FallDetectionService()
+    detect(service, 0.0, STANDING)
+    detect(service, 0.5, STANDING)
+    assert detect(service, 1.0, LYING)['fall_detected']
+
+    # Video mới: frame đầu không được so với bbox đứng của video trước (không reset -> fall ở 1.5s)
+    service.reset()
+    assert not detect(service, 1.5, LYING)['fall_detected']
+    assert not detect(service, 2.5, LYING)['fall_detected']
+
+
+def test_seizure_service_reset_skips_components_without_reset():
+    service = SeizureDetectionService()
+    calls = []
+    service.detector = types.SimpleNamespace(reset=lambda: calls.append('detector'))
+    service.predictor = object()
+    service.reset()
+    assert calls == ['detector']
+
+
+@pytest.fixture
+def runner_module():
+    pytest.importorskip("pandas")
+    sys.path.insert(0, str(Path(__file__).parent.parent / "examples" / "test"))
+    try:
+        module = pytest.importorskip("test_video_runner")
+    finally:
+        sys.path.pop(0)
+    return module
+
+
+def test_drain_progress_merges_worker_updates(runner_module, capsys):
+    progress_queue = queue.Queue()
+    for item in [(1, 'progress', 10, 100, 0), (2, 'progress', 5, 50, 1), (1, 'progress', 40, 100, 2),
+                 (2, 'completed', 50, 50, 1)]:
+        progress_queue.put(item)
+    progress = {}
+
+    runner_module.VideoTestRunner._drain_progress(progress_queue, progress, total_videos=2, completed=1)
+    assert progress == {1: (40, 100, 2)}
+    assert "#1: 40% (2 ev)" in capsys.readouterr().out
+
+
+def test_run_summary_totals(runner_module, tmp_path):
+    runner = runner_module.VideoTestRunner.__new__(runner_module.VideoTestRunner)
+    runner.output_folders = {'statistics': tmp_path}
+    results = [
+        {'case_number': 1, 'video_name': 'a', 'status': 'completed', 'processing_time': 6.0, 'total_frames': 300,
+         'detected_events': [{}, {}], 'statistics': {'total_falls': 2, 'total_seizures': 0}},
+        {'case_number': 2, 'video_name': 'b', 'status': 'completed', 'processing_time': 4.0, 'total_frames': 200,
+         'detected_events': [{}], 'statistics': {'total_falls': 0, 'total_seizures': 1}},
+        {'case_number': 3, 'video_name': 'c', 'status': 'failed', 'error': 'worker crashed'},
+    ]
+
+    summary = json.loads(runner._write_run_summary(results, wall_time=5.0, workers=2).read_text())
+    assert (summary['completed_cases'], summary['failed_cases']) == (2, 1)
+    assert summary['total_frames'] == 500 and summary['total_events'] == 3
+    assert (summary['total_falls'], summary['total_seizures']) == (2, 1)
+    assert summary['speedup'] == pytest.approx(2.0) and summary['throughput_fps'] == pytest.approx(100.0)
+    assert [case['status'] for case in summary['cases']] == ['completed', 'completed', 'failed']
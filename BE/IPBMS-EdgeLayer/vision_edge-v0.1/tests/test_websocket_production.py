@@ -0,0 +1,56 @@
+"""HealthcareWebSocketServer: subscribe với id sai kiểu -> error reply, server đang restart -> event bus retry"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("websockets")
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "examples"))
+
+import healthcare_websocket_production as ws_module
+from infrastructure.services.event_bus_service import BusEvent, RetryableEventError, _dumps
+from test_event_bus_dead_letter import make_bus
+
+
+def fall_event(entry_id='1-0'):
+    return BusEvent(entry_id, {'type': 'fall', 'ts': '1.0', 'camera_id': 'cam1', 'user_id': 'user-1',
+                               'data': _dumps({'alert_created': True, 'alert': {'status': 'danger'}})})
+
+
+def test_bus_event_while_server_down_is_retried_not_dead_lettered():
+    server = ws_module.HealthcareWebSocketServer()
+    with pytest.raises(RetryableEventError):
+        server._handle_bus_event(fall_event())
+
+    bus = make_bus(max_deliveries=2)
+    bus.client.xadd(bus.stream, {'type': 'fall', 'ts': '1.0', 'camera_id': 'cam1', 'user_id': 'user-1',
+                                 'data': _dumps({'alert_created': True, 'alert': {}})})
+    for _ in range(4):
+        bus._dispatch('websocket', bus.client.deliver(bus.stream), server._handle_bus_event, None)
+    assert bus.dead_letters() == []
+    assert '1-0' not in bus.client.acked
+
+
+def test_split_ids_accepts_scalars_and_rejects_other_types():
+    assert ws_module._split_ids(None) == set()
+    assert ws_module._split_ids(42) == {'42'}
+    assert ws_module._split_ids('a, b,') == {'a', 'b'}
+    assert ws_module._split_ids(['a,b', 7]) == {'a', 'b', '7'}
+    with pytest.raises(ValueError):
+        ws_module._split_ids({'id': 1})
+    with pytest.raises(ValueError):
+        ws_module._split_ids([['nested']])
+
+
+def test_invalid_subscribe_replies_error_and_keeps_subscription():
+    session = ws_module.ClientSession(None, 'client-1', 8, ws_module.DROP_OLDEST, user_ids=['user-1'])
+    reply = json.loads(ws_module.HealthcareWebSocketServer._handle_subscribe(session, {'user_id': 42}))
+    assert reply == {'type': 'subscribed', 'user_id': ['42'], 'camera_id': []}
+
+    reply = json.loads(ws_module.HealthcareWebSocketServer._handle_subscribe(
+        session, {'user_id': 'user-2', 'camera_id': {'bad': True}}))
+    assert reply['type'] == 'error' and reply['error'] == 'invalid_subscription'
+    assert session.user_ids == {'42'} and session.camera_ids == set()